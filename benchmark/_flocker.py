@@ -73,7 +73,7 @@ def create_dataset(
 
     d.addCallback(
         lambda dataset: loop_until_state_found(
-            reactor, control_service.list_datasets_state,
+            reactor, control_service.watch_datasets_state,
             partial(dataset_matches, dataset), timeout
         )
     )
@@ -112,7 +112,7 @@ def create_container(
             )
 
         d = loop_until_state_found(
-            reactor, control_service.list_containers_state,
+            reactor, control_service.watch_containers_state,
             partial(container_matches, container), timeout
         )
 
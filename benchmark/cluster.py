@@ -91,7 +91,7 @@ class BenchmarkCluster(object):
         self._control_service = None
 
     @classmethod
-    def from_acceptance_test_env(cls, env):
+    def from_acceptance_test_env(cls, env, persistent_connections=False):
         """
         Create a cluster from acceptance test environment variables.
 
@@ -99,6 +99,8 @@ class BenchmarkCluster(object):
 
         :param dict env: Dictionary mapping acceptance test environment names
             to values.
+        :param bool persistent_connections: Whether the control service
+            client keeps connections open between requests.
         :return: A ``BenchmarkCluster`` instance.
         :raise KeyError: if expected environment variables do not exist.
         :raise ValueError: if environment variables are malformed.
@@ -127,7 +129,8 @@ class BenchmarkCluster(object):
             port=4523,
             ca_cluster_path=certs.child('cluster.crt'),
             cert_path=certs.child('user.crt'),
-            key_path=certs.child('user.key')
+            key_path=certs.child('user.key'),
+            persistent=persistent_connections,
         )
         try:
             control_node_ip = IPAddress(control_node_address)
@@ -151,12 +154,14 @@ class BenchmarkCluster(object):
         )
 
     @classmethod
-    def from_cluster_yaml(cls, path):
+    def from_cluster_yaml(cls, path, persistent_connections=False):
         """
         Create a cluster from Quick Start Installer files.
 
         :param FilePath path: directory containing Quick Start Installer
             ``cluster.yml`` and certificate files.
+        :param bool persistent_connections: Whether the control service
+            client keeps connections open between requests.
         :return: A ``BenchmarkCluster`` instance.
         """
         with path.child('cluster.yml').open() as f:
@@ -173,7 +178,8 @@ class BenchmarkCluster(object):
             port=4523,
             ca_cluster_path=path.child('cluster.crt'),
             cert_path=path.child('user.crt'),
-            key_path=path.child('user.key')
+            key_path=path.child('user.key'),
+            persistent=persistent_connections,
         )
         return cls(
             IPAddress(control_node_address), control_service, public_addresses,
@@ -0,0 +1,579 @@
+# Copyright ClusterHQ Inc.  See LICENSE file for details.
+"""
+In-process microbenchmarks of control service and agent code paths.
+
+Unlike the ``benchmark`` script these do not need a running cluster.  Each
+benchmark builds a synthetic cluster model with a given number of nodes and
+measures one code path, so that the way its cost grows with the size of the
+cluster can be compared before and after a change.
+"""
+
+import json
+import sys
+from shutil import rmtree
+from tempfile import mkdtemp
+from time import clock, time
+from uuid import uuid4
+
+from twisted.internet.defer import succeed
+from twisted.internet.task import Clock
+from twisted.python.filepath import FilePath
+from twisted.python.usage import Options, UsageError
+from twisted.web.http_headers import Headers
+
+from flocker.control import (
+    Application, ChangeSource, Dataset, Deployment, DeploymentState,
+    DockerImage, Manifestation, Node, NodeState,
+)
+from flocker.control._clusterstate import ClusterStateService
+from flocker.control._diffing import create_diff
+from flocker.control._interest import ClusterInterest, project
+from flocker.control._persistence import (
+    ConfigurationPersistenceService, _ConfigurationEncoder, wire_decode,
+    wire_encode,
+)
+from flocker.control.httpapi import ConfigurationAPIUserV1
+from flocker.node.agents._volumewatcher import VolumeStateWatcher
+from flocker.node.agents.ebs import VolumeOperations, _volume_state_check
+from flocker.node.agents.testtools import FakeEC2, FakeTime
+from flocker.restapi.testtools import MemoryAgent
+
+# Map benchmark names to functions which take a node count and the number of
+# repetitions to time, and return a ``dict`` of measurements.
+_BENCHMARKS = {}
+
+
+def _benchmark(name):
+    """
+    Register a benchmark function under the given name.
+    """
+    def register(function):
+        _BENCHMARKS[name] = function
+        return function
+    return register
+
+
+def cpu_time(repeat, function, *args, **kwargs):
+    """
+    Measure the mean CPU time taken by a function.
+
+    :param int repeat: The number of times to call the function.
+    :param function: The function to call.
+
+    :return: A 2-tuple of the mean CPU seconds per call and the result of the
+        last call.
+    """
+    start = clock()
+    for _ in range(repeat):
+        result = function(*args, **kwargs)
+    return (clock() - start) / repeat, result
+
+
+def _node_pair(applications_per_node, datasets_per_node):
+    """
+    Create matching configuration and state for a single node.
+
+    :return: A 2-tuple of ``Node`` and ``NodeState``.
+    """
+    uuid = uuid4()
+    image = DockerImage.from_string(u"postgresql")
+    manifestations = {}
+    for _ in range(datasets_per_node):
+        dataset_id = unicode(uuid4())
+        manifestations[dataset_id] = Manifestation(
+            dataset=Dataset(dataset_id=dataset_id), primary=True,
+        )
+    applications = [
+        Application(name=u"app-{}".format(i), image=image)
+        for i in range(applications_per_node)
+    ]
+    node = Node(uuid=uuid, applications=applications,
+                manifestations=manifestations)
+    node_state = NodeState(
+        uuid=uuid, hostname=u"192.0.2.1", applications=applications,
+        manifestations=manifestations, devices={},
+        paths={dataset_id: FilePath(b"/flocker").child(bytes(dataset_id))
+               for dataset_id in manifestations},
+    )
+    return node, node_state
+
+
+def build_cluster(node_count, applications_per_node=5, datasets_per_node=5):
+    """
+    Create a synthetic cluster configuration and state.
+
+    :param int node_count: The number of nodes in the cluster.
+    :param int applications_per_node: The number of applications on each node.
+    :param int datasets_per_node: The number of datasets on each node.
+
+    :return: A 2-tuple of ``Deployment`` and ``DeploymentState``.
+    """
+    pairs = [
+        _node_pair(applications_per_node, datasets_per_node)
+        for _ in range(node_count)
+    ]
+    return (
+        Deployment(nodes=[node for (node, _) in pairs]),
+        DeploymentState(nodes=[node_state for (_, node_state) in pairs]),
+    )
+
+
+def change_one_node(state):
+    """
+    Make the kind of change to cluster state that a single agent report
+    causes.
+
+    :param DeploymentState state: The state to change.
+
+    :return DeploymentState: ``state`` with an extra manifestation on one of
+        its nodes.
+    """
+    node = next(iter(state.nodes))
+    dataset = Dataset(dataset_id=unicode(uuid4()))
+    return state.update_node(node.transform(
+        ["manifestations", dataset.dataset_id],
+        Manifestation(dataset=dataset, primary=True),
+    ))
+
+
+@_benchmark("cluster-update")
+def cluster_update(node_count, repeat):
+    """
+    Compare sending a full configuration and state to an agent with sending
+    a diff, after a change to a single node.
+    """
+    configuration, state = build_cluster(node_count)
+    new_state = change_one_node(state)
+
+    def full():
+        data = (wire_encode(configuration), wire_encode(new_state))
+        (wire_decode(data[0]), wire_decode(data[1]))
+        return sum(len(part) for part in data)
+
+    def diff():
+        data = (wire_encode(create_diff(configuration, configuration)),
+                wire_encode(create_diff(state, new_state)))
+        (wire_decode(data[0]).apply(configuration),
+         wire_decode(data[1]).apply(state))
+        return sum(len(part) for part in data)
+
+    full_cpu, full_bytes = cpu_time(repeat, full)
+    diff_cpu, diff_bytes = cpu_time(repeat, diff)
+    return dict(
+        full_bytes=full_bytes, full_cpu=full_cpu,
+        diff_bytes=diff_bytes, diff_cpu=diff_cpu,
+    )
+
+
+@_benchmark("wire-encode")
+def encode(node_count, repeat):
+    """
+    Compare encoding cluster state from scratch with re-encoding it after a
+    change to a single node.
+    """
+    _, state = build_cluster(node_count)
+    new_states = [change_one_node(state) for i in range(repeat)]
+    wire_encode(state)
+    full_cpu, _ = cpu_time(
+        repeat, lambda: json.dumps(state, cls=_ConfigurationEncoder))
+    start = clock()
+    for new_state in new_states:
+        wire_encode(new_state)
+    changed_cpu = (clock() - start) / repeat
+    return dict(full_cpu=full_cpu, changed_cpu=changed_cpu)
+
+
+@_benchmark("wire-decode")
+def decode(node_count, repeat):
+    """
+    Compare decoding cluster configuration and state with and without
+    checking types and invariants.
+    """
+    data = [wire_encode(obj) for obj in build_cluster(node_count)]
+
+    def decode_all(trusted):
+        for encoded in data:
+            wire_decode(encoded, trusted=trusted)
+
+    checked_cpu, _ = cpu_time(repeat, decode_all, False)
+    trusted_cpu, _ = cpu_time(repeat, decode_all, True)
+    return dict(checked_cpu=checked_cpu, trusted_cpu=trusted_cpu)
+
+
+@_benchmark("persistence-writes")
+def persistence_writes(node_count, repeat):
+    """
+    Measure how many configuration changes per second can be made durable as
+    the configuration grows: by rewriting the whole configuration for each
+    change, by journalling each change, and by journalling all the changes
+    at once as a threaded ``ConfigurationPersistenceService`` does for saves
+    made in the same reactor iteration.
+    """
+    configuration, _ = build_cluster(node_count)
+    changed = [configuration]
+    for _ in range(repeat):
+        changed.append(change_one_node(changed[-1]))
+    directory = mkdtemp()
+    try:
+        service = ConfigurationPersistenceService(Clock(), FilePath(directory))
+        service.startService()
+
+        start = time()
+        for deployment in changed[1:]:
+            service._write_snapshot(deployment)
+        rewrite = repeat / (time() - start)
+
+        service._write_snapshot(configuration)
+        start = time()
+        for previous, deployment in zip(changed, changed[1:]):
+            service._threaded_save(previous, deployment)
+        journal = repeat / (time() - start)
+
+        start = time()
+        service._threaded_save(configuration, changed[-1])
+        coalesced = repeat / (time() - start)
+        service.stopService()
+    finally:
+        rmtree(directory)
+    return dict(
+        datasets=sum(len(node.manifestations) for node in configuration.nodes),
+        rewrite_per_second=rewrite, journal_per_second=journal,
+        coalesced_per_second=coalesced,
+    )
+
+
+@_benchmark("node-updates")
+def node_updates(node_count, repeat):
+    """
+    Measure the CPU time the control service spends applying one state
+    update from every node in the cluster, as happens when all the agents
+    converge, that spent looking up a single node, and that spent each
+    second checking for expired state while every agent stays active.
+    """
+    _, state = build_cluster(node_count)
+    updates = [change_one_node(state.set(nodes=[node])).nodes
+               for node in state.nodes]
+    source = ChangeSource()
+
+    def convergence_wave():
+        service = ClusterStateService(Clock())
+        service.apply_changes_from_source(source, list(state.nodes))
+        for [node_state] in updates:
+            service.apply_changes_from_source(source, [node_state])
+        return service.as_deployment()
+
+    wave_cpu, _ = cpu_time(repeat, convergence_wave)
+    uuid = next(iter(state.nodes)).uuid
+    lookup_cpu, _ = cpu_time(repeat, state.get_node, uuid)
+
+    # Each agent has its own source, and keeps it active well within the
+    # expiration time, so nothing ever expires:
+    clock = Clock()
+    service = ClusterStateService(clock)
+    service.startService()
+    sources = []
+    for node_state in state.nodes:
+        node_source = ChangeSource()
+        node_source.set_last_activity(clock.seconds())
+        service.apply_changes_from_source(node_source, [node_state])
+        sources.append(node_source)
+
+    def idle_second():
+        clock.advance(1)
+        for node_source in sources:
+            node_source.set_last_activity(clock.seconds())
+
+    idle_cpu, _ = cpu_time(repeat * 10, idle_second)
+    service.stopService()
+    return dict(
+        wave_cpu=wave_cpu, per_update_cpu=wave_cpu / (2 * node_count),
+        lookup_cpu=lookup_cpu, idle_second_cpu=idle_cpu,
+    )
+
+
+@_benchmark("scoped-update")
+def scoped_update(node_count, repeat):
+    """
+    Compare sending the whole cluster configuration and state to an agent
+    with sending only the parts of it that a dataset agent needs.
+    """
+    configuration, state = build_cluster(node_count)
+    node_uuid = next(iter(state.nodes)).uuid
+
+    def send(interest):
+        # Bypass the encoding cache, which would otherwise make repeated
+        # encoding of the unchanged full configuration and state free:
+        data = [json.dumps(obj, cls=_ConfigurationEncoder) for obj in
+                project(interest, node_uuid, configuration, state)]
+        for encoded in data:
+            wire_decode(encoded)
+        return sum(len(part) for part in data)
+
+    full_cpu, full_bytes = cpu_time(repeat, send, ClusterInterest.ALL)
+    local_cpu, local_bytes = cpu_time(repeat, send, ClusterInterest.LOCAL)
+    return dict(
+        full_bytes=full_bytes, full_cpu=full_cpu,
+        local_bytes=local_bytes, local_cpu=local_cpu,
+    )
+
+
+# The REST API endpoints that ``api-reads`` requests:
+_READ_ENDPOINTS = [
+    b"/configuration/containers", b"/state/containers", b"/state/datasets",
+]
+
+
+@_benchmark("api-reads")
+def api_reads(node_count, repeat):
+    """
+    Measure how many requests per second the REST API can answer for a burst
+    of identical reads of the cluster configuration and state, with and
+    without reusing the encoded response built for the first of them.
+    """
+    configuration, state = build_cluster(node_count)
+    directory = mkdtemp()
+    try:
+        persistence_service = ConfigurationPersistenceService(
+            Clock(), FilePath(directory))
+        persistence_service.startService()
+        persistence_service.save(configuration)
+        cluster_state_service = ClusterStateService(Clock())
+        cluster_state_service.apply_changes_from_source(
+            ChangeSource(), list(state.nodes))
+        api = ConfigurationAPIUserV1(
+            persistence_service, cluster_state_service, Clock())
+        agent = MemoryAgent(api.app.resource())
+
+        def requests_per_second(path, reuse):
+            codes = []
+            start = time()
+            for _ in range(repeat):
+                if not reuse:
+                    api._responses.clear()
+                agent.request(b"GET", path).addCallback(
+                    lambda response: codes.append(response.code))
+            elapsed = time() - start
+            if codes != [200] * repeat:
+                raise RuntimeError(
+                    "Unexpected responses to {}: {}".format(path, codes))
+            return repeat / elapsed
+
+        result = {}
+        for path in _READ_ENDPOINTS:
+            name = path.strip(b"/").replace(b"/", b"_")
+            result[name + b"_built_per_second"] = requests_per_second(
+                path, False)
+            result[name + b"_reused_per_second"] = requests_per_second(
+                path, True)
+        persistence_service.stopService()
+    finally:
+        rmtree(directory)
+    return result
+
+
+# The number of datasets created by each burst of writes in ``api_writes``:
+_WRITE_BATCH = 100
+
+
+class _BodyProducer(object):
+    """
+    A request body for ``MemoryAgent`` which is written all at once, so that
+    requests complete without a running reactor.
+    """
+    def __init__(self, body):
+        self._body = body
+
+    def startProducing(self, consumer):
+        consumer.write(self._body)
+        return succeed(None)
+
+
+@_benchmark("api-writes")
+def api_writes(node_count, repeat):
+    """
+    Measure how many datasets per second the REST API can create in bursts,
+    with one request per dataset and with a single bulk request per burst,
+    and how many configuration changes each way makes.
+    """
+    configuration, _ = build_cluster(node_count)
+    primary = unicode(next(iter(configuration.nodes)).uuid)
+    directory = mkdtemp()
+    try:
+        persistence_service = ConfigurationPersistenceService(
+            Clock(), FilePath(directory))
+        persistence_service.startService()
+        persistence_service.save(configuration)
+        api = ConfigurationAPIUserV1(
+            persistence_service, ClusterStateService(Clock()), Clock())
+        agent = MemoryAgent(api.app.resource())
+        changes = []
+        persistence_service.register(lambda: changes.append(None))
+
+        def post(path, body, codes):
+            agent.request(
+                b"POST", path,
+                Headers({b"content-type": [b"application/json"]}),
+                _BodyProducer(json.dumps(body)),
+            ).addCallback(lambda response: codes.append(response.code))
+
+        def datasets_per_second(bulk):
+            del changes[:]
+            codes = []
+            start = time()
+            for _ in range(repeat):
+                creates = [{u"primary": primary} for _ in range(_WRITE_BATCH)]
+                if bulk:
+                    for create in creates:
+                        create[u"operation"] = u"create"
+                    post(b"/configuration/datasets/_bulk",
+                         {u"operations": creates}, codes)
+                else:
+                    for create in creates:
+                        post(b"/configuration/datasets", create, codes)
+            elapsed = time() - start
+            if bulk:
+                expected = [200] * repeat
+            else:
+                expected = [201] * repeat * _WRITE_BATCH
+            if codes != expected:
+                raise RuntimeError("Unexpected responses: {}".format(codes))
+            return repeat * _WRITE_BATCH / elapsed, len(changes)
+
+        individual, individual_changes = datasets_per_second(False)
+        bulk, bulk_changes = datasets_per_second(True)
+        persistence_service.stopService()
+    finally:
+        rmtree(directory)
+    return dict(
+        individual_per_second=individual, bulk_per_second=bulk,
+        individual_changes=individual_changes, bulk_changes=bulk_changes,
+    )
+
+
+@_benchmark("volume-waits")
+def volume_waits(node_count, repeat):
+    """
+    Compare the EC2 API calls made, and how long after becoming available
+    each volume is noticed, when one volume is created for every node at once
+    and each is waited for by itself with a fixed schedule, with when they
+    are all waited for by one ``VolumeStateWatcher``.
+
+    The volumes are created in a ``FakeEC2`` and take from 2 to 12 seconds to
+    become available, in simulated time.  The results don't vary, so
+    ``repeat`` is ignored.
+    """
+    latencies = [2 + 10.0 * i / node_count for i in range(node_count)]
+
+    def separately():
+        # Sleep for 5 seconds, then poll the volume every second:
+        clock = FakeTime()
+        ec2 = FakeEC2(clock)
+        delays = []
+        for latency in latencies:
+            # Nothing is shared, so each wait can be simulated in turn:
+            started = clock.time()
+            volume_id = ec2.create_volume(latency)
+            clock.sleep(5)
+            while ec2.describe_volumes([volume_id])[0].state != u"available":
+                clock.sleep(1)
+            delays.append(clock.time() - started - latency)
+        return len(ec2.describe_calls), delays
+
+    def watched():
+        clock = FakeTime()
+        ec2 = FakeEC2(clock)
+        watcher = VolumeStateWatcher(ec2.describe_volumes, time_module=clock)
+        waits = []
+        for latency in latencies:
+            volume_id = ec2.create_volume(latency)
+            waits.append(watcher.watch(
+                volume_id,
+                _volume_state_check(VolumeOperations.CREATE, volume_id)))
+        delays = []
+        for latency, wait in zip(latencies, waits):
+            watcher.wait(wait)
+            delays.append(clock.time() - latency)
+        return len(ec2.describe_calls), delays
+
+    separate_calls, separate_delays = separately()
+    watched_calls, watched_delays = watched()
+    return dict(
+        separate_describe_calls=separate_calls,
+        watched_describe_calls=watched_calls,
+        separate_mean_delay=sum(separate_delays) / node_count,
+        watched_mean_delay=sum(watched_delays) / node_count,
+    )
+
+
+def _parse_node_counts(value):
+    """
+    Parse a comma-separated list of node counts.
+    """
+    try:
+        return [int(count) for count in value.split(",")]
+    except ValueError:
+        raise UsageError("Invalid node counts: {!r}".format(value))
+
+
+class MicrobenchmarkOptions(Options):
+    """
+    Command line options for the ``microbenchmark`` script.
+    """
+    description = "Run in-process control service microbenchmarks."
+
+    optParameters = [
+        ['benchmark', None, None,
+         'The benchmark to run. Default: all of them.'],
+        ['node-counts', None, [10, 100, 1000],
+         'Comma-separated cluster sizes to benchmark.', _parse_node_counts],
+        ['repeat', None, 5,
+         'The number of times to repeat each measurement.', int],
+    ]
+
+    def postOptions(self):
+        if (self['benchmark'] is not None and
+                self['benchmark'] not in _BENCHMARKS):
+            raise UsageError(
+                "Unknown benchmark {!r}, choose from: {}".format(
+                    self['benchmark'], ", ".join(sorted(_BENCHMARKS))))
+
+
+def run(names, node_counts, repeat):
+    """
+    Run some microbenchmarks.
+
+    :param names: The names of the benchmarks to run.
+    :param node_counts: The cluster sizes to run each benchmark with.
+    :param int repeat: The number of times to repeat each measurement.
+
+    :return: A ``list`` of result ``dict``\\ s.
+    """
+    results = []
+    for name in names:
+        for node_count in node_counts:
+            result = dict(benchmark=name, nodes=node_count)
+            result.update(_BENCHMARKS[name](node_count, repeat))
+            results.append(result)
+    return results
+
+
+def main(argv):
+    options = MicrobenchmarkOptions()
+    try:
+        options.parseOptions(argv)
+    except UsageError as e:
+        sys.stderr.write("{}\n{}\n".format(options, e))
+        raise SystemExit(1)
+    if options['benchmark'] is None:
+        names = sorted(_BENCHMARKS)
+    else:
+        names = [options['benchmark']]
+    json.dump(
+        run(names, options['node-counts'], options['repeat']),
+        sys.stdout, indent=2,
+    )
+    sys.stdout.write("\n")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -88,6 +88,11 @@ class BenchmarkOptions(Options):
         ['log-file', None, None, 'File for writing log, stderr by default.'],
     ]
 
+    optFlags = [
+        ['persistent-connections', None,
+         'Keep connections to the control service open between requests.'],
+    ]
+
 
 def usage(options, message=None):
     sys.stderr.write(options.getUsage())
@@ -187,7 +192,8 @@ def get_cluster(options, env):
     if cluster_option:
         try:
             cluster = BenchmarkCluster.from_cluster_yaml(
-                FilePath(cluster_option)
+                FilePath(cluster_option),
+                persistent_connections=options['persistent-connections'],
             )
         except IOError as e:
             usage(
@@ -195,7 +201,9 @@ def get_cluster(options, env):
             )
     else:
         try:
-            cluster = BenchmarkCluster.from_acceptance_test_env(env)
+            cluster = BenchmarkCluster.from_acceptance_test_env(
+                env, persistent_connections=options['persistent-connections'],
+            )
         except KeyError as e:
             usage(
                 options, 'Environment variable {!r} not set.'.format(e.args[0])
@@ -0,0 +1,81 @@
+# Copyright ClusterHQ Inc.  See LICENSE file for details.
+
+"""
+Tests for ``benchmark.microbenchmark``.
+"""
+
+from twisted.python.usage import UsageError
+
+from flocker.testtools import TestCase
+
+from benchmark.microbenchmark import (
+    MicrobenchmarkOptions, build_cluster, change_one_node, run, _BENCHMARKS,
+)
+
+
+class BuildClusterTests(TestCase):
+    """
+    Tests for ``build_cluster`` and ``change_one_node``.
+    """
+    def test_sizes(self):
+        """
+        ``build_cluster`` creates matching configuration and state with the
+        requested number of nodes.
+        """
+        configuration, state = build_cluster(3, datasets_per_node=2)
+        self.assertEqual(
+            (3, 3, {node.uuid for node in configuration.nodes}, [2, 2, 2]),
+            (len(configuration.nodes), len(state.nodes),
+             {node.uuid for node in state.nodes},
+             [len(node.manifestations) for node in state.nodes]),
+        )
+
+    def test_change_one_node(self):
+        """
+        ``change_one_node`` returns different state with the same nodes.
+        """
+        _, state = build_cluster(3)
+        new_state = change_one_node(state)
+        self.assertEqual(
+            (False, {node.uuid for node in state.nodes}),
+            (state == new_state, {node.uuid for node in new_state.nodes}),
+        )
+
+
+class RunTests(TestCase):
+    """
+    Tests for ``run``.
+    """
+    def test_all_benchmarks(self):
+        """
+        Every registered benchmark can be run and produces a result for each
+        node count.
+        """
+        names = sorted(_BENCHMARKS)
+        results = run(names, [1, 2], 1)
+        self.assertEqual(
+            [(name, count) for name in names for count in [1, 2]],
+            [(result["benchmark"], result["nodes"]) for result in results],
+        )
+
+
+class MicrobenchmarkOptionsTests(TestCase):
+    """
+    Tests for ``MicrobenchmarkOptions``.
+    """
+    def test_node_counts(self):
+        """
+        ``--node-counts`` is parsed as a comma-separated list of integers.
+        """
+        options = MicrobenchmarkOptions()
+        options.parseOptions(["--node-counts", "1,20,300"])
+        self.assertEqual([1, 20, 300], options["node-counts"])
+
+    def test_unknown_benchmark(self):
+        """
+        An unknown benchmark name is rejected.
+        """
+        options = MicrobenchmarkOptions()
+        self.assertRaises(
+            UsageError, options.parseOptions, ["--benchmark", "no-such"],
+        )
@@ -14,6 +14,7 @@ from twisted.python.filepath import FilePath
 
 from flocker.testtools import TestCase
 
+from benchmark.cluster import BenchmarkCluster
 from benchmark.script import (
     BenchmarkOptions, get_cluster, validate_configuration, get_config_by_name,
     parse_userdata, main
@@ -113,6 +114,21 @@ class ClusterConfigurationTests(TestCase):
             IPAddress(_YAML_CONTROL_SERVICE_ADDRESS)
         )
 
+    def test_persistent_connections(self):
+        """
+        The ``--persistent-connections`` option makes the cluster's control
+        service client keep connections open between requests.
+        """
+        options = BenchmarkOptions()
+        options.parseOptions(['--persistent-connections'])
+        cluster = get_cluster(options, self.environ)
+        self.assertEqual(
+            (False, True),
+            (BenchmarkCluster.from_acceptance_test_env(self.environ)
+             ._control_service_factory.keywords['persistent'],
+             cluster._control_service_factory.keywords['persistent']),
+        )
+
     def test_missing_environment(self):
         """
         If no cluster option and no environment, script fails
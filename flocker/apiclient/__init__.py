@@ -10,9 +10,13 @@ from ._client import (
     IFlockerAPIV1Client, FakeFlockerClient, Dataset, DatasetState,
     DatasetAlreadyExists, FlockerClient, Lease, LeaseAlreadyHeld,
     conditional_create, DatasetsConfiguration, Node, MountedDataset,
+    BulkUpdateFailed, CreateDataset, MoveDataset, DeleteDataset,
+    ResizeDataset,
 )
 
 __all__ = ["IFlockerAPIV1Client", "FakeFlockerClient", "Dataset",
            "DatasetState", "DatasetAlreadyExists", "FlockerClient",
            "Lease", "LeaseAlreadyHeld", "conditional_create",
-           "DatasetsConfiguration", "Node", "MountedDataset", ]
+           "DatasetsConfiguration", "Node", "MountedDataset",
+           "BulkUpdateFailed", "CreateDataset", "MoveDataset",
+           "DeleteDataset", "ResizeDataset", ]
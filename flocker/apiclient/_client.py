@@ -5,9 +5,10 @@ Client for the Flocker REST API.
 """
 
 from uuid import UUID, uuid4
-from json import dumps
+from json import dumps, loads
 from datetime import datetime
 from os import environ
+from urllib import urlencode
 
 from ipaddr import IPv4Address, IPv6Address, IPAddress
 
@@ -17,13 +18,17 @@ from zope.interface import Interface, implementer
 
 from pyrsistent import PClass, field, pmap_field, pmap
 
+from repoze.lru import LRUCache
+
 from eliot import ActionType, Field
 from eliot.twisted import DeferredContext
 
 from twisted.internet.defer import succeed, fail
+from twisted.web.client import HTTPConnectionPool
 from twisted.python.filepath import FilePath
 from twisted.web.http import (
-    CREATED, OK, CONFLICT, NOT_FOUND, PRECONDITION_FAILED,
+    CREATED, OK, CONFLICT, NOT_FOUND, PRECONDITION_FAILED, NOT_MODIFIED,
+    BAD_REQUEST,
 )
 from twisted.internet.utils import getProcessOutput
 from twisted.internet.task import deferLater
@@ -52,6 +57,23 @@ _LOG_CONDITIONAL_CREATE = ActionType(
 
 NoneType = type(None)
 
+# The most idle connections to the control service a persistent
+# ``FlockerClient`` keeps open:
+_MAX_IDLE_CONNECTIONS = 2
+
+# How many seconds a persistent ``FlockerClient`` keeps an idle connection to
+# the control service open for:
+_IDLE_CONNECTION_TIMEOUT = 60
+
+# The most ``GET`` responses a ``FlockerClient`` keeps to reuse while they
+# are unchanged, so that requests for many different URLs don't grow without
+# bound:
+_MAX_KEPT_RESPONSES = 16
+
+# How many seconds the ``watch_*`` methods of ``IFlockerAPIV1Client`` wait for
+# a change by default:
+DEFAULT_WATCH_TIMEOUT = 30
+
 
 class ServerResponseMissingElementError(Exception):
     """
@@ -192,6 +214,59 @@ class Node(PClass):
     )
 
 
+class CreateDataset(PClass):
+    """
+    An operation for ``IFlockerAPIV1Client.bulk_update_datasets`` which
+    creates a new dataset.
+
+    :attr UUID primary: The node where the dataset should manifest.
+    :attr int|None maximum_size: Size of the dataset in bytes or ``None``
+        if no particular size is required.
+    :attr UUID|None dataset_id: The UUID to use for the dataset, or ``None``
+        to have one generated.
+    :attr metadata: A mapping between unicode keys and values.
+    """
+    primary = field(type=UUID, mandatory=True)
+    maximum_size = field(type=(int, NoneType), initial=None)
+    dataset_id = field(type=(UUID, NoneType), initial=None)
+    metadata = pmap_field(unicode, unicode)
+
+
+class MoveDataset(PClass):
+    """
+    An operation for ``IFlockerAPIV1Client.bulk_update_datasets`` which
+    moves a dataset to a new location.
+
+    :attr UUID dataset_id: The UUID of the dataset.
+    :attr UUID primary: The node where the dataset should manifest.
+    """
+    dataset_id = field(type=UUID, mandatory=True)
+    primary = field(type=UUID, mandatory=True)
+
+
+class DeleteDataset(PClass):
+    """
+    An operation for ``IFlockerAPIV1Client.bulk_update_datasets`` which
+    deletes a dataset.
+
+    :attr UUID dataset_id: The UUID of the dataset.
+    """
+    dataset_id = field(type=UUID, mandatory=True)
+
+
+class ResizeDataset(PClass):
+    """
+    An operation for ``IFlockerAPIV1Client.bulk_update_datasets`` which
+    changes the maximum size of a dataset.
+
+    :attr UUID dataset_id: The UUID of the dataset.
+    :attr int|None maximum_size: The new size of the dataset in bytes or
+        ``None`` if no particular size is required.
+    """
+    dataset_id = field(type=UUID, mandatory=True)
+    maximum_size = field(type=(int, NoneType), mandatory=True)
+
+
 class DatasetAlreadyExists(Exception):
     """
     The suggested dataset ID already exists.
@@ -217,6 +292,20 @@ class ConfigurationChanged(Exception):
     """
 
 
+class BulkUpdateFailed(Exception):
+    """
+    None of the operations passed to
+    ``IFlockerAPIV1Client.bulk_update_datasets`` were applied because at
+    least one of them failed.
+
+    :ivar list errors: For each operation in order, ``None`` if it did not
+        fail or otherwise the exception describing why it failed.
+    """
+    def __init__(self, errors):
+        Exception.__init__(self, errors)
+        self.errors = errors
+
+
 class DatasetsConfiguration(PClass):
     """
     Currently configured datasets.
@@ -288,21 +377,64 @@ class IFlockerAPIV1Client(Interface):
         been deleted, after the configuration has been updated.
         """
 
-    def list_datasets_configuration():
+    def bulk_update_datasets(operations, configuration_tag=None):
+        """
+        Create, move, delete or resize many datasets in a single change to
+        the configuration.
+
+        Either all of the operations are applied, in order, or none are.
+
+        :param operations: A sequence of ``CreateDataset``, ``MoveDataset``,
+            ``DeleteDataset`` and ``ResizeDataset`` instances.
+        :param configuration_tag: If not ``None``, should be
+            ``DatasetsConfiguration.tag``.
+
+        :return: ``Deferred`` that fires after the configuration has been
+            updated with a ``list`` of the ``Dataset`` resulting from each
+            operation, or errbacking with ``BulkUpdateFailed``.
+        """
+
+    def list_datasets_configuration(dataset_id=None, metadata=None):
         """
         Return the configured datasets, excluding any datasets that
         have been deleted.
 
+        :param UUID dataset_id: If not ``None``, only return the dataset with
+            this ID.
+        :param metadata: If not ``None``, a mapping between unicode keys and
+            values; only return the datasets with these metadata values.
+
         :return: ``Deferred`` firing with a ``DatasetsConfiguration``.
         """
 
-    def list_datasets_state():
+    def list_datasets_state(dataset_id=None, primary=None):
         """
         Return the actual datasets in the cluster.
 
+        :param UUID dataset_id: If not ``None``, only return the dataset with
+            this ID.
+        :param UUID primary: If not ``None``, only return the datasets
+            manifest on the node with this UUID.
+
         :return: ``Deferred`` firing with iterable of ``DatasetState``.
         """
 
+    def watch_datasets_state(timeout=DEFAULT_WATCH_TIMEOUT, dataset_id=None,
+                             primary=None):
+        """
+        Wait for the actual datasets in the cluster to change.
+
+        :param float timeout: The most seconds to wait for a change.
+        :param UUID dataset_id: See ``list_datasets_state``.
+        :param UUID primary: See ``list_datasets_state``.
+
+        :return: ``Deferred`` firing with iterable of ``DatasetState``, once
+            the actual datasets differ from those last returned by
+            ``list_datasets_state`` or ``watch_datasets_state``, or once
+            ``timeout`` seconds have passed.  It may also fire sooner with
+            unchanged datasets, so callers should check the result.
+        """
+
     def acquire_lease(dataset_id, node_uuid, expires):
         """
         Acquire a lease on a dataset on a given node.
@@ -329,10 +461,15 @@ class IFlockerAPIV1Client(Interface):
         :return: ``Deferred`` firing with the released ``Lease`` on success.
         """
 
-    def list_leases():
+    def list_leases(dataset_id=None, node_uuid=None):
         """
         Return current leases.
 
+        :param UUID dataset_id: If not ``None``, only return the lease on the
+            dataset with this ID.
+        :param UUID node_uuid: If not ``None``, only return the leases held
+            by the node with this UUID.
+
         :return: ``Deferred`` firing with a list of ``Lease`` instance.
         """
 
@@ -372,13 +509,30 @@ class IFlockerAPIV1Client(Interface):
         :return: ``Deferred`` firing with ``iterable`` of ``Container``.
         """
 
-    def list_containers_state():
+    def list_containers_state(node_uuid=None):
         """
         Return the actual containers in the cluster.
 
+        :param UUID node_uuid: If not ``None``, only return the containers on
+            the node with this UUID.
+
         :return: ``Deferred`` firing with ``iterable`` of ``ContainerState``.
         """
 
+    def watch_containers_state(timeout=DEFAULT_WATCH_TIMEOUT, node_uuid=None):
+        """
+        Wait for the actual containers in the cluster to change.
+
+        :param float timeout: The most seconds to wait for a change.
+        :param UUID node_uuid: See ``list_containers_state``.
+
+        :return: ``Deferred`` firing with ``iterable`` of ``ContainerState``,
+            once the actual containers differ from those last returned by
+            ``list_containers_state`` or ``watch_containers_state``, or once
+            ``timeout`` seconds have passed.  It may also fire sooner with
+            unchanged containers, so callers should check the result.
+        """
+
     def delete_container(name):
         """
         :param unicode name: The name of the container to be deleted.
@@ -461,15 +615,88 @@ class FakeFlockerClient(object):
             [dataset_id, "primary"], primary)
         return succeed(self._configured_datasets[dataset_id])
 
-    def list_datasets_configuration(self):
+    def bulk_update_datasets(self, operations, configuration_tag=None):
+        try:
+            self._ensure_matching_tag(configuration_tag)
+        except:
+            return fail()
+
+        datasets = self._configured_datasets
+        results = []
+        errors = []
+        for operation in operations:
+            try:
+                datasets, dataset = self._apply_operation(datasets, operation)
+            except Exception as e:
+                errors.append(e)
+            else:
+                results.append(dataset)
+                errors.append(None)
+        if len(results) < len(operations):
+            return fail(BulkUpdateFailed(errors))
+        self._configured_datasets = datasets
+        return succeed(results)
+
+    def _apply_operation(self, datasets, operation):
+        """
+        Apply one operation passed to ``bulk_update_datasets``.
+
+        :param datasets: Map ``UUID`` to the configured ``Dataset``.
+        :param operation: A ``CreateDataset``, ``MoveDataset``,
+            ``DeleteDataset`` or ``ResizeDataset``.
+
+        :raise: An exception describing why the operation failed.
+        :return: A tuple of the updated ``datasets`` and the ``Dataset``
+            resulting from the operation.
+        """
+        if isinstance(operation, CreateDataset):
+            dataset_id = operation.dataset_id
+            if dataset_id is None:
+                dataset_id = uuid4()
+            if dataset_id in datasets:
+                raise DatasetAlreadyExists()
+            dataset = Dataset(primary=operation.primary,
+                              maximum_size=operation.maximum_size,
+                              dataset_id=dataset_id,
+                              metadata=operation.metadata)
+            return datasets.set(dataset_id, dataset), dataset
+
+        if operation.dataset_id not in datasets:
+            raise ResponseError(NOT_FOUND, u"Dataset not found.")
+        dataset = datasets[operation.dataset_id]
+        if isinstance(operation, DeleteDataset):
+            return datasets.remove(operation.dataset_id), dataset
+        if isinstance(operation, MoveDataset):
+            dataset = dataset.set(primary=operation.primary)
+        else:
+            dataset = dataset.set(maximum_size=operation.maximum_size)
+        return datasets.set(operation.dataset_id, dataset), dataset
+
+    def list_datasets_configuration(self, dataset_id=None, metadata=None):
+        if metadata is None:
+            metadata = {}
         return succeed(DatasetsConfiguration(
             # Since the tag is opaque object, using the actual configuration
             # is a fine way to have a matching tag.
             tag=self._configured_datasets,
-            datasets=self._configured_datasets))
+            datasets={
+                uuid: dataset
+                for uuid, dataset in self._configured_datasets.items()
+                if dataset_id in (None, uuid) and all(
+                    dataset.metadata.get(key) == value
+                    for key, value in metadata.items())
+            }))
+
+    def list_datasets_state(self, dataset_id=None, primary=None):
+        return succeed([
+            dataset for dataset in self._state_datasets
+            if dataset_id in (None, dataset.dataset_id) and
+            primary in (None, dataset.primary)
+        ])
 
-    def list_datasets_state(self):
-        return succeed(self._state_datasets)
+    def watch_datasets_state(self, timeout=DEFAULT_WATCH_TIMEOUT,
+                             dataset_id=None, primary=None):
+        return self.list_datasets_state(dataset_id, primary)
 
     def synchronize_state(self):
         """
@@ -513,12 +740,14 @@ class FakeFlockerClient(object):
                   expires=((lease.expiration - self._NOW).total_seconds()
                            if lease.expiration is not None else None)))
 
-    def list_leases(self):
+    def list_leases(self, dataset_id=None, node_uuid=None):
         return succeed([
             Lease(dataset_id=l.dataset_id, node_uuid=l.node_id,
                   expires=((l.expiration - self._NOW).total_seconds()
                            if l.expiration is not None else None))
-            for l in self._leases.values()])
+            for l in self._leases.values()
+            if dataset_id in (None, l.dataset_id) and
+            node_uuid in (None, l.node_id)])
 
     def version(self):
         return succeed(
@@ -545,8 +774,15 @@ class FakeFlockerClient(object):
     def list_containers_configuration(self):
         return succeed(self._configured_containers.values())
 
-    def list_containers_state(self):
-        return succeed(self._state_containers)
+    def list_containers_state(self, node_uuid=None):
+        return succeed([
+            container for container in self._state_containers
+            if node_uuid in (None, container.node_uuid)
+        ])
+
+    def watch_containers_state(self, timeout=DEFAULT_WATCH_TIMEOUT,
+                               node_uuid=None):
+        return self.list_containers_state(node_uuid)
 
     def delete_container(self, name):
         self._configured_containers = self._configured_containers.remove(name)
@@ -572,13 +808,81 @@ class NotFound(Exception):
     """
 
 
+def _bulk_operation_body(operation):
+    """
+    Encode an operation passed to ``bulk_update_datasets`` for the request
+    body.
+
+    :param operation: A ``CreateDataset``, ``MoveDataset``,
+        ``DeleteDataset`` or ``ResizeDataset``.
+
+    :return dict: The JSON-encodable operation.
+    """
+    if isinstance(operation, CreateDataset):
+        body = {u"operation": u"create",
+                u"primary": unicode(operation.primary),
+                u"metadata": dict(operation.metadata)}
+        if operation.dataset_id is not None:
+            body[u"dataset_id"] = unicode(operation.dataset_id)
+        if operation.maximum_size is not None:
+            body[u"maximum_size"] = operation.maximum_size
+        return body
+    body = {u"dataset_id": unicode(operation.dataset_id)}
+    if isinstance(operation, MoveDataset):
+        body.update(operation=u"move", primary=unicode(operation.primary))
+    elif isinstance(operation, DeleteDataset):
+        body.update(operation=u"delete")
+    else:
+        body.update(operation=u"resize", maximum_size=operation.maximum_size)
+    return body
+
+
+def _bulk_update_failed(body):
+    """
+    Describe a ``BAD_REQUEST`` response to a bulk dataset request.
+
+    :param bytes body: The body of the response.
+
+    :return: ``BulkUpdateFailed`` if some operations failed, or otherwise
+        ``ResponseError`` if the request itself was rejected.
+    """
+    errors = loads(body).get(u"errors", [])
+    if not any(isinstance(error, dict) for error in errors):
+        return ResponseError(BAD_REQUEST, body)
+
+    def exception(error):
+        if error is None:
+            return None
+        if error[u"code"] == CONFLICT:
+            return DatasetAlreadyExists(error[u"description"])
+        return ResponseError(error[u"code"], error[u"description"])
+    return BulkUpdateFailed([exception(error) for error in errors])
+
+
+def _query_path(path, arguments):
+    """
+    Add query arguments to the path of a request.
+
+    :param bytes path: The path of the request.
+    :param dict arguments: Map ``bytes`` argument names to their values, or
+        to ``None`` to leave them out.  Values are converted to ``unicode``.
+    :return: ``bytes`` path, with a query string if there are any arguments.
+    """
+    query = sorted(
+        (name, unicode(value).encode("utf-8"))
+        for name, value in arguments.items() if value is not None)
+    if not query:
+        return path
+    return path + b"?" + urlencode(query)
+
+
 @implementer(IFlockerAPIV1Client)
 class FlockerClient(object):
     """
     A client for the Flocker V1 REST API.
     """
     def __init__(self, reactor, host, port,
-                 ca_cluster_path, cert_path, key_path):
+                 ca_cluster_path, cert_path, key_path, persistent=False):
         """
         :param reactor: Reactor to use for connections.
         :param bytes host: Host to connect to.
@@ -586,15 +890,38 @@ class FlockerClient(object):
         :param FilePath ca_cluster_path: Path to cluster's CA certificate.
         :param FilePath cert_path: Path to user certificate.
         :param FilePath key_path: Path to user private key.
+        :param bool persistent: If ``True`` keep connections open between
+            requests, so that only the first request pays for a TCP and TLS
+            handshake.  Otherwise every request uses a new connection.
         """
         self._reactor = reactor
+        self._pool = None
+        if persistent:
+            self._pool = HTTPConnectionPool(reactor, persistent=True)
+            self._pool.maxPersistentPerHost = _MAX_IDLE_CONNECTIONS
+            self._pool.cachedConnectionTimeout = _IDLE_CONNECTION_TIMEOUT
         self._treq = treq_with_authentication(reactor, ca_cluster_path,
-                                              cert_path, key_path)
+                                              cert_path, key_path,
+                                              pool=self._pool)
         self._base_url = b"https://%s:%d/v1" % (host, port)
+        # Map the URLs of the most recent ``GET`` requests to the ``ETag``
+        # header, decoded body and headers of the latest response that had
+        # one:
+        self._responses = LRUCache(_MAX_KEPT_RESPONSES)
+
+    def close(self):
+        """
+        Close any connections kept open between requests.
+
+        :return: ``Deferred`` that fires when the connections are closed.
+        """
+        if self._pool is None:
+            return succeed(None)
+        return self._pool.closeCachedConnections()
 
     def _request_with_headers(
             self, method, path, body, success_codes, error_codes=None,
-            configuration_tag=None):
+            configuration_tag=None, wait=None):
         """
         Send a HTTP request to the Flocker API, return decoded JSON body and
         headers.
@@ -608,12 +935,27 @@ class FlockerClient(object):
             raised if it is present, or ``None`` to set no errors.
         :param configuration_tag: If not ``None``, include value as
             ``X-If-Configuration-Matches`` header.
+        :param wait: If not ``None``, the most seconds to wait for a ``GET``
+            response to change from the one kept for it.
+
+        ``GET`` responses with an ``ETag`` header are kept for the
+        ``_MAX_KEPT_RESPONSES`` most recently requested URLs, and the next
+        request for the same URL only asks for the response again if it has
+        changed.
 
         :return: ``Deferred`` firing a tuple of (decoded JSON,
             response headers).
         """
         url = self._base_url + path
-        action = _LOG_HTTP_REQUEST(url=url, method=method, request_body=body)
+        kept = None
+        if method == b"GET":
+            kept = self._responses.get(url)
+        request_url = url
+        if kept is not None and wait is not None:
+            request_url = b"%s%swait=%s" % (
+                url, b"&" if b"?" in url else b"?", wait)
+        action = _LOG_HTTP_REQUEST(
+            url=request_url, method=method, request_body=body)
 
         if error_codes is None:
             error_codes = {}
@@ -624,20 +966,34 @@ class FlockerClient(object):
             raise ResponseError(code, body)
 
         def got_response(response):
+            if response.code == NOT_MODIFIED and kept is not None:
+                action.addSuccessFields(response_code=response.code)
+                d = content(response)
+                d.addCallback(lambda _: kept[1:])
+                return d
             if response.code in success_codes:
                 action.addSuccessFields(response_code=response.code)
                 d = json_content(response)
                 d.addCallback(lambda decoded_body:
                               (decoded_body, response.headers))
+                etag = response.headers.getRawHeaders(b"ETag", [None])[0]
+                if method == b"GET" and etag is not None:
+                    d.addCallback(keep, etag)
                 return d
             else:
                 d = content(response)
                 d.addCallback(error, response.code)
                 return d
 
+        def keep(result, etag):
+            self._responses.put(url, (etag,) + result)
+            return result
+
         # Serialize the current task ID so we can trace logging across
         # processes:
         headers = {b"X-Eliot-Task-Id": action.serialize_task_id()}
+        if kept is not None:
+            headers[b"If-None-Match"] = [kept[0]]
         data = None
         if body is not None:
             headers["content-type"] = b"application/json"
@@ -648,10 +1004,8 @@ class FlockerClient(object):
 
         with action.context():
             request = DeferredContext(self._treq.request(
-                method, url,
+                method, request_url,
                 data=data, headers=headers,
-                # Keep tests from having dirty reactor problems:
-                persistent=False
                 ))
         request.addCallback(got_response)
 
@@ -718,9 +1072,28 @@ class FlockerClient(object):
         request.addCallback(self._parse_configuration_dataset)
         return request
 
-    def list_datasets_configuration(self):
+    def bulk_update_datasets(self, operations, configuration_tag=None):
+        request = self._request(
+            b"POST", b"/configuration/datasets/_bulk",
+            {u"operations": [_bulk_operation_body(operation)
+                             for operation in operations]},
+            {OK},
+            {BAD_REQUEST: _bulk_update_failed,
+             PRECONDITION_FAILED: ConfigurationChanged},
+            configuration_tag=configuration_tag)
+        request.addCallback(
+            lambda results: [self._parse_configuration_dataset(result)
+                             for result in results])
+        return request
+
+    def list_datasets_configuration(self, dataset_id=None, metadata=None):
+        arguments = {b"dataset_id": dataset_id}
+        if metadata is not None:
+            for key, value in metadata.items():
+                arguments[b"metadata." + key.encode("utf-8")] = value
         request = self._request_with_headers(
-            b"GET", b"/configuration/datasets", None, {OK})
+            b"GET", _query_path(b"/configuration/datasets", arguments),
+            None, {OK})
         # In order to accomodate the client running against older versions of
         # flocker, put an artificial tag of None in if we are running against
         # an older server.
@@ -735,8 +1108,26 @@ class FlockerClient(object):
         )
         return request
 
-    def list_datasets_state(self):
-        request = self._request(b"GET", b"/state/datasets", None, {OK})
+    def list_datasets_state(self, dataset_id=None, primary=None):
+        return self._list_datasets_state(dataset_id, primary)
+
+    def watch_datasets_state(self, timeout=DEFAULT_WATCH_TIMEOUT,
+                             dataset_id=None, primary=None):
+        return self._list_datasets_state(dataset_id, primary, wait=timeout)
+
+    def _list_datasets_state(self, dataset_id, primary, wait=None):
+        """
+        Get the actual datasets in the cluster.
+
+        :param dataset_id: See ``list_datasets_state``.
+        :param primary: See ``list_datasets_state``.
+        :param wait: See ``_request_with_headers``.
+        :return: ``Deferred`` firing with ``list`` of ``DatasetState``.
+        """
+        request = self._request(
+            b"GET", _query_path(b"/state/datasets", {
+                b"dataset_id": dataset_id, b"primary": primary}),
+            None, {OK}, wait=wait)
 
         def parse_dataset_state(dataset_dict):
             primary = dataset_dict.get(u"primary")
@@ -783,9 +1174,11 @@ class FlockerClient(object):
         request.addCallback(self._parse_lease)
         return request
 
-    def list_leases(self):
+    def list_leases(self, dataset_id=None, node_uuid=None):
         request = self._request(
-            b"GET", b"/configuration/leases", None, {OK})
+            b"GET", _query_path(b"/configuration/leases", {
+                b"dataset_id": dataset_id, b"node_uuid": node_uuid}),
+            None, {OK})
         request.addCallback(
             lambda results: [self._parse_lease(l) for l in results])
         return request
@@ -841,8 +1234,25 @@ class FlockerClient(object):
         )
         return d
 
-    def list_containers_state(self):
-        d = self._request(b"GET", b"/state/containers", None, {OK})
+    def list_containers_state(self, node_uuid=None):
+        return self._list_containers_state(node_uuid)
+
+    def watch_containers_state(self, timeout=DEFAULT_WATCH_TIMEOUT,
+                               node_uuid=None):
+        return self._list_containers_state(node_uuid, wait=timeout)
+
+    def _list_containers_state(self, node_uuid, wait=None):
+        """
+        Get the actual containers in the cluster.
+
+        :param node_uuid: See ``list_containers_state``.
+        :param wait: See ``_request_with_headers``.
+        :return: ``Deferred`` firing with ``list`` of ``ContainerState``.
+        """
+        d = self._request(
+            b"GET", _query_path(b"/state/containers", {
+                b"node_uuid": node_uuid}),
+            None, {OK}, wait=wait)
 
         def parse(container):
             try:
@@ -23,8 +23,8 @@ from twisted.python.filepath import FilePath
 from twisted.internet.task import Clock
 from twisted.internet import reactor
 from twisted.internet.endpoints import TCP4ServerEndpoint
-from twisted.web.http import BAD_REQUEST
-from twisted.internet.defer import gatherResults
+from twisted.web.http import BAD_REQUEST, NOT_MODIFIED, OK
+from twisted.internet.defer import gatherResults, succeed
 from twisted.python.runtime import platform
 from twisted.python.procutils import which
 
@@ -34,7 +34,10 @@ from .._client import (
     Lease, LeaseAlreadyHeld, Node, Container, ContainerAlreadyExists,
     DatasetsConfiguration, ConfigurationChanged, conditional_create,
     _LOG_CONDITIONAL_CREATE, ContainerState, MountedDataset,
+    BulkUpdateFailed, CreateDataset, MoveDataset, DeleteDataset,
+    ResizeDataset, _MAX_KEPT_RESPONSES,
 )
+from ...common import loop_until
 from ...ca import rest_api_context_factory
 from ...ca.testtools import get_credential_sets
 from ...testtools import (
@@ -104,6 +107,31 @@ def make_clientv1_tests():
             creating.addCallback(created)
             return creating
 
+        def test_list_dataset_configuration_filtered(self):
+            """
+            ``list_datasets_configuration`` only lists the datasets with the
+            given ID or metadata.
+            """
+            d = gatherResults([
+                self.client.create_dataset(primary=self.node_1.uuid),
+                self.client.create_dataset(
+                    primary=self.node_1.uuid, metadata={u"name": u"demo"}),
+            ])
+
+            def created((plain, named)):
+                d = gatherResults([
+                    self.client.list_datasets_configuration(
+                        dataset_id=plain.dataset_id),
+                    self.client.list_datasets_configuration(
+                        metadata={u"name": u"demo"}),
+                ])
+                d.addCallback(lambda results: self.assertEqual(
+                    [dict(result.datasets) for result in results],
+                    [{plain.dataset_id: plain}, {named.dataset_id: named}]))
+                return d
+            d.addCallback(created)
+            return d
+
         def assert_creates(self, client, dataset_id=None, maximum_size=None,
                            configuration_tag=None, **create_kwargs):
             """
@@ -347,6 +375,88 @@ def make_clientv1_tests():
                                          configuration_tag=u"willnotmatch")
             return self.assertFailure(d, ConfigurationChanged)
 
+        def test_bulk_update(self):
+            """
+            ``bulk_update_datasets`` applies each operation in order and
+            returns the resulting ``Dataset`` for each of them.
+            """
+            created_id = uuid4()
+            deleted_id = uuid4()
+            d = self.assert_creates(self.client, primary=self.node_1.uuid,
+                                    maximum_size=DATASET_SIZE)
+
+            def got_dataset(existing):
+                self.existing = existing
+                return self.client.bulk_update_datasets([
+                    CreateDataset(primary=self.node_1.uuid,
+                                  dataset_id=created_id,
+                                  metadata={u"name": u"new"}),
+                    MoveDataset(dataset_id=existing.dataset_id,
+                                primary=self.node_2.uuid),
+                    ResizeDataset(dataset_id=existing.dataset_id,
+                                  maximum_size=2 * DATASET_SIZE),
+                    CreateDataset(primary=self.node_2.uuid,
+                                  dataset_id=deleted_id),
+                    DeleteDataset(dataset_id=deleted_id),
+                ])
+            d.addCallback(got_dataset)
+
+            def got_result(results):
+                created = Dataset(dataset_id=created_id,
+                                  primary=self.node_1.uuid,
+                                  maximum_size=None,
+                                  metadata={u"name": u"new"})
+                moved = self.existing.set(primary=self.node_2.uuid)
+                resized = moved.set(maximum_size=2 * DATASET_SIZE)
+                deleted = Dataset(dataset_id=deleted_id,
+                                  primary=self.node_2.uuid,
+                                  maximum_size=None)
+                self.assertEqual(
+                    results, [created, moved, resized, deleted, deleted])
+                listed = self.client.list_datasets_configuration()
+                listed.addCallback(lambda result: self.assertEqual(
+                    set(result), {created, resized}))
+                return listed
+            d.addCallback(got_result)
+            return d
+
+        def test_bulk_update_failure(self):
+            """
+            If any operation passed to ``bulk_update_datasets`` fails, none
+            are applied and ``BulkUpdateFailed`` describes which failed.
+            """
+            d = self.assert_creates(self.client, primary=self.node_1.uuid)
+
+            def got_dataset(existing):
+                updating = self.client.bulk_update_datasets([
+                    CreateDataset(primary=self.node_1.uuid),
+                    MoveDataset(dataset_id=uuid4(),
+                                primary=self.node_2.uuid),
+                    CreateDataset(primary=self.node_1.uuid,
+                                  dataset_id=existing.dataset_id),
+                ])
+                updating = self.assertFailure(updating, BulkUpdateFailed)
+                updating.addCallback(lambda e: self.assertEqual(
+                    [type(error) for error in e.errors],
+                    [type(None), ResponseError, DatasetAlreadyExists]))
+                updating.addCallback(
+                    lambda _: self.client.list_datasets_configuration())
+                updating.addCallback(lambda result: self.assertEqual(
+                    list(result), [existing]))
+                return updating
+            d.addCallback(got_dataset)
+            return d
+
+        def test_bulk_update_conflicting_tag(self):
+            """
+            If a conflicting tag is given then an appropriate exception is
+            raised.
+            """
+            d = self.client.bulk_update_datasets(
+                [CreateDataset(primary=self.node_1.uuid)],
+                configuration_tag=u"willnotmatch")
+            return self.assertFailure(d, ConfigurationChanged)
+
         def test_dataset_state(self):
             """
             ``list_datasets_state`` returns information about state.
@@ -367,6 +477,68 @@ def make_clientv1_tests():
                               states))
             return d
 
+        def test_dataset_state_filtered(self):
+            """
+            ``list_datasets_state`` only returns the states of the datasets
+            with the given ID or primary node.
+            """
+            dataset_ids = [uuid4(), uuid4()]
+            d = gatherResults([
+                self.assert_creates(self.client, primary=node.uuid,
+                                    maximum_size=DATASET_SIZE,
+                                    dataset_id=dataset_id)
+                for (node, dataset_id) in zip(
+                    [self.node_1, self.node_2], dataset_ids)
+            ])
+            d.addCallback(lambda _: self.synchronize_state())
+            d.addCallback(lambda _: gatherResults([
+                self.client.list_datasets_state(dataset_id=dataset_ids[0]),
+                self.client.list_datasets_state(primary=self.node_2.uuid),
+            ]))
+            d.addCallback(lambda results: self.assertEqual(
+                [[state.dataset_id for state in states]
+                 for states in results],
+                [[dataset_ids[0]], [dataset_ids[1]]]))
+            return d
+
+        def test_watch_dataset_state(self):
+            """
+            ``watch_datasets_state`` returns information about state once it
+            changes.
+            """
+            dataset_id = uuid4()
+            d = self.client.list_datasets_state()
+            d.addCallback(lambda _: self.assert_creates(
+                self.client, primary=self.node_1.uuid,
+                maximum_size=DATASET_SIZE, dataset_id=dataset_id))
+            d.addCallback(lambda _: self.synchronize_state())
+            d.addCallback(lambda _: self.client.watch_datasets_state())
+            d.addCallback(lambda states: self.assertIn(
+                dataset_id, [state.dataset_id for state in states]))
+            return d
+
+        def test_watch_dataset_state_filtered(self):
+            """
+            ``watch_datasets_state`` only returns the states of the datasets
+            with the given ID once they change.
+            """
+            dataset_id = uuid4()
+            d = self.client.list_datasets_state(dataset_id=dataset_id)
+            d.addCallback(lambda _: gatherResults([
+                self.assert_creates(
+                    self.client, primary=self.node_1.uuid,
+                    maximum_size=DATASET_SIZE, dataset_id=dataset_id),
+                self.assert_creates(
+                    self.client, primary=self.node_1.uuid,
+                    maximum_size=DATASET_SIZE),
+            ]))
+            d.addCallback(lambda _: self.synchronize_state())
+            d.addCallback(lambda _: self.client.watch_datasets_state(
+                dataset_id=dataset_id))
+            d.addCallback(lambda states: self.assertEqual(
+                [dataset_id], [state.dataset_id for state in states]))
+            return d
+
         def test_acquire_lease_result(self):
             """
             ``acquire_lease`` returns a ``Deferred`` firing with ``Lease``
@@ -419,6 +591,28 @@ def make_clientv1_tests():
             )
             return d
 
+        def test_list_leases_filtered(self):
+            """
+            ``list_leases`` only lists the leases on the dataset with the
+            given ID or held by the given node.
+            """
+            d1, d2 = uuid4(), uuid4()
+            d = gatherResults([
+                self.client.acquire_lease(d1, self.node_1.uuid, None),
+                self.client.acquire_lease(d2, self.node_2.uuid, None),
+                ])
+            d.addCallback(lambda _: gatherResults([
+                self.client.list_leases(dataset_id=d1),
+                self.client.list_leases(node_uuid=self.node_2.uuid),
+            ]))
+            d.addCallback(self.assertEqual, [
+                [Lease(dataset_id=d1, node_uuid=self.node_1.uuid,
+                       expires=None)],
+                [Lease(dataset_id=d2, node_uuid=self.node_2.uuid,
+                       expires=None)],
+            ])
+            return d
+
         def test_renew_lease(self):
             """
             Acquiring a lease twice on the same dataset and node renews it.
@@ -523,6 +717,41 @@ def make_clientv1_tests():
 
             return d
 
+        def test_container_state_filtered(self):
+            """
+            ``list_containers_state`` only returns the containers on the given
+            node.
+            """
+            expected, d = create_container_for_test(self, self.client)
+            d.addCallback(lambda _ignored: self.synchronize_state())
+            d.addCallback(lambda _ignored: gatherResults([
+                self.client.list_containers_state(
+                    node_uuid=expected.node_uuid),
+                self.client.list_containers_state(node_uuid=uuid4()),
+            ]))
+            d.addCallback(lambda results: self.assertEqual(
+                [[state.name for state in states] for states in results],
+                [[expected.name], []]))
+            return d
+
+        def test_watch_container_state(self):
+            """
+            ``watch_containers_state`` returns information about state once
+            it changes.
+            """
+            d = self.client.list_containers_state()
+
+            def listed(_):
+                expected, d = create_container_for_test(self, self.client)
+                d.addCallback(lambda _: self.synchronize_state())
+                d.addCallback(
+                    lambda _: self.client.watch_containers_state())
+                d.addCallback(lambda containers: self.assertIn(
+                    expected.name, [state.name for state in containers]))
+                return d
+            d.addCallback(listed)
+            return d
+
         def test_container_volumes(self):
             """
             Mounted datasets are included in response messages.
@@ -702,7 +931,12 @@ class FakeFlockerClientTests(make_clientv1_tests()):
 class FlockerClientTests(make_clientv1_tests()):
     """
     Interface tests for ``FlockerClient``.
+
+    :ivar bool persistent: Whether the client keeps connections open between
+        requests.
     """
+    persistent = False
+
     @skipUnless(platform.isLinux(),
                 "flocker-node-era currently requires Linux.")
     @skipUnless(which("flocker-node-era"),
@@ -715,6 +949,7 @@ class FlockerClientTests(make_clientv1_tests()):
         :return: ``FlockerClient`` instance.
         """
         clock = Clock()
+        self.api_clock = clock
         _, self.port = find_free_port()
         self.persistence_service = ConfigurationPersistenceService(
             clock, FilePath(self.mktemp()))
@@ -752,10 +987,13 @@ class FlockerClientTests(make_clientv1_tests()):
         self.addCleanup(api_service.stopService)
 
         credential_set.copy_to(credentials_path, user=True)
-        return FlockerClient(reactor, b"127.0.0.1", self.port,
-                             credentials_path.child(b"cluster.crt"),
-                             credentials_path.child(b"user.crt"),
-                             credentials_path.child(b"user.key"))
+        client = FlockerClient(reactor, b"127.0.0.1", self.port,
+                               credentials_path.child(b"cluster.crt"),
+                               credentials_path.child(b"user.crt"),
+                               credentials_path.child(b"user.key"),
+                               persistent=self.persistent)
+        self.addCleanup(client.close)
+        return client
 
     def synchronize_state(self):
         deployment = self.persistence_service.get()
@@ -855,6 +1093,79 @@ class FlockerClientTests(make_clientv1_tests()):
                           states))
         return d
 
+    def test_unchanged_response_reused(self):
+        """
+        If the cluster state hasn't changed, ``FlockerClient`` reuses the
+        previous response rather than the control service building a new
+        one.
+        """
+        d = self.client.list_nodes()
+
+        def listed(nodes):
+            self.patch(self.cluster_state_service, "as_deployment",
+                       lambda: 1/0)
+            d = self.client.list_nodes()
+            d.addCallback(self.assertEqual, nodes)
+            return d
+        d.addCallback(listed)
+        return d
+
+    def test_changed_response_not_reused(self):
+        """
+        If the cluster state has changed, ``FlockerClient`` gets a new
+        response rather than reusing the previous one.
+        """
+        d = self.client.list_nodes()
+
+        def listed(_):
+            self.cluster_state_service.apply_changes(
+                [NodeState(uuid=uuid4(), hostname=u"192.0.2.3")])
+            return self.client.list_nodes()
+        d.addCallback(listed)
+        d.addCallback(lambda nodes: self.assertEqual(len(nodes), 3))
+        return d
+
+    @capture_logging(None)
+    def test_kept_responses_bounded(self, logger):
+        """
+        ``FlockerClient`` only keeps the responses of the
+        ``_MAX_KEPT_RESPONSES`` most recently requested URLs, so it asks for
+        older ones again unconditionally.
+        """
+        dataset_ids = [uuid4() for _ in range(_MAX_KEPT_RESPONSES + 1)]
+        d = succeed(None)
+        for dataset_id in dataset_ids + [dataset_ids[-1], dataset_ids[0]]:
+            d.addCallback(
+                lambda _, dataset_id=dataset_id:
+                self.client.list_datasets_state(dataset_id=dataset_id))
+        d.addCallback(lambda _: self.assertEqual(
+            [action.end_message[u"response_code"] for action in
+             LoggedAction.ofType(logger.messages, _LOG_HTTP_REQUEST)[-2:]],
+            [NOT_MODIFIED, OK]))
+        return d
+
+    def test_watch_unchanged(self):
+        """
+        If the cluster state doesn't change, ``FlockerClient`` waits for the
+        timeout and then returns the unchanged state.
+        """
+        d = self.client.list_datasets_state()
+
+        def listed(states):
+            watched = []
+            self.client.watch_datasets_state(timeout=5).addCallback(
+                watched.append)
+
+            def advance():
+                # Time out the request once the API is waiting with it:
+                self.api_clock.advance(5)
+                return watched
+            d = loop_until(reactor, advance)
+            d.addCallback(self.assertEqual, [states])
+            return d
+        d.addCallback(listed)
+        return d
+
     def test_this_node_uuid_retry(self):
         """
         ``this_node_uuid`` retries if the node UUID is unknown.
@@ -888,6 +1199,14 @@ class FlockerClientTests(make_clientv1_tests()):
                                   ResponseError)
 
 
+class PersistentFlockerClientTests(FlockerClientTests):
+    """
+    Interface tests for a ``FlockerClient`` which keeps connections open
+    between requests.
+    """
+    persistent = True
+
+
 class ConditionalCreateTests(TestCase):
     """
     Tests for ``conditional_create``.
@@ -30,6 +30,7 @@ from ._protocol import (
     SetNodeEraCommand,
     SetBlockDeviceIdForDatasetId,
 )
+from ._interest import ClusterInterest
 from ._registry import (
     IStatePersister,
 )
@@ -73,4 +74,5 @@ __all__ = [
     'UpdateNodeStateEra',
     'NoWipe',
     'IStatePersister',
+    'ClusterInterest',
 ]
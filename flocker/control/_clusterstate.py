@@ -4,14 +4,16 @@
 Combine and retrieve current cluster state.
 """
 
-from datetime import datetime, timedelta
+from calendar import timegm
+from datetime import timedelta
+from heapq import heappop, heappush
+from itertools import count
 
 from twisted.python.versions import Version
 from twisted.python.deprecate import deprecated
 from twisted.application.service import MultiService
-from twisted.application.internet import TimerService
 
-from pyrsistent import PClass, field, pmap
+from eliot import write_traceback
 
 from . import DeploymentState, ChangeSource
 
@@ -21,25 +23,18 @@ EXPIRATION_TIME = timedelta(seconds=120)
 v1_0 = Version("flocker", 1, 0, 0)
 
 
-class _WiperAndSource(PClass):
+def _expiration(source):
     """
-    :ivar IClusterStateWipe wiper: A change wiper.
-    :ivar IClusterStateSource source: Where the change wiper came from.
-    """
-    wiper = field()
-    source = field()
+    :param IClusterStateSource source: Where some changes came from.
 
-    def last_activity(self):
-        """
-        Return the source's last activity time.
-        """
-        return self.source.last_activity()
-
-    def update_cluster_state(self, deployment_state):
-        """
-        Update the state according to the wiper.
-        """
-        return self.wiper.update_cluster_state(deployment_state)
+    :return float: The time, in seconds since the epoch, at which the
+        information from ``source`` expires unless there is more activity
+        from it first.
+    """
+    last_activity = source.last_activity()
+    return (timegm(last_activity.utctimetuple()) +
+            last_activity.microsecond / 1e6 +
+            EXPIRATION_TIME.total_seconds())
 
 
 class ClusterStateService(MultiService):
@@ -51,34 +46,139 @@ class ClusterStateService(MultiService):
     Eventually we'll probably want a better policy:
     https://clusterhq.atlassian.net/browse/FLOC-1896
 
+    Rather than checking every source of information every second, sources
+    are kept in order of when they would next expire, and a single timer is
+    set for the earliest of them.  Sources that have been active since they
+    were ordered are only put back in order when that timer fires, so
+    recording activity doesn't cost the service anything.
+
     :ivar DeploymentState _deployment_state: The current known cluster state.
-    :ivar PMap _information_wipers: Map (wiper class, wiper key) to
-        ``_WiperAndSource``.
+    :ivar int _generation: The number of times ``_deployment_state`` has
+        changed.
+    :ivar list _change_callbacks: Callables to call when
+        ``_deployment_state`` changes.
+    :ivar dict _information_wipers: Map each ``IClusterStateSource`` to a
+        ``dict`` mapping (wiper class, wiper key) to the
+        ``IClusterStateWipe`` that clears the information it gave.
+    :ivar dict _wiper_sources: Map (wiper class, wiper key) to the
+        ``IClusterStateSource`` whose wiper it is.
+    :ivar list _expirations: Heap of 3-tuples of the time a source would
+        expire when it was added, a sequence number and the source.
+    :ivar dict _queued: Map each source in ``_information_wipers`` to the
+        sequence number of its entry in ``_expirations``.  Other entries are
+        stale and ignored.
+    :ivar _timer: The ``IDelayedCall`` for the next ``_wipe_expired``, or
+        ``None``.
     :ivar _clock: ``IReactorTime`` provider.
     """
     def __init__(self, reactor):
         MultiService.__init__(self)
         self._deployment_state = DeploymentState()
-        timer = TimerService(1, self._wipe_expired)
-        timer.clock = reactor
-        timer.setServiceParent(self)
-        self._information_wipers = pmap()
+        self._generation = 0
+        self._change_callbacks = []
+        self._information_wipers = {}
+        self._wiper_sources = {}
+        self._expirations = []
+        self._queued = {}
+        self._sequence = count()
+        self._timer = None
         self._clock = reactor
 
+    def startService(self):
+        MultiService.startService(self)
+        self._set_timer()
+
+    def stopService(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        return MultiService.stopService(self)
+
+    def _queue(self, source, expiration):
+        """
+        Add a source to ``_expirations``, replacing any earlier entry.
+
+        :param IClusterStateSource source: The source.
+        :param float expiration: When it would expire.
+        """
+        sequence = next(self._sequence)
+        heappush(self._expirations, (expiration, sequence, source))
+        self._queued[source] = sequence
+
+    def _set_timer(self):
+        """
+        Make sure ``_wipe_expired`` is called by the time the earliest entry
+        in ``_expirations`` is due, if the service is running.
+        """
+        if not self.running or not self._expirations:
+            return
+        expiration = self._expirations[0][0]
+        if self._timer is not None:
+            if self._timer.getTime() <= expiration:
+                return
+            self._timer.cancel()
+        self._timer = self._clock.callLater(
+            max(0, expiration - self._clock.seconds()), self._wipe_expired)
+
     def _wipe_expired(self):
         """
         Clear any expired state from memory.
         """
-        current_time = datetime.utcfromtimestamp(self._clock.seconds())
-        evolver = self._information_wipers.evolver()
-        for key, wipe in self._information_wipers.items():
-            last_activity = wipe.last_activity()
-            if current_time - last_activity >= EXPIRATION_TIME:
-                self._deployment_state = wipe.update_cluster_state(
-                    self._deployment_state
-                )
-                evolver.remove(key)
-        self._information_wipers = evolver.persistent()
+        self._timer = None
+        now = self._clock.seconds()
+        deployment_state = self._deployment_state
+        while self._expirations and self._expirations[0][0] <= now:
+            _, sequence, source = heappop(self._expirations)
+            if self._queued.get(source) != sequence:
+                continue
+            expiration = _expiration(source)
+            if expiration > now:
+                # It has been active since it was queued:
+                self._queue(source, expiration)
+                continue
+            del self._queued[source]
+            for key, wiper in self._information_wipers.pop(source).items():
+                deployment_state = wiper.update_cluster_state(deployment_state)
+                del self._wiper_sources[key]
+        self._set_deployment_state(deployment_state)
+        self._set_timer()
+
+    def _set_deployment_state(self, deployment_state):
+        """
+        Replace the current known cluster state, advancing the generation if
+        it is a different object.
+
+        :param DeploymentState deployment_state: The new cluster state.
+        """
+        if deployment_state is not self._deployment_state:
+            self._deployment_state = deployment_state
+            self._generation += 1
+            for callback in self._change_callbacks:
+                try:
+                    callback()
+                except:
+                    write_traceback()
+
+    def register(self, change_callback):
+        """
+        Register a function to be called whenever the cluster state changes.
+
+        :param change_callback: Callable that takes no arguments, will be
+            called when the cluster state changes.
+        """
+        self._change_callbacks.append(change_callback)
+
+    def generation(self):
+        """
+        Return a number that changes whenever the cluster state does.
+
+        Objects derived from ``as_deployment`` may be reused for as long as
+        this number stays the same.  It starts again from zero when the
+        service is created, so it only identifies state within one process.
+
+        :return int: The current generation of the cluster state.
+        """
+        return self._generation
 
     def manifestation_path(self, node_uuid, dataset_id):
         """
@@ -113,16 +213,39 @@ class ClusterStateService(MultiService):
         # XXX: Multiple nodes may report being primary for a dataset. Enforce
         # consistency here. See
         # https://clusterhq.atlassian.net/browse/FLOC-1303
+        deployment_state = self._deployment_state
         for change in changes:
-            self._deployment_state = change.update_cluster_state(
-                self._deployment_state
-            )
+            deployment_state = change.update_cluster_state(deployment_state)
+        self._set_deployment_state(deployment_state)
+        if not changes:
+            return
+        wipers = self._information_wipers.get(source)
+        if wipers is None:
+            wipers = self._information_wipers[source] = {}
+            self._queue(source, _expiration(source))
+            self._set_timer()
         for change in changes:
             wiper = change.get_information_wipe()
             key = (wiper.__class__, wiper.key())
-            self._information_wipers = self._information_wipers.set(
-                key, _WiperAndSource(wiper=wiper, source=source)
-            )
+            previous = self._wiper_sources.get(key)
+            if previous is not None and previous is not source:
+                self._forget(previous, key)
+            wipers[key] = wiper
+            self._wiper_sources[key] = source
+
+    def _forget(self, source, key):
+        """
+        Stop wiping information when a source expires, since another source
+        has since given it.
+
+        :param IClusterStateSource source: The source that gave it first.
+        :param key: The (wiper class, wiper key) of the information.
+        """
+        wipers = self._information_wipers[source]
+        del wipers[key]
+        if not wipers:
+            del self._information_wipers[source]
+            del self._queued[source]
 
     @deprecated(v1_0, "ClusterStateService.apply_changes_from_source")
     def apply_changes(self, changes):
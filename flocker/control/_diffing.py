@@ -0,0 +1,212 @@
+# Copyright ClusterHQ Inc.  See LICENSE file for details.
+# -*- test-case-name: flocker.control.test.test_diffing -*-
+
+"""
+Calculate and apply differences between pyrsistent objects.
+
+This is used to send only the changes to the cluster configuration and state
+to convergence agents, rather than the whole thing every time something
+changes.  A diff is itself a pyrsistent object so it can be serialized with
+``wire_encode``.
+"""
+
+from pyrsistent import PClass, PMap, PRecord, PSet, PVector, field, pvector
+
+from ._model import _NodeMap
+
+
+def _transform(obj, path, operation):
+    """
+    Apply ``operation`` to the part of ``obj`` found at ``path``.
+
+    :param obj: The pyrsistent object to transform.
+    :param path: A sequence of keys identifying part of ``obj``.  An empty
+        path identifies ``obj`` itself.
+    :param operation: A one-argument callable which is called with the
+        current value at ``path`` and returns the new value.
+
+    :return: The updated object.
+    """
+    if not path:
+        return operation(obj)
+    return obj.transform(path, operation)
+
+
+class _Set(PClass):
+    """
+    Replace the value found at a path.
+
+    :ivar PVector path: The keys leading to the value to replace.
+    :ivar value: The new value.
+    """
+    path = field(type=PVector, factory=pvector, mandatory=True)
+    value = field(mandatory=True)
+
+    def apply(self, obj):
+        return _transform(obj, self.path, lambda _: self.value)
+
+
+class _Add(PClass):
+    """
+    Add an item to the set found at a path.
+
+    :ivar PVector path: The keys leading to the set.
+    :ivar item: The item to add.
+    """
+    path = field(type=PVector, factory=pvector, mandatory=True)
+    item = field(mandatory=True)
+
+    def apply(self, obj):
+        return _transform(obj, self.path, lambda s: s.add(self.item))
+
+
+class _Remove(PClass):
+    """
+    Remove an item from the set, or a key from the map, found at a path.
+
+    :ivar PVector path: The keys leading to the set or map.
+    :ivar item: The set item or map key to remove.
+    """
+    path = field(type=PVector, factory=pvector, mandatory=True)
+    item = field(mandatory=True)
+
+    def apply(self, obj):
+        return _transform(obj, self.path, lambda s: s.discard(self.item))
+
+
+class _Diff(PClass):
+    """
+    A sequence of changes which transforms one object into another.
+
+    :ivar PVector changes: ``_Set``, ``_Add`` and ``_Remove`` instances to be
+        applied in order.
+    """
+    changes = field(type=PVector, factory=pvector, mandatory=True,
+                    initial=pvector())
+
+    def apply(self, obj):
+        """
+        Apply this diff to an object.
+
+        :param obj: The object this diff was created against (or an object
+            equal to it).
+
+        :return: The object this diff was created from.
+        """
+        for change in self.changes:
+            obj = change.apply(obj)
+        return obj
+
+
+def _fields(obj):
+    """
+    :return: A ``dict`` mapping the names of the fields which are set on a
+        ``PClass`` instance to their values.
+    """
+    return obj.evolver().data
+
+
+def _create_diffs_for_mappings(path, a, b):
+    """
+    Calculate the changes for two mappings of the same type.
+
+    :param PVector path: The path to ``a`` and ``b``.
+    :param a: The mapping to transform from.
+    :param b: The mapping to transform to.
+
+    :return: A ``list`` of changes.
+    """
+    a_keys = set(a.keys())
+    b_keys = set(b.keys())
+    changes = []
+    for key in a_keys - b_keys:
+        changes.append(_Remove(path=path, item=key))
+    for key in b_keys - a_keys:
+        changes.append(_Set(path=path.append(key), value=b[key]))
+    for key in a_keys & b_keys:
+        changes.extend(_create_diffs_for(path.append(key), a[key], b[key]))
+    return changes
+
+
+def _create_diffs_for(path, a, b):
+    """
+    Calculate the changes which transform ``a`` into ``b``.
+
+    Structures are only descended into when both sides have the same type;
+    anything else is replaced wholesale.
+
+    :param PVector path: The path to ``a`` and ``b`` from the root of the
+        objects being compared.
+    :param a: The object to transform from.
+    :param b: The object to transform to.
+
+    :return: A ``list`` of changes.
+    """
+    # Containers are compared by descending into them rather than with
+    # ``==``, which would compare (and hash) every item even when only one
+    # has changed.
+    if a is b:
+        return []
+    if type(a) is not type(b):
+        return [_Set(path=path, value=b)]
+    if isinstance(a, PClass):
+        a_fields = _fields(a)
+        b_fields = _fields(b)
+        if set(a_fields) != set(b_fields):
+            return [_Set(path=path, value=b)]
+        changes = []
+        for name in a_fields:
+            changes.extend(_create_diffs_for(
+                path.append(name), a_fields[name], b_fields[name]))
+        return changes
+    if isinstance(a, PRecord):
+        if set(a.keys()) != set(b.keys()):
+            return [_Set(path=path, value=b)]
+        return _create_diffs_for_mappings(path, a, b)
+    if isinstance(a, _NodeMap):
+        # Nodes are found by UUID rather than by hashing every node.  A
+        # changed node is replaced as a whole, since the fields of a
+        # ``NodeState`` can't always be changed one at a time without
+        # breaking its invariant:
+        changes = [
+            _Remove(path=path, item=node) for key, node in a.items()
+            if b.get(key) is None
+        ]
+        changes.extend(
+            _Add(path=path, item=node) for key, node in b.items()
+            if a.get(key) is not node and a.get(key) != node
+        )
+        return changes
+    if isinstance(a, PMap):
+        return _create_diffs_for_mappings(path, a, b)
+    if isinstance(a, PSet):
+        # Items present in both sets are usually the very same objects, and
+        # checking identity is much cheaper than hashing:
+        a_ids = set(id(item) for item in a)
+        b_ids = set(id(item) for item in b)
+        return (
+            [_Remove(path=path, item=item) for item in a
+             if id(item) not in b_ids and item not in b] +
+            [_Add(path=path, item=item) for item in b
+             if id(item) not in a_ids and item not in a]
+        )
+    if a == b:
+        return []
+    return [_Set(path=path, value=b)]
+
+
+def create_diff(object_a, object_b):
+    """
+    Calculate a diff which transforms ``object_a`` into ``object_b``.
+
+    :param object_a: A pyrsistent object, typically a ``Deployment`` or
+        ``DeploymentState``.
+    :param object_b: Another object of the same type.
+
+    :return _Diff: A diff such that ``diff.apply(object_a) == object_b``.
+    """
+    return _Diff(changes=_create_diffs_for(pvector(), object_a, object_b))
+
+
+# Classes that can be serialized as part of a diff:
+DIFF_SERIALIZABLE_CLASSES = [_Set, _Add, _Remove, _Diff]
@@ -0,0 +1,94 @@
+# Copyright ClusterHQ Inc.  See LICENSE file for details.
+# -*- test-case-name: flocker.control.test.test_interest -*-
+
+"""
+Restrict the cluster configuration and state sent to a convergence agent to
+the parts it needs.
+
+Most agents only act on the node they are running on, so sending them the
+configuration and state of every other node makes the cost of each update
+grow with the size of the cluster rather than with the size of the node.
+"""
+
+from twisted.python.constants import Names, NamedConstant
+
+from ._model import _IdentityCache
+
+
+class ClusterInterest(Names):
+    """
+    The parts of the cluster configuration and state a convergence agent
+    needs to be sent.
+
+    :cvar ALL: The configuration and state of every node.
+    :cvar LOCAL: The configuration, state and era of the agent's own node,
+        along with the leases, persistent state and non-manifest datasets
+        which apply to the whole cluster.
+    :cvar APPLICATIONS: As ``LOCAL``, plus the configuration and state of
+        the nodes configured to run applications which expose ports, since
+        the agent proxies those ports to them.
+    """
+    ALL = NamedConstant()
+    LOCAL = NamedConstant()
+    APPLICATIONS = NamedConstant()
+
+
+# Map ``Deployment`` instances to the ``frozenset`` of UUIDs of their nodes
+# which are configured with applications that expose ports:
+_exposing_nodes = _IdentityCache()
+
+
+def _exposing_node_uuids(configuration):
+    """
+    :param Deployment configuration: The cluster configuration.
+
+    :return frozenset: The UUIDs of the nodes that ``configuration`` says
+        should run applications which expose ports.
+    """
+    uuids = _exposing_nodes.get(configuration)
+    if uuids is None:
+        uuids = frozenset(
+            node.uuid for node in configuration.nodes
+            if any(application.ports for application in node.applications)
+        )
+        _exposing_nodes.put(configuration, uuids)
+    return uuids
+
+
+def project(interest, node_uuid, configuration, state):
+    """
+    Restrict cluster configuration and state to the parts an agent needs.
+
+    :param NamedConstant interest: A ``ClusterInterest`` constant.
+    :param UUID node_uuid: The node the agent is running on.
+    :param Deployment configuration: The cluster configuration.
+    :param DeploymentState state: The cluster state.
+
+    :return: A 2-tuple of the restricted ``Deployment`` and
+        ``DeploymentState``.  For ``ClusterInterest.ALL`` these are
+        ``configuration`` and ``state`` themselves.
+    """
+    if interest is ClusterInterest.ALL:
+        return configuration, state
+    node_uuids = {node_uuid}
+    if interest is ClusterInterest.APPLICATIONS:
+        node_uuids |= _exposing_node_uuids(configuration)
+    era = state.node_uuid_to_era.get(node_uuid)
+    return (
+        configuration.set(nodes=_nodes(configuration, node_uuids)),
+        state.set(
+            nodes=_nodes(state, node_uuids),
+            node_uuid_to_era={} if era is None else {node_uuid: era},
+        ),
+    )
+
+
+def _nodes(deployment, node_uuids):
+    """
+    :param deployment: A ``Deployment`` or ``DeploymentState``.
+    :param node_uuids: The UUIDs of the nodes to find.
+
+    :return list: The nodes of ``deployment`` that have those UUIDs.
+    """
+    nodes = (deployment.nodes.get(uuid) for uuid in node_uuids)
+    return [node for node in nodes if node is not None]
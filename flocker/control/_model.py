@@ -14,18 +14,64 @@ from uuid import UUID
 from warnings import warn
 from hashlib import md5
 from datetime import datetime, timedelta
+from bisect import bisect_left, insort
+from weakref import ref
 
 from characteristic import attributes
 from twisted.python.filepath import FilePath
 
 from pyrsistent import (
     pmap, PClass, PRecord, field, PMap, CheckedPSet, CheckedPMap, discard,
-    optional as optional_type, CheckedPVector
+    optional as optional_type, CheckedPVector, InvariantException
     )
 
 from zope.interface import Interface, implementer
 
 
+class _IdentityCache(object):
+    """
+    Cache values computed from objects, keyed by object identity.
+
+    Entries are forgotten when the object they were computed from is garbage
+    collected, so the cache never holds on to old versions of the model.
+    Only immutable objects should be cached.
+
+    :ivar dict _entries: Map ``id()`` of objects to tuples of a weak reference
+        to the object and the cached value.
+    """
+    def __init__(self):
+        self._entries = {}
+
+    def get(self, obj):
+        """
+        :return: The value cached for ``obj``, or ``None`` if there isn't one.
+        """
+        entry = self._entries.get(id(obj))
+        if entry is None:
+            return None
+        reference, value = entry
+        # Guard against an identifier being reused by a new object before
+        # the callback removing the old entry has run:
+        if reference() is not obj:
+            return None
+        return value
+
+    def put(self, obj, value):
+        """
+        Cache a value for ``obj``.
+        """
+        key = id(obj)
+
+        def forget(reference):
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] is reference:
+                del self._entries[key]
+        self._entries[key] = (ref(obj, forget), value)
+
+    def __len__(self):
+        return len(self._entries)
+
+
 def _sequence_field(checked_class, suffix, item_type, optional, initial):
     """
     Create checked field for either ``PSet`` or ``PVector``.
@@ -138,6 +184,212 @@ def pmap_field(
                  factory=factory, invariant=invariant)
 
 
+# Indexes of the manifestations of ``_NodeMap``\ s, see
+# ``_NodeMap._manifestation_index``:
+_manifestation_indexes = _IdentityCache()
+
+
+class _NodeMap(CheckedPMap):
+    """
+    Nodes mapped by their UUIDs, so that a node can be looked up, added or
+    replaced in ``O(log n)`` time.
+
+    To code that treats it as a collection of nodes, this behaves like the
+    set of nodes it contains: iteration yields nodes, ``in`` checks whether
+    a node is present and ``add``, ``remove`` and ``discard`` take nodes.
+    Use ``get`` or indexing with a UUID to look up a node, and
+    ``remove_uuid`` to remove the node with a UUID.
+
+    The manifestations on the nodes are also indexed by dataset, so that the
+    nodes with a dataset can be found without looking at every node.  The
+    index is built the first time it is needed and then kept up to date by
+    ``set`` and ``remove_uuid``, and so by ``add``, ``remove`` and
+    ``discard``.
+    """
+    __key_type__ = UUID
+
+    def __invariant__(uuid, node):
+        """
+        The UUID (key) must match the UUID of the node (value).
+        """
+        if uuid != node.uuid:
+            return (False, "uuid {} does not match node {}".format(
+                uuid, node.uuid))
+        return (True, "")
+
+    @classmethod
+    def create(cls, source_data):
+        """
+        :param source_data: An iterable of nodes.  Equal nodes are only
+            included once, like in a set.
+
+        :raise InvariantException: If different nodes have the same UUID.
+        :return: A map of the nodes.
+        """
+        if isinstance(source_data, cls):
+            return source_data
+        nodes = {}
+        for node in source_data:
+            existing = nodes.setdefault(node.uuid, node)
+            if existing is not node and existing != node:
+                raise InvariantException(
+                    error_codes=("Different nodes with uuid {}".format(
+                        node.uuid),))
+        return cls(nodes)
+
+    def _manifestation_index(self):
+        """
+        :return PMap: Map dataset IDs to ``PMap``\ s of the UUIDs of the
+            nodes with manifestations of that dataset to the
+            ``Manifestation``\ s.
+        """
+        index = _manifestation_indexes.get(self)
+        if index is None:
+            index = pmap().evolver()
+            for node in self.itervalues():
+                _index_manifestations(index, node, add=True)
+            index = index.persistent()
+            _manifestation_indexes.put(self, index)
+        return index
+
+    def _update_index(self, updated, removed, added):
+        """
+        Derive the manifestation index of an updated map from this one's, if
+        it has been built.
+
+        :param _NodeMap updated: The updated map.
+        :param removed: The node removed from this map, or ``None``.
+        :param added: The node added to this map, or ``None``.
+
+        :return: ``updated``.
+        """
+        index = _manifestation_indexes.get(self)
+        if index is not None:
+            if (removed is not None and added is not None and
+                    removed.manifestations is added.manifestations):
+                _manifestation_indexes.put(updated, index)
+                return updated
+            index = index.evolver()
+            if removed is not None:
+                _index_manifestations(index, removed, add=False)
+            if added is not None:
+                _index_manifestations(index, added, add=True)
+            _manifestation_indexes.put(updated, index.persistent())
+        return updated
+
+    def set(self, uuid, node):
+        return self._update_index(
+            CheckedPMap.set(self, uuid, node), self.get(uuid), node)
+
+    def remove_uuid(self, uuid):
+        """
+        :param UUID uuid: The UUID of a node to remove.
+
+        :raise KeyError: If there is no node with the UUID.
+        :return: The updated map.
+        """
+        return self._update_index(
+            CheckedPMap.remove(self, uuid), self.get(uuid), None)
+
+    def manifestations_of(self, dataset_id):
+        """
+        :param unicode dataset_id: The ID of a dataset.
+
+        :return PMap: Map the UUIDs of the nodes with manifestations of the
+            dataset to those ``Manifestation``\ s.
+        """
+        return self._manifestation_index().get(dataset_id, pmap())
+
+    def all_manifestations(self):
+        """
+        :return: An iterable of ``(Manifestation, node)`` pairs for every
+            manifestation on every node.
+        """
+        for manifestations in self._manifestation_index().itervalues():
+            for uuid, manifestation in manifestations.iteritems():
+                yield manifestation, self[uuid]
+
+    def __iter__(self):
+        return self.itervalues()
+
+    def __contains__(self, node):
+        existing = self.get(node.uuid)
+        return existing is node or existing == node
+
+    def add(self, node):
+        """
+        :param node: A node to add, replacing any with the same UUID.
+        :return: The updated map.
+        """
+        return self.set(node.uuid, node)
+
+    def remove(self, node):
+        """
+        :param node: A node to remove.
+
+        :raise KeyError: If the node is not present.
+        :return: The updated map.
+        """
+        if node not in self:
+            raise KeyError(node)
+        return self.remove_uuid(node.uuid)
+
+    def discard(self, node):
+        """
+        :param node: A node to remove.
+        :return: The updated map, or this one if the node is not present.
+        """
+        if node in self:
+            return self.remove_uuid(node.uuid)
+        return self
+
+
+def _index_manifestations(index, node, add):
+    """
+    Add or remove the manifestations on a node to or from a manifestation
+    index.
+
+    :param index: An evolver of an index, see
+        ``_NodeMap._manifestation_index``.
+    :param node: A ``Node`` or ``NodeState``.
+    :param bool add: Whether to add the manifestations rather than remove
+        them.
+    """
+    if node.manifestations is None:
+        return
+    for dataset_id, manifestation in node.manifestations.items():
+        if dataset_id in index:
+            by_node = index[dataset_id]
+        else:
+            by_node = pmap()
+        if add:
+            index[dataset_id] = by_node.set(node.uuid, manifestation)
+        else:
+            by_node = by_node.discard(node.uuid)
+            if by_node:
+                index[dataset_id] = by_node
+            else:
+                index.remove(dataset_id)
+
+
+def _node_map_field(node_type):
+    """
+    Create a field holding nodes mapped by their UUIDs.
+
+    :param node_type: The required type for the nodes, ``Node`` or
+        ``NodeState``.
+
+    :return: A ``field`` containing a ``_NodeMap``.  Its factory accepts any
+        iterable of nodes.
+    """
+    class TheMap(_NodeMap):
+        __value_type__ = node_type
+    TheMap.__name__ = node_type.__name__ + "Map"
+
+    return field(mandatory=True, initial=TheMap(), type=TheMap,
+                 factory=TheMap.create)
+
+
 class DockerImage(PClass):
     """
     An image that can be used to run an application using Docker.
@@ -486,12 +738,10 @@ def _get_node(default_factory):
              is found.
     """
     def get_node(deployment, uuid, **defaults):
-        nodes = list(
-            node for node in deployment.nodes if node.uuid == uuid
-        )
-        if len(nodes) == 0:
+        node = deployment.nodes.get(uuid)
+        if node is None:
             return default_factory(uuid=uuid, **defaults)
-        return nodes[0]
+        return node
     return get_node
 
 
@@ -533,9 +783,18 @@ class Lease(PClass):
     )
 
 
+# Expiry-ordered indexes of ``Leases``, see ``Leases._expiry_index``:
+_lease_expiry_indexes = _IdentityCache()
+
+
 class Leases(CheckedPMap):
     """
     A representation of all leases in a cluster, mapped by dataset id.
+
+    Leases which expire are also indexed by expiration time, so that expired
+    leases can be found without looking at every lease.  The index is built
+    the first time it is needed and then kept up to date by ``acquire``,
+    ``release`` and ``expire``.
     """
     __key_type__ = UUID
     __value_type__ = Lease
@@ -551,6 +810,42 @@ class Leases(CheckedPMap):
             ))
         return (True, "")
 
+    def _expiry_index(self):
+        """
+        :return: A sorted ``list`` of ``(expiration, dataset_id)`` tuples for
+            all the leases which expire.  It must not be mutated.
+        """
+        index = _lease_expiry_indexes.get(self)
+        if index is None:
+            index = sorted(
+                (lease.expiration, lease.dataset_id)
+                for lease in self.values() if lease.expiration is not None
+            )
+            _lease_expiry_indexes.put(self, index)
+        return index
+
+    def _update_index(self, updated, removed=None, added=None):
+        """
+        Derive the expiry index of an updated ``Leases`` from this one's, if
+        it has been built.
+
+        :param Leases updated: The updated leases.
+        :param Lease removed: The lease removed from this ``Leases``, if any.
+        :param Lease added: The lease added to this ``Leases``, if any.
+
+        :return: ``updated``.
+        """
+        index = _lease_expiry_indexes.get(self)
+        if index is not None:
+            index = list(index)
+            if removed is not None and removed.expiration is not None:
+                del index[bisect_left(
+                    index, (removed.expiration, removed.dataset_id))]
+            if added is not None and added.expiration is not None:
+                insort(index, (added.expiration, added.dataset_id))
+            _lease_expiry_indexes.put(updated, index)
+        return updated
+
     def _check_lease(self, dataset_id, node_id, action):
         """
         Check if a lease for a given dataset is already held by a
@@ -582,7 +877,8 @@ class Leases(CheckedPMap):
             expiration = now + timedelta(seconds=expires)
         lease = Lease(dataset_id=dataset_id, node_id=node_id,
                       expiration=expiration)
-        return self.set(dataset_id, lease)
+        return self._update_index(
+            self.set(dataset_id, lease), self.get(dataset_id), lease)
 
     def release(self, dataset_id, node_id):
         """
@@ -593,19 +889,48 @@ class Leases(CheckedPMap):
         :return: The updated ``Leases`` representation.
         """
         self._check_lease(dataset_id, node_id, LEASE_ACTION_RELEASE)
-        return self.remove(dataset_id)
+        return self._update_index(
+            self.remove(dataset_id), self.get(dataset_id))
+
+    def next_expiration(self):
+        """
+        :return: The ``datetime`` at which the next lease expires, or ``None``
+            if no lease expires.
+        """
+        index = self._expiry_index()
+        if index:
+            return index[0][0]
+        return None
+
+    def expired(self, now):
+        """
+        :param datetime now: The current date/time.
+        :return: A ``list`` of the ``Lease``\ s which have expired, in order of
+            expiration.
+        """
+        index = self._expiry_index()
+        return [
+            self[dataset_id]
+            for _, dataset_id in index[:bisect_left(index, (now,))]
+        ]
 
     def expire(self, now):
         """
         Remove all expired leases.
 
         :param datetime now: The current date/time.
-        :return: The updated ``Leases`` representation.
+        :return: The updated ``Leases`` representation, or this one if no
+            lease has expired.
         """
-        updated = self
-        for lease in self.values():
-            if lease.expiration is not None and lease.expiration < now:
-                updated = updated.release(lease.dataset_id, lease.node_id)
+        index = self._expiry_index()
+        expired = bisect_left(index, (now,))
+        if expired == 0:
+            return self
+        evolver = self.evolver()
+        for _, dataset_id in index[:expired]:
+            evolver.remove(dataset_id)
+        updated = evolver.persistent()
+        _lease_expiry_indexes.put(updated, index[expired:])
         return updated
 
 
@@ -668,8 +993,8 @@ class Deployment(PClass):
     A ``Deployment`` describes the configuration of a number of applications on
     a number of cooperating nodes.
 
-    :ivar PSet nodes: A set containing ``Node`` instances
-        describing the configuration of each cooperating node.
+    :ivar _NodeMap nodes: ``Node`` instances describing the configuration
+        of each cooperating node, mapped by UUID.
     :ivar Leases leases: A map of configured ``Lease``s.
     :ivar PersistentState persistent_state: The non-discoverable persistent
         state of the cluster. (Note: XXX This should idealy be a sibling to the
@@ -677,7 +1002,7 @@ class Deployment(PClass):
         refactoring doesn't seem worth it currently, and can be done later if
         ever).
     """
-    nodes = pset_field(Node)
+    nodes = _node_map_field(Node)
     leases = field(type=Leases, mandatory=True, initial=Leases())
     persistent_state = field(type=PersistentState, initial=PersistentState())
 
@@ -704,10 +1029,7 @@ class Deployment(PClass):
 
         :return Deployment: Updated with new ``Node``.
         """
-        return self.set(
-            'nodes',
-            [n for n in self.nodes if not same_node(n, node)] + [node]
-        )
+        return self.set('nodes', self.nodes.add(node))
 
     def move_application(self, application, target_node):
         """
@@ -1059,18 +1381,17 @@ class _WipeNodeState(PClass):
     attributes = pset_field(str)
 
     def update_cluster_state(self, cluster_state):
-        nodes = {n for n in cluster_state.nodes
-                 if n.uuid == self.node_uuid}
-        if not nodes:
+        original_node = cluster_state.nodes.get(self.node_uuid)
+        if original_node is None:
             return cluster_state
-        [original_node] = nodes
         updated_node = original_node.evolver()
         for attribute in self.attributes:
             updated_node = updated_node.set(attribute, None)
         updated_node = updated_node.persistent()
-        final_nodes = cluster_state.nodes.discard(original_node)
         if updated_node._provides_information():
-            final_nodes = final_nodes.add(updated_node)
+            final_nodes = cluster_state.nodes.add(updated_node)
+        else:
+            final_nodes = cluster_state.nodes.remove_uuid(self.node_uuid)
         return cluster_state.set("nodes", final_nodes)
 
     def key(self):
@@ -1081,8 +1402,8 @@ class DeploymentState(PClass):
     """
     A ``DeploymentState`` describes the state of the nodes in the cluster.
 
-    :ivar PSet nodes: A set containing ``NodeState`` instances describing the
-        state of each cooperating node.
+    :ivar _NodeMap nodes: ``NodeState`` instances describing the state of
+        each cooperating node, mapped by UUID.
     :ivar PMap node_uuid_to_era: Mapping between a node's UUID and its era.
     :ivar PMap nonmanifest_datasets: A mapping from dataset identifiers (as
         ``unicode``) to corresponding ``Dataset`` instances.  This mapping
@@ -1098,7 +1419,7 @@ class DeploymentState(PClass):
         initialized to meaningful values (see
         https://clusterhq.atlassian.net/browse/FLOC-1247).
     """
-    nodes = pset_field(NodeState)
+    nodes = _node_map_field(NodeState)
     node_uuid_to_era = pmap_field(UUID, UUID)
     nonmanifest_datasets = pmap_field(
         unicode, Dataset, invariant=_keys_match_dataset_id
@@ -1122,17 +1443,14 @@ class DeploymentState(PClass):
 
         :return DeploymentState: Updated with new ``NodeState``.
         """
-        nodes = {n for n in self.nodes if same_node(n, node_state)}
-        if not nodes:
-            return self.transform(["nodes"], lambda s: s.add(node_state))
-        [original_node] = nodes
+        original_node = self.nodes.get(node_state.uuid)
+        if original_node is None:
+            return self.set("nodes", self.nodes.add(node_state))
         updated_node = original_node.evolver()
         for key, value in node_state.items():
             if value is not None:
                 updated_node = updated_node.set(key, value)
-        return self.set(
-            "nodes", self.nodes.discard(original_node).add(
-                updated_node.persistent()))
+        return self.set("nodes", self.nodes.add(updated_node.persistent()))
 
     def remove_node(self, node_uuid):
         """
@@ -1142,8 +1460,9 @@ class DeploymentState(PClass):
 
         :return: Updated ``DeploymentState``.
         """
-        return self.set(nodes={node for node in self.nodes
-                               if node.uuid != node_uuid})
+        if self.nodes.get(node_uuid) is None:
+            return self
+        return self.set("nodes", self.nodes.remove_uuid(node_uuid))
 
     def all_datasets(self):
         """
@@ -1151,12 +1470,9 @@ class DeploymentState(PClass):
             ``None``) for all the primary manifest datasets and non-manifest
             datasets in the ``DeploymentState``.
         """
-        for node in self.nodes:
-            if node.manifestations is None:
-                continue
-            for manifestation in node.manifestations.values():
-                if manifestation.primary:
-                    yield manifestation.dataset, node
+        for manifestation, node in self.nodes.all_manifestations():
+            if manifestation.primary:
+                yield manifestation.dataset, node
         for dataset in self.nonmanifest_datasets.values():
             yield dataset, None
 
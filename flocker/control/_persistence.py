@@ -4,7 +4,9 @@
 Persistence of cluster configuration.
 """
 
+import os
 from json import dumps, loads, JSONEncoder
+from json.encoder import encode_basestring_ascii
 from uuid import UUID
 from calendar import timegm
 from datetime import datetime
@@ -12,16 +14,28 @@ from hashlib import sha256
 
 from eliot import Logger, write_traceback, MessageType, Field, ActionType
 
-from pyrsistent import PRecord, PVector, PMap, PSet, pmap, PClass
+from pyrsistent import (
+    PRecord, PVector, PMap, PSet, pmap, PClass, CheckedPMap, CheckedPSet,
+    CheckedPVector,
+)
+from pyrsistent._field_common import PFIELD_NO_INITIAL
+from pyrsistent._pvector import python_pvector
 
 from pytz import UTC
 
+from repoze.lru import LRUCache
+
 from twisted.python.filepath import FilePath
 from twisted.application.service import Service, MultiService
-from twisted.internet.defer import succeed
-from twisted.internet.task import LoopingCall
+from twisted.internet.defer import Deferred, succeed
+from twisted.internet.threads import deferToThreadPool
+from twisted.python.failure import Failure
 
-from ._model import SERIALIZABLE_CLASSES, Deployment, Configuration
+from ._model import (
+    SERIALIZABLE_CLASSES, Deployment, Configuration, Node, NodeState,
+    Dataset, Lease, _IdentityCache, _NodeMap,
+)
+from ._diffing import DIFF_SERIALIZABLE_CLASSES, create_diff
 
 # The class at the root of the configuration tree.
 ROOT_CLASS = Deployment
@@ -34,8 +48,20 @@ _CLASS_MARKER = u"$__class__$"
 # always integers.
 _CONFIG_VERSION = 4
 
+# Changes saved since the configuration file was last written are appended
+# to a journal file.  The configuration file is rewritten, and the journal
+# emptied, once the journal has this many entries:
+_MAX_JOURNAL_ENTRIES = 1000
+
+# How many seconds after the next lease expiration ``LeaseService`` checks
+# for expired leases:
+_LEASE_EXPIRY_SLACK = 0.001
+
 # Map of serializable class names to classes
-_CONFIG_CLASS_MAP = {cls.__name__: cls for cls in SERIALIZABLE_CLASSES}
+_CONFIG_CLASS_MAP = {
+    cls.__name__: cls
+    for cls in SERIALIZABLE_CLASSES + DIFF_SERIALIZABLE_CLASSES
+}
 
 
 class ConfigurationMigrationError(Exception):
@@ -176,6 +202,10 @@ class _ConfigurationEncoder(JSONEncoder):
             result = obj.evolver().data
             result[_CLASS_MARKER] = obj.__class__.__name__
             return result
+        elif isinstance(obj, _NodeMap):
+            # Encoded as a list of nodes, the same as the sets of nodes used
+            # by earlier versions:
+            return list(obj)
         elif isinstance(obj, PMap):
             return {_CLASS_MARKER: u"PMap", u"values": dict(obj).items()}
         elif isinstance(obj, (PSet, PVector, set)):
@@ -195,54 +225,308 @@ class _ConfigurationEncoder(JSONEncoder):
         return JSONEncoder.default(self, obj)
 
 
+# Subtrees of the model whose encodings are cached.  These are the units
+# which typically change independently of each other, so re-encoding a
+# configuration or state after a change only encodes the changed ones.
+_MEMOIZED_CLASSES = (Node, NodeState, Dataset, Lease)
+
+_encoding_cache = _IdentityCache()
+
+_encode_leaf = _ConfigurationEncoder().encode
+
+
+def _encode_items(items):
+    """
+    Encode a JSON object from already encoded values.
+
+    :param items: Iterable of ``(unicode or bytes, bytes)`` pairs of keys and
+        encoded values.
+    :return bytes: The encoded object.
+    """
+    return b"{" + b", ".join(
+        encode_basestring_ascii(key) + b": " + value for key, value in items
+    ) + b"}"
+
+
+def _splice_encode(obj):
+    """
+    Encode an object, re-using the cached encodings of any unchanged
+    ``_MEMOIZED_CLASSES`` instances it contains.
+
+    The structure above those instances is encoded in Python; the instances
+    themselves are encoded by ``_ConfigurationEncoder`` on a cache miss.
+
+    :param obj: An object from the configuration model.
+    :return bytes: Encoded object.
+    """
+    if isinstance(obj, _MEMOIZED_CLASSES):
+        result = _encoding_cache.get(obj)
+        if result is None:
+            result = dumps(obj, cls=_ConfigurationEncoder)
+            _encoding_cache.put(obj, result)
+        return result
+    elif isinstance(obj, PRecord):
+        items = [(key, _splice_encode(value)) for key, value in obj.items()]
+        items.append((_CLASS_MARKER, _encode_leaf(obj.__class__.__name__)))
+        return _encode_items(items)
+    elif isinstance(obj, PClass):
+        items = [
+            (key, _splice_encode(value))
+            for key, value in obj.evolver().data.items()
+        ]
+        items.append((_CLASS_MARKER, _encode_leaf(obj.__class__.__name__)))
+        return _encode_items(items)
+    elif isinstance(obj, _NodeMap):
+        return b"[" + b", ".join(_splice_encode(node) for node in obj) + b"]"
+    elif isinstance(obj, PMap):
+        values = b"[" + b", ".join(
+            b"[" + _splice_encode(key) + b", " + _splice_encode(value) + b"]"
+            for key, value in obj.items()
+        ) + b"]"
+        return _encode_items([(_CLASS_MARKER, _encode_leaf(u"PMap")),
+                              (u"values", values)])
+    elif isinstance(obj, (PSet, PVector, set, list, tuple)):
+        return b"[" + b", ".join(_splice_encode(item) for item in obj) + b"]"
+    return _encode_leaf(obj)
+
+
 def wire_encode(obj):
     """
     Encode the given model object into bytes.
 
+    Encodings of unchanged ``Node``, ``NodeState``, ``Dataset`` and ``Lease``
+    instances are cached and re-used, so encoding a new version of a large
+    configuration or state only costs as much as the parts that changed.
+
     :param obj: An object from the configuration model, e.g. ``Deployment``.
     :return bytes: Encoded object.
     """
-    return dumps(obj, cls=_ConfigurationEncoder)
+    return _splice_encode(obj)
 
 
-def wire_decode(data):
+def _trusted_field_factory(field):
     """
-    Decode the given model object from bytes.
+    Create a function converting decoded values to the type of a field
+    without checking the types of their contents.
 
-    :param bytes data: Encoded object.
+    :param field: A ``PClass`` or ``PRecord`` field.
+    :return: A one-argument callable.
+    """
+    checked_types = [
+        t for t in field.type
+        if isinstance(t, type) and
+        issubclass(t, (CheckedPSet, CheckedPMap, CheckedPVector))
+    ]
+    if len(checked_types) != 1:
+        return field.factory
+    [checked_type] = checked_types
+
+    if issubclass(checked_type, _NodeMap):
+        def convert(value):
+            value = pmap({node.uuid: node for node in value})
+            return checked_type(value._buckets, value._size)
+    elif issubclass(checked_type, CheckedPSet):
+        def convert(value):
+            return checked_type(pmap(dict.fromkeys(value, True)))
+    elif issubclass(checked_type, CheckedPMap):
+        def convert(value):
+            if type(value) is not PMap:
+                value = pmap(value)
+            return checked_type(value._buckets, value._size)
+    else:
+        def convert(value):
+            return checked_type(python_pvector(value))
+
+    def factory(value):
+        if value is None or isinstance(value, checked_type):
+            return value
+        return convert(value)
+    return factory
+
+
+def _trusted_factory(cls):
+    """
+    Create a function which creates instances of a ``PClass`` or ``PRecord``
+    from a decoded ``dict`` of field values, without running the type checks
+    and invariants that ``create`` does.
+
+    :param cls: A serializable class.
+    :return: A one-argument callable.
+    """
+    if not issubclass(cls, (PClass, PRecord)):
+        return cls.create
+    if issubclass(cls, PRecord):
+        factories = {
+            name: _trusted_field_factory(field)
+            for name, field in cls._precord_fields.items()
+        }
+        initial_values = cls._precord_initial_values
+
+        def create_record(dictionary):
+            values = dict(initial_values)
+            for name, value in dictionary.items():
+                values[name] = factories[name](value)
+            values = pmap(values)
+            return cls(_precord_size=values._size,
+                       _precord_buckets=values._buckets)
+        return create_record
+
+    fields = [
+        (name, _trusted_field_factory(field), field.initial)
+        for name, field in cls._pclass_fields.items()
+    ]
+
+    # Bypass the frozen check in ``PClass.__setattr__``:
+    set_attribute = object.__setattr__
+
+    def create_class(dictionary):
+        result = object.__new__(cls)
+        for name, factory, initial in fields:
+            if name in dictionary:
+                set_attribute(result, name, factory(dictionary[name]))
+            elif initial is not PFIELD_NO_INITIAL:
+                set_attribute(result, name, initial)
+        set_attribute(result, "_pclass_frozen", True)
+        return result
+    return create_class
+
+
+_LEAF_DECODERS = {
+    u"FilePath": lambda d: FilePath(d[u"path"].encode("utf-8")),
+    u"PMap": lambda d: pmap(d[u"values"]),
+    u"UUID": lambda d: UUID(d[u"hex"]),
+    u"datetime": lambda d: datetime.fromtimestamp(d[u"seconds"], UTC),
+}
+
+# Map class names to functions creating instances from decoded dictionaries
+# with the class marker removed, for untrusted and trusted input:
+_DECODERS = dict(_LEAF_DECODERS)
+_DECODERS.update(
+    (name, cls.create) for name, cls in _CONFIG_CLASS_MAP.items())
+_TRUSTED_DECODERS = dict(_LEAF_DECODERS)
+_TRUSTED_DECODERS.update(
+    (name, _trusted_factory(cls)) for name, cls in _CONFIG_CLASS_MAP.items())
+
+
+def _object_hook(decoders):
     """
+    Create a JSON object hook which decodes class-marked dictionaries.
+
+    :param dict decoders: Map class names to decoding functions.
+    """
+    get_decoder = decoders.get
+
     def decode(dictionary):
-        class_name = dictionary.get(_CLASS_MARKER, None)
-        if class_name == u"FilePath":
-            return FilePath(dictionary.get(u"path").encode("utf-8"))
-        elif class_name == u"PMap":
-            return pmap(dictionary[u"values"])
-        elif class_name == u"UUID":
-            return UUID(dictionary[u"hex"])
-        elif class_name == u"datetime":
-            return datetime.fromtimestamp(dictionary[u"seconds"], UTC)
-        elif class_name in _CONFIG_CLASS_MAP:
-            dictionary = dictionary.copy()
-            dictionary.pop(_CLASS_MARKER)
-            return _CONFIG_CLASS_MAP[class_name].create(dictionary)
-        else:
+        decoder = get_decoder(dictionary.get(_CLASS_MARKER))
+        if decoder is None:
             return dictionary
+        # The dictionary was created by the JSON decoder for us alone, so it
+        # can be modified:
+        del dictionary[_CLASS_MARKER]
+        return decoder(dictionary)
+    return decode
+
+_decode = _object_hook(_DECODERS)
+_trusted_decode = _object_hook(_TRUSTED_DECODERS)
+
+
+def wire_decode(data, trusted=False):
+    """
+    Decode the given model object from bytes.
+
+    :param bytes data: Encoded object.
+    :param bool trusted: If true, skip the type checks and invariants of the
+        decoded model objects.  Only use this for data encoded by
+        ``wire_encode`` in a process we trust, e.g. the control service
+        talking to agents over an authenticated TLS connection.
+    """
+    if trusted:
+        return loads(data, object_hook=_trusted_decode)
+    return loads(data, object_hook=_decode)
+
+
+# The configuration and state can get pretty big, so don't want too many:
+_wire_encode_cache = LRUCache(50)
+
 
-    return loads(data, object_hook=decode)
+def caching_wire_encode(obj):
+    """
+    Encode an object to bytes using ``wire_encode`` and cache the result,
+    or return cached result if available.
 
+    This relies on cached objects being immutable, or at least not being
+    modified. Given our usage patterns that is currently the case and
+    should continue to be, but worth keeping in mind.
 
-def to_unserialized_json(obj):
+    :param obj: Object to encode.  Lists are encoded but not cached, since
+        they are neither hashable nor immutable.
+    :return: Resulting ``bytes``.
     """
-    Convert a wire encodeable object into structured Python objects that
-    are JSON serializable.
+    if isinstance(obj, list):
+        return wire_encode(obj)
+    result = _wire_encode_cache.get(obj)
+    if result is None:
+        result = wire_encode(obj)
+        _wire_encode_cache.put(obj, result)
+    return result
+
+
+# Whether ``PayloadSummarizer`` logs every value in full, rather than only
+# those that differ from the value it logged last.  Full logging can be
+# enabled when debugging by setting the environment variable
+# FLOCKER_LOG_FULL_PAYLOADS to "yes".
+_log_full_payloads = os.environ.get('FLOCKER_LOG_FULL_PAYLOADS') == 'yes'
+
 
-    :param obj: An object that can be passed to ``wire_encode``.
-    :return: Python object that can be JSON serialized.
+class PayloadSummarizer(object):
     """
-    # Worst implementation everrrr:
-    return loads(wire_encode(obj))
+    An Eliot field serializer for large values, such as the cluster
+    configuration and state, which are logged over and over again while
+    rarely changing.
+
+    A value is logged as a ``dict`` of the SHA-256 ``hash`` and the
+    ``size`` of its encoding.  The encoding itself is only included, as
+    ``payload``, if it differs from the encoding of the value this
+    serializer logged last or if full logging is enabled.
+
+    :ivar _encode: A one-argument callable returning the encoding of a
+        value as ``bytes``.
+    :ivar bytes _last_data: The encoding of the value logged last.
+    :ivar unicode _last_hash: The hash of ``_last_data``.
+    """
+    def __init__(self, encode=caching_wire_encode):
+        """
+        :param encode: A one-argument callable returning the encoding of a
+            value as ``bytes``.  Defaults to ``caching_wire_encode``, so
+            that values which are also sent over the network are only
+            encoded once.
+        """
+        self._encode = encode
+        self._last_data = None
+        self._last_hash = None
 
-_DEPLOYMENT_FIELD = Field(u"configuration", to_unserialized_json)
+    def __call__(self, value):
+        """
+        :param value: The value to log.
+
+        :return dict: The summary of ``value``.
+        """
+        data = self._encode(value)
+        if data is self._last_data:
+            # Cached encodings of a value already logged needn't be hashed
+            # again:
+            digest = self._last_hash
+        else:
+            digest = unicode(sha256(data).hexdigest())
+        summary = {u"hash": digest, u"size": len(data)}
+        if _log_full_payloads or digest != self._last_hash:
+            summary[u"payload"] = data
+        self._last_data = data
+        self._last_hash = digest
+        return summary
+
+
+_DEPLOYMENT_FIELD = Field(u"configuration", PayloadSummarizer())
 _LOG_STARTUP = MessageType(u"flocker-control:persistence:startup",
                            [_DEPLOYMENT_FIELD])
 _LOG_SAVE = ActionType(u"flocker-control:persistence:save",
@@ -271,35 +555,67 @@ _LOG_UNCHANGED_DEPLOYMENT_NOT_SAVED = MessageType(
 class LeaseService(Service):
     """
     Manage leases.
-    In particular, clear out expired leases once a second.
+    In particular, clear out expired leases as soon as they expire.
 
     :ivar _reactor: A ``IReactorTime`` provider.
     :ivar _persistence_service: The persistence service to act with.
-    :ivar _lc: A ``twisted.internet.task.LoopingCall`` run every second
-        to update the configured leases by releasing leases that have
-        expired.
+    :ivar _call: The ``IDelayedCall`` that will update the configured leases
+        by releasing leases that have expired, or ``None`` if no lease is
+        due to expire or the service is not running.
     """
     def __init__(self, reactor, persistence_service):
         self._reactor = reactor
         self._persistence_service = persistence_service
+        self._call = None
+        persistence_service.register(self._schedule)
 
     def startService(self):
-        self._lc = LoopingCall(self._expire)
-        self._lc.clock = self._reactor
-        self._lc.start(1)
+        Service.startService(self)
+        self._schedule()
 
     def stopService(self):
-        self._lc.stop()
+        Service.stopService(self)
+        if self._call is not None:
+            self._call.cancel()
+            self._call = None
+
+    def _now(self):
+        """
+        :return: The current time as a ``datetime``.
+        """
+        return datetime.fromtimestamp(self._reactor.seconds(), tz=UTC)
+
+    def _schedule(self):
+        """
+        Arrange for ``_expire`` to be called just after the next lease
+        expires, replacing any previously scheduled call.
+        """
+        if self._call is not None:
+            self._call.cancel()
+            self._call = None
+        if not self.running:
+            return
+        expiration = self._persistence_service.get().leases.next_expiration()
+        if expiration is not None:
+            # Leases only expire once the current time is past their
+            # expiration:
+            delay = (expiration - self._now()).total_seconds()
+            self._call = self._reactor.callLater(
+                max(delay, 0) + _LEASE_EXPIRY_SLACK, self._expire)
 
     def _expire(self):
-        now = datetime.fromtimestamp(self._reactor.seconds(), tz=UTC)
+        self._call = None
+        now = self._now()
+        leases = self._persistence_service.get().leases
+        if not leases.expired(now):
+            self._schedule()
+            return succeed(leases)
 
         def expire(leases):
-            updated_leases = leases.expire(now)
-            for dataset_id in set(leases) - set(updated_leases):
-                _LOG_EXPIRE(dataset_id=dataset_id,
-                            node_id=leases[dataset_id].node_id).write()
-            return updated_leases
+            for lease in leases.expired(now):
+                _LOG_EXPIRE(dataset_id=lease.dataset_id,
+                            node_id=lease.node_id).write()
+            return leases.expire(now)
         return update_leases(expire, self._persistence_service)
 
 
@@ -322,24 +638,91 @@ def update_leases(transform, persistence_service):
     return d
 
 
+def _write_durably(path, data):
+    """
+    Atomically replace the contents of a file, making sure the new contents
+    have reached the disk.
+
+    :param FilePath path: The file to write.
+    :param bytes data: The new contents.
+    """
+    temporary = path.temporarySibling()
+    with temporary.open("w") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    temporary.moveTo(path)
+    directory = os.open(path.parent().path, os.O_RDONLY)
+    try:
+        os.fsync(directory)
+    finally:
+        os.close(directory)
+
+
 class ConfigurationPersistenceService(MultiService):
     """
     Persist configuration to disk, and load it back.
 
+    Rather than rewriting the whole configuration every time it is saved, the
+    changes are appended to a journal.  The first line of the journal records
+    the configuration version and the hash of the configuration file the
+    changes apply to; every other line is an encoded ``_Diff``.  Once the
+    journal grows long enough, and on startup and shutdown, the
+    configuration file is rewritten and a new, empty journal is started.
+    Journal writes are flushed immediately but only ``fsync``\ ed once per
+    reactor iteration, however many saves happened in it.
+
+    In threaded mode saved configurations are instead written in the
+    reactor's thread pool.  The new configuration takes effect immediately,
+    but all the saves made in one reactor iteration are written together in
+    a single journal entry, and the ``Deferred`` returned by each ``save``
+    fires once that entry is durable.  Saves made while a write is in
+    progress are written together once it finishes.
+
     :ivar Deployment _deployment: The current desired deployment configuration.
-    :ivar bytes _hash: A SHA256 hash of the configuration.
+    :ivar bool _threaded: Whether to write in the thread pool.
+    :ivar _hash: A SHA256 hash of the configuration as ``bytes``, or ``None``
+        if it has not been calculated since the last save.
+    :ivar _journal_file: The journal, opened for appending, or ``None`` if
+        the service is not running.
+    :ivar int _journal_entries: The number of changes in the journal.
+    :ivar _sync_call: The ``IDelayedCall`` that will ``fsync`` the journal,
+        or ``None`` if there are no unsynced changes.
+    :ivar _written: In threaded mode, the ``Deployment`` most recently passed
+        to the thread pool to be written, or ``None`` if that write failed.
+    :ivar list _waiting: ``Deferred``\ s for saves not yet being written.
+    :ivar list _in_flight: ``Deferred``\ s for saves being written.
+    :ivar _write_call: The ``IDelayedCall`` that will start the next write,
+        or ``None``.
+    :ivar _writing: A ``Deferred`` firing when the write in progress is done,
+        or ``None``.
     """
     logger = Logger()
 
-    def __init__(self, reactor, path):
+    def __init__(self, reactor, path, threaded=False):
         """
         :param reactor: Reactor to use for thread pool.
         :param FilePath path: Directory where desired deployment will be
             persisted.
+        :param bool threaded: If true, write configuration in the reactor's
+            thread pool rather than blocking the reactor thread.
         """
         MultiService.__init__(self)
+        self._reactor = reactor
         self._path = path
         self._config_path = self._path.child(b"current_configuration.json")
+        self._journal_path = self._path.child(
+            b"current_configuration.journal")
+        self._hash = None
+        self._journal_file = None
+        self._journal_entries = 0
+        self._sync_call = None
+        self._threaded = threaded
+        self._written = None
+        self._waiting = []
+        self._in_flight = []
+        self._write_call = None
+        self._writing = None
         self._change_callbacks = []
         LeaseService(reactor, self).setServiceParent(self)
 
@@ -350,6 +733,17 @@ class ConfigurationPersistenceService(MultiService):
         MultiService.startService(self)
         _LOG_STARTUP(configuration=self.get()).write(self.logger)
 
+    def stopService(self):
+        d = MultiService.stopService(self)
+        d.addCallback(lambda _: self._wait_for_writes())
+
+        def stopped(_):
+            if self._journal_file is not None:
+                self._write_snapshot(self._deployment)
+                self._close_journal()
+        d.addCallback(stopped)
+        return d
+
     def _process_v1_config(self, file_name, archive_name):
         """
         Check if a v1 configuration file exists and upgrade it if necessary.
@@ -382,6 +776,10 @@ class ConfigurationPersistenceService(MultiService):
         """
         :return bytes: A hash of the configuration.
         """
+        if self._hash is None:
+            config = Configuration(
+                version=_CONFIG_VERSION, deployment=self._deployment)
+            self._hash = sha256(wire_encode(config)).hexdigest()
         return self._hash
 
     def load_configuration(self):
@@ -405,6 +803,7 @@ class ConfigurationPersistenceService(MultiService):
         # file as normal.
         if self._config_path.exists():
             config_json = self._config_path.getContent()
+            snapshot_hash = sha256(config_json).hexdigest()
             config_dict = loads(config_json)
             config_version = config_dict['version']
             if config_version < _CONFIG_VERSION:
@@ -416,11 +815,104 @@ class ConfigurationPersistenceService(MultiService):
                         config_version, _CONFIG_VERSION,
                         config_json, ConfigurationMigration)
             config = wire_decode(config_json)
-            self._deployment = config.deployment
-            self._sync_save(config.deployment)
+            self._deployment = self._replay_journal(
+                snapshot_hash, config.deployment)
         else:
             self._deployment = Deployment()
-            self._sync_save(self._deployment)
+        self._write_snapshot(self._deployment)
+        self._written = self._deployment
+        self._hash = None
+
+    def _replay_journal(self, snapshot_hash, deployment):
+        """
+        Apply the changes in the journal to a deployment loaded from the
+        configuration file.
+
+        A journal written for a different configuration file, e.g. because
+        a crash happened while the configuration file was being rewritten,
+        is ignored.  So is an incompletely written final entry.
+
+        :param bytes snapshot_hash: The hash of the configuration file.
+        :param Deployment deployment: The deployment loaded from the
+            configuration file.
+
+        :return Deployment: The deployment with the changes applied.
+        """
+        if not self._journal_path.exists():
+            return deployment
+        with self._journal_path.open() as journal:
+            lines = journal.readlines()
+        if not lines or not lines[0].endswith(b"\n"):
+            return deployment
+        header = loads(lines[0])
+        if header[u"snapshot"] != snapshot_hash:
+            return deployment
+        entries = lines[1:]
+        if entries and header[u"version"] != _CONFIG_VERSION:
+            raise ConfigurationMigrationError(
+                "Changes journalled with configuration version {} can't be "
+                "upgraded to version {}.".format(
+                    header[u"version"], _CONFIG_VERSION))
+        for line in entries:
+            if not line.endswith(b"\n"):
+                break
+            deployment = wire_decode(line).apply(deployment)
+        return deployment
+
+    def _write_snapshot(self, deployment):
+        """
+        Durably write the whole configuration to disk and start a new, empty
+        journal.
+        """
+        config = Configuration(version=_CONFIG_VERSION, deployment=deployment)
+        data = wire_encode(config)
+        _write_durably(self._config_path, data)
+        self._close_journal()
+        _write_durably(self._journal_path, dumps({
+            u"version": _CONFIG_VERSION,
+            u"snapshot": sha256(data).hexdigest(),
+        }) + b"\n")
+        self._journal_file = self._journal_path.open("a")
+        self._journal_entries = 0
+
+    def _close_journal(self):
+        """
+        ``fsync`` and close the journal, if it is open.
+        """
+        if self._journal_file is not None:
+            self._sync_journal()
+            self._journal_file.close()
+            self._journal_file = None
+
+    def _sync_journal(self):
+        """
+        ``fsync`` any changes written to the journal.
+        """
+        if self._sync_call is not None:
+            if self._sync_call.active():
+                self._sync_call.cancel()
+            self._sync_call = None
+            os.fsync(self._journal_file.fileno())
+
+    def _append_to_journal(self, diff, deployment):
+        """
+        Append a change to the journal, or rewrite the configuration file
+        instead if the journal is full.
+
+        :param _Diff diff: The changes from the previously written
+            configuration.
+        :param Deployment deployment: The configuration after the changes.
+
+        :return bool: Whether the journal needs to be ``fsync``\ ed for the
+            change to be durable.
+        """
+        self._journal_entries += 1
+        if self._journal_entries >= _MAX_JOURNAL_ENTRIES:
+            self._write_snapshot(deployment)
+            return False
+        self._journal_file.write(wire_encode(diff) + b"\n")
+        self._journal_file.flush()
+        return True
 
     def register(self, change_callback):
         """
@@ -431,14 +923,106 @@ class ConfigurationPersistenceService(MultiService):
         """
         self._change_callbacks.append(change_callback)
 
-    def _sync_save(self, deployment):
+    def _sync_save(self, diff, deployment):
         """
-        Save and flush new configuration to disk synchronously.
+        Write a new configuration to disk synchronously.
+
+        If the service is not running the configuration file is rewritten,
+        otherwise the changes are journalled.
+
+        :param _Diff diff: The changes from the current configuration.
+        :param Deployment deployment: The new configuration.
         """
-        config = Configuration(version=_CONFIG_VERSION, deployment=deployment)
-        data = wire_encode(config)
-        self._hash = sha256(data).hexdigest()
-        self._config_path.setContent(data)
+        if self._journal_file is None:
+            self._write_snapshot(deployment)
+            self._close_journal()
+        elif (self._append_to_journal(diff, deployment) and
+              self._sync_call is None):
+            self._sync_call = self._reactor.callLater(0, self._sync_journal)
+
+    def _threaded_save(self, previous, deployment):
+        """
+        Durably write a new configuration to disk.  This runs in a thread
+        pool.
+
+        :param previous: The last configuration written, or ``None`` if it
+            is unknown whether it was written successfully.
+        :param Deployment deployment: The new configuration.
+        """
+        if previous is None:
+            self._write_snapshot(deployment)
+        elif self._append_to_journal(
+                create_diff(previous, deployment), deployment):
+            os.fsync(self._journal_file.fileno())
+
+    def _schedule_write(self):
+        """
+        Arrange for the current configuration to be written in the next
+        reactor iteration, unless a write is already in progress.
+
+        :return Deferred: Fires when the current configuration is durable.
+        """
+        d = Deferred()
+        self._waiting.append(d)
+        if self._write_call is None and self._writing is None:
+            self._write_call = self._reactor.callLater(0, self._write)
+        return d
+
+    def _write(self):
+        """
+        Write the current configuration in the thread pool, firing the
+        ``Deferred``\ s of all the saves since the last write once done.
+        """
+        self._write_call = None
+        self._in_flight, self._waiting = self._waiting, []
+        previous, self._written = self._written, self._deployment
+        self._writing = deferToThreadPool(
+            self._reactor, self._reactor.getThreadPool(),
+            self._threaded_save, previous, self._deployment)
+
+        def written(result):
+            self._writing = None
+            if isinstance(result, Failure):
+                # The journal may not match what was written, so rewrite
+                # the whole configuration next time:
+                self._written = None
+            in_flight, self._in_flight = self._in_flight, []
+            if self._waiting and self._write_call is None:
+                self._write_call = self._reactor.callLater(0, self._write)
+            for d in in_flight:
+                if isinstance(result, Failure):
+                    d.errback(result)
+                else:
+                    d.callback(None)
+        self._writing.addBoth(written)
+
+    def _wait_for_writes(self):
+        """
+        Write any pending configuration changes immediately.
+
+        :return Deferred: Fires when all saved configurations are durable.
+        """
+        if self._write_call is not None:
+            self._write_call.cancel()
+            self._write()
+        if self._writing is None:
+            return succeed(None)
+        d = Deferred()
+        self._in_flight.append(d)
+        d.addBoth(lambda _: self._wait_for_writes())
+        return d
+
+    def _durable(self):
+        """
+        :return Deferred: Fires when the current configuration is durable.
+        """
+        if self._waiting:
+            return self._schedule_write()
+        elif self._writing is not None:
+            d = Deferred()
+            self._in_flight.append(d)
+            return d
+        return succeed(None)
 
     def save(self, deployment):
         """
@@ -446,13 +1030,19 @@ class ConfigurationPersistenceService(MultiService):
 
         :return Deferred: Fires when write is finished.
         """
-        if deployment == self._deployment:
+        diff = create_diff(self._deployment, deployment)
+        if not diff.changes:
             _LOG_UNCHANGED_DEPLOYMENT_NOT_SAVED().write(self.logger)
-            return succeed(None)
+            return self._durable()
 
         with _LOG_SAVE(self.logger, configuration=deployment):
-            self._sync_save(deployment)
+            if self._threaded:
+                result = self._schedule_write()
+            else:
+                self._sync_save(diff, deployment)
+                result = succeed(None)
             self._deployment = deployment
+            self._hash = None
             # At some future point this will likely involve talking to a
             # distributed system (e.g. ZooKeeper or etcd), so the API doesn't
             # guarantee immediate saving of the data.
@@ -463,7 +1053,7 @@ class ConfigurationPersistenceService(MultiService):
                     # Second argument will be ignored in next Eliot release, so
                     # not bothering with particular value.
                     write_traceback(self.logger, u"")
-            return succeed(None)
+            return result
 
     def get(self):
         """
@@ -21,14 +21,25 @@ Interactions:
   the control service receives an update to the state of a specific node via a
   ``NodeStateCommand``, the control service integrates that update into a
   cluster-wide state representation (the state of all of the nodes) and sends a
-  ``ClusterStatusCommand`` to all convergence agents.
+  ``ClusterStatusCommand`` to all convergence agents.  Changes arriving
+  within a short delay of each other are sent as a single update.
+
+* Every configuration and state pair sent to agents is assigned a
+  generation number.  Once an agent has acknowledged a generation the
+  control service sends it a ``ClusterStatusDiffCommand`` containing only
+  the changes since that generation.  A full ``ClusterStatusCommand`` is
+  sent instead on a new connection, when the acknowledged generation is no
+  longer remembered, or when the diff is not much smaller than the full
+  update.
+
+* An agent may tell the control service, along with its era, that it only
+  needs part of the cluster configuration and state (see
+  ``ClusterInterest``).  It is then only sent that part, so the size of its
+  updates depends on the size of its node rather than of the cluster.
 
 Eliot contexts are transferred along with AMP commands, allowing tracing
 of logged actions across processes (see
 http://eliot.readthedocs.org/en/0.6.0/threads.html).
-
-:var _wire_encode_cache: ``LRUCache`` mapping serializable objects to
-    their ``wire_encode`` output.
 """
 
 from datetime import timedelta
@@ -61,7 +72,11 @@ from twisted.internet.protocol import ServerFactory
 from twisted.application.internet import StreamServerEndpointService
 from twisted.protocols.tls import TLSMemoryBIOFactory
 
-from ._persistence import wire_encode, wire_decode
+from ._persistence import (
+    wire_decode, caching_wire_encode, PayloadSummarizer,
+)
+from ._diffing import create_diff, _Diff
+from ._interest import ClusterInterest, project
 from ._model import (
     Deployment, DeploymentState, ChangeSource, UpdateNodeStateEra,
     BlockDeviceOwnership, DatasetAlreadyOwned,
@@ -69,6 +84,11 @@ from ._model import (
 
 PING_INTERVAL = timedelta(seconds=30)
 
+# How long the control service waits after a configuration or state change
+# before sending an update to agents, so that changes arriving close together
+# are sent as a single update:
+BROADCAST_DELAY = timedelta(milliseconds=50)
+
 
 class Big(Argument):
     """
@@ -126,27 +146,91 @@ class Big(Argument):
         self.another_argument.fromBox(name, strings, objects, proto)
 
 
-# The configuration and state can get pretty big, so don't want too many:
-_wire_encode_cache = LRUCache(50)
+# A diff is only sent if its encoding is at most this fraction of the size of
+# the encoding of the full configuration and state it replaces:
+_MAX_DIFF_RATIO = 0.5
 
+# Marker for cache misses, since ``None`` is a valid cached value:
+_UNKNOWN = object()
 
-def caching_wire_encode(obj):
+
+class _GenerationTracker(object):
+    """
+    Assign generation numbers to the configuration and state pairs sent to
+    agents, and calculate diffs between recent generations.
+
+    :ivar _generation_numbers: An iterator of the generation numbers to
+        assign.
+    :ivar int _generation: The most recently assigned generation.
+    :ivar _configuration: The configuration of the current generation.
+    :ivar _state: The state of the current generation.
+    :ivar LRUCache _history: Map generation numbers to
+        ``(configuration, state)`` tuples.
+    :ivar LRUCache _diffs: Map ``(start, end)`` generation pairs to
+        ``(configuration_diff, state_diff)`` tuples, or ``None`` if the diff
+        is too large to be worth sending.
     """
-    Encode an object to bytes using ``wire_encode`` and cache the result,
-    or return cached result if available.
+    def __init__(self, cache_size, generation_numbers=None):
+        """
+        :param int cache_size: The number of generations to remember.
+        :param generation_numbers: An iterator of the generation numbers to
+            assign, which may be shared with other trackers so that a
+            generation from one is never mistaken for a generation of
+            another.  By default numbers are counted from 1.
+        """
+        if generation_numbers is None:
+            generation_numbers = count(1)
+        self._generation_numbers = generation_numbers
+        self._generation = 0
+        self._configuration = None
+        self._state = None
+        self._history = LRUCache(cache_size)
+        self._diffs = LRUCache(cache_size)
+
+    def track(self, configuration, state):
+        """
+        Get the generation of a configuration and state pair, assigning a new
+        one if it differs from the current generation.
 
-    This relies on cached objects being immutable, or at least not being
-    modified. Given our usage patterns that is currently the case and
-    should continue to be, but worth keeping in mind.
+        :param Deployment configuration: The cluster configuration.
+        :param DeploymentState state: The cluster state.
 
-    :param obj: Object to encode.
-    :return: Resulting ``bytes``.
-    """
-    result = _wire_encode_cache.get(obj)
-    if result is None:
-        result = wire_encode(obj)
-        _wire_encode_cache.put(obj, result)
-    return result
+        :return int: The generation number.
+        """
+        if configuration is not self._configuration or (
+                state is not self._state):
+            self._generation = next(self._generation_numbers)
+            self._configuration = configuration
+            self._state = state
+            self._history.put(self._generation, (configuration, state))
+        return self._generation
+
+    def get_diffs(self, start_generation, end_generation):
+        """
+        Calculate the changes between two generations.
+
+        :param int start_generation: The generation to diff from.
+        :param int end_generation: The generation to diff to.
+
+        :return: A ``(configuration_diff, state_diff)`` tuple of ``_Diff``
+            instances, or ``None`` if either generation is no longer
+            remembered or the diffs are too large to be worth sending.
+        """
+        key = (start_generation, end_generation)
+        cached = self._diffs.get(key, _UNKNOWN)
+        if cached is not _UNKNOWN:
+            return cached
+        start = self._history.get(start_generation)
+        end = self._history.get(end_generation)
+        if start is None or end is None:
+            return None
+        diffs = (create_diff(start[0], end[0]), create_diff(start[1], end[1]))
+        diff_size = sum(len(caching_wire_encode(diff)) for diff in diffs)
+        full_size = sum(len(caching_wire_encode(obj)) for obj in end)
+        if diff_size > full_size * _MAX_DIFF_RATIO:
+            diffs = None
+        self._diffs.put(key, diffs)
+        return diffs
 
 
 class SerializableArgument(Argument):
@@ -154,17 +238,23 @@ class SerializableArgument(Argument):
     AMP argument that takes an object that can be serialized by the
     configuration persistence layer.
     """
-    def __init__(self, *classes):
+    def __init__(self, *classes, **kwargs):
         """
         :param *classes: The type or types of the objects we expect to
             (de)serialize. Only immutable types should be used if encoding
             caching will be enabled.
+        :param bool trusted: If true, skip checking the types and invariants
+            of decoded objects.  Only use this for arguments sent by the
+            control service, which has already checked them.
         """
         Argument.__init__(self)
         self._expected_classes = classes
+        self._trusted = kwargs.pop("trusted", False)
+        if kwargs:
+            raise TypeError("Unexpected arguments: {}".format(kwargs))
 
     def fromString(self, in_bytes):
-        obj = wire_decode(in_bytes)
+        obj = wire_decode(in_bytes, trusted=self._trusted)
         if not isinstance(obj, self._expected_classes):
             raise TypeError(
                 "{} is none of {}".format(obj, self._expected_classes)
@@ -221,15 +311,44 @@ class ClusterStatusCommand(Command):
     Having both as a single command simplifies the decision making process
     in the convergence agent during startup.
     """
-    arguments = [('configuration', Big(SerializableArgument(Deployment))),
-                 ('state', Big(SerializableArgument(DeploymentState))),
+    arguments = [('configuration',
+                  Big(SerializableArgument(Deployment, trusted=True))),
+                 ('state',
+                  Big(SerializableArgument(DeploymentState, trusted=True))),
+                 ('generation', Integer(optional=True)),
+                 ('eliot_context', _EliotActionArgument())]
+    response = []
+
+
+class GenerationMismatch(Exception):
+    """
+    A ``ClusterStatusDiffCommand`` was received which does not apply to the
+    generation of the configuration and state the agent currently has.
+    """
+
+
+class ClusterStatusDiffCommand(Command):
+    """
+    Used by the control service to inform a convergence agent of the changes
+    to the cluster state and desired configuration since a generation that
+    the agent has already acknowledged.
+    """
+    arguments = [('configuration_diff',
+                  Big(SerializableArgument(_Diff, trusted=True))),
+                 ('state_diff',
+                  Big(SerializableArgument(_Diff, trusted=True))),
+                 ('start_generation', Integer()),
+                 ('end_generation', Integer()),
                  ('eliot_context', _EliotActionArgument())]
     response = []
+    errors = {GenerationMismatch: 'GENERATION_MISMATCH'}
 
 
 class SetNodeEraCommand(Command):
     """
-    Tell the control service the current era for a node.
+    Tell the control service the current era for a node, and optionally the
+    name of the ``ClusterInterest`` constant describing which parts of the
+    cluster configuration and state the agent needs to be sent.
 
     This should clear any previous NodeState that has a different
     era. Updates to the node should only be sent after this command, to
@@ -237,7 +356,8 @@ class SetNodeEraCommand(Command):
     with wrong era).
     """
     arguments = [('era', Unicode()),
-                 ('node_uuid', Unicode())]
+                 ('node_uuid', Unicode()),
+                 ('interest', Unicode(optional=True))]
     response = []
 
 
@@ -311,8 +431,10 @@ class ControlServiceLocator(CommandLocator):
     :ivar IClusterStateSource _source: The change source uniquely representing
         the AMP connection for which this locator is being used.
     :ivar _reactor: See ``reactor`` parameter of ``__init__``
+    :ivar _connection: See ``connection`` parameter of ``__init__``
     """
-    def __init__(self, reactor, control_amp_service, timeout):
+    def __init__(self, reactor, control_amp_service, timeout,
+                 connection=None):
         """
         :param IReactorTime reactor: A reactor to use to tell the time for
             activity/inactivity reporting.
@@ -320,6 +442,8 @@ class ControlServiceLocator(CommandLocator):
             connections to the control service.
         :param Timeout timeout: A ``Timeout`` object to reset when a message
             is received.
+        :param ControlAMP connection: The connection this locator receives
+            commands from.
         """
         CommandLocator.__init__(self)
 
@@ -332,6 +456,7 @@ class ControlServiceLocator(CommandLocator):
         self._timeout = timeout
 
         self._reactor = reactor
+        self._connection = connection
         self.control_amp_service = control_amp_service
 
     def locateResponder(self, name):
@@ -367,11 +492,16 @@ class ControlServiceLocator(CommandLocator):
             return {}
 
     @SetNodeEraCommand.responder
-    def set_node_era(self, era, node_uuid):
+    def set_node_era(self, era, node_uuid, interest=None):
         # Further work will be done in FLOC-3380
         self.control_amp_service.cluster_state.apply_changes_from_source(
             self._source, [UpdateNodeStateEra(era=UUID(era),
                                               uuid=UUID(node_uuid))])
+        if interest is not None:
+            self.control_amp_service.set_interest(
+                self._connection, UUID(node_uuid),
+                ClusterInterest.lookupByName(interest),
+            )
         # We don't bother sending an update to other nodes because this
         # command will immediately be followed by a ``NodeStateCommand``
         # with more interesting information.
@@ -421,7 +551,8 @@ class ControlAMP(AMP):
             connections to the control service.
         """
         locator = ControlServiceLocator(reactor, control_amp_service,
-                                        timeout_for_protocol(reactor, self))
+                                        timeout_for_protocol(reactor, self),
+                                        connection=self)
         AMP.__init__(self, locator=locator)
 
         self.control_amp_service = control_amp_service
@@ -438,13 +569,14 @@ class ControlAMP(AMP):
         self._pinger.stop()
 
 
-# These two logging fields use caching_wire_encode as the serializer so
+# These two logging fields are serialized using caching_wire_encode so
 # that they can share the encoding cache with the network code related to
-# this logging.  This reduces the overhead of logging these (potentially
-# quite large) data structures.
-DEPLOYMENT_CONFIG = Field(u"configuration", caching_wire_encode,
+# this logging.  Only a summary is logged unless the value has changed,
+# which keeps these (potentially quite large) data structures from being
+# repeated in the logs every time they are sent.
+DEPLOYMENT_CONFIG = Field(u"configuration", PayloadSummarizer(),
                           u"The cluster configuration")
-CLUSTER_STATE = Field(u"state", caching_wire_encode, u"The cluster state")
+CLUSTER_STATE = Field(u"state", PayloadSummarizer(), u"The cluster state")
 
 LOG_SEND_CLUSTER_STATE = ActionType(
     "flocker:controlservice:send_cluster_state",
@@ -497,6 +629,27 @@ AGENT_UPDATE_DELAYED = MessageType(
 )
 
 
+LOG_BROADCAST = MessageType(
+    "flocker:controlservice:broadcast",
+    [Field.for_types(u"coalesced", [int],
+                     u"The number of changes included in the update."),
+     Field.for_types(u"connections", [int],
+                     u"The number of connected agents."),
+     Field.for_types(u"latency", [float],
+                     u"Seconds between the first change included in the "
+                     u"update and the update being sent to all agents.")],
+    u"An update was sent to all connected agents.",
+)
+
+
+AGENT_UPDATE_DIFF_REJECTED = MessageType(
+    "flocker:controlservice:agent_update_diff_rejected",
+    [AGENT],
+    u"An agent rejected a diff update because it applies to a generation the "
+    u"agent does not have.  A full update will be sent instead.",
+)
+
+
 class _UpdateState(PClass):
     """
     Represent the state related to sending a ``ClusterStatusCommand`` to an
@@ -510,6 +663,63 @@ class _UpdateState(PClass):
     next_scheduled = field()
 
 
+class _Scope(object):
+    """
+    The configuration and state sent to an agent which is only interested in
+    part of the cluster.
+
+    :ivar NamedConstant interest: The ``ClusterInterest`` of the agent.
+    :ivar UUID node_uuid: The node the agent is running on.
+    :ivar _GenerationTracker _generations: Generation numbers and diffs for
+        the updates sent to the agent.
+    :ivar _inputs: The last full configuration and state projected.
+    :ivar _projection: The projection of ``_inputs``.
+    """
+    def __init__(self, interest, node_uuid, generation_numbers):
+        """
+        :param NamedConstant interest: See ``interest``.
+        :param UUID node_uuid: See ``node_uuid``.
+        :param generation_numbers: See ``_GenerationTracker.__init__``.
+        """
+        self.interest = interest
+        self.node_uuid = node_uuid
+        self._generations = _GenerationTracker(10, generation_numbers)
+        self._inputs = (None, None)
+        self._projection = (None, None)
+
+    def project(self, configuration, state):
+        """
+        Restrict cluster configuration and state to the parts the agent
+        needs.
+
+        :param Deployment configuration: The cluster configuration.
+        :param DeploymentState state: The cluster state.
+
+        :return: A 3-tuple of the restricted ``Deployment`` and
+            ``DeploymentState`` and their generation.  The generation only
+            changes when the restricted configuration or state does.
+        """
+        last_configuration, last_state = self._inputs
+        if configuration is not last_configuration or (
+                state is not last_state):
+            projection = project(
+                self.interest, self.node_uuid, configuration, state)
+            # Keep the old objects if nothing the agent needs has changed,
+            # so that they keep their generation:
+            if projection != self._projection:
+                self._projection = projection
+            self._inputs = (configuration, state)
+        configuration, state = self._projection
+        return (configuration, state,
+                self._generations.track(configuration, state))
+
+    def get_diffs(self, start_generation, end_generation):
+        """
+        See ``_GenerationTracker.get_diffs``.
+        """
+        return self._generations.get_diffs(start_generation, end_generation)
+
+
 class ControlAMPService(Service):
     """
     Control Service AMP server.
@@ -519,11 +729,24 @@ class ControlAMPService(Service):
     :ivar dict _current_command: A dictionary containing information about
         connections to which state updates are currently in progress.  The keys
         are protocol instances.  The values are ``_UpdateState`` instances.
+    :ivar dict _acknowledged_generations: Map connections to the generation
+        of the last update they acknowledged.
+    :ivar _GenerationTracker _generations: Generation numbers and diffs for
+        the updates sent to agents.
+    :ivar dict _scopes: Map connections from agents which are only
+        interested in part of the cluster to their ``_Scope``.
+    :ivar _generation_numbers: The generation numbers shared by
+        ``_generations`` and every ``_Scope``.
+    :ivar int broadcasts: The number of updates sent to all connected agents.
+    :ivar int coalesced_changes: The number of configuration and state
+        changes included in those updates.
+    :ivar _broadcast_call: The ``IDelayedCall`` which will send the next
+        update to all connected agents, or ``None``.
     """
     logger = Logger()
 
     def __init__(self, reactor, cluster_state, configuration_service, endpoint,
-                 context_factory):
+                 context_factory, broadcast_delay=None):
         """
         :param reactor: See ``ControlServiceLocator.__init__``.
         :param ClusterStateService cluster_state: Object that records known
@@ -532,9 +755,24 @@ class ControlAMPService(Service):
             Persistence service for desired cluster configuration.
         :param endpoint: Endpoint to listen on.
         :param context_factory: TLS context factory.
+        :param timedelta broadcast_delay: How long to wait after a change
+            before sending an update to all connected agents.  Further
+            changes made in that time are included in the same update.  If
+            ``None`` each change is sent as soon as it is made.
         """
+        self._reactor = reactor
+        self._broadcast_delay = broadcast_delay
+        self._broadcast_call = None
+        self._pending_changes = 0
+        self._first_change = None
+        self.broadcasts = 0
+        self.coalesced_changes = 0
         self.connections = set()
         self._current_command = {}
+        self._acknowledged_generations = {}
+        self._generation_numbers = count(1)
+        self._generations = _GenerationTracker(100, self._generation_numbers)
+        self._scopes = {}
         self.cluster_state = cluster_state
         self.configuration_service = configuration_service
         self.endpoint_service = StreamServerEndpointService(
@@ -546,17 +784,47 @@ class ControlAMPService(Service):
             )
         )
         # When configuration changes, notify all connected clients:
-        self.configuration_service.register(
-            lambda: self._send_state_to_connections(self.connections))
+        self.configuration_service.register(self._changed)
 
     def startService(self):
         self.endpoint_service.startService()
 
     def stopService(self):
+        if self._broadcast_call is not None:
+            self._broadcast_call.cancel()
+            self._broadcast_call = None
         self.endpoint_service.stopService()
         for connection in self.connections:
             connection.transport.loseConnection()
 
+    def _changed(self):
+        """
+        Arrange for the current configuration and state to be sent to all
+        connected agents, once the broadcast delay has passed.
+        """
+        if self._pending_changes == 0:
+            self._first_change = self._reactor.seconds()
+        self._pending_changes += 1
+        if self._broadcast_delay is None:
+            self._broadcast()
+        elif self._broadcast_call is None:
+            self._broadcast_call = self._reactor.callLater(
+                self._broadcast_delay.total_seconds(), self._broadcast)
+
+    def _broadcast(self):
+        """
+        Send the current configuration and state to all connected agents.
+        """
+        self._broadcast_call = None
+        coalesced, self._pending_changes = self._pending_changes, 0
+        self._send_state_to_connections(self.connections)
+        self.broadcasts += 1
+        self.coalesced_changes += coalesced
+        LOG_BROADCAST(
+            coalesced=coalesced, connections=len(self.connections),
+            latency=float(self._reactor.seconds() - self._first_change),
+        ).write()
+
     def _send_state_to_connections(self, connections):
         """
         Send desired configuration and cluster state to all given connections.
@@ -565,6 +833,7 @@ class ControlAMPService(Service):
         """
         configuration = self.configuration_service.get()
         state = self.cluster_state.as_deployment()
+        generation = self._generations.track(configuration, state)
 
         # Connections are separated into three groups to support a scheme which
         # lets us avoid sending certain updates which we know are not
@@ -633,7 +902,9 @@ class ControlAMPService(Service):
                 action.add_success_fields(configuration=None, state=None)
 
             for connection in can_update:
-                self._update_connection(connection, configuration, state)
+                self._update_connection(
+                    connection, configuration, state, generation,
+                )
 
             for connection in elided_update:
                 AGENT_UPDATE_ELIDED(agent=connection).write()
@@ -641,37 +912,91 @@ class ControlAMPService(Service):
             for connection in delayed_update:
                 self._delayed_update_connection(connection)
 
-    def _update_connection(self, connection, configuration, state):
+    def _update_connection(self, connection, configuration, state,
+                           generation):
         """
-        Send a ``ClusterStatusCommand`` to an agent.
+        Send a ``ClusterStatusCommand`` or, if the agent has acknowledged an
+        earlier generation, a ``ClusterStatusDiffCommand`` to an agent.
+
+        Agents which are only interested in part of the cluster are only
+        sent that part, and are not sent anything if it hasn't changed since
+        the update they last acknowledged.
 
         :param ControlAMP connection: The connection to use to send the
             command.
 
         :param Deployment configuration: The cluster configuration to send.
         :param DeploymentState state: The current cluster state to send.
+        :param int generation: The generation of ``configuration`` and
+            ``state``.
         """
+        generations = self._generations
+        start_generation = self._acknowledged_generations.get(connection)
+        scope = self._scopes.get(connection)
+        if scope is not None:
+            configuration, state, generation = scope.project(
+                configuration, state)
+            if generation == start_generation:
+                # Nothing the agent is interested in has changed.
+                return
+            generations = scope
+
+        diffs = None
+        if start_generation is not None:
+            diffs = generations.get_diffs(start_generation, generation)
+
         action = LOG_SEND_TO_AGENT(agent=connection)
         with action.context():
             # Use ``maybeDeferred`` so if an exception happens,
             # it will be wrapped in a ``Failure`` - see FLOC-3221
-            d = DeferredContext(maybeDeferred(
-                connection.callRemote,
-                ClusterStatusCommand,
-                configuration=configuration,
-                state=state,
-                eliot_context=action
-            ))
+            if diffs is None:
+                d = maybeDeferred(
+                    connection.callRemote,
+                    ClusterStatusCommand,
+                    configuration=configuration,
+                    state=state,
+                    generation=generation,
+                    eliot_context=action
+                )
+            else:
+                configuration_diff, state_diff = diffs
+                d = maybeDeferred(
+                    connection.callRemote,
+                    ClusterStatusDiffCommand,
+                    configuration_diff=configuration_diff,
+                    state_diff=state_diff,
+                    start_generation=start_generation,
+                    end_generation=generation,
+                    eliot_context=action
+                )
+            d = DeferredContext(d)
             d.addActionFinish()
-            d.result.addErrback(lambda _: None)
+
+        def acknowledged(ignored):
+            if connection in self.connections:
+                self._acknowledged_generations[connection] = generation
+            return False
+
+        def not_acknowledged(failure):
+            # Whatever the agent has now, we no longer know it so the next
+            # update must be a full one.
+            self._acknowledged_generations.pop(connection, None)
+            if failure.check(GenerationMismatch):
+                AGENT_UPDATE_DIFF_REJECTED(agent=connection).write()
+                return True
+            return False
+        d.result.addCallbacks(acknowledged, not_acknowledged)
 
         update = self._current_command[connection] = _UpdateState(
             response=d.result,
             next_scheduled=False,
         )
 
-        def finished_update(ignored):
-            del self._current_command[connection]
+        def finished_update(resend):
+            next_scheduled = self._current_command.pop(
+                connection).next_scheduled
+            if resend and not next_scheduled:
+                self._send_state_to_connections([connection])
         update.response.addCallback(finished_update)
 
     def _delayed_update_connection(self, connection):
@@ -708,6 +1033,23 @@ class ControlAMPService(Service):
         :param ControlAMP connection: The lost connection.
         """
         self.connections.remove(connection)
+        self._acknowledged_generations.pop(connection, None)
+        self._scopes.pop(connection, None)
+
+    def set_interest(self, connection, node_uuid, interest):
+        """
+        Only send an agent the parts of the cluster configuration and state
+        it is interested in.
+
+        :param ControlAMP connection: The connection to the agent.
+        :param UUID node_uuid: The node the agent is running on.
+        :param NamedConstant interest: A ``ClusterInterest`` constant.
+        """
+        if interest is ClusterInterest.ALL:
+            self._scopes.pop(connection, None)
+        else:
+            self._scopes[connection] = _Scope(
+                interest, node_uuid, self._generation_numbers)
 
     def node_changed(self, source, state_changes):
         """
@@ -719,7 +1061,7 @@ class ControlAMPService(Service):
             providers representing the state change which has taken place.
         """
         self.cluster_state.apply_changes_from_source(source, state_changes)
-        self._send_state_to_connections(self.connections)
+        self._changed()
 
 
 class IConvergenceAgent(Interface):
@@ -758,6 +1100,12 @@ class IConvergenceAgent(Interface):
 class _AgentLocator(CommandLocator):
     """
     Command locator for convergence agent.
+
+    :ivar _generation: The generation of the last configuration and state
+        received from the control service, or ``None`` if no update has been
+        received or the control service did not supply a generation.
+    :ivar _configuration: The last ``Deployment`` received.
+    :ivar _state: The last ``DeploymentState`` received.
     """
     def __init__(self, agent, timeout):
         """
@@ -768,6 +1116,9 @@ class _AgentLocator(CommandLocator):
         CommandLocator.__init__(self)
         self.agent = agent
         self._timeout = timeout
+        self._generation = None
+        self._configuration = None
+        self._state = None
 
     def locateResponder(self, name):
         """
@@ -790,10 +1141,37 @@ class _AgentLocator(CommandLocator):
         """
         return self.agent.logger
 
+    def _update(self, generation, configuration, state):
+        """
+        Record a newly received configuration and state and pass them on to
+        the agent.
+        """
+        self._generation = generation
+        self._configuration = configuration
+        self._state = state
+        self.agent.cluster_updated(configuration, state)
+
     @ClusterStatusCommand.responder
-    def cluster_updated(self, eliot_context, configuration, state):
+    def cluster_updated(self, eliot_context, configuration, state,
+                        generation=None):
         with eliot_context:
-            self.agent.cluster_updated(configuration, state)
+            self._update(generation, configuration, state)
+            return {}
+
+    @ClusterStatusDiffCommand.responder
+    def cluster_updated_diff(self, eliot_context, configuration_diff,
+                             state_diff, start_generation, end_generation):
+        with eliot_context:
+            if (self._generation is None or
+                    self._generation != start_generation):
+                raise GenerationMismatch(
+                    "Have generation {}, diff is from generation {}".format(
+                        self._generation, start_generation))
+            self._update(
+                end_generation,
+                configuration_diff.apply(self._configuration),
+                state_diff.apply(self._state),
+            )
             return {}
 
 
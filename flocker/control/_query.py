@@ -0,0 +1,207 @@
+# Copyright ClusterHQ Inc.  See LICENSE file for details.
+# -*- test-case-name: flocker.control.test.test_query -*-
+
+"""
+Indexes of the cluster configuration and state for answering filtered and
+paginated list requests to the REST API.
+
+Without them every such request would look at every dataset, container or
+lease in the cluster, no matter how few of them it asks for.  Each index is
+built the first time it is needed for a particular configuration or state
+and kept for as long as that configuration or state is.
+"""
+
+from bisect import bisect_right
+from itertools import islice
+
+from ._model import _IdentityCache
+
+
+class Index(object):
+    """
+    Items which can be selected by the terms that describe them, in the order
+    of their keys.
+
+    :ivar list _keys: The keys of all the items, sorted.
+    :ivar dict _items: Map keys to tuples of the ``frozenset`` of terms
+        describing the item with that key, and the item itself.
+    :ivar dict _postings: Map each term to the sorted ``list`` of keys of the
+        items it describes.
+    """
+    def __init__(self, entries):
+        """
+        :param entries: Iterable of 3-tuples of a key, an iterable of terms
+            and an item.  Keys are ``unicode`` and unique, and are the cursors
+            given to ``select``.  Terms are 2-tuples of ``unicode`` names and
+            values.
+        """
+        self._items = {}
+        self._postings = {}
+        for key, terms, item in entries:
+            self._items[key] = (frozenset(terms), item)
+        self._keys = sorted(self._items)
+        for key in self._keys:
+            for term in self._items[key][0]:
+                self._postings.setdefault(term, []).append(key)
+
+    def select(self, terms, cursor=None, limit=None):
+        """
+        Find the items described by all of the given terms.
+
+        :param terms: Iterable of terms that must all describe each item.
+        :param unicode cursor: If not ``None``, only select the items whose
+            keys sort after this one.
+        :param int limit: If not ``None``, the most items to select.
+
+        :return: 2-tuple of the ``list`` of selected items, in order, and the
+            cursor to use to select the ones after them, or ``None`` if there
+            aren't any more.
+        """
+        required = frozenset(terms)
+        # Only the keys of items described by the rarest of the terms need to
+        # be looked at:
+        candidates = self._keys
+        for term in required:
+            keys = self._postings.get(term, [])
+            if len(keys) < len(candidates):
+                candidates = keys
+        start = 0 if cursor is None else bisect_right(candidates, cursor)
+        selected = []
+        last_key = None
+        for key in islice(candidates, start, None):
+            item_terms, item = self._items[key]
+            if required <= item_terms:
+                if len(selected) == limit:
+                    return selected, last_key
+                selected.append(item)
+                last_key = key
+        return selected, None
+
+
+def _indexed(entries):
+    """
+    Create a function that returns an ``Index`` of an immutable object,
+    building it only the first time it is needed for that object.
+
+    :param entries: Callable taking the object and returning the entries of
+        its ``Index``.
+    :return: Function taking the object and returning its ``Index``.
+    """
+    cache = _IdentityCache()
+
+    def index(obj):
+        result = cache.get(obj)
+        if result is None:
+            result = Index(entries(obj))
+            cache.put(obj, result)
+        return result
+    index.__name__ = entries.__name__
+    index.__doc__ = entries.__doc__
+    return index
+
+
+@_indexed
+def configuration_datasets(deployment):
+    """
+    :param Deployment deployment: The cluster configuration.
+
+    :return: ``Index`` of 2-tuples of each configured ``Dataset`` and the
+        ``UUID`` of its primary node, keyed by dataset ID and described by the
+        ``dataset_id``, ``primary`` and ``metadata.<key>`` terms.
+    """
+    for manifestation, node in deployment.nodes.all_manifestations():
+        if manifestation.primary:
+            dataset = manifestation.dataset
+            terms = [(u"dataset_id", dataset.dataset_id),
+                     (u"primary", unicode(node.uuid))]
+            terms.extend(
+                (u"metadata." + key, value)
+                for key, value in dataset.metadata.items()
+            )
+            yield dataset.dataset_id, terms, (dataset, node.uuid)
+
+
+@_indexed
+def state_datasets(deployment_state):
+    """
+    :param DeploymentState deployment_state: The cluster state.
+
+    :return: ``Index`` of 2-tuples of each ``Dataset`` in the cluster and the
+        ``NodeState`` it is manifest on or ``None``, keyed by dataset ID, or
+        by ``<dataset_id>/<node_uuid>`` if it is manifest, and described by
+        the ``dataset_id`` and ``primary`` terms.
+    """
+    # A dataset can be reported as manifest on more than one node, for
+    # example while it is being moved, so the dataset ID alone isn't unique:
+    for dataset, node in deployment_state.all_datasets():
+        key = dataset.dataset_id
+        terms = [(u"dataset_id", dataset.dataset_id)]
+        if node is not None:
+            key = u"%s/%s" % (key, node.uuid)
+            terms.append((u"primary", unicode(node.uuid)))
+        yield key, terms, (dataset, node)
+
+
+def state_datasets_with_id(deployment_state, dataset_id):
+    """
+    Find the datasets with an ID in the cluster state, like selecting them
+    from ``state_datasets`` by the ``dataset_id`` term.
+
+    A new cluster state is built whenever an agent reports its state, so
+    rather than building a new ``Index`` for it these are looked up in the
+    manifestation index its nodes keep up to date.
+
+    :param DeploymentState deployment_state: The cluster state.
+    :param unicode dataset_id: The ID of the datasets.
+
+    :return: ``list`` of 2-tuples of each ``Dataset`` with the ID and the
+        ``NodeState`` it is manifest on or ``None``, in the order of their
+        ``state_datasets`` keys.
+    """
+    found = []
+    nonmanifest = deployment_state.nonmanifest_datasets.get(dataset_id)
+    if nonmanifest is not None:
+        found.append((nonmanifest, None))
+    manifestations = deployment_state.nodes.manifestations_of(dataset_id)
+    for uuid in sorted(manifestations, key=unicode):
+        manifestation = manifestations[uuid]
+        if manifestation.primary:
+            found.append(
+                (manifestation.dataset, deployment_state.nodes[uuid]))
+    return found
+
+
+@_indexed
+def state_containers(deployment_state):
+    """
+    :param DeploymentState deployment_state: The cluster state.
+
+    :return: ``Index`` of 2-tuples of each ``Application`` in the cluster and
+        the ``UUID`` of the node it is running on, keyed by
+        ``<node_uuid>/<name>`` and described by the ``node_uuid`` term.
+    """
+    for node in deployment_state.nodes:
+        if node.applications is None:
+            continue
+        node_uuid = unicode(node.uuid)
+        for application in node.applications:
+            yield (u"%s/%s" % (node_uuid, application.name),
+                   [(u"node_uuid", node_uuid)],
+                   (application, node.uuid))
+
+
+@_indexed
+def configuration_leases(deployment):
+    """
+    :param Deployment deployment: The cluster configuration.
+
+    :return: ``Index`` of each ``Lease`` in the configuration, keyed by
+        dataset ID and described by the ``dataset_id`` and ``node_uuid``
+        terms.
+    """
+    for lease in deployment.leases.values():
+        dataset_id = unicode(lease.dataset_id)
+        yield (dataset_id,
+               [(u"dataset_id", dataset_id),
+                (u"node_uuid", unicode(lease.node_id))],
+               lease)
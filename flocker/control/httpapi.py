@@ -14,17 +14,20 @@ import yaml
 
 from pyrsistent import pmap, thaw
 
+from repoze.lru import LRUCache
+
 from twisted.protocols.tls import TLSMemoryBIOFactory
 
 from twisted.python.filepath import FilePath
 from twisted.web.http import (
     CONFLICT, CREATED, NOT_FOUND, OK, NOT_ALLOWED as METHOD_NOT_ALLOWED,
-    BAD_REQUEST, PRECONDITION_FAILED,
+    BAD_REQUEST, PRECONDITION_FAILED, NOT_MODIFIED,
 )
 from twisted.web.server import Site
 from twisted.web.resource import Resource
 from twisted.application.internet import StreamServerEndpointService
 from twisted.internet import reactor
+from twisted.internet.defer import Deferred, maybeDeferred
 
 from klein import Klein
 
@@ -32,7 +35,7 @@ from pyrsistent import discard
 
 from ..restapi import (
     EndpointResponse, structured, user_documentation, make_bad_request,
-    private_api
+    private_api, BadRequest,
 )
 from . import (
     Dataset, Manifestation, Application, DockerImage, Port,
@@ -44,12 +47,17 @@ from ._config import (
     ConfigurationError
 )
 from ._persistence import update_leases
+from . import _query
 from ._model import LeaseError
 
 from .. import __version__, REST_API_PORT as _port
 REST_API_PORT = _port  # Some modules expect this constant to be here
 
 
+# The most responses ``_cached`` keeps for each tag, so that requests with
+# many different query arguments can't grow the cache without bound:
+_MAXIMUM_CACHED_RESPONSES = 64
+
 SCHEMA_BASE = FilePath(__file__).parent().child(b'schema')
 SCHEMAS = {
     b'/v1/types.json': yaml.safe_load(
@@ -92,6 +100,8 @@ LEASE_HELD = make_bad_request(
     code=CONFLICT, description=u"Lease already held.")
 NODE_BY_ERA_NOT_FOUND = make_bad_request(
     code=NOT_FOUND, description=u"No node found with given era.")
+INVALID_LIMIT = make_bad_request(
+    description=u"The limit must be a positive integer.")
 
 _UNDEFINED_MAXIMUM_SIZE = object()
 
@@ -134,6 +144,236 @@ def _if_configuration_matches(original):
     return render_if_matches
 
 
+ETAG_HEADER = b"ETag"
+NEXT_CURSOR_HEADER = b"X-Next-Cursor"
+IF_NONE_MATCH_HEADER = b"If-None-Match"
+
+# The longest a conditional ``GET`` request can wait for a change, in seconds:
+LONG_POLL_LIMIT = 60
+
+
+def get_state_tag(api):
+    """
+    Return tag value for the cluster state.
+
+    :param ConfigurationAPIUserV1 api: API instance.
+    :return: Tag as ``bytes``.
+    """
+    return b"%s-%d" % (
+        api.state_epoch, api.cluster_state_service.generation())
+
+
+def _if_none_match(get_tag):
+    """
+    Create a decorator that supports conditional ``GET`` requests.
+
+    The decorated endpoint's successful responses include an ``ETag`` header
+    whose value is the quoted result of ``get_tag``.  If the request has an
+    ``If-None-Match`` header naming that tag, the endpoint is not called and
+    a ``NOT_MODIFIED`` response with no body is sent instead.
+
+    If the request also has a ``wait`` query argument, a matching tag instead
+    delays the response by up to that many seconds (at most
+    ``LONG_POLL_LIMIT``), until the tag changes.  The endpoint is then called
+    as usual, or a ``NOT_MODIFIED`` response is sent if the time runs out
+    first.
+
+    :param get_tag: Callable taking the API instance and returning the
+        current tag as ``bytes``.  The response of the decorated endpoint must
+        only change when this does.
+    :return: Decorator.
+    """
+    def decorator(original):
+        @wraps(original)
+        def render_if_none_match(self, request, **route_arguments):
+            if_none_match = set(
+                tag.strip()
+                for header in request.requestHeaders.getRawHeaders(
+                    IF_NONE_MATCH_HEADER, [])
+                for tag in header.split(b",")
+            )
+            wait = request.args.get(b"wait", [b"0"])[0]
+            try:
+                deadline = self.clock.seconds() + min(
+                    float(wait), LONG_POLL_LIMIT)
+            except ValueError:
+                request.setResponseCode(BAD_REQUEST)
+                request.responseHeaders.setRawHeaders(
+                    b"content-type", [b"application/json"])
+                return dumps({"description":
+                              "Invalid wait: %s" % (wait,)})
+
+            def render(_=None):
+                # Get the tag before building the response, so that a change
+                # while it is built results in a tag that won't match later:
+                etag = b'"%s"' % (get_tag(self),)
+                if etag in if_none_match or b"*" in if_none_match:
+                    remaining = deadline - self.clock.seconds()
+                    if remaining > 0:
+                        return self._wait_for_change(remaining).addCallback(
+                            render)
+                    request.setResponseCode(NOT_MODIFIED)
+                    request.responseHeaders.setRawHeaders(ETAG_HEADER, [etag])
+                    return b""
+                # Set the header up front, since a large response may start
+                # being written before the endpoint's result is returned:
+                request.responseHeaders.setRawHeaders(ETAG_HEADER, [etag])
+                d = maybeDeferred(original, self, request, **route_arguments)
+
+                def rendered(body):
+                    if request.code != OK:
+                        request.responseHeaders.removeHeader(ETAG_HEADER)
+                    return body
+                d.addCallback(rendered)
+                return d
+            return render()
+        return render_if_none_match
+    return decorator
+
+
+def _cached(get_tag):
+    """
+    Create a decorator that reuses the encoded responses of a ``GET``
+    endpoint.
+
+    A successful response is kept along with the result of ``get_tag`` at the
+    time it was built, and sent again for identical requests for as long as
+    ``get_tag`` returns the same value.  Such requests skip building,
+    validating, encoding and logging the response.  Responses large enough
+    to be written to the request as they are encoded are not kept, and only
+    the ``_MAXIMUM_CACHED_RESPONSES`` most recently used are kept for each
+    tag.
+
+    :param get_tag: Callable taking the API instance and returning the
+        current tag as ``bytes``.  The response of the decorated endpoint must
+        only change when this does.
+    :return: Decorator.
+    """
+    def decorator(original):
+        @wraps(original)
+        def render_cached(self, request, **route_arguments):
+            tag = get_tag(self)
+            # All the responses kept for a tag are discarded together once it
+            # changes:
+            cached_tag, responses = self._responses.get(get_tag, (None, None))
+            if cached_tag != tag:
+                responses = LRUCache(_MAXIMUM_CACHED_RESPONSES)
+                self._responses[get_tag] = (tag, responses)
+            # Filtered and paginated requests are kept separately, but waiting
+            # for a change doesn't change the response:
+            key = (original.__name__,) + tuple(
+                sorted(route_arguments.items())) + tuple(
+                sorted((name, tuple(values))
+                       for name, values in request.args.items()
+                       if name != b"wait"))
+            response = responses.get(key)
+            if response is not None:
+                headers, body = response
+                request.setResponseCode(OK)
+                for name, values in headers:
+                    request.responseHeaders.setRawHeaders(name, values)
+                return body
+            d = maybeDeferred(original, self, request, **route_arguments)
+
+            def rendered(body):
+                # Responses written to the request as they were encoded
+                # weren't kept, and are too large to be worth keeping:
+                if request.code == OK and body is not None:
+                    responses.put(key, (
+                        list(request.responseHeaders.getAllRawHeaders()),
+                        body))
+                return body
+            d.addCallback(rendered)
+            return d
+        return render_cached
+    return decorator
+
+
+def _query_arguments(*names):
+    """
+    Create a decorator that passes the query arguments of a ``GET`` request
+    to the endpoint as keyword arguments.
+
+    :param names: The names of the query arguments to pass, as ``bytes``.  If
+        an argument is given more than once, its last value is passed.  A
+        name ending in ``.`` instead passes a ``dict`` mapping the rest of the
+        names of all the arguments starting with it to their values, unless
+        there aren't any.  Names and values are decoded from UTF-8.
+    :return: Decorator.
+    """
+    def decorator(original):
+        @wraps(original)
+        def render_with_query_arguments(self, request, **route_arguments):
+            for name in names:
+                if name.endswith(b"."):
+                    values = {
+                        key[len(name):].decode("utf-8"):
+                        value[-1].decode("utf-8")
+                        for key, value in request.args.items()
+                        if key.startswith(name)
+                    }
+                    if values:
+                        route_arguments[name[:-1]] = values
+                elif name in request.args:
+                    route_arguments[name] = request.args[name][-1].decode(
+                        "utf-8")
+            return original(self, request, **route_arguments)
+        return render_with_query_arguments
+    return decorator
+
+
+def _query_terms(metadata=None, **arguments):
+    """
+    Convert the filters given as query arguments to the terms of an
+    ``_query.Index``.
+
+    :param dict metadata: Map metadata keys to the value a dataset must have
+        for them, or ``None``.
+    :param arguments: Map the names of the other filters to the value they
+        must have, or ``None`` if not given.
+    :return: ``list`` of terms.
+    """
+    terms = [(name.decode("ascii"), value)
+             for name, value in arguments.items() if value is not None]
+    if metadata is not None:
+        terms.extend(
+            (u"metadata." + key, value) for key, value in metadata.items())
+    return terms
+
+
+def _select(index, terms, limit, cursor, render, headers=None):
+    """
+    Build the response to a filtered or paginated list request.
+
+    :param _query.Index index: The items to select from.
+    :param list terms: The terms which must all describe the selected items.
+    :param unicode limit: The most items to respond with, as given in the
+        request, or ``None``.
+    :param unicode cursor: The cursor given in the request, or ``None``.
+    :param render: Callable converting a selected item to the ``dict`` to
+        respond with.
+    :param dict headers: Further response headers, or ``None``.
+
+    :raise BadRequest: If ``limit`` is not a positive integer.
+    :return: ``EndpointResponse`` with an iterator of the rendered items and,
+        if there are more items after them, an ``X-Next-Cursor`` header with
+        the cursor to request them with.
+    """
+    if limit is not None:
+        try:
+            limit = int(limit)
+        except ValueError:
+            raise INVALID_LIMIT
+        if limit < 1:
+            raise INVALID_LIMIT
+    items, next_cursor = index.select(terms, cursor, limit)
+    headers = dict(headers or {})
+    if next_cursor is not None:
+        headers[NEXT_CURSOR_HEADER] = next_cursor.encode("utf-8")
+    return EndpointResponse(
+        OK, (render(item) for item in items), headers=headers)
+
+
 class ConfigurationAPIUserV1(object):
     """
     A user accessing the API.
@@ -159,6 +399,50 @@ class ConfigurationAPIUserV1(object):
         self.persistence_service = persistence_service
         self.cluster_state_service = cluster_state_service
         self.clock = clock
+        # The cluster state generation starts again from zero whenever the
+        # control service restarts, so state tags also include a value unique
+        # to this process:
+        self.state_epoch = uuid4().hex
+        # Map tag functions to the tag they returned and the responses kept
+        # for it by ``_cached``:
+        self._responses = {}
+        # Deferreds waiting for the next change to the configuration or the
+        # cluster state:
+        self._waiting = set()
+        persistence_service.register(self._changed)
+        cluster_state_service.register(self._changed)
+
+    def _changed(self):
+        """
+        Wake up the requests waiting for a change to the configuration or the
+        cluster state.
+        """
+        waiting, self._waiting = self._waiting, set()
+        for d in waiting:
+            d.callback(None)
+
+    def _wait_for_change(self, timeout):
+        """
+        Wait for the configuration or the cluster state to change.
+
+        :param float timeout: The most seconds to wait.
+        :return: ``Deferred`` that fires with ``None`` after the next change,
+            or after ``timeout`` seconds if there is none.
+        """
+        d = Deferred(canceller=lambda d: self._waiting.discard(d))
+
+        def timed_out():
+            self._waiting.discard(d)
+            d.callback(None)
+        timeout_call = self.clock.callLater(timeout, timed_out)
+
+        def finished(result):
+            if timeout_call.active():
+                timeout_call.cancel()
+            return result
+        d.addBoth(finished)
+        self._waiting.add(d)
+        return d
 
     @app.route("/version", methods=['GET'])
     @user_documentation(
@@ -186,11 +470,25 @@ class ConfigurationAPIUserV1(object):
 
         Includes a ``X-Configuration-Tag`` header in the response for use
         with operations that support ``X-If-Configuration-Matches``.
+
+        The ``dataset_id``, ``primary`` and ``metadata.<key>`` query
+        arguments only include the datasets with that ID, primary node UUID
+        or metadata value.
+        The ``limit`` query argument includes at most that many datasets, in
+        order of their IDs.
+        If there are more, the response has a ``X-Next-Cursor`` header whose
+        value can be given as the ``cursor`` query argument to get the ones
+        after them.
         """,
         header=u"Get the cluster's dataset configuration",
-        examples=[u"get configured datasets"],
+        examples=[u"get configured datasets",
+                  u"get configured datasets by metadata"],
         section=u"dataset",
     )
+    @_if_none_match(get_configuration_tag)
+    @_cached(get_configuration_tag)
+    @_query_arguments(b"dataset_id", b"primary", b"metadata.", b"limit",
+                      b"cursor")
     @structured(
         inputSchema={},
         outputSchema={
@@ -199,17 +497,36 @@ class ConfigurationAPIUserV1(object):
         },
         schema_store=SCHEMAS,
     )
-    def get_dataset_configuration(self):
+    def get_dataset_configuration(self, dataset_id=None, primary=None,
+                                  metadata=None, limit=None, cursor=None):
         """
         Get the configured datasets.
 
-        :return: A ``list`` of ``dict`` representing each of dataset
+        :param unicode dataset_id: If not ``None``, only include the dataset
+            with this ID.
+        :param unicode primary: If not ``None``, only include the datasets
+            whose primary node has this UUID.
+        :param dict metadata: If not ``None``, only include the datasets with
+            these metadata values.
+        :param unicode limit: If not ``None``, the most datasets to include.
+        :param unicode cursor: If not ``None``, only include the datasets
+            after the one with this ID.
+
+        :return: An iterator of ``dict`` representing each of dataset
             that is configured to exist anywhere on the cluster.
         """
         tag = get_configuration_tag(self)
-        return EndpointResponse(
-            OK, list(datasets_from_deployment(self.persistence_service.get())),
-            headers={b"X-Configuration-Tag": tag})
+        headers = {b"X-Configuration-Tag": tag}
+        deployment = self.persistence_service.get()
+        terms = _query_terms(
+            dataset_id=dataset_id, primary=primary, metadata=metadata)
+        if not terms and limit is None and cursor is None:
+            return EndpointResponse(
+                OK, datasets_from_deployment(deployment), headers=headers)
+        return _select(
+            _query.configuration_datasets(deployment), terms, limit, cursor,
+            lambda item: api_dataset_from_dataset_and_node(*item),
+            headers=headers)
 
     @app.route("/configuration/datasets", methods=['POST'])
     @user_documentation(
@@ -269,45 +586,11 @@ class ConfigurationAPIUserV1(object):
             cluster configuration or giving error information if this is not
             possible.
         """
-        if dataset_id is None:
-            dataset_id = unicode(uuid4())
-        dataset_id = dataset_id.lower()
-
-        if metadata is None:
-            metadata = {}
-
-        primary = UUID(hex=primary)
-
-        # Use persistence_service to get a Deployment for the cluster
-        # configuration.
-        deployment = self.persistence_service.get()
-        for node in deployment.nodes:
-            for manifestation in node.manifestations.values():
-                if manifestation.dataset.dataset_id == dataset_id:
-                    raise DATASET_ID_COLLISION
-
-        # XXX Check cluster state to determine if the given primary node
-        # actually exists.  If not, raise PRIMARY_NODE_NOT_FOUND.
-        # See FLOC-1278
-
-        dataset = Dataset(
-            dataset_id=dataset_id,
-            maximum_size=maximum_size,
-            metadata=pmap(metadata)
-        )
-        manifestation = Manifestation(dataset=dataset, primary=True)
-
-        primary_node = deployment.get_node(primary)
-
-        new_node_config = primary_node.transform(
-            ("manifestations", manifestation.dataset_id), manifestation)
-        new_deployment = deployment.update_node(new_node_config)
-        saving = self.persistence_service.save(new_deployment)
-
-        def saved(ignored):
-            result = api_dataset_from_dataset_and_node(dataset, primary)
-            return EndpointResponse(CREATED, result)
-        saving.addCallback(saved)
+        deployment, result = _create_dataset(
+            self.persistence_service.get(), primary, dataset_id,
+            maximum_size, metadata)
+        saving = self.persistence_service.save(deployment)
+        saving.addCallback(lambda _: EndpointResponse(CREATED, result))
         return saving
 
     @app.route("/configuration/datasets/<dataset_id>", methods=['DELETE'])
@@ -345,26 +628,10 @@ class ConfigurationAPIUserV1(object):
             as deleted in the cluster configuration or giving error
             information if this is not possible.
         """
-        # Get the current configuration.
-        deployment = self.persistence_service.get()
-
-        # XXX this doesn't handle replicas
-        # https://clusterhq.atlassian.net/browse/FLOC-1240
-        _, origin_node = _find_manifestation_and_node(
-            deployment, dataset_id)
-
-        new_node = origin_node.transform(
-            ("manifestations", dataset_id, "dataset", "deleted"), True)
-        deployment = deployment.update_node(new_node)
-
+        deployment, result = _delete_dataset(
+            self.persistence_service.get(), dataset_id)
         saving = self.persistence_service.save(deployment)
-
-        def saved(ignored):
-            result = api_dataset_from_dataset_and_node(
-                new_node.manifestations[dataset_id].dataset, new_node.uuid,
-            )
-            return EndpointResponse(OK, result)
-        saving.addCallback(saved)
+        saving.addCallback(lambda _: EndpointResponse(OK, result))
         return saving
 
     @app.route("/configuration/datasets/<dataset_id>", methods=['POST'])
@@ -412,37 +679,77 @@ class ConfigurationAPIUserV1(object):
             cluster configuration or giving error information if this is not
             possible.
         """
-        # Get the current configuration.
-        deployment = self.persistence_service.get()
+        deployment, result = _move_dataset(
+            self.persistence_service.get(), dataset_id, primary)
+        saving = self.persistence_service.save(deployment)
+        saving.addCallback(lambda _: EndpointResponse(OK, result))
+        return saving
 
-        # Raises DATASET_NOT_FOUND if the ``dataset_id`` is not found.
-        primary_manifestation, current_node = _find_manifestation_and_node(
-            deployment, dataset_id
-        )
+    @app.route("/configuration/datasets/_bulk", methods=['POST'])
+    @user_documentation(
+        u"""
+        Create, move, delete or resize many datasets at once.
 
-        if primary_manifestation.dataset.deleted:
-            raise DATASET_DELETED
+        The operations are applied in order to a single version of the
+        configuration, which is then saved once.  Either all of them are
+        applied or, if any of them fails, none are.  The response has one
+        item for each operation: the resulting dataset if all of the
+        operations succeeded, or otherwise an error description for each
+        failed operation and ``null`` for the others.
 
-        if primary is not None:
-            deployment = _update_dataset_primary(
-                deployment, dataset_id, UUID(hex=primary)
-            )
+        Supports ``X-If-Configuration-Matches`` header in the request to
+        ensure the operations only happen if the configuration hasn't
+        changed.
+        """,
+        header=u"Update many datasets",
+        examples=[
+            u"bulk dataset operations",
+            u"bulk dataset operations with unknown dataset id",
+        ],
+        section=u"dataset",
+    )
+    @_if_configuration_matches
+    @structured(
+        inputSchema={
+            '$ref':
+            '/v1/endpoints.json#/definitions/configuration_datasets_bulk'},
+        outputSchema={
+            '$ref':
+            '/v1/endpoints.json#/definitions/configuration_datasets_list'},
+        schema_store=SCHEMAS,
+    )
+    def bulk_update_datasets(self, operations):
+        """
+        Apply many dataset operations to the cluster configuration at once.
 
-        saving = self.persistence_service.save(deployment)
+        :param list operations: A ``list`` of ``dict``, each with an
+            ``operation`` of ``create``, ``move``, ``delete`` or ``resize``
+            and the parameters of that operation.
 
-        primary_manifestation, current_node = _find_manifestation_and_node(
-            deployment, dataset_id
-        )
+        :return: A ``list`` of ``dict`` describing the dataset resulting
+            from each operation, or error information for each operation
+            that failed if any did.
+        """
+        deployment = self.persistence_service.get()
+        results = []
+        errors = []
+        for operation in operations:
+            arguments = operation.copy()
+            apply_operation = _DATASET_OPERATIONS[arguments.pop(u"operation")]
+            try:
+                deployment, result = apply_operation(deployment, **arguments)
+            except BadRequest as e:
+                errors.append(dict(e.result, code=e.code))
+            else:
+                results.append(result)
+                errors.append(None)
+        if len(results) < len(operations):
+            raise make_bad_request(
+                description=u"No dataset operations were applied.",
+                errors=errors)
 
-        # Return an API response dictionary containing the dataset with updated
-        # primary address.
-        def saved(ignored):
-            result = api_dataset_from_dataset_and_node(
-                primary_manifestation.dataset,
-                current_node.uuid,
-            )
-            return EndpointResponse(OK, result)
-        saving.addCallback(saved)
+        saving = self.persistence_service.save(deployment)
+        saving.addCallback(lambda _: EndpointResponse(OK, results))
         return saving
 
     @app.route("/state/datasets", methods=['GET'])
@@ -451,11 +758,22 @@ class ConfigurationAPIUserV1(object):
         The result reflects the control service's knowledge, which may be
         out of date or incomplete. E.g. a dataset agent has not connected
         or updated the control service yet.
+
+        The ``dataset_id`` and ``primary`` query arguments only include the
+        datasets with that ID or manifest on the node with that UUID.
+        The ``limit`` query argument includes at most that many datasets, in
+        order of their IDs.
+        If there are more, the response has a ``X-Next-Cursor`` header whose
+        value can be given as the ``cursor`` query argument to get the ones
+        after them.
         """,
         header=u"Get current cluster datasets",
-        examples=[u"get state datasets"],
+        examples=[u"get state datasets", u"get state datasets by id"],
         section=u"dataset",
     )
+    @_if_none_match(get_state_tag)
+    @_cached(get_state_tag)
+    @_query_arguments(b"dataset_id", b"primary", b"limit", b"cursor")
     @structured(
         inputSchema={},
         outputSchema={
@@ -463,12 +781,46 @@ class ConfigurationAPIUserV1(object):
             },
         schema_store=SCHEMAS
     )
-    def state_datasets(self):
+    def state_datasets(self, dataset_id=None, primary=None, limit=None,
+                       cursor=None):
         """
         Return all primary manifest datasets and all non-manifest datasets in
         the cluster.
 
-        :return: A ``list`` containing all datasets in the cluster.
+        :param unicode dataset_id: If not ``None``, only include the dataset
+            with this ID.
+        :param unicode primary: If not ``None``, only include the datasets
+            manifest on the node with this UUID.
+        :param unicode limit: If not ``None``, the most datasets to include.
+        :param unicode cursor: If not ``None``, only include the datasets
+            after the ones the previous response ended with, as given by its
+            ``X-Next-Cursor`` header.
+
+        :return: An iterator of all datasets in the cluster.
+        """
+        deployment_state = self.cluster_state_service.as_deployment()
+        if limit is None and cursor is None and primary is None:
+            if dataset_id is None:
+                datasets = deployment_state.all_datasets()
+            else:
+                datasets = _query.state_datasets_with_id(
+                    deployment_state, dataset_id)
+            return (
+                self._state_dataset_response(dataset, node)
+                for dataset, node in datasets
+            )
+        terms = _query_terms(dataset_id=dataset_id, primary=primary)
+        return _select(
+            _query.state_datasets(deployment_state), terms, limit, cursor,
+            lambda item: self._state_dataset_response(*item))
+
+    def _state_dataset_response(self, dataset, node):
+        """
+        :param Dataset dataset: A dataset in the cluster.
+        :param NodeState node: The node it is manifest on, or ``None``.
+
+        :return: ``dict`` describing the dataset in the state datasets
+            response.
         """
         # XXX This duplicates code in datasets_from_deployment, but that
         # function is designed to operate on a Deployment rather than a
@@ -476,27 +828,22 @@ class ConfigurationAPIUserV1(object):
         # includes metadata and deleted flags which should not be part of the
         # dataset state response.
         # Refactor. See FLOC-2207.
-        response = []
-        deployment_state = self.cluster_state_service.as_deployment()
-        get_manifestation_path = self.cluster_state_service.manifestation_path
-
-        for dataset, node in deployment_state.all_datasets():
-            response_dataset = dict(
-                dataset_id=dataset.dataset_id,
-            )
+        response_dataset = dict(
+            dataset_id=dataset.dataset_id,
+        )
 
-            if node is not None:
-                response_dataset[u"primary"] = unicode(node.uuid)
-                response_dataset[u"path"] = get_manifestation_path(
+        if node is not None:
+            response_dataset[u"primary"] = unicode(node.uuid)
+            response_dataset[u"path"] = (
+                self.cluster_state_service.manifestation_path(
                     node.uuid,
                     dataset.dataset_id
-                ).path.decode("utf-8")
+                ).path.decode("utf-8"))
 
-            if dataset.maximum_size is not None:
-                response_dataset[u"maximum_size"] = dataset.maximum_size
+        if dataset.maximum_size is not None:
+            response_dataset[u"maximum_size"] = dataset.maximum_size
 
-            response.append(response_dataset)
-        return response
+        return response_dataset
 
     @app.route("/configuration/containers", methods=['GET'])
     @user_documentation(
@@ -508,6 +855,8 @@ class ConfigurationAPIUserV1(object):
         examples=[u"get configured containers"],
         section=u"container",
     )
+    @_if_none_match(get_configuration_tag)
+    @_cached(get_configuration_tag)
     @structured(
         inputSchema={},
         outputSchema={
@@ -520,10 +869,10 @@ class ConfigurationAPIUserV1(object):
         """
         Get the configured containers.
 
-        :return: A ``list`` of ``dict`` representing each of the containers
-            that are configured to exist anywhere on the cluster.
+        :return: An iterator of ``dict`` representing each of the
+            containers that are configured to exist anywhere on the cluster.
         """
-        return list(containers_from_deployment(self.persistence_service.get()))
+        return containers_from_deployment(self.persistence_service.get())
 
     @app.route("/state/containers", methods=['GET'])
     @user_documentation(
@@ -531,11 +880,22 @@ class ConfigurationAPIUserV1(object):
         This reflects the control service's knowledge of the cluster,
         which may be out of date or incomplete, e.g. if a container agent
         has not connected or updated the control service yet.
+
+        The ``node_uuid`` query argument only includes the containers on the
+        node with that UUID.
+        The ``limit`` query argument includes at most that many containers,
+        in order of their node UUIDs and names.
+        If there are more, the response has a ``X-Next-Cursor`` header whose
+        value can be given as the ``cursor`` query argument to get the ones
+        after them.
         """,
         header=u"Get the cluster's actual containers",
         examples=[u"get actual containers"],
         section=u"container",
     )
+    @_if_none_match(get_state_tag)
+    @_cached(get_state_tag)
+    @_query_arguments(b"node_uuid", b"limit", b"cursor")
     @structured(
         inputSchema={},
         outputSchema={
@@ -544,24 +904,31 @@ class ConfigurationAPIUserV1(object):
         },
         schema_store=SCHEMAS,
     )
-    def get_containers_state(self):
+    def get_containers_state(self, node_uuid=None, limit=None, cursor=None):
         """
         Get the containers present in the cluster.
 
-        :return: A ``list`` of ``dict`` representing each of the containers
-            that are configured to exist anywhere on the cluster.
+        :param unicode node_uuid: If not ``None``, only include the containers
+            on the node with this UUID.
+        :param unicode limit: If not ``None``, the most containers to include.
+        :param unicode cursor: If not ``None``, only include the containers
+            after the one with this ``<node_uuid>/<name>``.
+
+        :return: An iterator of ``dict`` representing each of the
+            containers that are configured to exist anywhere on the cluster.
         """
-        result = []
         deployment_state = self.cluster_state_service.as_deployment()
-        for node in deployment_state.nodes:
-            if node.applications is None:
-                continue
-            for application in node.applications:
-                container = container_configuration_response(
-                    application, node.uuid)
-                container[u"running"] = application.running
-                result.append(container)
-        return result
+        terms = _query_terms(node_uuid=node_uuid)
+        if not terms and limit is None and cursor is None:
+            return (
+                _container_state_response(application, node.uuid)
+                for node in deployment_state.nodes
+                if node.applications is not None
+                for application in node.applications
+            )
+        return _select(
+            _query.state_containers(deployment_state), terms, limit, cursor,
+            lambda item: _container_state_response(*item))
 
     def _get_attached_volume(self, node_uuid, volume):
         """
@@ -885,6 +1252,8 @@ class ConfigurationAPIUserV1(object):
         ],
         section=u"common",
     )
+    @_if_none_match(get_state_tag)
+    @_cached(get_state_tag)
     @structured(
         inputSchema={},
         outputSchema={"$ref":
@@ -917,6 +1286,8 @@ class ConfigurationAPIUserV1(object):
         ],
         section=u"common",
     )
+    @_if_none_match(get_state_tag)
+    @_cached(get_state_tag)
     @structured(
         inputSchema={},
         outputSchema={"$ref":
@@ -972,6 +1343,15 @@ class ConfigurationAPIUserV1(object):
         u"""
         List the currently existing leases on datasets, including which
         node the lease is for and when if ever the lease will expire.
+
+        The ``dataset_id`` and ``node_uuid`` query arguments only include the
+        leases on the dataset with that ID or held by the node with that
+        UUID.
+        The ``limit`` query argument includes at most that many leases, in
+        order of their dataset IDs.
+        If there are more, the response has a ``X-Next-Cursor`` header whose
+        value can be given as the ``cursor`` query argument to get the ones
+        after them.
         """,
         header=u"List all leases on datasets",
         examples=[
@@ -979,6 +1359,7 @@ class ConfigurationAPIUserV1(object):
         ],
         section=u"dataset",
     )
+    @_query_arguments(b"dataset_id", b"node_uuid", b"limit", b"cursor")
     @structured(
         inputSchema={},
         outputSchema={
@@ -987,15 +1368,30 @@ class ConfigurationAPIUserV1(object):
         },
         schema_store=SCHEMAS
     )
-    def list_leases(self):
+    def list_leases(self, dataset_id=None, node_uuid=None, limit=None,
+                    cursor=None):
         """
         List the current leases in the configuration.
+
+        :param unicode dataset_id: If not ``None``, only include the lease on
+            the dataset with this ID.
+        :param unicode node_uuid: If not ``None``, only include the leases
+            held by the node with this UUID.
+        :param unicode limit: If not ``None``, the most leases to include.
+        :param unicode cursor: If not ``None``, only include the leases on
+            datasets after the one with this ID.
         """
         now = datetime.fromtimestamp(self.clock.seconds(), UTC)
-        result = []
-        for lease in self.persistence_service.get().leases.values():
-            result.append(lease_response(lease, now))
-        return result
+        deployment = self.persistence_service.get()
+        terms = _query_terms(dataset_id=dataset_id, node_uuid=node_uuid)
+        if not terms and limit is None and cursor is None:
+            result = []
+            for lease in deployment.leases.values():
+                result.append(lease_response(lease, now))
+            return result
+        return _select(
+            _query.configuration_leases(deployment), terms, limit, cursor,
+            lambda lease: lease_response(lease, now))
 
     @app.route("/configuration/leases/<dataset_id>", methods=['DELETE'])
     @user_documentation(
@@ -1187,6 +1583,155 @@ def _update_dataset_maximum_size(deployment, dataset_id, maximum_size):
     return deployment.set(nodes=deployment.nodes.add(node))
 
 
+def _create_dataset(deployment, primary, dataset_id=None, maximum_size=None,
+                    metadata=None):
+    """
+    Add a new dataset to ``deployment``.
+
+    :param Deployment deployment: The configuration to add the dataset to.
+    :param unicode primary: The UUID of the node on which the primary
+        manifestation of the dataset will be created.
+    :param unicode dataset_id: The UUID to give the dataset, or ``None`` to
+        generate one.
+    :param maximum_size: The maximum size of the dataset in bytes or ``None``
+        to make it unlimited.
+    :param dict metadata: Key/value pairs to associate with the dataset, or
+        ``None`` for none.
+
+    :raise BadRequest: If a dataset with the given ``dataset_id`` already
+        exists.
+    :return: A tuple of the updated ``Deployment`` and a ``dict`` describing
+        the new dataset.
+    """
+    if dataset_id is None:
+        dataset_id = unicode(uuid4())
+    dataset_id = dataset_id.lower()
+
+    if metadata is None:
+        metadata = {}
+
+    primary = UUID(hex=primary)
+
+    if deployment.nodes.manifestations_of(dataset_id):
+        raise DATASET_ID_COLLISION
+
+    # XXX Check cluster state to determine if the given primary node
+    # actually exists.  If not, raise PRIMARY_NODE_NOT_FOUND.
+    # See FLOC-1278
+
+    dataset = Dataset(
+        dataset_id=dataset_id,
+        maximum_size=maximum_size,
+        metadata=pmap(metadata)
+    )
+    manifestation = Manifestation(dataset=dataset, primary=True)
+
+    primary_node = deployment.get_node(primary)
+
+    new_node_config = primary_node.transform(
+        ("manifestations", manifestation.dataset_id), manifestation)
+    deployment = deployment.update_node(new_node_config)
+    return deployment, api_dataset_from_dataset_and_node(dataset, primary)
+
+
+def _delete_dataset(deployment, dataset_id):
+    """
+    Mark a dataset in ``deployment`` as deleted.
+
+    :param Deployment deployment: The configuration containing the dataset.
+    :param unicode dataset_id: The UUID of the dataset.
+
+    :raise BadRequest: If the dataset is not found.
+    :return: A tuple of the updated ``Deployment`` and a ``dict`` describing
+        the deleted dataset.
+    """
+    # XXX this doesn't handle replicas
+    # https://clusterhq.atlassian.net/browse/FLOC-1240
+    _, origin_node = _find_manifestation_and_node(deployment, dataset_id)
+
+    new_node = origin_node.transform(
+        ("manifestations", dataset_id, "dataset", "deleted"), True)
+    deployment = deployment.update_node(new_node)
+    return deployment, api_dataset_from_dataset_and_node(
+        new_node.manifestations[dataset_id].dataset, new_node.uuid,
+    )
+
+
+def _move_dataset(deployment, dataset_id, primary=None):
+    """
+    Move a dataset in ``deployment`` to a new primary node.
+
+    :param Deployment deployment: The configuration containing the dataset.
+    :param unicode dataset_id: The UUID of the dataset.
+    :param primary: The UUID of the node to which the dataset will be
+        moved, or ``None`` indicating no change.
+
+    :raise BadRequest: If the dataset is not found or has been deleted.
+    :return: A tuple of the updated ``Deployment`` and a ``dict`` describing
+        the moved dataset.
+    """
+    # Raises DATASET_NOT_FOUND if the ``dataset_id`` is not found.
+    primary_manifestation, _ = _find_manifestation_and_node(
+        deployment, dataset_id
+    )
+
+    if primary_manifestation.dataset.deleted:
+        raise DATASET_DELETED
+
+    if primary is not None:
+        deployment = _update_dataset_primary(
+            deployment, dataset_id, UUID(hex=primary)
+        )
+
+    primary_manifestation, current_node = _find_manifestation_and_node(
+        deployment, dataset_id
+    )
+    return deployment, api_dataset_from_dataset_and_node(
+        primary_manifestation.dataset, current_node.uuid,
+    )
+
+
+def _resize_dataset(deployment, dataset_id, maximum_size):
+    """
+    Change the maximum size of a dataset in ``deployment``.
+
+    :param Deployment deployment: The configuration containing the dataset.
+    :param unicode dataset_id: The UUID of the dataset.
+    :param maximum_size: The new maximum size of the dataset in bytes or
+        ``None`` to make it unlimited.
+
+    :raise BadRequest: If the dataset is not found or has been deleted.
+    :return: A tuple of the updated ``Deployment`` and a ``dict`` describing
+        the resized dataset.
+    """
+    primary_manifestation, _ = _find_manifestation_and_node(
+        deployment, dataset_id
+    )
+
+    if primary_manifestation.dataset.deleted:
+        raise DATASET_DELETED
+
+    deployment = _update_dataset_maximum_size(
+        deployment, dataset_id, maximum_size)
+
+    primary_manifestation, current_node = _find_manifestation_and_node(
+        deployment, dataset_id
+    )
+    return deployment, api_dataset_from_dataset_and_node(
+        primary_manifestation.dataset, current_node.uuid,
+    )
+
+
+# Map the ``operation`` of each item of a bulk dataset request to the
+# function that applies it to a ``Deployment``:
+_DATASET_OPERATIONS = {
+    u"create": _create_dataset,
+    u"delete": _delete_dataset,
+    u"move": _move_dataset,
+    u"resize": _resize_dataset,
+}
+
+
 def manifestations_from_deployment(deployment, dataset_id):
     """
     Extract all other manifestations of the supplied dataset_id from the
@@ -1199,9 +1744,9 @@ def manifestations_from_deployment(deployment, dataset_id):
     :return: Iterable returning all manifestations of the supplied
         ``dataset_id``.
     """
-    for node in deployment.nodes:
-        if dataset_id in node.manifestations:
-            yield node.manifestations[dataset_id], node
+    nodes = deployment.nodes
+    for uuid, manifestation in nodes.manifestations_of(dataset_id).items():
+        yield manifestation, nodes[uuid]
 
 
 def datasets_from_deployment(deployment):
@@ -1217,18 +1762,15 @@ def datasets_from_deployment(deployment):
 
     :return: Iterable returning all datasets.
     """
-    for node in deployment.nodes:
-        if node.manifestations is None:
-            continue
-        for manifestation in node.manifestations.values():
-            if manifestation.primary:
-                # There may be multiple datasets marked as primary until we
-                # implement consistency checking when state is reported by each
-                # node.
-                # See https://clusterhq.atlassian.net/browse/FLOC-1303
-                yield api_dataset_from_dataset_and_node(
-                    manifestation.dataset, node.uuid
-                )
+    for manifestation, node in deployment.nodes.all_manifestations():
+        if manifestation.primary:
+            # There may be multiple datasets marked as primary until we
+            # implement consistency checking when state is reported by each
+            # node.
+            # See https://clusterhq.atlassian.net/browse/FLOC-1303
+            yield api_dataset_from_dataset_and_node(
+                manifestation.dataset, node.uuid
+            )
 
 
 def containers_from_deployment(deployment):
@@ -1273,6 +1815,20 @@ def container_configuration_response(application, node):
     return result
 
 
+def _container_state_response(application, node):
+    """
+    Return a container dict which conforms to
+    ``/v1/endpoints.json#/definitions/state_container``
+
+    :param Application application: An ``Application`` instance.
+    :param UUID node: The host on which this application is running.
+    :return: A ``dict`` containing the container state.
+    """
+    container = container_configuration_response(application, node)
+    container[u"running"] = application.running
+    return container
+
+
 def api_dataset_from_dataset_and_node(dataset, node_uuid):
     """
     Return a dataset dict which conforms to
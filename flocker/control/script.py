@@ -8,6 +8,7 @@ Script for starting control service server.
 import cProfile
 import signal
 import time
+from datetime import timedelta
 
 from twisted.python.usage import Options
 from twisted.internet.endpoints import serverFromString
@@ -20,7 +21,7 @@ from ._persistence import ConfigurationPersistenceService
 from ._clusterstate import ClusterStateService
 from ..common.script import (
     flocker_standard_options, FlockerScriptRunner, main_for_service)
-from ._protocol import ControlAMPService
+from ._protocol import ControlAMPService, BROADCAST_DELAY
 from ..ca import (
     rest_api_context_factory, ControlCredential, amp_server_context_factory,
 )
@@ -44,6 +45,10 @@ class ControlOptions(Options):
          ("Absolute path to directory containing the cluster "
           "root certificate (cluster.crt) and control service certificate "
           "and private key (control-service.crt and control-service.key).")],
+        ["broadcast-delay", None, BROADCAST_DELAY.total_seconds(),
+         ("Seconds to wait after a configuration or state change before "
+          "sending it to agents, so that changes arriving close together "
+          "are sent as a single update."), float],
     ]
 
 
@@ -63,7 +68,7 @@ class ControlScript(object):
 
         top_service = MultiService()
         persistence = ConfigurationPersistenceService(
-            reactor, options["data-path"])
+            reactor, options["data-path"], threaded=True)
         persistence.setServiceParent(top_service)
         cluster_state = ClusterStateService(reactor)
         cluster_state.setServiceParent(top_service)
@@ -75,7 +80,8 @@ class ControlScript(object):
         amp_service = ControlAMPService(
             reactor, cluster_state, persistence, serverFromString(
                 reactor, options["agent-port"]),
-            amp_server_context_factory(ca, control_credential))
+            amp_server_context_factory(ca, control_credential),
+            broadcast_delay=timedelta(seconds=options["broadcast-delay"]))
         amp_service.setServiceParent(top_service)
         return main_for_service(reactor, top_service)
 
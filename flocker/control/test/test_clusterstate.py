@@ -6,6 +6,8 @@ Tests for ``flocker.control._clusterstate``.
 
 from uuid import uuid4
 
+from eliot.testing import capture_logging
+
 from twisted.python.filepath import FilePath
 from twisted.internet.task import Clock
 
@@ -253,3 +255,119 @@ class ClusterStateServiceTests(TestCase):
             service.as_deployment(),
             DeploymentState(nodes=[self.WITH_APPS]),
         )
+
+    def test_generation_changes(self):
+        """
+        ``ClusterStateService.generation`` changes when changes are applied.
+        """
+        service = self.service()
+        before = service.generation()
+        service.apply_changes([self.WITH_APPS])
+        self.assertNotEqual(before, service.generation())
+
+    def test_generation_unchanged(self):
+        """
+        ``ClusterStateService.generation`` stays the same if no changes are
+        applied and nothing expires.
+        """
+        service = self.service()
+        service.apply_changes([self.WITH_APPS])
+        before = service.generation()
+        service.apply_changes([])
+        advance_rest(self.clock)
+        self.assertEqual(before, service.generation())
+
+    def test_generation_expiration(self):
+        """
+        ``ClusterStateService.generation`` changes when information expires.
+        """
+        service = self.service()
+        service.apply_changes([self.WITH_APPS])
+        advance_rest(self.clock)
+        before = service.generation()
+        advance_some(self.clock)
+        self.assertNotEqual(before, service.generation())
+
+    def test_register(self):
+        """
+        Functions passed to ``ClusterStateService.register`` are called when
+        the cluster state changes.
+        """
+        service = self.service()
+        calls = []
+        service.register(lambda: calls.append(service.as_deployment()))
+        service.apply_changes([self.WITH_APPS])
+        service.apply_changes([])
+        self.assertEqual(calls, [DeploymentState(nodes=[self.WITH_APPS])])
+
+    @capture_logging(
+        lambda test, logger:
+        test.assertEqual(len(logger.flush_tracebacks(ZeroDivisionError)), 1))
+    def test_register_failing_callback(self, logger):
+        """
+        A registered function raising an exception doesn't prevent other
+        registered functions being called.
+        """
+        service = self.service()
+        calls = []
+        service.register(lambda: 1/0)
+        service.register(lambda: calls.append(None))
+        service.apply_changes([self.WITH_APPS])
+        self.assertEqual(calls, [None])
+
+    def test_single_timer(self):
+        """
+        However many sources changes are applied from, a single timer is
+        pending to expire them.
+        """
+        service = self.service()
+        for node_state in [self.WITH_APPS, self.WITH_MANIFESTATION]:
+            source = ChangeSource()
+            source.set_last_activity(self.clock.seconds())
+            service.apply_changes_from_source(source, [node_state])
+            advance_some(self.clock)
+        self.assertEqual(len(self.clock.getDelayedCalls()), 1)
+
+    def test_overwritten_by_other_source(self):
+        """
+        Information given again by another source is not wiped when the
+        source that gave it first expires.
+        """
+        service = self.service()
+        first = ChangeSource()
+        first.set_last_activity(self.clock.seconds())
+        service.apply_changes_from_source(
+            first, [self.WITH_APPS, self.WITH_MANIFESTATION])
+        advance_some(self.clock)
+        second = ChangeSource()
+        second.set_last_activity(self.clock.seconds())
+        service.apply_changes_from_source(second, [self.WITH_APPS])
+        advance_rest(self.clock)
+        self.assertEqual(
+            service.as_deployment(), DeploymentState(nodes=[self.WITH_APPS]))
+
+    def test_not_running(self):
+        """
+        Information doesn't expire while the service isn't running, and
+        expires once it is started if it has been inactive for long enough.
+        """
+        service = ClusterStateService(self.clock)
+        service.apply_changes([self.WITH_APPS])
+        advance_rest(self.clock)
+        advance_some(self.clock)
+        before_start = service.as_deployment()
+        service.startService()
+        self.addCleanup(service.stopService)
+        self.clock.advance(0)
+        self.assertEqual(
+            [before_start, service.as_deployment()],
+            [DeploymentState(nodes=[self.WITH_APPS]), DeploymentState()])
+
+    def test_stop(self):
+        """
+        Stopping the service cancels its timer.
+        """
+        service = self.service()
+        service.apply_changes([self.WITH_APPS])
+        service.stopService()
+        self.assertEqual(self.clock.getDelayedCalls(), [])
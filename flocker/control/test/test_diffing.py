@@ -0,0 +1,120 @@
+# Copyright ClusterHQ Inc.  See LICENSE file for details.
+
+"""
+Tests for ``flocker.control._diffing``.
+"""
+
+from uuid import uuid4
+
+from hypothesis import given
+
+from .._diffing import create_diff, _Diff, _Add, _Remove
+from .._persistence import wire_encode, wire_decode
+from .. import (
+    Application, DeploymentState, DockerImage, Node, NodeState,
+)
+from ...testtools import TestCase
+from .test_persistence import DEPLOYMENTS, TEST_DEPLOYMENT
+
+
+class CreateDiffTests(TestCase):
+    """
+    Tests for ``create_diff`` and the ``_Diff`` it returns.
+    """
+    @given(DEPLOYMENTS)
+    def test_deployment_diffs(self, deployment):
+        """
+        Diffs created between deployments transform the first into the second,
+        in either direction.
+        """
+        self.assertEqual(
+            (deployment, TEST_DEPLOYMENT),
+            (create_diff(TEST_DEPLOYMENT, deployment).apply(TEST_DEPLOYMENT),
+             create_diff(deployment, TEST_DEPLOYMENT).apply(deployment)),
+        )
+
+    @given(DEPLOYMENTS)
+    def test_serialized_diffs(self, deployment):
+        """
+        A diff can be roundtripped through ``wire_encode`` and
+        ``wire_decode`` and still transforms the first deployment into the
+        second.
+        """
+        diff = create_diff(TEST_DEPLOYMENT, deployment)
+        decoded = wire_decode(wire_encode(diff))
+        self.assertEqual(deployment, decoded.apply(TEST_DEPLOYMENT))
+
+    def test_equal_objects(self):
+        """
+        The diff between equal objects has no changes.
+        """
+        self.assertEqual(
+            _Diff(changes=[]),
+            create_diff(TEST_DEPLOYMENT, TEST_DEPLOYMENT),
+        )
+
+    def test_state_diffs(self):
+        """
+        A diff created between two ``DeploymentState`` instances, including
+        changes from unknown to known node information, transforms the first
+        into the second.
+        """
+        node_uuid = uuid4()
+        state_a = DeploymentState(
+            nodes=[NodeState(uuid=node_uuid, hostname=u"192.0.2.1")],
+            node_uuid_to_era={node_uuid: uuid4()},
+        )
+        state_b = state_a.update_node(
+            NodeState(uuid=node_uuid, hostname=u"192.0.2.1",
+                      applications=[], manifestations={}, paths={},
+                      devices={})
+        ).transform(["node_uuid_to_era", node_uuid], uuid4())
+        diff = wire_decode(wire_encode(create_diff(state_a, state_b)))
+        self.assertEqual(state_b, diff.apply(state_a))
+
+    def test_set_changes_only_changed_items(self):
+        """
+        The diff between two sets only mentions the items which were added
+        or removed.
+        """
+        image = DockerImage.from_string(u"postgresql")
+        applications = [
+            Application(name=u"app-{}".format(i), image=image)
+            for i in range(10)
+        ]
+        node_a = Node(uuid=uuid4(), applications=applications)
+        new_application = Application(name=u"new", image=image)
+        node_b = node_a.transform(
+            ["applications"],
+            lambda s: s.remove(applications[0]).add(new_application),
+        )
+        self.assertEqual(
+            _Diff(changes=[
+                _Remove(path=["applications"], item=applications[0]),
+                _Add(path=["applications"], item=new_application),
+            ]),
+            create_diff(node_a, node_b),
+        )
+
+    def test_nodes_changes_only_changed_nodes(self):
+        """
+        The diff between two deployments only mentions the nodes which were
+        added, removed or changed, replacing changed nodes as a whole.
+        """
+        image = DockerImage.from_string(u"postgresql")
+        unchanged, removed, changed, added = [
+            Node(uuid=uuid4()) for _ in range(4)]
+        updated = changed.transform(
+            ["applications"],
+            lambda s: s.add(Application(name=u"new", image=image)))
+        deployment_a = TEST_DEPLOYMENT.set(
+            nodes=[unchanged, removed, changed])
+        deployment_b = deployment_a.set(nodes=[unchanged, updated, added])
+        diff = create_diff(deployment_a, deployment_b)
+        self.assertEqual(
+            ({_Remove(path=["nodes"], item=removed),
+              _Add(path=["nodes"], item=updated),
+              _Add(path=["nodes"], item=added)},
+             deployment_b),
+            (set(diff.changes), diff.apply(deployment_a)),
+        )
@@ -3,7 +3,7 @@
 Tests for ``flocker.control.httpapi``.
 """
 
-from uuid import uuid4
+from uuid import uuid4, UUID
 from copy import deepcopy
 from datetime import datetime
 from unittest import skip
@@ -14,20 +14,22 @@ from pytz import UTC
 
 from zope.interface.verify import verifyObject
 
-from twisted.internet import reactor
-from twisted.internet.defer import gatherResults
+from twisted.internet.defer import CancelledError, gatherResults
 from twisted.internet.endpoints import TCP4ServerEndpoint
 from twisted.test.proto_helpers import MemoryReactor
 from twisted.web.http import (
     CREATED, OK, CONFLICT, BAD_REQUEST, NOT_FOUND,
-    NOT_ALLOWED as METHOD_NOT_ALLOWED, PRECONDITION_FAILED,
+    NOT_ALLOWED as METHOD_NOT_ALLOWED, PRECONDITION_FAILED, NOT_MODIFIED,
+    INTERNAL_SERVER_ERROR,
 )
 from twisted.web.client import readBody
+from twisted.web.http_headers import Headers
 from twisted.application.service import IService
 from twisted.python.filepath import FilePath
 from twisted.internet.ssl import ClientContextFactory
 from twisted.internet.task import Clock
 
+from ...restapi import _infrastructure
 from ...restapi.testtools import (
     buildIntegrationTests, loads, APIAssertionsMixin)
 
@@ -37,10 +39,12 @@ from .. import (
     RestartAlways, RestartNever, Link, same_node, DeploymentState,
     NonManifestDatasets, Leases, Lease, UpdateNodeStateEra,
 )
+from .. import httpapi, _query
 from ..httpapi import (
     ConfigurationAPIUserV1, create_api_service, datasets_from_deployment,
     api_dataset_from_dataset_and_node, container_configuration_response,
-    IF_MATCHES_HEADER,
+    IF_MATCHES_HEADER, ETAG_HEADER, IF_NONE_MATCH_HEADER, LONG_POLL_LIMIT,
+    NEXT_CURSOR_HEADER, get_state_tag,
 )
 from .._persistence import ConfigurationPersistenceService
 from .._clusterstate import ClusterStateService
@@ -67,15 +71,28 @@ class APITestsMixin(APIAssertionsMixin):
         """
         Create initial objects for the ``ConfigurationAPIUserV1``.
         """
+        self.clock = Clock()
         self.persistence_service = ConfigurationPersistenceService(
-            reactor, FilePath(self.mktemp()))
+            self.clock, FilePath(self.mktemp()))
         self.persistence_service.startService()
         self.cluster_state_service = ClusterStateService(Clock())
         self.cluster_state_service.startService()
-        self.clock = Clock()
         self.addCleanup(self.cluster_state_service.stopService)
         self.addCleanup(self.persistence_service.stopService)
 
+    def get_etag(self, path):
+        """
+        Request a resource without conditions.
+
+        :param bytes path: The path of the resource.
+        :return: ``Deferred`` firing with the ``ETag`` header of the
+            response.
+        """
+        d = self.assertResponseCode(b"GET", path, None, OK)
+        d.addCallback(
+            lambda response: response.headers.getRawHeaders(ETAG_HEADER)[0])
+        return d
+
 
 class VersionTestsMixin(APITestsMixin):
     """
@@ -2395,6 +2412,237 @@ RealTestsDeleteDataset, MemoryTestsDeleteDataset = (
 )
 
 
+class BulkUpdateDatasetsTestsMixin(APITestsMixin):
+    """
+    Tests for the bulk dataset endpoint at
+    ``/configuration/datasets/_bulk``.
+    """
+    def _setup_manifestations(self):
+        """
+        Create and save a configuration with a single node that has two
+        manifestations.
+
+        :return: ``Deferred`` firing with a ``list`` of the two new
+            ``Manifestation`` instances.
+        """
+        manifestations = [_manifestation(), _manifestation()]
+        node_a = Node(
+            uuid=self.NODE_A_UUID,
+            manifestations={manifestation.dataset_id: manifestation
+                            for manifestation in manifestations}
+        )
+        d = self.persistence_service.save(Deployment(nodes={node_a}))
+        d.addCallback(lambda _: manifestations)
+        return d
+
+    def test_operations(self):
+        """
+        Datasets are created, moved, resized and deleted, and the resulting
+        dataset is returned for each operation in order.
+        """
+        new_dataset_id = unicode(uuid4())
+        d = self._setup_manifestations()
+
+        def got_manifestations((moved, resized)):
+            operations = [
+                {u"operation": u"create", u"primary": self.NODE_A,
+                 u"dataset_id": new_dataset_id,
+                 u"metadata": {u"name": u"new"}},
+                {u"operation": u"move", u"dataset_id": moved.dataset_id,
+                 u"primary": self.NODE_B},
+                {u"operation": u"resize", u"dataset_id": resized.dataset_id,
+                 u"maximum_size": 1024 * 1024 * 1024},
+                {u"operation": u"delete", u"dataset_id": new_dataset_id},
+            ]
+            return self.assertResult(
+                b"POST", b"/configuration/datasets/_bulk",
+                {u"operations": operations}, OK, [
+                    {u"dataset_id": new_dataset_id, u"primary": self.NODE_A,
+                     u"metadata": {u"name": u"new"}, u"deleted": False},
+                    {u"dataset_id": moved.dataset_id,
+                     u"primary": self.NODE_B,
+                     u"metadata": {}, u"deleted": False},
+                    {u"dataset_id": resized.dataset_id,
+                     u"primary": self.NODE_A, u"metadata": {},
+                     u"maximum_size": 1024 * 1024 * 1024,
+                     u"deleted": False},
+                    {u"dataset_id": new_dataset_id, u"primary": self.NODE_A,
+                     u"metadata": {u"name": u"new"}, u"deleted": True},
+                ])
+        d.addCallback(got_manifestations)
+
+        def got_result(result):
+            self.assertItemsEqual(
+                result[1:],
+                datasets_from_deployment(self.persistence_service.get()))
+        d.addCallback(got_result)
+        return d
+
+    def test_single_save(self):
+        """
+        All the operations are saved as a single configuration change.
+        """
+        d = self._setup_manifestations()
+
+        def got_manifestations(manifestations):
+            changes = []
+            self.persistence_service.register(lambda: changes.append(None))
+            operations = [
+                {u"operation": u"move",
+                 u"dataset_id": manifestation.dataset_id,
+                 u"primary": self.NODE_B}
+                for manifestation in manifestations
+            ] + [
+                {u"operation": u"create", u"primary": self.NODE_B},
+                {u"operation": u"create", u"primary": self.NODE_B},
+            ]
+            moving = self.assertResponseCode(
+                b"POST", b"/configuration/datasets/_bulk",
+                {u"operations": operations}, OK)
+            moving.addCallback(lambda _: self.assertEqual(
+                (len(changes),
+                 len(self.persistence_service.get().get_node(
+                     self.NODE_B_UUID).manifestations)),
+                (1, 4)))
+            return moving
+        d.addCallback(got_manifestations)
+        return d
+
+    def test_failure_applies_nothing(self):
+        """
+        If any operation fails, none of the operations are applied and the
+        error of each failed operation is returned.
+        """
+        unknown_dataset_id = unicode(uuid4())
+        d = self._setup_manifestations()
+
+        def got_manifestations(manifestations):
+            self.expected = self.persistence_service.get()
+            operations = [
+                {u"operation": u"move",
+                 u"dataset_id": manifestations[0].dataset_id,
+                 u"primary": self.NODE_B},
+                {u"operation": u"delete", u"dataset_id": unknown_dataset_id},
+                {u"operation": u"create", u"primary": self.NODE_A,
+                 u"dataset_id": manifestations[1].dataset_id},
+            ]
+            return self.assertResult(
+                b"POST", b"/configuration/datasets/_bulk",
+                {u"operations": operations}, BAD_REQUEST, {
+                    u"description": u"No dataset operations were applied.",
+                    u"errors": [
+                        None,
+                        {u"code": NOT_FOUND,
+                         u"description": u"Dataset not found."},
+                        {u"code": CONFLICT,
+                         u"description":
+                         u"The provided dataset_id is already in use."},
+                    ],
+                })
+        d.addCallback(got_manifestations)
+        d.addCallback(lambda _: self.assertEqual(
+            self.expected, self.persistence_service.get()))
+        return d
+
+    def test_duplicate_create(self):
+        """
+        If two create operations in the same request have the same
+        ``dataset_id``, the second is reported as a collision and nothing is
+        saved.
+        """
+        dataset_id = unicode(uuid4())
+        d = self._setup_manifestations()
+
+        def got_manifestations(_):
+            self.expected = self.persistence_service.get()
+            operations = [
+                {u"operation": u"create", u"primary": self.NODE_A,
+                 u"dataset_id": dataset_id},
+                {u"operation": u"create", u"primary": self.NODE_B,
+                 u"dataset_id": dataset_id},
+            ]
+            return self.assertResult(
+                b"POST", b"/configuration/datasets/_bulk",
+                {u"operations": operations}, BAD_REQUEST, {
+                    u"description": u"No dataset operations were applied.",
+                    u"errors": [
+                        None,
+                        {u"code": CONFLICT,
+                         u"description":
+                         u"The provided dataset_id is already in use."},
+                    ],
+                })
+        d.addCallback(got_manifestations)
+        d.addCallback(lambda _: self.assertEqual(
+            self.expected, self.persistence_service.get()))
+        return d
+
+    def test_earlier_operations_apply(self):
+        """
+        Each operation is applied to the configuration resulting from the
+        operations before it.
+        """
+        d = self._setup_manifestations()
+
+        def got_manifestations(manifestations):
+            dataset_id = manifestations[0].dataset_id
+            operations = [
+                {u"operation": u"delete", u"dataset_id": dataset_id},
+                {u"operation": u"resize", u"dataset_id": dataset_id,
+                 u"maximum_size": None},
+            ]
+            return self.assertResult(
+                b"POST", b"/configuration/datasets/_bulk",
+                {u"operations": operations}, BAD_REQUEST, {
+                    u"description": u"No dataset operations were applied.",
+                    u"errors": [
+                        None,
+                        {u"code": METHOD_NOT_ALLOWED,
+                         u"description": u"The dataset has been deleted."},
+                    ],
+                })
+        d.addCallback(got_manifestations)
+        return d
+
+    def test_if_matches_success(self):
+        """
+        If an ``X-If-Configuration-Matches`` header is sent with a matching
+        tag, the operations succeed.
+        """
+        d = self._setup_manifestations()
+        d.addCallback(lambda manifestations: self.assertResponseCode(
+            b"POST", b"/configuration/datasets/_bulk",
+            {u"operations": [
+                {u"operation": u"delete",
+                 u"dataset_id": manifestations[0].dataset_id}]},
+            OK,
+            additional_headers={
+                IF_MATCHES_HEADER:
+                [self.persistence_service.configuration_hash()]}))
+        return d
+
+    def test_if_matches_failure(self):
+        """
+        If an ``X-If-Configuration-Matches`` header is sent with a
+        non-matching tag, none of the operations are applied.
+        """
+        d = self.assertResponseCode(
+            b"POST", b"/configuration/datasets/_bulk",
+            {u"operations": [
+                {u"operation": u"create", u"primary": self.NODE_A}]},
+            PRECONDITION_FAILED,
+            additional_headers={IF_MATCHES_HEADER: [b"willnotmatch"]})
+        d.addCallback(lambda _: self.assertEqual(
+            Deployment(), self.persistence_service.get()))
+        return d
+
+
+RealTestsBulkUpdateDatasets, MemoryTestsBulkUpdateDatasets = (
+    buildIntegrationTests(
+        BulkUpdateDatasetsTestsMixin, "BulkUpdateDatasets", _build_app)
+)
+
+
 def get_dataset_ids(deployment):
     """
     Get an iterator of all of the ``dataset_id`` values on all nodes in the
@@ -3642,3 +3890,734 @@ class NodeByEraTestsMixin(APITestsMixin):
 
 RealNodeByEra, MemoryRealByEra = buildIntegrationTests(
     NodeByEraTestsMixin, "NodeByEra", _build_app)
+
+
+# The endpoints that support conditional requests, and whether the responses
+# of each are derived from the configuration or from the cluster state:
+CONFIGURATION_ENDPOINTS = [b"/configuration/datasets",
+                           b"/configuration/containers"]
+STATE_ENDPOINTS = [b"/state/datasets", b"/state/containers", b"/state/nodes"]
+
+
+class ConditionalGetTestsMixin(APITestsMixin):
+    """
+    Tests for ``ETag`` and ``If-None-Match`` support in ``GET`` endpoints.
+    """
+    def assert_conditional(self, paths, change, expected_code):
+        """
+        Assert the response code of conditional requests for resources made
+        with the tags of earlier responses.
+
+        :param paths: The paths of the resources to request.
+        :param change: A function to call between the requests.
+        :param int expected_code: The response code expected for the
+            conditional requests.
+        :return: ``Deferred`` firing with the conditional responses.
+        """
+        d = gatherResults([self.get_etag(path) for path in paths])
+
+        def got_etags(etags):
+            change()
+            return gatherResults([
+                self.assertResponseCode(
+                    b"GET", path, None, expected_code,
+                    additional_headers={IF_NONE_MATCH_HEADER: [etag]})
+                for path, etag in zip(paths, etags)
+            ])
+        d.addCallback(got_etags)
+        return d
+
+    def test_configuration_etag(self):
+        """
+        Responses from configuration endpoints include an ``ETag`` header with
+        the quoted configuration hash.
+        """
+        d = gatherResults([
+            self.get_etag(path) for path in CONFIGURATION_ENDPOINTS])
+        d.addCallback(
+            self.assertEqual,
+            [b'"%s"' % (self.persistence_service.configuration_hash(),)] *
+            len(CONFIGURATION_ENDPOINTS))
+        return d
+
+    def test_not_modified(self):
+        """
+        If neither the configuration nor the cluster state has changed, a
+        request with an ``If-None-Match`` header naming the tag of an earlier
+        response gets a ``NOT_MODIFIED`` response with no body and the same
+        tag.
+        """
+        paths = CONFIGURATION_ENDPOINTS + STATE_ENDPOINTS
+        d = gatherResults([self.get_etag(path) for path in paths])
+
+        def got_etags(etags):
+            d = self.assert_conditional(paths, lambda: None, NOT_MODIFIED)
+            d.addCallback(lambda responses: self.assertEqual(
+                [response.headers.getRawHeaders(ETAG_HEADER)[0]
+                 for response in responses], etags))
+            d.addCallback(lambda _: gatherResults([
+                self.assertResponseCode(
+                    b"GET", path, None, NOT_MODIFIED,
+                    additional_headers={IF_NONE_MATCH_HEADER: [etag]},
+                ).addCallback(readBody)
+                for path, etag in zip(paths, etags)
+            ]))
+            d.addCallback(self.assertEqual, [b""] * len(paths))
+            return d
+        d.addCallback(got_etags)
+        return d
+
+    def test_any_of_several(self):
+        """
+        A request gets a ``NOT_MODIFIED`` response if any of the tags in its
+        ``If-None-Match`` header match.
+        """
+        d = self.get_etag(b"/state/nodes")
+        d.addCallback(lambda etag: self.assertResponseCode(
+            b"GET", b"/state/nodes", None, NOT_MODIFIED,
+            additional_headers={
+                IF_NONE_MATCH_HEADER: [b'"other", ' + etag]}))
+        return d
+
+    def test_configuration_changed(self):
+        """
+        If the configuration has changed since the earlier response, a
+        request to a configuration endpoint gets a complete response.
+        """
+        return self.assert_conditional(
+            CONFIGURATION_ENDPOINTS,
+            lambda: self.persistence_service.save(Deployment(nodes=[
+                Node(uuid=self.NODE_A_UUID)])),
+            OK)
+
+    def test_state_changed(self):
+        """
+        If the cluster state has changed since the earlier response, a
+        request to a state endpoint gets a complete response.
+        """
+        return self.assert_conditional(
+            STATE_ENDPOINTS,
+            lambda: self.cluster_state_service.apply_changes([
+                NodeState(uuid=self.NODE_A_UUID, hostname=self.NODE_A_IP)]),
+            OK)
+
+    def test_error_has_no_etag(self):
+        """
+        Error responses don't include an ``ETag`` header.
+        """
+        d = self.assertResponseCode(
+            b"GET", b"/state/nodes/by_era/" + bytes(uuid4()), None, NOT_FOUND)
+        d.addCallback(lambda response: self.assertFalse(
+            response.headers.hasHeader(ETAG_HEADER)))
+        return d
+
+    def test_streamed_etag(self):
+        """
+        Responses large enough to be written as they are encoded include an
+        ``ETag`` header.
+        """
+        self.patch(_infrastructure, "_STREAMING_THRESHOLD", 1)
+        d = gatherResults([
+            self.get_etag(path) for path in CONFIGURATION_ENDPOINTS])
+        d.addCallback(
+            self.assertEqual,
+            [b'"%s"' % (self.persistence_service.configuration_hash(),)] *
+            len(CONFIGURATION_ENDPOINTS))
+        return d
+
+    def test_leases_not_conditional(self):
+        """
+        The leases endpoint doesn't include an ``ETag`` header, since the
+        remaining lease times it returns change as time passes.
+        """
+        d = self.assertResponseCode(
+            b"GET", b"/configuration/leases", None, OK)
+        d.addCallback(lambda response: self.assertFalse(
+            response.headers.hasHeader(ETAG_HEADER)))
+        return d
+
+
+RealConditionalGet, MemoryConditionalGet = buildIntegrationTests(
+    ConditionalGetTestsMixin, "ConditionalGet", _build_app)
+
+
+class CachedResponseTestsMixin(APITestsMixin):
+    """
+    Tests for reusing the responses of ``GET`` endpoints.
+    """
+    def get(self, path, expected_code=OK):
+        """
+        Request a resource.
+
+        :param bytes path: The path of the resource.
+        :param int expected_code: The expected response code.
+        :return: ``Deferred`` firing with a 2-tuple of the response headers
+            and body.
+        """
+        d = self.assertResponseCode(b"GET", path, None, expected_code)
+        d.addCallback(lambda response: readBody(response).addCallback(
+            lambda body: (response.headers, body)))
+        return d
+
+    def test_reused(self):
+        """
+        An unchanged response is sent again, with the same headers, without
+        building it from the configuration or cluster state.
+        """
+        paths = CONFIGURATION_ENDPOINTS + STATE_ENDPOINTS
+        d = gatherResults([self.get(path) for path in paths])
+
+        def got_responses(responses):
+            self.patch(self.persistence_service, "get", lambda: 1/0)
+            self.patch(self.cluster_state_service, "as_deployment",
+                       lambda: 1/0)
+            d = gatherResults([self.get(path) for path in paths])
+            d.addCallback(lambda again: self.assertEqual(
+                [(list(headers.getAllRawHeaders()), body)
+                 for (headers, body) in again],
+                [(list(headers.getAllRawHeaders()), body)
+                 for (headers, body) in responses]))
+            return d
+        d.addCallback(got_responses)
+        return d
+
+    def test_configuration_changed(self):
+        """
+        A response from a configuration endpoint is built again once the
+        configuration changes.
+        """
+        d = self.get(b"/configuration/containers")
+        d.addCallback(lambda _: self.persistence_service.save(Deployment(
+            nodes=[Node(uuid=self.NODE_A_UUID, applications=[Application(
+                name=u"app", image=DockerImage.from_string(u"busybox"))])])))
+        d.addCallback(lambda _: self.get(b"/configuration/containers"))
+        d.addCallback(lambda (headers, body): self.assertEqual(
+            [container[u"name"] for container in loads(body)], [u"app"]))
+        return d
+
+    def test_state_changed(self):
+        """
+        A response from a state endpoint is built again once the cluster
+        state changes.
+        """
+        d = self.get(b"/state/nodes")
+        d.addCallback(lambda _: self.cluster_state_service.apply_changes([
+            NodeState(uuid=self.NODE_A_UUID, hostname=self.NODE_A_IP)]))
+        d.addCallback(lambda _: self.get(b"/state/nodes"))
+        d.addCallback(lambda (headers, body): self.assertEqual(
+            loads(body), [{u"host": self.NODE_A_IP, u"uuid": self.NODE_A}]))
+        return d
+
+    def test_errors_not_reused(self):
+        """
+        Error responses are not sent again.
+        """
+        self.patch(self.cluster_state_service, "as_deployment", lambda: 1/0)
+        d = self.get(b"/state/nodes", INTERNAL_SERVER_ERROR)
+
+        def failed(_):
+            self.patch(self.cluster_state_service, "as_deployment",
+                       lambda: DeploymentState())
+            return self.assertResult(b"GET", b"/state/nodes", None, OK, [])
+        d.addCallback(failed)
+        return d
+
+    def test_streamed_not_reused(self):
+        """
+        Responses large enough to be written as they are encoded are built
+        again for each request.
+        """
+        self.patch(_infrastructure, "_STREAMING_THRESHOLD", 1)
+        d = self.get(b"/state/datasets")
+
+        def got_response(_):
+            self.patch(self.cluster_state_service, "as_deployment",
+                       lambda: 1/0)
+            return self.get(b"/state/datasets", INTERNAL_SERVER_ERROR)
+        d.addCallback(got_response)
+        return d
+
+    def test_route_arguments(self):
+        """
+        Responses to requests for the same endpoint with different arguments
+        are kept separately.
+        """
+        eras = [uuid4(), uuid4()]
+        self.cluster_state_service.apply_changes([
+            UpdateNodeStateEra(era=eras[0], uuid=self.NODE_A_UUID),
+            UpdateNodeStateEra(era=eras[1], uuid=self.NODE_B_UUID),
+        ])
+        d = gatherResults([
+            self.get(b"/state/nodes/by_era/" + bytes(era)) for era in eras])
+        d.addCallback(lambda responses: self.assertEqual(
+            [loads(body)[u"uuid"] for (headers, body) in responses],
+            [self.NODE_A, self.NODE_B]))
+        return d
+
+    def test_bounded(self):
+        """
+        Only the ``_MAXIMUM_CACHED_RESPONSES`` most recently used responses
+        are kept, so requests with many different query arguments are built
+        again once they have been pushed out.
+        """
+        self.patch(httpapi, "_MAXIMUM_CACHED_RESPONSES", 1)
+        d = self.get(b"/state/nodes?a=1")
+        d.addCallback(lambda _: self.get(b"/state/nodes?a=2"))
+
+        def got_responses(_):
+            self.patch(self.cluster_state_service, "as_deployment",
+                       lambda: 1/0)
+            d = self.get(b"/state/nodes?a=2")
+            d.addCallback(lambda _: self.get(
+                b"/state/nodes?a=1", INTERNAL_SERVER_ERROR))
+            return d
+        d.addCallback(got_responses)
+        return d
+
+
+RealCachedResponse, MemoryCachedResponse = buildIntegrationTests(
+    CachedResponseTestsMixin, "CachedResponse", _build_app)
+
+
+class LongPollTestsMixin(APITestsMixin):
+    """
+    Tests for conditional ``GET`` requests that wait for a change.
+    """
+    def wait(self, path, wait=b"30"):
+        """
+        Make a conditional request for a resource that waits for a change.
+
+        :param bytes path: The path of the resource.
+        :param bytes wait: The ``wait`` query argument.
+        :return: ``Deferred`` firing with the response.
+        """
+        d = self.get_etag(path)
+        d.addCallback(lambda etag: self.agent.request(
+            b"GET", path + b"?wait=" + wait,
+            Headers({IF_NONE_MATCH_HEADER: [etag]})))
+        return d
+
+    def test_changed(self):
+        """
+        A request waiting for a change gets a complete response once there
+        is one.
+        """
+        d = self.wait(b"/state/nodes")
+        self.assertNoResult(d)
+        self.cluster_state_service.apply_changes([
+            NodeState(uuid=self.NODE_A_UUID, hostname=self.NODE_A_IP)])
+        response = self.successResultOf(d)
+        self.assertEqual(
+            (response.code, loads(self.successResultOf(readBody(response)))),
+            (OK, [{u"host": self.NODE_A_IP, u"uuid": self.NODE_A}]))
+
+    def test_already_changed(self):
+        """
+        A request that would wait for a change gets a complete response
+        immediately if the tag it gives is out of date.
+        """
+        d = self.get_etag(b"/configuration/datasets")
+
+        def got_etag(etag):
+            self.persistence_service.save(Deployment(nodes=[
+                Node(uuid=self.NODE_A_UUID)]))
+            return self.assertResponseCode(
+                b"GET", b"/configuration/datasets?wait=30", None, OK,
+                additional_headers={IF_NONE_MATCH_HEADER: [etag]})
+        d.addCallback(got_etag)
+        return d
+
+    def test_timeout(self):
+        """
+        A request waiting for a change gets a ``NOT_MODIFIED`` response if
+        there is none within the given number of seconds.
+        """
+        d = self.wait(b"/state/nodes", b"2.5")
+        self.clock.advance(2)
+        self.assertNoResult(d)
+        self.clock.advance(0.5)
+        self.assertEqual(self.successResultOf(d).code, NOT_MODIFIED)
+
+    def test_limit(self):
+        """
+        A request can't wait for a change for longer than
+        ``LONG_POLL_LIMIT`` seconds.
+        """
+        d = self.wait(b"/state/nodes", b"1000")
+        self.clock.advance(LONG_POLL_LIMIT)
+        self.assertEqual(self.successResultOf(d).code, NOT_MODIFIED)
+
+    def test_unrelated_change(self):
+        """
+        A request waiting for a change to the cluster state keeps waiting if
+        only the configuration changes.
+        """
+        d = self.wait(b"/state/nodes")
+        self.clock.advance(10)
+        self.persistence_service.save(Deployment(nodes=[
+            Node(uuid=self.NODE_A_UUID)]))
+        self.assertNoResult(d)
+        self.clock.advance(20)
+        self.assertEqual(self.successResultOf(d).code, NOT_MODIFIED)
+
+    def test_invalid_wait(self):
+        """
+        A ``wait`` query argument that isn't a number results in a
+        ``BAD_REQUEST`` response.
+        """
+        return self.assertResult(
+            b"GET", b"/state/nodes?wait=soon", None, BAD_REQUEST,
+            {u"description": u"Invalid wait: soon"})
+
+
+# Waiting requests depend on the API's fake clock being advanced after they
+# have been received, so only run these tests in memory:
+MemoryLongPoll = buildIntegrationTests(
+    LongPollTestsMixin, "LongPoll", _build_app)[1]
+
+
+class QueryTestsMixin(APITestsMixin):
+    """
+    Tests for filtering and paginating the responses of list endpoints with
+    query arguments.
+    """
+    DATASET_IDS = [u"00000000-0000-4000-8000-%012d" % (i,)
+                   for i in range(3)]
+
+    def get(self, path, expected_code=OK):
+        """
+        Request a list.
+
+        :param bytes path: The path of the list, including query arguments.
+        :param int expected_code: The expected response code.
+        :return: ``Deferred`` firing with a 2-item ``list`` of the value of
+            the ``X-Next-Cursor`` header, or ``None``, and the decoded body.
+        """
+        d = self.assertResponseCode(b"GET", path, None, expected_code)
+        d.addCallback(lambda response: readBody(response).addCallback(
+            lambda body: [
+                response.headers.getRawHeaders(
+                    NEXT_CURSOR_HEADER, [None])[0],
+                loads(body)]))
+        return d
+
+    def save_datasets(self):
+        """
+        Configure a dataset on each of two nodes and one more, named
+        ``demo``, on the first.
+
+        :return: ``Deferred`` that fires when done.
+        """
+        return self.persistence_service.save(Deployment(nodes=[
+            Node(uuid=self.NODE_A_UUID, manifestations={
+                self.DATASET_IDS[0]: Manifestation(
+                    dataset=Dataset(dataset_id=self.DATASET_IDS[0]),
+                    primary=True),
+                self.DATASET_IDS[2]: Manifestation(
+                    dataset=Dataset(dataset_id=self.DATASET_IDS[2],
+                                    metadata={u"name": u"demo"}),
+                    primary=True),
+            }),
+            Node(uuid=self.NODE_B_UUID, manifestations={
+                self.DATASET_IDS[1]: Manifestation(
+                    dataset=Dataset(dataset_id=self.DATASET_IDS[1]),
+                    primary=True),
+            }),
+        ]))
+
+    def dataset_ids(self, (cursor, body)):
+        """
+        :return: 2-tuple of ``cursor`` and the dataset IDs in ``body``.
+        """
+        return cursor, [dataset[u"dataset_id"] for dataset in body]
+
+    def test_configuration_datasets_dataset_id(self):
+        """
+        ``dataset_id`` only lists the configured dataset with that ID.
+        """
+        d = self.save_datasets()
+        d.addCallback(lambda _: self.get(
+            b"/configuration/datasets?dataset_id=" +
+            bytes(self.DATASET_IDS[1])))
+        d.addCallback(lambda (cursor, body): self.assertEqual(
+            (cursor, body),
+            (None, [{u"dataset_id": self.DATASET_IDS[1],
+                     u"primary": self.NODE_B, u"metadata": {},
+                     u"deleted": False}])))
+        return d
+
+    def test_configuration_datasets_primary(self):
+        """
+        ``primary`` only lists the configured datasets on that node.
+        """
+        d = self.save_datasets()
+        d.addCallback(lambda _: self.get(
+            b"/configuration/datasets?primary=" + bytes(self.NODE_A)))
+        d.addCallback(self.dataset_ids)
+        d.addCallback(self.assertEqual,
+                      (None, [self.DATASET_IDS[0], self.DATASET_IDS[2]]))
+        return d
+
+    def test_configuration_datasets_metadata(self):
+        """
+        ``metadata.<key>`` only lists the configured datasets with that
+        metadata value.
+        """
+        d = self.save_datasets()
+        d.addCallback(lambda _: self.get(
+            b"/configuration/datasets?metadata.name=demo"))
+        d.addCallback(self.dataset_ids)
+        d.addCallback(self.assertEqual, (None, [self.DATASET_IDS[2]]))
+        return d
+
+    def test_combined(self):
+        """
+        Datasets are only listed if they match all of the filters.
+        """
+        d = self.save_datasets()
+        d.addCallback(lambda _: self.get(
+            b"/configuration/datasets?metadata.name=demo&primary=" +
+            bytes(self.NODE_B)))
+        d.addCallback(self.assertEqual, [None, []])
+        return d
+
+    def test_pages(self):
+        """
+        ``limit`` lists at most that many datasets, in order, along with a
+        cursor which lists the ones after them when given as ``cursor``.
+        """
+        d = self.save_datasets()
+        d.addCallback(lambda _: self.get(
+            b"/configuration/datasets?limit=2"))
+        d.addCallback(self.dataset_ids)
+
+        def got_first_page((cursor, dataset_ids)):
+            self.assertEqual(
+                (cursor, dataset_ids),
+                (self.DATASET_IDS[1], self.DATASET_IDS[:2]))
+            return self.get(
+                b"/configuration/datasets?limit=2&cursor=" + cursor)
+        d.addCallback(got_first_page)
+        d.addCallback(self.dataset_ids)
+        d.addCallback(self.assertEqual, (None, self.DATASET_IDS[2:]))
+        return d
+
+    def test_invalid_limit(self):
+        """
+        A ``limit`` which is not a positive integer results in a
+        ``BAD_REQUEST`` response.
+        """
+        return gatherResults([
+            self.assertResult(
+                b"GET", b"/configuration/datasets?limit=" + limit, None,
+                BAD_REQUEST,
+                {u"description": u"The limit must be a positive integer."})
+            for limit in [b"0", b"many"]
+        ])
+
+    def test_state_datasets(self):
+        """
+        ``dataset_id`` only lists the dataset in the cluster state with that
+        ID, and ``primary`` those manifest on that node.
+        """
+        self.cluster_state_service.apply_changes([
+            NodeState(
+                hostname=self.NODE_A_IP, uuid=self.NODE_A_UUID,
+                manifestations={
+                    self.DATASET_IDS[0]: Manifestation(
+                        dataset=Dataset(dataset_id=self.DATASET_IDS[0]),
+                        primary=True)},
+                paths={self.DATASET_IDS[0]: FilePath(b"/path/dataset")},
+                devices={},
+            ),
+            NonManifestDatasets(datasets={
+                self.DATASET_IDS[1]: Dataset(
+                    dataset_id=self.DATASET_IDS[1])}),
+        ])
+        d = gatherResults([
+            self.get(b"/state/datasets?dataset_id=" +
+                     bytes(self.DATASET_IDS[1])),
+            self.get(b"/state/datasets?primary=" + bytes(self.NODE_A)),
+        ])
+        d.addCallback(self.assertEqual, [
+            [None, [{u"dataset_id": self.DATASET_IDS[1]}]],
+            [None, [{u"dataset_id": self.DATASET_IDS[0],
+                     u"primary": self.NODE_A,
+                     u"path": u"/path/dataset"}]],
+        ])
+        return d
+
+    def test_state_dataset_id_without_index(self):
+        """
+        The datasets in the cluster state with a ``dataset_id`` are found
+        without building an index of the whole cluster state.
+        """
+        self.patch(_query, "state_datasets", lambda deployment_state: 1/0)
+        self.cluster_state_service.apply_changes([
+            NodeState(
+                hostname=self.NODE_A_IP, uuid=self.NODE_A_UUID,
+                manifestations={
+                    self.DATASET_IDS[0]: Manifestation(
+                        dataset=Dataset(dataset_id=self.DATASET_IDS[0]),
+                        primary=True)},
+                paths={self.DATASET_IDS[0]: FilePath(b"/path/dataset")},
+                devices={},
+            ),
+        ])
+        d = self.get(
+            b"/state/datasets?dataset_id=" + bytes(self.DATASET_IDS[0]))
+        d.addCallback(self.assertEqual, [
+            None, [{u"dataset_id": self.DATASET_IDS[0],
+                    u"primary": self.NODE_A,
+                    u"path": u"/path/dataset"}]])
+        return d
+
+    def test_state_containers(self):
+        """
+        ``node_uuid`` only lists the containers in the cluster state on that
+        node, and they can be listed a page at a time.
+        """
+        self.cluster_state_service.apply_changes([
+            NodeState(
+                hostname=ip, uuid=uuid, applications=[
+                    Application(
+                        name=name,
+                        image=DockerImage.from_string(u"busybox"))
+                    for name in [u"app1", u"app2"]])
+            for (ip, uuid) in [(self.NODE_A_IP, self.NODE_A_UUID),
+                               (self.NODE_B_IP, self.NODE_B_UUID)]
+        ])
+        d = self.get(
+            b"/state/containers?limit=1&node_uuid=" + bytes(self.NODE_B))
+
+        def got_first_page((cursor, body)):
+            self.assertEqual(
+                (cursor, [(container[u"node_uuid"], container[u"name"])
+                          for container in body]),
+                (self.NODE_B + u"/app1", [(self.NODE_B, u"app1")]))
+            return self.get(
+                b"/state/containers?limit=1&node_uuid=%s&cursor=%s" % (
+                    bytes(self.NODE_B), cursor))
+        d.addCallback(got_first_page)
+        d.addCallback(lambda (cursor, body): self.assertEqual(
+            (cursor, [(container[u"node_uuid"], container[u"name"])
+                      for container in body]),
+            (None, [(self.NODE_B, u"app2")])))
+        return d
+
+    def test_leases(self):
+        """
+        ``dataset_id`` only lists the lease on that dataset, and
+        ``node_uuid`` those held by that node.
+        """
+        now = datetime.fromtimestamp(self.clock.seconds(), tz=UTC)
+        leases = Leases().acquire(
+            now, UUID(self.DATASET_IDS[0]), self.NODE_A_UUID, None)
+        leases = leases.acquire(
+            now, UUID(self.DATASET_IDS[1]), self.NODE_B_UUID, None)
+        d = self.persistence_service.save(Deployment(leases=leases))
+        d.addCallback(lambda _: gatherResults([
+            self.get(b"/configuration/leases?dataset_id=" +
+                     bytes(self.DATASET_IDS[1])),
+            self.get(
+                b"/configuration/leases?node_uuid=" + bytes(self.NODE_A)),
+        ]))
+        d.addCallback(self.assertEqual, [
+            [None, [{u"dataset_id": self.DATASET_IDS[1],
+                     u"node_uuid": self.NODE_B, u"expires": None}]],
+            [None, [{u"dataset_id": self.DATASET_IDS[0],
+                     u"node_uuid": self.NODE_A, u"expires": None}]],
+        ])
+        return d
+
+    def test_not_cached_together(self):
+        """
+        The response to a filtered request is not reused for a request with
+        different filters, or none.
+        """
+        d = self.save_datasets()
+        d.addCallback(lambda _: self.get(
+            b"/configuration/datasets?dataset_id=" +
+            bytes(self.DATASET_IDS[0])))
+        d.addCallback(lambda _: gatherResults([
+            self.get(b"/configuration/datasets?dataset_id=" +
+                     bytes(self.DATASET_IDS[1])),
+            self.get(b"/configuration/datasets"),
+        ]))
+        d.addCallback(lambda responses: self.assertEqual(
+            [sorted(self.dataset_ids(response)[1])
+             for response in responses],
+            [[self.DATASET_IDS[1]], self.DATASET_IDS]))
+        return d
+
+
+RealQuery, MemoryQuery = buildIntegrationTests(
+    QueryTestsMixin, "Query", _build_app)
+
+
+class WaitForChangeTests(TestCase):
+    """
+    Tests for ``ConfigurationAPIUserV1._wait_for_change``.
+    """
+    def setUp(self):
+        super(WaitForChangeTests, self).setUp()
+        self.clock = Clock()
+        self.cluster_state_service = ClusterStateService(Clock())
+        self.api = ConfigurationAPIUserV1(
+            ConfigurationPersistenceService(
+                self.clock, FilePath(self.mktemp())),
+            self.cluster_state_service, self.clock)
+
+    def test_change(self):
+        """
+        The result fires with ``None`` when the cluster state changes, and
+        the timeout is cancelled.
+        """
+        d = self.api._wait_for_change(10)
+        self.cluster_state_service.apply_changes([
+            NodeState(uuid=uuid4(), hostname=u"192.0.2.3")])
+        self.assertEqual(
+            (self.successResultOf(d), self.clock.getDelayedCalls()),
+            (None, []))
+
+    def test_timeout(self):
+        """
+        The result fires with ``None`` once the timeout passes, and is no
+        longer woken by changes.
+        """
+        d = self.api._wait_for_change(10)
+        self.clock.advance(10)
+        self.assertEqual(
+            (self.successResultOf(d), self.api._waiting), (None, set()))
+
+    def test_cancel(self):
+        """
+        Cancelling the result stops it waiting for either a change or the
+        timeout.
+        """
+        d = self.api._wait_for_change(10)
+        d.cancel()
+        self.failureResultOf(d, CancelledError)
+        self.assertEqual(
+            (self.api._waiting, self.clock.getDelayedCalls()), (set(), []))
+
+
+class GetStateTagTests(TestCase):
+    """
+    Tests for ``get_state_tag``.
+    """
+    def test_restarted(self):
+        """
+        The tags of API instances in different processes differ even if the
+        generation of their cluster state is the same, since the generation
+        starts again from zero in each process.
+        """
+        persistence_service = ConfigurationPersistenceService(
+            Clock(), FilePath(self.mktemp()))
+        cluster_state_service = ClusterStateService(Clock())
+        tags = [
+            get_state_tag(ConfigurationAPIUserV1(
+                persistence_service, cluster_state_service))
+            for _ in range(2)
+        ]
+        self.assertNotEqual(tags[0], tags[1])
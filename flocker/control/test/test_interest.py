@@ -0,0 +1,106 @@
+# Copyright ClusterHQ Inc.  See LICENSE file for details.
+
+"""
+Tests for ``flocker.control._interest``.
+"""
+
+from uuid import uuid4
+
+from .._interest import ClusterInterest, project
+from .. import (
+    Application, Dataset, Deployment, DeploymentState, DockerImage, Lease,
+    Leases, Node, NodeState, NonManifestDatasets, Port,
+)
+from ...testtools import TestCase
+
+
+IMAGE = DockerImage.from_string(u"postgresql")
+LOCAL_UUID = uuid4()
+EXPOSING_UUID = uuid4()
+OTHER_UUID = uuid4()
+DATASET_ID = unicode(uuid4())
+
+LOCAL_NODE = Node(uuid=LOCAL_UUID, applications=[
+    Application(name=u"local", image=IMAGE),
+])
+EXPOSING_NODE = Node(uuid=EXPOSING_UUID, applications=[
+    Application(name=u"exposing", image=IMAGE,
+                ports=[Port(internal_port=80, external_port=8080)]),
+])
+OTHER_NODE = Node(uuid=OTHER_UUID, applications=[
+    Application(name=u"other", image=IMAGE),
+])
+LEASED_DATASET_ID = uuid4()
+CONFIGURATION = Deployment(
+    nodes=[LOCAL_NODE, EXPOSING_NODE, OTHER_NODE],
+    leases=Leases({LEASED_DATASET_ID: Lease(
+        dataset_id=LEASED_DATASET_ID, node_id=OTHER_UUID, expiration=None,
+    )}),
+)
+
+LOCAL_STATE = NodeState(uuid=LOCAL_UUID, hostname=u"192.0.2.1")
+EXPOSING_STATE = NodeState(uuid=EXPOSING_UUID, hostname=u"192.0.2.2")
+OTHER_STATE = NodeState(uuid=OTHER_UUID, hostname=u"192.0.2.3")
+LOCAL_ERA = uuid4()
+STATE = DeploymentState(
+    nodes=[LOCAL_STATE, EXPOSING_STATE, OTHER_STATE],
+    node_uuid_to_era={
+        LOCAL_UUID: LOCAL_ERA, EXPOSING_UUID: uuid4(), OTHER_UUID: uuid4(),
+    },
+    nonmanifest_datasets=NonManifestDatasets(datasets={
+        DATASET_ID: Dataset(dataset_id=DATASET_ID),
+    }).datasets,
+)
+
+
+class ProjectTests(TestCase):
+    """
+    Tests for ``project``.
+    """
+    def test_all(self):
+        """
+        ``ClusterInterest.ALL`` returns the configuration and state
+        unchanged.
+        """
+        configuration, state = project(
+            ClusterInterest.ALL, LOCAL_UUID, CONFIGURATION, STATE)
+        self.assertEqual(
+            (configuration is CONFIGURATION, state is STATE), (True, True))
+
+    def test_local(self):
+        """
+        ``ClusterInterest.LOCAL`` returns only the configuration, state and
+        era of the given node, along with the cluster-wide leases and
+        non-manifest datasets.
+        """
+        self.assertEqual(
+            project(ClusterInterest.LOCAL, LOCAL_UUID, CONFIGURATION, STATE),
+            (CONFIGURATION.set(nodes=[LOCAL_NODE]),
+             STATE.set(nodes=[LOCAL_STATE],
+                       node_uuid_to_era={LOCAL_UUID: LOCAL_ERA})),
+        )
+
+    def test_applications(self):
+        """
+        ``ClusterInterest.APPLICATIONS`` also returns the configuration and
+        state of nodes configured with applications that expose ports, but
+        not their eras.
+        """
+        self.assertEqual(
+            project(ClusterInterest.APPLICATIONS, LOCAL_UUID, CONFIGURATION,
+                    STATE),
+            (CONFIGURATION.set(nodes=[LOCAL_NODE, EXPOSING_NODE]),
+             STATE.set(nodes=[LOCAL_STATE, EXPOSING_STATE],
+                       node_uuid_to_era={LOCAL_UUID: LOCAL_ERA})),
+        )
+
+    def test_unknown_node(self):
+        """
+        If the given node is neither configured nor has known state, no
+        nodes are returned for it.
+        """
+        self.assertEqual(
+            project(ClusterInterest.LOCAL, uuid4(), CONFIGURATION, STATE),
+            (CONFIGURATION.set(nodes=[]),
+             STATE.set(nodes=[], node_uuid_to_era={})),
+        )
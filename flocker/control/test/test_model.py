@@ -437,10 +437,10 @@ class NonManifestDatasetsTests(TestCase):
 
 class DeploymentInitTests(make_with_init_tests(
         record_type=Deployment,
-        kwargs=dict(nodes=pset([
+        kwargs=dict(nodes=Deployment(nodes=[
             Node(hostname=u'node1.example.com', applications=frozenset()),
             Node(hostname=u'node2.example.com', applications=frozenset())
-        ]))
+        ]).nodes)
 )):
     """
     Tests for ``Deployment.__init__``.
@@ -1187,6 +1187,173 @@ class PMapFieldTests(TestCase):
         assert Record(value={1: 2}).value == {1: 2}
 
 
+class NodeMapTests(TestCase):
+    """
+    Tests for the ``nodes`` field of ``Deployment`` and ``DeploymentState``.
+    """
+    def test_iterates_nodes(self):
+        """
+        Iterating over ``nodes`` yields the nodes, however they were given.
+        """
+        nodes = {Node(uuid=uuid4()), Node(uuid=uuid4())}
+        self.assertEqual(
+            (nodes, nodes),
+            (set(Deployment(nodes=nodes).nodes),
+             set(Deployment(nodes=frozenset(nodes)).nodes)))
+
+    def test_lookup_by_uuid(self):
+        """
+        ``nodes`` maps node UUIDs to nodes.
+        """
+        node = NodeState(uuid=uuid4(), hostname=u"192.0.2.1")
+        nodes = DeploymentState(nodes=[node]).nodes
+        self.assertEqual((node, None), (nodes[node.uuid], nodes.get(uuid4())))
+
+    def test_contains(self):
+        """
+        ``in`` checks whether a node is in ``nodes``, not just whether a node
+        with the same UUID is.
+        """
+        node = Node(uuid=uuid4())
+        nodes = Deployment(nodes=[node]).nodes
+        self.assertEqual(
+            (True, False),
+            (node in nodes, node.set(applications={APP1}) in nodes))
+
+    def test_add_replaces(self):
+        """
+        ``add`` replaces any node with the same UUID.
+        """
+        node = Node(uuid=uuid4())
+        updated = node.set(applications={APP1})
+        nodes = Deployment(nodes=[node]).nodes.add(updated)
+        self.assertEqual([updated], list(nodes))
+
+    def test_discard(self):
+        """
+        ``discard`` removes a node, and does nothing if the node is not
+        present.
+        """
+        node = Node(uuid=uuid4())
+        nodes = Deployment(nodes=[node]).nodes
+        self.assertEqual(
+            ([], nodes),
+            (list(nodes.discard(node)),
+             nodes.discard(node.set(applications={APP1}))))
+
+    def test_remove(self):
+        """
+        ``remove`` removes a node.
+        """
+        node = Node(uuid=uuid4())
+        self.assertEqual(
+            [], list(Deployment(nodes=[node]).nodes.remove(node)))
+
+    def test_remove_missing(self):
+        """
+        ``remove`` raises ``KeyError`` if the node is not present, even if a
+        different node with the same UUID is.
+        """
+        node = Node(uuid=uuid4())
+        nodes = Deployment(nodes=[node]).nodes
+        self.assertRaises(
+            KeyError, nodes.remove, node.set(applications={APP1}))
+
+    def test_remove_uuid(self):
+        """
+        ``remove_uuid`` removes the node with a UUID.
+        """
+        node = Node(uuid=uuid4())
+        self.assertEqual(
+            [], list(Deployment(nodes=[node]).nodes.remove_uuid(node.uuid)))
+
+    def test_equal_nodes(self):
+        """
+        Equal nodes are only included once, like in a set.
+        """
+        node = Node(uuid=uuid4())
+        self.assertEqual(
+            [node], list(Deployment(nodes=[node, Node(uuid=node.uuid)]).nodes))
+
+    def test_duplicate_uuid(self):
+        """
+        Different nodes with the same UUID can't both be included.
+        """
+        node = Node(uuid=uuid4())
+        self.assertRaises(
+            InvariantException, Deployment,
+            nodes=[node, node.set(applications={APP1})])
+
+    def test_manifestations_of(self):
+        """
+        ``manifestations_of`` maps the UUIDs of the nodes with manifestations
+        of a dataset to those manifestations, after nodes are added, updated
+        and removed.
+        """
+        dataset_id = unicode(uuid4())
+        manifestation = Manifestation(
+            dataset=Dataset(dataset_id=dataset_id), primary=True)
+        replica = manifestation.set(primary=False)
+        node_a = Node(uuid=uuid4(),
+                      manifestations={dataset_id: manifestation})
+        node_b = Node(uuid=uuid4())
+        nodes = Deployment(nodes=[node_a, node_b]).nodes
+        # Build the index before making further changes:
+        before = nodes.manifestations_of(dataset_id)
+        added = nodes.add(
+            node_b.transform(["manifestations", dataset_id], replica))
+        moved = added.discard(node_a)
+        updated = DeploymentState(nodes=[NodeState(
+            uuid=node_b.uuid, hostname=u"192.0.2.1",
+            manifestations={dataset_id: replica}, devices={}, paths={},
+            applications=[])]).update_node(NodeState(
+                uuid=node_b.uuid, hostname=u"192.0.2.1",
+                manifestations={}, devices={}, paths={})).nodes
+        self.assertEqual(
+            ({node_a.uuid: manifestation},
+             {node_a.uuid: manifestation, node_b.uuid: replica},
+             {node_b.uuid: replica}, {}, {}),
+            (before, added.manifestations_of(dataset_id),
+             moved.manifestations_of(dataset_id),
+             updated.manifestations_of(dataset_id),
+             nodes.manifestations_of(unicode(uuid4()))))
+
+    def test_all_manifestations(self):
+        """
+        ``all_manifestations`` returns every manifestation with the node it
+        is on.
+        """
+        manifestations = [
+            Manifestation(dataset=Dataset(dataset_id=unicode(uuid4())),
+                          primary=True)
+            for _ in range(3)
+        ]
+        node_a = Node(uuid=uuid4(), manifestations={
+            m.dataset_id: m for m in manifestations[:2]})
+        node_b = Node(uuid=uuid4(), manifestations={
+            manifestations[2].dataset_id: manifestations[2]})
+        self.assertItemsEqual(
+            [(manifestations[0], node_a), (manifestations[1], node_a),
+             (manifestations[2], node_b)],
+            Deployment(nodes=[node_a, node_b]).nodes.all_manifestations())
+
+    def test_uuid_mismatch(self):
+        """
+        A node can't be mapped by a different UUID to its own.
+        """
+        self.assertRaises(
+            InvariantException,
+            Deployment().nodes.set, uuid4(), Node(uuid=uuid4()))
+
+    def test_wrong_type(self):
+        """
+        ``Deployment.nodes`` only accepts ``Node`` instances.
+        """
+        self.assertRaises(
+            TypeError, Deployment,
+            nodes=[NodeState(uuid=uuid4(), hostname=u"192.0.2.1")])
+
+
 class DeploymentStateTests(TestCase):
     """
     Tests for ``DeploymentState``.
@@ -1693,6 +1860,50 @@ class LeaseTests(TestCase):
             exception.message, expected_error
         )
 
+    def test_expire_unchanged(self):
+        """
+        ``Leases.expire`` returns the same ``Leases`` if no lease has expired.
+        """
+        leases = self.leases.acquire(
+            self.now, self.dataset_id, self.node_id, self.lease_duration)
+        leases = leases.acquire(self.now, uuid4(), self.node_id)
+        self.assertIs(leases, leases.expire(
+            self.now + datetime.timedelta(seconds=self.lease_duration)))
+
+    def test_next_expiration(self):
+        """
+        ``Leases.next_expiration`` returns the earliest expiration of the
+        leases that expire, and ``Leases.expired`` returns the leases that
+        have expired in order of expiration, after leases are acquired,
+        renewed, released and expired.
+        """
+        later = uuid4()
+        never = uuid4()
+        leases = self.leases.acquire(
+            self.now, self.dataset_id, self.node_id, self.lease_duration)
+        # Build the index before making further changes:
+        before = leases.next_expiration()
+        leases = leases.acquire(
+            self.now, later, self.node_id, self.lease_duration * 2)
+        leases = leases.acquire(self.now, never, self.node_id)
+        renewed = leases.acquire(
+            self.now, self.dataset_id, self.node_id, self.lease_duration * 3)
+        released = renewed.release(later, self.node_id)
+        end = self.now + datetime.timedelta(seconds=self.lease_duration * 4)
+        expired = leases.expire(
+            self.now + datetime.timedelta(seconds=self.lease_duration + 1))
+        self.assertEqual(
+            (before, renewed.next_expiration(), released.next_expiration(),
+             expired.next_expiration(), [lease.dataset_id for lease in
+                                         renewed.expired(end)],
+             released.expire(end).next_expiration()),
+            (self.now + datetime.timedelta(seconds=self.lease_duration),
+             self.now + datetime.timedelta(seconds=self.lease_duration * 2),
+             self.now + datetime.timedelta(seconds=self.lease_duration * 3),
+             self.now + datetime.timedelta(seconds=self.lease_duration * 2),
+             [later, self.dataset_id],
+             None))
+
     def test_invariant_success(self):
         """
         A lease's ID (key in the ``Leases`` map) must match its dataset ID.
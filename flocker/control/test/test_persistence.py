@@ -3,10 +3,13 @@
 """
 Tests for ``flocker.control._persistence``.
 """
+import gc
 import json
+import os
 import string
 
 from datetime import datetime, timedelta
+from hashlib import sha256
 from uuid import uuid4, UUID
 
 from pytz import UTC
@@ -19,18 +22,22 @@ from hypothesis import strategies as st
 from hypothesis.extra.datetime import datetimes
 
 from twisted.internet import reactor
+from twisted.internet.defer import gatherResults
 from twisted.internet.task import Clock
 from twisted.python.filepath import FilePath
 
-from pyrsistent import PClass, pset
+from pyrsistent import PClass, InvariantException, pset
 
 from ...testtools import AsyncTestCase, TestCase
+from .. import _persistence
+from .._diffing import create_diff
 from .._persistence import (
     ConfigurationPersistenceService, wire_decode, wire_encode,
     _LOG_SAVE, _LOG_STARTUP, migrate_configuration,
     _CONFIG_VERSION, ConfigurationMigration, ConfigurationMigrationError,
     _LOG_UPGRADE, MissingMigrationError, update_leases, _LOG_EXPIRE,
-    _LOG_UNCHANGED_DEPLOYMENT_NOT_SAVED, to_unserialized_json,
+    _LOG_UNCHANGED_DEPLOYMENT_NOT_SAVED,
+    _IdentityCache, _encoding_cache, PayloadSummarizer, caching_wire_encode,
     )
 from .._model import (
     Deployment, Application, DockerImage, Node, Dataset, Manifestation,
@@ -165,6 +172,44 @@ class LeasesTests(AsyncTestCase):
         d.addCallback(saved)
         return d
 
+    def test_expiry_scheduled(self):
+        """
+        ``LeaseService`` only checks for expired leases when the next lease is
+        due to expire, and only saves the configuration if a lease has
+        expired.
+        """
+        leases = Leases().acquire(
+            datetime.fromtimestamp(self.clock.seconds(), UTC),
+            uuid4(), uuid4(), 100)
+        d = self.persistence_service.save(Deployment(leases=leases))
+
+        def saved(_):
+            saves = []
+            self.patch(self.persistence_service, "save", saves.append)
+            # Let the journal be synced:
+            self.clock.advance(0)
+            calls = [call.getTime() for call in self.clock.getDelayedCalls()]
+            self.clock.advance(50)
+            self.assertEqual(([100.001], []), (calls, saves))
+        d.addCallback(saved)
+        return d
+
+    def test_no_expiring_leases(self):
+        """
+        ``LeaseService`` does not schedule any calls if no lease expires.
+        """
+        d = self.persistence_service.save(Deployment(
+            leases=Leases().acquire(
+                datetime.fromtimestamp(self.clock.seconds(), UTC),
+                uuid4(), uuid4())))
+
+        def saved(_):
+            # Let the journal be synced:
+            self.clock.advance(0)
+            self.assertEqual([], self.clock.getDelayedCalls())
+        d.addCallback(saved)
+        return d
+
     @capture_logging(None)
     def test_expire_lease_logging(self, logger):
         """
@@ -485,6 +530,258 @@ class ConfigurationPersistenceServiceTests(AsyncTestCase):
         return d
 
 
+class ConfigurationJournalTests(TestCase):
+    """
+    Tests for the journal of changes kept by
+    ``ConfigurationPersistenceService``.
+    """
+    def setUp(self):
+        super(ConfigurationJournalTests, self).setUp()
+        self.clock = Clock()
+        self.path = FilePath(self.mktemp())
+        self.config_path = self.path.child(b"current_configuration.json")
+        self.journal_path = self.path.child(b"current_configuration.journal")
+
+    def service(self):
+        """
+        Start a service, schedule its stop.
+
+        :return: Started ``ConfigurationPersistenceService``.
+        """
+        service = ConfigurationPersistenceService(self.clock, self.path)
+        service.startService()
+        self.addCleanup(service.stopService)
+        return service
+
+    def test_save_appends(self):
+        """
+        Saving a configuration appends an entry to the journal rather than
+        rewriting the configuration file.
+        """
+        service = self.service()
+        original = self.config_path.getContent()
+        service.save(TEST_DEPLOYMENT)
+        self.assertEqual(
+            (original, 2),
+            (self.config_path.getContent(),
+             len(self.journal_path.getContent().splitlines())),
+        )
+
+    def test_replay(self):
+        """
+        Changes in the journal are applied to the configuration file when a
+        service starts, e.g. after a crash.
+        """
+        service = self.service()
+        service.save(TEST_DEPLOYMENT)
+        service.save(TEST_DEPLOYMENT.set(leases=Leases()))
+        self.assertEqual(service.get(), self.service().get())
+
+    def test_compacted_on_startup(self):
+        """
+        When a service starts the configuration file is rewritten with the
+        journalled changes and the journal is emptied.
+        """
+        self.service().save(TEST_DEPLOYMENT)
+        self.service()
+        self.assertEqual(
+            (TEST_DEPLOYMENT, 1),
+            (wire_decode(self.config_path.getContent()).deployment,
+             len(self.journal_path.getContent().splitlines())),
+        )
+
+    def test_compacted_on_stop(self):
+        """
+        When a service stops the configuration file is rewritten with the
+        journalled changes and the journal is emptied.
+        """
+        service = ConfigurationPersistenceService(self.clock, self.path)
+        service.startService()
+        service.save(TEST_DEPLOYMENT)
+        service.stopService()
+        self.assertEqual(
+            (TEST_DEPLOYMENT, 1),
+            (wire_decode(self.config_path.getContent()).deployment,
+             len(self.journal_path.getContent().splitlines())),
+        )
+
+    def test_compacted_when_full(self):
+        """
+        Once the journal has ``_MAX_JOURNAL_ENTRIES`` entries the
+        configuration file is rewritten and the journal is emptied.
+        """
+        self.patch(_persistence, "_MAX_JOURNAL_ENTRIES", 2)
+        service = self.service()
+        service.save(TEST_DEPLOYMENT)
+        after_one = self.config_path.getContent()
+        new_deployment = TEST_DEPLOYMENT.set(nodes=[])
+        service.save(new_deployment)
+        self.assertEqual(
+            (Deployment(), new_deployment, 1),
+            (wire_decode(after_one).deployment,
+             wire_decode(self.config_path.getContent()).deployment,
+             len(self.journal_path.getContent().splitlines())),
+        )
+
+    def test_stale_journal_ignored(self):
+        """
+        A journal written for a different configuration file is ignored.
+        """
+        self.service().save(TEST_DEPLOYMENT)
+        other_deployment = TEST_DEPLOYMENT.set(nodes=[])
+        self.config_path.setContent(wire_encode(Configuration(
+            version=_CONFIG_VERSION, deployment=other_deployment)))
+        self.assertEqual(other_deployment, self.service().get())
+
+    def test_incomplete_entry_ignored(self):
+        """
+        An incompletely written final journal entry is ignored.
+        """
+        service = self.service()
+        service.save(TEST_DEPLOYMENT)
+        with self.journal_path.open("a") as journal:
+            journal.write(wire_encode(create_diff(
+                TEST_DEPLOYMENT, Deployment()))[:-1])
+        self.assertEqual(TEST_DEPLOYMENT, self.service().get())
+
+    def test_old_version_journal(self):
+        """
+        A journal with entries written for an older configuration version
+        can't be replayed, so a ``ConfigurationMigrationError`` is raised.
+        """
+        self.service().save(TEST_DEPLOYMENT)
+        lines = self.journal_path.getContent().splitlines(True)
+        header = json.loads(lines[0])
+        header[u"version"] = _CONFIG_VERSION - 1
+        self.journal_path.setContent(
+            json.dumps(header) + b"\n" + b"".join(lines[1:]))
+        service = ConfigurationPersistenceService(self.clock, self.path)
+        self.assertRaises(ConfigurationMigrationError, service.startService)
+
+    def test_fsync_batched(self):
+        """
+        The journal is ``fsync``\ ed once after any number of saves in the
+        same reactor iteration.
+        """
+        service = self.service()
+        synced = []
+        self.patch(os, "fsync", synced.append)
+        service.save(TEST_DEPLOYMENT)
+        service.save(TEST_DEPLOYMENT.set(leases=Leases()))
+        before = len(synced)
+        self.clock.advance(0)
+        self.assertEqual((0, 1), (before, len(synced)))
+
+
+class ThreadedPersistenceTests(AsyncTestCase):
+    """
+    Tests for ``ConfigurationPersistenceService`` in threaded mode.
+    """
+    def setUp(self):
+        super(ThreadedPersistenceTests, self).setUp()
+        self.path = FilePath(self.mktemp())
+        self.journal_path = self.path.child(b"current_configuration.journal")
+
+    def service(self):
+        """
+        Start a threaded service, schedule its stop.
+
+        :return: Started ``ConfigurationPersistenceService``.
+        """
+        service = ConfigurationPersistenceService(
+            reactor, self.path, threaded=True)
+        service.startService()
+        self.addCleanup(service.stopService)
+        return service
+
+    def test_immediate(self):
+        """
+        A saved configuration is available immediately but the ``Deferred``
+        returned by ``save`` only fires after the configuration has been
+        written.
+        """
+        service = self.service()
+        d = service.save(TEST_DEPLOYMENT)
+        self.assertEqual(
+            (TEST_DEPLOYMENT, False), (service.get(), d.called))
+
+        def saved(_):
+            new_service = ConfigurationPersistenceService(reactor, self.path)
+            new_service.load_configuration()
+            new_service._close_journal()
+            self.assertEqual(TEST_DEPLOYMENT, new_service.get())
+        d.addCallback(saved)
+        return d
+
+    def test_coalesced(self):
+        """
+        Saves made in the same reactor iteration are written as a single
+        journal entry.
+        """
+        service = self.service()
+        d = gatherResults([
+            service.save(TEST_DEPLOYMENT),
+            service.save(TEST_DEPLOYMENT.set(leases=Leases())),
+        ])
+        d.addCallback(lambda _: self.assertEqual(
+            2, len(self.journal_path.getContent().splitlines())))
+        return d
+
+    def test_unchanged_waits(self):
+        """
+        Saving an unchanged configuration while the same configuration is
+        still being written returns a ``Deferred`` that fires once it has
+        been written.
+        """
+        service = self.service()
+        first = service.save(TEST_DEPLOYMENT)
+        second = service.save(TEST_DEPLOYMENT)
+        self.assertFalse(second.called)
+        return gatherResults([first, second])
+
+    def test_stop_writes(self):
+        """
+        Stopping the service writes any pending configuration changes.
+        """
+        service = ConfigurationPersistenceService(
+            reactor, self.path, threaded=True)
+        service.startService()
+        service.save(TEST_DEPLOYMENT)
+        d = service.stopService()
+
+        def stopped(_):
+            config_path = self.path.child(b"current_configuration.json")
+            self.assertEqual(
+                TEST_DEPLOYMENT,
+                wire_decode(config_path.getContent()).deployment)
+        d.addCallback(stopped)
+        return d
+
+    def test_failed_write(self):
+        """
+        If a write fails the ``Deferred`` returned by ``save`` fails, and
+        the next write rewrites the whole configuration.
+        """
+        service = self.service()
+
+        def fail(diff, deployment):
+            raise ZeroDivisionError()
+        self.patch(service, "_append_to_journal", fail)
+        d = service.save(TEST_DEPLOYMENT)
+        d = self.assertFailure(d, ZeroDivisionError)
+
+        def failed(_):
+            del service._append_to_journal
+            return service.save(TEST_DEPLOYMENT.set(leases=Leases()))
+        d.addCallback(failed)
+
+        def saved(_):
+            self.assertEqual(
+                1, len(self.journal_path.getContent().splitlines()))
+        d.addCallback(saved)
+        return d
+
+
 class StubMigration(object):
     """
     A simple stub migration class, used to test ``migrate_configuration``.
@@ -669,7 +966,7 @@ SUPPORTED_VERSIONS = st.integers(1, _CONFIG_VERSION)
 
 class WireEncodeDecodeTests(TestCase):
     """
-    Tests for ``to_unserialized_json``, ``wire_encode`` and ``wire_decode``.
+    Tests for ``wire_encode`` and ``wire_decode``.
     """
     def test_encode_to_bytes(self):
         """
@@ -688,13 +985,44 @@ class WireEncodeDecodeTests(TestCase):
         self.assertEqual(decoded_deployment, deployment)
 
     @given(DEPLOYMENTS)
-    def test_to_unserialized_json(self, deployment):
+    def test_trusted_roundtrip(self, deployment):
+        """
+        A range of generated configurations (deployments) can be
+        roundtripped via the wire encode/decode with trusted decoding.
+        """
+        self.assertEqual(
+            deployment, wire_decode(wire_encode(deployment), trusted=True))
+
+    def test_trusted_record(self):
+        """
+        ``PRecord`` instances can be roundtripped via the wire encode/decode
+        with trusted decoding.
         """
-        ``to_unserialized_json`` is same output as ``wire_encode`` except
-        without doing JSON byte encoding.
+        application = Application(
+            name=u"myapp", image=DockerImage.from_string(u"postgresql"))
+        node_state = NodeState(hostname=u'127.0.0.1', uuid=uuid4(),
+                               applications=[application], manifestations={},
+                               paths={},
+                               devices={uuid4(): FilePath(b"/tmp")})
+        self.assertEqual(
+            node_state, wire_decode(wire_encode(node_state), trusted=True))
+
+    def test_trusted_skips_invariants(self):
+        """
+        Trusted decoding does not check invariants, while normal decoding
+        does.
         """
-        unserialized = to_unserialized_json(deployment)
-        self.assertEquals(wire_decode(json.dumps(unserialized)), deployment)
+        encoded = json.loads(wire_encode(Node(
+            uuid=NODE_UUID, manifestations={DATASET.dataset_id: MANIFESTATION},
+        )))
+        [[_, manifestation]] = encoded[u"manifestations"][u"values"]
+        encoded[u"manifestations"][u"values"] = [[u"wrong", manifestation]]
+        data = json.dumps(encoded)
+        self.assertEqual(
+            [u"wrong"],
+            list(wire_decode(data, trusted=True).manifestations),
+        )
+        self.assertRaises(InvariantException, wire_decode, data)
 
     def test_no_arbitrary_decoding(self):
         """
@@ -742,6 +1070,130 @@ class WireEncodeDecodeTests(TestCase):
         """
         self.assertRaises(ValueError, wire_encode, datetime.now())
 
+    def test_unchanged_nodes_reused(self):
+        """
+        ``wire_encode`` re-uses the encoding of nodes which are unchanged
+        from a previously encoded object, and encodes changed nodes afresh.
+        """
+        changed_node = Node(uuid=uuid4())
+        unchanged_node = Node(uuid=uuid4())
+        wire_encode(Deployment(nodes=[changed_node, unchanged_node]))
+        cached = _encoding_cache.get(unchanged_node)
+        new_node = changed_node.set(manifestations={
+            MANIFESTATION.dataset_id: MANIFESTATION})
+        new_deployment = Deployment(nodes=[new_node, unchanged_node])
+        encoded = wire_encode(new_deployment)
+        self.assertEqual(
+            (True, new_deployment, wire_encode(new_node)),
+            (cached is _encoding_cache.get(unchanged_node),
+             wire_decode(encoded), _encoding_cache.get(new_node)),
+        )
+
+
+class IdentityCacheTests(TestCase):
+    """
+    Tests for ``_IdentityCache``.
+    """
+    def test_get_missing(self):
+        """
+        ``_IdentityCache.get`` returns ``None`` for an object that has no
+        cached value.
+        """
+        self.assertIs(None, _IdentityCache().get(Node(uuid=uuid4())))
+
+    def test_identity(self):
+        """
+        Values are cached by object identity, not equality.
+        """
+        cache = _IdentityCache()
+        uuid = uuid4()
+        node = Node(uuid=uuid)
+        cache.put(node, b"value")
+        self.assertEqual(
+            (b"value", None),
+            (cache.get(node), cache.get(Node(uuid=uuid))),
+        )
+
+    def test_forgotten_when_collected(self):
+        """
+        Cached values are removed once the object they were cached for is
+        garbage collected.
+        """
+        cache = _IdentityCache()
+        cache.put(Node(uuid=uuid4()), b"value")
+        gc.collect()
+        self.assertEqual(0, len(cache))
+
+
+class PayloadSummarizerTests(TestCase):
+    """
+    Tests for ``PayloadSummarizer``.
+    """
+    def test_first(self):
+        """
+        The first value is logged as the hash and size of its encoding along
+        with the encoding itself.
+        """
+        data = caching_wire_encode(TEST_DEPLOYMENT)
+        self.assertEqual(
+            {u"hash": sha256(data).hexdigest(), u"size": len(data),
+             u"payload": data},
+            PayloadSummarizer()(TEST_DEPLOYMENT),
+        )
+
+    def test_unchanged(self):
+        """
+        A value with the same encoding as the value logged last is logged
+        without its encoding.
+        """
+        summarize = PayloadSummarizer()
+        first = summarize(TEST_DEPLOYMENT)
+        second = summarize(wire_decode(wire_encode(TEST_DEPLOYMENT)))
+        self.assertEqual(
+            {u"hash": first[u"hash"], u"size": first[u"size"]}, second)
+
+    def test_changed(self):
+        """
+        A value with a different encoding from the value logged last is
+        logged along with its encoding.
+        """
+        summarize = PayloadSummarizer()
+        summarize(TEST_DEPLOYMENT)
+        changed = TEST_DEPLOYMENT.update_node(Node(uuid=uuid4()))
+        self.assertEqual(
+            wire_encode(changed), summarize(changed)[u"payload"])
+
+    def test_full_logging(self):
+        """
+        If full logging is enabled, unchanged values are logged along with
+        their encoding.
+        """
+        self.patch(_persistence, "_log_full_payloads", True)
+        summarize = PayloadSummarizer()
+        summarize(TEST_DEPLOYMENT)
+        self.assertEqual(
+            caching_wire_encode(TEST_DEPLOYMENT),
+            summarize(TEST_DEPLOYMENT)[u"payload"])
+
+    def test_encode(self):
+        """
+        Values are encoded with the given callable.
+        """
+        self.assertEqual(
+            {u"hash": sha256(b"123").hexdigest(), u"size": 3,
+             u"payload": b"123"},
+            PayloadSummarizer(lambda value: bytes(value))(123),
+        )
+
+    def test_list(self):
+        """
+        Lists of serializable objects, which can't be cached, are encoded
+        with ``wire_encode``.
+        """
+        nodes = [Node(uuid=NODE_UUID)]
+        self.assertEqual(
+            wire_encode(nodes), PayloadSummarizer()(nodes)[u"payload"])
+
 
 class ConfigurationMigrationTests(TestCase):
     """
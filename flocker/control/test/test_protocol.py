@@ -14,7 +14,8 @@ from characteristic import attributes, Attribute
 
 from eliot import ActionType, start_action, MemoryLogger, Logger
 from eliot.testing import (
-    capture_logging, validate_logging, assertHasAction,
+    capture_logging, validate_logging, assertHasAction, assertHasMessage,
+    LoggedMessage,
 )
 
 from twisted.internet.error import ConnectionDone
@@ -37,18 +38,21 @@ from ...testtools.amp import (
 )
 
 from .._protocol import (
-    PING_INTERVAL, Big, SerializableArgument,
+    PING_INTERVAL, BROADCAST_DELAY, LOG_BROADCAST, Big, SerializableArgument,
     VersionCommand, ClusterStatusCommand, NodeStateCommand, IConvergenceAgent,
     NoOp, AgentAMP, ControlAMP, _AgentLocator,
     ControlServiceLocator, LOG_SEND_CLUSTER_STATE, LOG_SEND_TO_AGENT,
     AGENT_CONNECTED, caching_wire_encode, SetNodeEraCommand,
-    timeout_for_protocol,
+    timeout_for_protocol, ClusterStatusDiffCommand, GenerationMismatch,
+    AGENT_UPDATE_DIFF_REJECTED, _GenerationTracker,
 )
 from .. import (
     Deployment, Application, DockerImage, Node, NodeState, Manifestation,
-    Dataset, DeploymentState, NonManifestDatasets,
+    Dataset, DeploymentState, NonManifestDatasets, ChangeSource,
+    ClusterInterest,
 )
 from .._persistence import wire_encode
+from .._diffing import create_diff
 from .clusterstatetools import advance_some, advance_rest
 
 
@@ -307,6 +311,17 @@ class SerializationTests(TestCase):
             [type(as_bytes), deserialized],
         )
 
+    def test_trusted(self):
+        """
+        ``SerializableArgument`` created with ``trusted=True`` can round-trip
+        a ``Deployment`` instance.
+        """
+        argument = SerializableArgument(Deployment, trusted=True)
+        self.assertEqual(
+            TEST_DEPLOYMENT,
+            argument.fromString(argument.toString(TEST_DEPLOYMENT)),
+        )
+
     def test_multiple_type_serialization(self):
         """
         ``SerializableArgument`` can be given multiple types to allow instances
@@ -458,11 +473,15 @@ class ControlAMPTests(ControlTestCase):
 
         self.protocol.makeConnection(StringTransportWithAbort())
         cluster_state = self.control_amp_service.cluster_state.as_deployment()
+        generation = self.control_amp_service._generations.track(
+            TEST_DEPLOYMENT, cluster_state,
+        )
         self.assertEqual(
             sent[0],
             (((ClusterStatusCommand,),
               dict(configuration=TEST_DEPLOYMENT,
-                   state=cluster_state))))
+                   state=cluster_state,
+                   generation=generation))))
 
     def test_connection_lost(self):
         """
@@ -849,6 +868,334 @@ class ControlAMPServiceTests(ControlTestCase):
              third_agent_desired],
         )
 
+    def test_acknowledged_update_followed_by_diff(self):
+        """
+        Once an agent has acknowledged an update, the next update is sent as a
+        ``ClusterStatusDiffCommand`` which results in the agent having the new
+        configuration.
+        """
+        agent = FakeAgent()
+        client = AgentAMP(Clock(), agent)
+        service = build_control_amp_service(self)
+        service.startService()
+        # Make the state large enough that sending diffs is worthwhile:
+        service.cluster_state.apply_changes([huge_node(SIMPLE_NODE_STATE)])
+        server = _RecordingAMPClient(LoopbackAMPClient(client.locator))
+        service.connected(server)
+
+        modified_configuration = arbitrary_transformation(
+            service.configuration_service.get()
+        )
+        service.configuration_service.save(modified_configuration)
+
+        self.assertEqual(
+            ([ClusterStatusCommand, ClusterStatusDiffCommand],
+             modified_configuration),
+            (server.commands, agent.desired),
+        )
+
+    def test_new_connection_gets_full_update(self):
+        """
+        A new connection from an agent is sent a full ``ClusterStatusCommand``
+        even if an earlier connection had acknowledged an update.
+        """
+        service = build_control_amp_service(self)
+        service.startService()
+        first_server = LoopbackAMPClient(
+            AgentAMP(Clock(), FakeAgent()).locator
+        )
+        service.connected(first_server)
+        service.disconnected(first_server)
+
+        agent = FakeAgent()
+        server = _RecordingAMPClient(
+            LoopbackAMPClient(AgentAMP(Clock(), agent).locator)
+        )
+        service.connected(server)
+
+        self.assertEqual(
+            ([ClusterStatusCommand], service.configuration_service.get()),
+            (server.commands, agent.desired),
+        )
+
+    @capture_logging(assertHasMessage, AGENT_UPDATE_DIFF_REJECTED)
+    def test_rejected_diff_followed_by_full_update(self, logger):
+        """
+        If an agent rejects a ``ClusterStatusDiffCommand`` with
+        ``GenerationMismatch`` a full ``ClusterStatusCommand`` is sent
+        instead.
+        """
+        agent = FakeAgent()
+        client = AgentAMP(Clock(), agent)
+        service = build_control_amp_service(self)
+        service.startService()
+        # Make the state large enough that sending diffs is worthwhile:
+        service.cluster_state.apply_changes([huge_node(SIMPLE_NODE_STATE)])
+        server = _RecordingAMPClient(LoopbackAMPClient(client.locator))
+        service.connected(server)
+        # Make the agent forget what it was sent:
+        client.locator._generation = None
+
+        modified_configuration = arbitrary_transformation(
+            service.configuration_service.get()
+        )
+        service.configuration_service.save(modified_configuration)
+
+        self.assertEqual(
+            ([ClusterStatusCommand, ClusterStatusDiffCommand,
+              ClusterStatusCommand],
+             modified_configuration),
+            (server.commands, agent.desired),
+        )
+
+    def _scoped_service(self, interest):
+        """
+        Create a started ``ControlAMPService`` with a connected agent running
+        on the node of ``SIMPLE_NODE_STATE``.
+
+        :param interest: The ``ClusterInterest`` of the agent.
+
+        :return: A 3-tuple of the service, a ``_RecordingAMPClient`` for the
+            connection to the agent and the ``FakeAgent``.
+        """
+        agent = FakeAgent()
+        service = build_control_amp_service(self)
+        service.startService()
+        server = _RecordingAMPClient(
+            LoopbackAMPClient(AgentAMP(Clock(), agent).locator)
+        )
+        service.connected(server)
+        service.set_interest(server, SIMPLE_NODE_STATE.uuid, interest)
+        return service, server, agent
+
+    def test_interest_restricts_update(self):
+        """
+        An agent which is only interested in its own node is only sent the
+        state of that node.
+        """
+        service, server, agent = self._scoped_service(ClusterInterest.LOCAL)
+        service.node_changed(ChangeSource(), [SIMPLE_NODE_STATE, NODE_STATE])
+        self.assertEqual(
+            ([ClusterStatusCommand, ClusterStatusCommand],
+             DeploymentState(nodes=[SIMPLE_NODE_STATE])),
+            (server.commands, agent.actual),
+        )
+
+    def test_uninteresting_change_not_sent(self):
+        """
+        An agent which is only interested in its own node is not sent an
+        update when only another node changes.
+        """
+        service, server, agent = self._scoped_service(ClusterInterest.LOCAL)
+        service.node_changed(ChangeSource(), [SIMPLE_NODE_STATE, NODE_STATE])
+        sent = len(server.commands)
+        service.node_changed(
+            ChangeSource(), [NODE_STATE.set(applications=[APP1])])
+        self.assertEqual(sent, len(server.commands))
+
+    def test_interesting_change_sent(self):
+        """
+        An agent which is only interested in its own node is sent an update
+        when its node changes.
+        """
+        service, server, agent = self._scoped_service(ClusterInterest.LOCAL)
+        service.node_changed(ChangeSource(), [SIMPLE_NODE_STATE, NODE_STATE])
+        changed = SIMPLE_NODE_STATE.set(applications=[APP1])
+        service.node_changed(ChangeSource(), [changed])
+        self.assertEqual(DeploymentState(nodes=[changed]), agent.actual)
+
+    def test_interest_all(self):
+        """
+        An agent which is interested in the whole cluster is sent the state
+        of every node.
+        """
+        service, server, agent = self._scoped_service(ClusterInterest.LOCAL)
+        service.set_interest(
+            server, SIMPLE_NODE_STATE.uuid, ClusterInterest.ALL)
+        service.node_changed(ChangeSource(), [SIMPLE_NODE_STATE, NODE_STATE])
+        self.assertEqual(
+            service.cluster_state.as_deployment(), agent.actual)
+
+    def test_set_node_era_interest(self):
+        """
+        A ``SetNodeEraCommand`` with an interest makes the service only send
+        the agent on that connection the parts of the cluster it is
+        interested in.
+        """
+        service = build_control_amp_service(self)
+        protocol = ControlAMP(Clock(), service)
+        client = LoopbackAMPClient(protocol.locator)
+        node_uuid = uuid4()
+        self.successResultOf(client.callRemote(
+            SetNodeEraCommand, era=unicode(uuid4()),
+            node_uuid=unicode(node_uuid), interest=u"LOCAL",
+        ))
+        scope = service._scopes[protocol]
+        self.assertEqual(
+            (ClusterInterest.LOCAL, node_uuid),
+            (scope.interest, scope.node_uuid),
+        )
+
+    def _coalescing_service(self):
+        """
+        Create a started ``ControlAMPService`` which waits for
+        ``BROADCAST_DELAY`` before sending changes, with a connected agent.
+
+        :return: A 4-tuple of the ``Clock`` used by the service, the service,
+            a ``_RecordingAMPClient`` for the connection to the agent and the
+            ``FakeAgent``.
+        """
+        reactor = Clock()
+        agent = FakeAgent()
+        service = build_control_amp_service(
+            self, reactor, broadcast_delay=BROADCAST_DELAY,
+        )
+        service.startService()
+        self.addCleanup(service.stopService)
+        server = _RecordingAMPClient(
+            LoopbackAMPClient(AgentAMP(Clock(), agent).locator)
+        )
+        service.connected(server)
+        return reactor, service, server, agent
+
+    def test_changes_delayed(self):
+        """
+        If the service has a broadcast delay, changes are not sent to agents
+        until the delay has passed.
+        """
+        reactor, service, server, agent = self._coalescing_service()
+        service.node_changed(ChangeSource(), [SIMPLE_NODE_STATE])
+        reactor.advance(BROADCAST_DELAY.total_seconds() / 2)
+        sent_early = (list(server.commands), agent.actual)
+        reactor.advance(BROADCAST_DELAY.total_seconds() / 2)
+        self.assertEqual(
+            (sent_early, agent.actual),
+            (([ClusterStatusCommand], DeploymentState()),
+             service.cluster_state.as_deployment()),
+        )
+
+    @capture_logging(None)
+    def test_changes_coalesced(self, logger):
+        """
+        Changes to configuration and state made within the broadcast delay
+        are sent to agents as a single update, which is logged with the
+        number of changes it includes.
+        """
+        reactor, service, server, agent = self._coalescing_service()
+        service.node_changed(ChangeSource(), [SIMPLE_NODE_STATE])
+        service.configuration_service.save(TEST_DEPLOYMENT)
+        reactor.advance(0)
+        service.node_changed(ChangeSource(), [NODE_STATE])
+        reactor.advance(BROADCAST_DELAY.total_seconds())
+        [message] = LoggedMessage.of_type(logger.messages, LOG_BROADCAST)
+        self.assertEqual(
+            (len(server.commands), agent.desired, agent.actual,
+             service.broadcasts, service.coalesced_changes,
+             message.message["coalesced"], message.message["connections"],
+             message.message["latency"]),
+            (2, TEST_DEPLOYMENT, service.cluster_state.as_deployment(),
+             1, 3, 3, 1, BROADCAST_DELAY.total_seconds()),
+        )
+
+    def test_stop_service_cancels_broadcast(self):
+        """
+        Stopping the service cancels any pending update to agents.
+        """
+        reactor, service, server, agent = self._coalescing_service()
+        service.node_changed(ChangeSource(), [SIMPLE_NODE_STATE])
+        service.stopService()
+        reactor.advance(BROADCAST_DELAY.total_seconds())
+        self.assertEqual(
+            ([ClusterStatusCommand], 0), (server.commands, service.broadcasts)
+        )
+
+
+class GenerationTrackerTests(TestCase):
+    """
+    Tests for ``_GenerationTracker``.
+    """
+    def test_same_objects_same_generation(self):
+        """
+        Tracking the same configuration and state objects again returns the
+        same generation.
+        """
+        tracker = _GenerationTracker(10)
+        state = DeploymentState()
+        first = tracker.track(TEST_DEPLOYMENT, state)
+        self.assertEqual(
+            [first, first],
+            [tracker.track(TEST_DEPLOYMENT, state),
+             tracker.track(TEST_DEPLOYMENT, state)],
+        )
+
+    def test_new_objects_new_generation(self):
+        """
+        Tracking a different configuration or state object assigns a new
+        generation.
+        """
+        tracker = _GenerationTracker(10)
+        state = DeploymentState()
+        first = tracker.track(TEST_DEPLOYMENT, state)
+        self.assertEqual(
+            [first + 1, first + 2],
+            [tracker.track(Deployment(), state),
+             tracker.track(Deployment(), state)],
+        )
+
+    def test_diffs(self):
+        """
+        ``get_diffs`` returns diffs which transform the configuration and
+        state of the start generation into those of the end generation.
+        """
+        tracker = _GenerationTracker(10)
+        state = huge_state()
+        start = tracker.track(TEST_DEPLOYMENT, state)
+        configuration = arbitrary_transformation(TEST_DEPLOYMENT)
+        new_state = state.update_node(NODE_STATE)
+        end = tracker.track(configuration, new_state)
+        configuration_diff, state_diff = tracker.get_diffs(start, end)
+        self.assertEqual(
+            (configuration, new_state),
+            (configuration_diff.apply(TEST_DEPLOYMENT),
+             state_diff.apply(state)),
+        )
+
+    def test_forgotten_generation(self):
+        """
+        ``get_diffs`` returns ``None`` if the start generation is no longer
+        remembered.
+        """
+        tracker = _GenerationTracker(1)
+        start = tracker.track(TEST_DEPLOYMENT, DeploymentState())
+        end = tracker.track(Deployment(), DeploymentState())
+        self.assertIs(None, tracker.get_diffs(start, end))
+
+    def test_large_diff(self):
+        """
+        ``get_diffs`` returns ``None`` if the diffs are not much smaller than
+        the full configuration and state.
+        """
+        tracker = _GenerationTracker(10)
+        start = tracker.track(Deployment(), DeploymentState())
+        end = tracker.track(huge_deployment(), DeploymentState())
+        self.assertIs(None, tracker.get_diffs(start, end))
+
+
+class _RecordingAMPClient(object):
+    """
+    Wrap an AMP client, recording the commands sent with it.
+
+    :ivar list commands: The ``Command`` subclasses sent, in order.
+    """
+    def __init__(self, client):
+        self._client = client
+        self.transport = client.transport
+        self.commands = []
+
+    def callRemote(self, command, **kwargs):
+        self.commands.append(command)
+        return self._client.callRemote(command, **kwargs)
+
 
 @implementer(IConvergenceAgent)
 @attributes([Attribute("is_connected", default_value=False),
@@ -991,6 +1338,76 @@ class AgentClientTests(TestCase):
                                                desired=TEST_DEPLOYMENT,
                                                actual=actual))
 
+    def test_cluster_updated_diff(self):
+        """
+        ``ClusterStatusDiffCommand`` sent to the ``AgentClient`` results in
+        the diffs being applied to the previously received configuration and
+        state, and the agent being told about the result.
+        """
+        actual = DeploymentState(nodes=[])
+        self.successResultOf(self.server.callRemote(
+            ClusterStatusCommand,
+            configuration=TEST_DEPLOYMENT,
+            state=actual,
+            generation=1,
+            eliot_context=TEST_ACTION
+        ))
+        new_configuration = arbitrary_transformation(TEST_DEPLOYMENT)
+        new_state = actual.update_node(NODE_STATE)
+        d = self.server.callRemote(
+            ClusterStatusDiffCommand,
+            configuration_diff=create_diff(TEST_DEPLOYMENT, new_configuration),
+            state_diff=create_diff(actual, new_state),
+            start_generation=1,
+            end_generation=2,
+            eliot_context=TEST_ACTION
+        )
+        self.successResultOf(d)
+        self.assertEqual(
+            (new_configuration, new_state),
+            (self.agent.desired, self.agent.actual),
+        )
+
+    def test_cluster_updated_diff_wrong_generation(self):
+        """
+        ``ClusterStatusDiffCommand`` fails with ``GenerationMismatch`` if it
+        does not start from the generation the agent last received, and the
+        agent is not told about any update.
+        """
+        self.successResultOf(self.server.callRemote(
+            ClusterStatusCommand,
+            configuration=TEST_DEPLOYMENT,
+            state=DeploymentState(),
+            generation=1,
+            eliot_context=TEST_ACTION
+        ))
+        d = self.server.callRemote(
+            ClusterStatusDiffCommand,
+            configuration_diff=create_diff(TEST_DEPLOYMENT, Deployment()),
+            state_diff=create_diff(DeploymentState(), DeploymentState()),
+            start_generation=2,
+            end_generation=3,
+            eliot_context=TEST_ACTION
+        )
+        self.failureResultOf(d, GenerationMismatch)
+        self.assertEqual(TEST_DEPLOYMENT, self.agent.desired)
+
+    def test_cluster_updated_diff_no_generation(self):
+        """
+        ``ClusterStatusDiffCommand`` fails with ``GenerationMismatch`` if no
+        full update has been received yet.
+        """
+        d = self.server.callRemote(
+            ClusterStatusDiffCommand,
+            configuration_diff=create_diff(Deployment(), TEST_DEPLOYMENT),
+            state_diff=create_diff(DeploymentState(), DeploymentState()),
+            start_generation=1,
+            end_generation=2,
+            eliot_context=TEST_ACTION
+        )
+        self.failureResultOf(d, GenerationMismatch)
+        self.assertEqual(None, self.agent.desired)
+
 
 def iconvergence_agent_tests_factory(fixture):
     """
@@ -1081,10 +1498,24 @@ class ClusterStatusCommandTests(TestCase):
         ClusterStatusCommand requires the following arguments.
         """
         self.assertItemsEqual(
-            ['configuration', 'state', 'eliot_context'],
+            ['configuration', 'state', 'generation', 'eliot_context'],
             (v[0] for v in ClusterStatusCommand.arguments))
 
 
+class ClusterStatusDiffCommandTests(TestCase):
+    """
+    Tests for ``ClusterStatusDiffCommand``.
+    """
+    def test_command_arguments(self):
+        """
+        ClusterStatusDiffCommand requires the following arguments.
+        """
+        self.assertItemsEqual(
+            ['configuration_diff', 'state_diff', 'start_generation',
+             'end_generation', 'eliot_context'],
+            (v[0] for v in ClusterStatusDiffCommand.arguments))
+
+
 class AgentLocatorTests(TestCase):
     """
     Tests for ``_AgentLocator``.
@@ -0,0 +1,199 @@
+# Copyright ClusterHQ Inc.  See LICENSE file for details.
+
+"""
+Tests for ``flocker.control._query``.
+"""
+
+from uuid import uuid4
+
+from .._query import (
+    Index, configuration_datasets, state_datasets, state_datasets_with_id,
+)
+from .. import (
+    Dataset, Deployment, DeploymentState, Manifestation, Node, NodeState,
+    NonManifestDatasets,
+)
+from ...testtools import TestCase
+
+
+ENTRIES = [
+    (u"c", [(u"colour", u"red"), (u"size", u"big")], 3),
+    (u"a", [(u"colour", u"red"), (u"size", u"small")], 1),
+    (u"b", [(u"colour", u"blue"), (u"size", u"big")], 2),
+    (u"d", [(u"colour", u"red"), (u"size", u"big")], 4),
+]
+
+
+class IndexTests(TestCase):
+    """
+    Tests for ``Index``.
+    """
+    def test_all(self):
+        """
+        With no terms, all the items are selected in the order of their keys.
+        """
+        self.assertEqual(Index(ENTRIES).select([]), ([1, 2, 3, 4], None))
+
+    def test_terms(self):
+        """
+        Only the items described by all of the terms are selected.
+        """
+        self.assertEqual(
+            Index(ENTRIES).select([(u"colour", u"red"), (u"size", u"big")]),
+            ([3, 4], None))
+
+    def test_unknown_term(self):
+        """
+        No items are selected by a term which describes none of them.
+        """
+        self.assertEqual(
+            Index(ENTRIES).select([(u"colour", u"green")]), ([], None))
+
+    def test_limit(self):
+        """
+        At most ``limit`` items are selected, along with the key of the last
+        of them if there are more.
+        """
+        self.assertEqual(
+            Index(ENTRIES).select([(u"colour", u"red")], limit=2),
+            ([1, 3], u"c"))
+
+    def test_limit_exact(self):
+        """
+        If there are no more items after the ``limit`` selected ones, no
+        cursor is returned.
+        """
+        self.assertEqual(
+            Index(ENTRIES).select([(u"colour", u"red")], limit=3),
+            ([1, 3, 4], None))
+
+    def test_cursor(self):
+        """
+        Only the items with keys after ``cursor`` are selected, whether or
+        not ``cursor`` is itself the key of a selected item.
+        """
+        index = Index(ENTRIES)
+        self.assertEqual(
+            [index.select([(u"colour", u"red")], cursor=cursor)
+             for cursor in [u"a", u"b"]],
+            [([3, 4], None), ([3, 4], None)])
+
+
+class ConfigurationDatasetsTests(TestCase):
+    """
+    Tests for ``configuration_datasets``.
+    """
+    def test_reused(self):
+        """
+        The index of a configuration is only built once.
+        """
+        deployment = Deployment(nodes=[Node(uuid=uuid4())])
+        self.assertIs(configuration_datasets(deployment),
+                      configuration_datasets(deployment))
+
+    def test_terms(self):
+        """
+        The primary manifestations of datasets are selected by their dataset
+        ID, primary node and metadata, while other manifestations are not
+        included.
+        """
+        dataset = Dataset(dataset_id=unicode(uuid4()),
+                          metadata={u"name": u"demo"})
+        primary = Node(uuid=uuid4(), manifestations={
+            dataset.dataset_id: Manifestation(dataset=dataset, primary=True)})
+        replica = Node(uuid=uuid4(), manifestations={
+            dataset.dataset_id: Manifestation(dataset=dataset,
+                                              primary=False)})
+        index = configuration_datasets(
+            Deployment(nodes=[primary, replica]))
+        expected = ([(dataset, primary.uuid)], None)
+        self.assertEqual(
+            [index.select([term]) for term in [
+                (u"dataset_id", dataset.dataset_id),
+                (u"primary", unicode(primary.uuid)),
+                (u"metadata.name", u"demo"),
+            ]] + [index.select([(u"primary", unicode(replica.uuid))])],
+            [expected] * 3 + [([], None)])
+
+
+class StateDatasetsTests(TestCase):
+    """
+    Tests for ``state_datasets``.
+    """
+    def setUp(self):
+        super(StateDatasetsTests, self).setUp()
+        # A dataset reported as manifest on two nodes, as it may be while it
+        # is being moved:
+        self.dataset = Dataset(dataset_id=unicode(uuid4()))
+        self.nodes = [
+            NodeState(uuid=uuid4(), hostname=hostname, manifestations={
+                self.dataset.dataset_id: Manifestation(
+                    dataset=self.dataset, primary=True)},
+                devices={}, paths={})
+            for hostname in [u"192.0.2.1", u"192.0.2.2"]
+        ]
+        self.deployment_state = DeploymentState(nodes=self.nodes)
+        self.index = state_datasets(self.deployment_state)
+
+    def test_manifest_on_several_nodes(self):
+        """
+        A dataset manifest on more than one node is selected once for each of
+        them, like ``DeploymentState.all_datasets`` includes it.
+        """
+        expected = list(self.deployment_state.all_datasets())
+        selections = [
+            self.index.select(terms)[0] for terms in
+            [[], [(u"dataset_id", self.dataset.dataset_id)]]
+        ]
+        self.assertEqual(
+            ([(len(selected), set(selected)) for selected in selections],
+             [self.index.select([(u"primary", unicode(node.uuid))])[0]
+              for node in self.nodes]),
+            ([(2, set(expected))] * 2,
+             [[(self.dataset, node)] for node in self.nodes]))
+
+    def test_paginated(self):
+        """
+        Paginating through the datasets selects each of them once, including
+        a dataset manifest on several nodes.
+        """
+        selected, cursor = self.index.select([], limit=1)
+        rest, end = self.index.select([], cursor=cursor, limit=1)
+        self.assertEqual(
+            (len(selected + rest), set(selected + rest), end),
+            (2, set(self.deployment_state.all_datasets()), None))
+
+
+class StateDatasetsWithIdTests(TestCase):
+    """
+    Tests for ``state_datasets_with_id``.
+    """
+    def test_like_index(self):
+        """
+        The same datasets are found, in the same order, as are selected from
+        ``state_datasets`` by their ID, whether they are manifest on several
+        nodes, manifest only as replicas or not manifest at all.
+        """
+        manifest = Dataset(dataset_id=unicode(uuid4()))
+        replica = Dataset(dataset_id=unicode(uuid4()))
+        nonmanifest = Dataset(dataset_id=unicode(uuid4()))
+        nodes = [
+            NodeState(uuid=uuid4(), hostname=hostname, manifestations={
+                manifest.dataset_id: Manifestation(
+                    dataset=manifest, primary=True),
+                replica.dataset_id: Manifestation(
+                    dataset=replica, primary=False)},
+                devices={}, paths={})
+            for hostname in [u"192.0.2.1", u"192.0.2.2"]
+        ]
+        deployment_state = NonManifestDatasets(datasets={
+            nonmanifest.dataset_id: nonmanifest,
+        }).update_cluster_state(DeploymentState(nodes=nodes))
+        index = state_datasets(deployment_state)
+        dataset_ids = [manifest.dataset_id, replica.dataset_id,
+                       nonmanifest.dataset_id, unicode(uuid4())]
+        self.assertEqual(
+            [state_datasets_with_id(deployment_state, dataset_id)
+             for dataset_id in dataset_ids],
+            [index.select([(u"dataset_id", dataset_id)])[0]
+             for dataset_id in dataset_ids])
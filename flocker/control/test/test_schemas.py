@@ -767,6 +767,64 @@ ConfigurationDatasetsCreateSchemaTests = build_schema_test(
     passing_instances=CONFIGURATION_DATASETS_PASSING_INSTANCES,
 )
 
+ConfigurationDatasetsBulkSchemaTests = build_schema_test(
+    name="ConfigurationDatasetsBulkSchemaTests",
+    schema={'$ref':
+            '/v1/endpoints.json#/definitions/configuration_datasets_bulk'},
+    schema_store=SCHEMAS,
+    failing_instances={
+        INVALID_OBJECT_PROPERTY_MISSING: [
+            # operations is required
+            {},
+        ],
+        INVALID_OBJECT_PROPERTY_UNDEFINED: [
+            {u"operations": [], u"primary": valid_uuid},
+        ],
+        INVALID_WRONG_TYPE: [
+            # operations must be an array
+            {u"operations": {}},
+        ],
+        INVALID_OBJECT_NO_MATCH: [
+            # Unknown operation
+            {u"operations": [
+                {u"operation": u"copy", u"dataset_id": valid_uuid}]},
+            # primary is required for create
+            {u"operations": [{u"operation": u"create"}]},
+            # primary is required for move
+            {u"operations": [
+                {u"operation": u"move", u"dataset_id": valid_uuid}]},
+            # maximum_size is required for resize
+            {u"operations": [
+                {u"operation": u"resize", u"dataset_id": valid_uuid}]},
+            # maximum_size must be valid for resize
+            {u"operations": [
+                {u"operation": u"resize", u"dataset_id": valid_uuid,
+                 u"maximum_size": 1024}]},
+            # delete takes no other parameters
+            {u"operations": [
+                {u"operation": u"delete", u"dataset_id": valid_uuid,
+                 u"primary": valid_uuid}]},
+            # dataset_id must be a valid UUID
+            {u"operations": [
+                {u"operation": u"delete", u"dataset_id": bad_uuid_1}]},
+        ],
+    },
+    passing_instances=[
+        {u"operations": []},
+        {u"operations": [
+            {u"operation": u"create", u"primary": valid_uuid},
+            {u"operation": u"create", u"primary": valid_uuid,
+             u"dataset_id": valid_uuid, u"metadata": {u"name": u"x"},
+             u"maximum_size": 1024 * 1024 * 64},
+            {u"operation": u"move", u"dataset_id": valid_uuid,
+             u"primary": valid_uuid},
+            {u"operation": u"delete", u"dataset_id": valid_uuid},
+            {u"operation": u"resize", u"dataset_id": valid_uuid,
+             u"maximum_size": None},
+        ]},
+    ],
+)
+
 StateDatasetsArraySchemaTests = build_schema_test(
     name="StateDatasetsArraySchemaTests",
     schema={'$ref': '/v1/endpoints.json#/definitions/state_datasets_array'},
@@ -3,6 +3,7 @@
 from twisted.python.filepath import FilePath
 
 from ..script import ControlOptions, ControlScript
+from .._protocol import BROADCAST_DELAY
 from ...testtools import (
     MemoryCoreReactor, make_standard_options_test, TestCase,
 )
@@ -69,6 +70,25 @@ class ControlOptionsTests(make_standard_options_test(ControlOptions)):
         options.parseOptions([b"--agent-port", b"tcp:1234"])
         self.assertEqual(options["agent-port"], b"tcp:1234")
 
+    def test_default_broadcast_delay(self):
+        """
+        The default broadcast delay configured by ``ControlOptions`` is
+        ``BROADCAST_DELAY``.
+        """
+        options = ControlOptions()
+        options.parseOptions([])
+        self.assertEqual(
+            options["broadcast-delay"], BROADCAST_DELAY.total_seconds())
+
+    def test_custom_broadcast_delay(self):
+        """
+        The ``--broadcast-delay`` command-line option allows configuring the
+        number of seconds to wait before sending changes to agents.
+        """
+        options = ControlOptions()
+        options.parseOptions([b"--broadcast-delay", b"0.5"])
+        self.assertEqual(options["broadcast-delay"], 0.5)
+
 
 class ControlScriptTests(TestCase):
     """
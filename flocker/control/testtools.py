@@ -107,11 +107,12 @@ def make_istatepersister_tests(fixture):
     return IStatePersisterTests
 
 
-def build_control_amp_service(test_case, reactor=None):
+def build_control_amp_service(test_case, reactor=None, broadcast_delay=None):
     """
     Create a new ``ControlAMPService``.
 
     :param TestCase test_case: The test this service is for.
+    :param timedelta broadcast_delay: See ``ControlAMPService.__init__``.
 
     :return ControlAMPService: Not started.
     """
@@ -129,6 +130,7 @@ def build_control_amp_service(test_case, reactor=None):
         TCP4ServerEndpoint(MemoryReactor(), 1234),
         # Easiest TLS context factory to create:
         ClientContextFactory(),
+        broadcast_delay=broadcast_delay,
     )
 
 
@@ -224,9 +224,12 @@ class VolumePlugin(object):
         :return: ``Deferred`` firing with dataset ID as ``UUID``, or
             errbacks with ``_NotFound`` if no dataset was found.
         """
-        listing = self._flocker_client.list_datasets_configuration()
+        listing = self._flocker_client.list_datasets_configuration(
+            metadata={NAME_FIELD: name})
 
         def got_configured(configured):
+            # Control services which don't support filtering list every
+            # dataset, so check the name anyway:
             for dataset in configured:
                 if dataset.metadata.get(NAME_FIELD) == name:
                     return dataset.dataset_id
@@ -289,19 +292,27 @@ class VolumePlugin(object):
         creating.addCallback(lambda _: {u"Err": u""})
         return creating
 
-    def _get_path_from_dataset_id(self, dataset_id):
+    def _get_path_from_dataset_id(self, dataset_id, watch=False):
         """
         Return a dataset's path if available.
 
         :param UUID dataset_id: The dataset to lookup.
+        :param bool watch: If ``True``, wait for the state of datasets to
+            change before looking it up.
 
         :return: ``Deferred`` that fires with the mountpoint ``FilePath``,
             ``None`` if the dataset is not locally mounted, or errbacks
             with ``_NotFound`` if it is does not exist at all.
         """
-        d = self._flocker_client.list_datasets_state()
+        if watch:
+            d = self._flocker_client.watch_datasets_state(
+                dataset_id=dataset_id)
+        else:
+            d = self._flocker_client.list_datasets_state(
+                dataset_id=dataset_id)
 
         def got_state(datasets):
+            # As in _dataset_id_for_name, the filter may have been ignored:
             datasets = [dataset for dataset in datasets
                         if dataset.dataset_id == dataset_id]
             if datasets and datasets[0].primary == self._node_id:
@@ -330,9 +341,10 @@ class VolumePlugin(object):
                                                         dataset_id))
         d.addCallback(lambda dataset: dataset.dataset_id)
 
+        # Rather than listing the state every time, wait for it to change:
         d.addCallback(lambda dataset_id: loop_until(
             self._reactor,
-            lambda: self._get_path_from_dataset_id(dataset_id),
+            lambda: self._get_path_from_dataset_id(dataset_id, watch=True),
             repeat(self._POLL_INTERVAL)))
         d.addCallback(lambda p: {u"Err": u"", u"Mountpoint": p.path})
 
@@ -65,10 +65,12 @@ class DockerPluginScript(object):
 
         certificates_path = options["agent-config"].parent()
         control_port = options["rest-api-port"]
+        # The plugin polls the control service, so reuse connections:
         flocker_client = FlockerClient(reactor, control_host, control_port,
                                        certificates_path.child(b"cluster.crt"),
                                        certificates_path.child(b"plugin.crt"),
-                                       certificates_path.child(b"plugin.key"))
+                                       certificates_path.child(b"plugin.key"),
+                                       persistent=True)
 
         self._create_listening_directory(PLUGIN_PATH.parent())
 
@@ -346,10 +346,11 @@ class APITestsMixin(APIAssertionsMixin):
             self.assertEqual([self.NODE_A],
                              [d.primary for d in datasets
                               if d.dataset_id == dataset_id])
-            # There should be less than 20 calls to list_datasets_state over
-            # the course of 5 seconds.
+            # There should be less than 20 calls to list_datasets_state or
+            # watch_datasets_state over the course of 5 seconds.
             self.assertLess(
-                self.flocker_client.num_calls('list_datasets_state'), 20)
+                self.flocker_client.num_calls('list_datasets_state') +
+                self.flocker_client.num_calls('watch_datasets_state'), 20)
         d.addCallback(final_assertions)
 
         return d
@@ -519,7 +520,7 @@ class APITestsMixin(APIAssertionsMixin):
         """
         If an unexpected error occurs Docker gets back a useful error message.
         """
-        def error():
+        def error(**kwargs):
             raise CustomException("I've made a terrible mistake")
         self.patch(self.flocker_client, "list_datasets_configuration",
                    error)
@@ -534,7 +535,7 @@ class APITestsMixin(APIAssertionsMixin):
         If a ``BadRequest`` exception is raised it is converted to appropriate
         JSON.
         """
-        def error():
+        def error(**kwargs):
             raise make_bad_request(code=423, Err=u"no good")
         self.patch(self.flocker_client, "list_datasets_configuration",
                    error)
@@ -23,6 +23,7 @@ from ..control._model import (
     Application, AttachedVolume, NodeState, DockerImage, Port, Link,
     RestartNever, pset_field, ip_to_uuid,
     )
+from ..control import ClusterInterest
 from ..route import make_host_network, Proxy, OpenPort
 from ..common import gather_deferreds
 
@@ -238,6 +239,9 @@ class ApplicationNodeDeployer(object):
     :ivar INetwork network: The network routing API to use in
         deployment operations. Default is iptables-based implementation.
     """
+    # Only this node and the nodes whose ports are proxied are needed:
+    interest = ClusterInterest.APPLICATIONS
+
     def __init__(self, hostname, docker_client=None, network=None,
                  node_uuid=None):
         if node_uuid is None:
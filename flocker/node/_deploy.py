@@ -58,9 +58,12 @@ class IDeployer(Interface):
     :ivar UUID node_uuid: The UUID of the node this deployer is running.
     :ivar unicode hostname: The hostname (really, IP) of the node this
         deployer is managing.
+    :ivar interest: A ``ClusterInterest`` constant describing which parts of
+        the cluster configuration and state this deployer needs to be passed.
     """
     node_uuid = Attribute("")
     hostname = Attribute("")
+    interest = Attribute("")
 
     def discover_state(cluster_state, persistent_state):
         """
@@ -51,7 +51,7 @@ from ..control import (
     NodeStateCommand, IConvergenceAgent, AgentAMP, SetNodeEraCommand,
     IStatePersister, SetBlockDeviceIdForDatasetId,
 )
-from ..control._persistence import to_unserialized_json
+from ..control._persistence import PayloadSummarizer
 
 
 class ClusterStatusInputs(Names):
@@ -371,7 +371,7 @@ _FIELD_CONNECTION = Field(
     u"The AMP connection to control service")
 
 _FIELD_LOCAL_CHANGES = Field(
-    u"local_changes", to_unserialized_json,
+    u"local_changes", PayloadSummarizer(),
     u"Changes discovered in local state.")
 
 LOG_SEND_TO_CONTROL_SERVICE = ActionType(
@@ -380,11 +380,11 @@ LOG_SEND_TO_CONTROL_SERVICE = ActionType(
     u"Send the local state to the control service.")
 
 _FIELD_CLUSTERSTATE = Field(
-    u"cluster_state", to_unserialized_json,
+    u"cluster_state", PayloadSummarizer(),
     u"The state of the cluster, according to control service.")
 
 _FIELD_CONFIGURATION = Field(
-    u"desired_configuration", to_unserialized_json,
+    u"desired_configuration", PayloadSummarizer(),
     u"The configuration of the cluster according to the control service.")
 
 _FIELD_ACTIONS = Field(
@@ -778,7 +778,8 @@ class AgentLoopService(MultiService, object):
         self.reconnecting_factory.resetDelay()
         d = client.callRemote(SetNodeEraCommand,
                               era=unicode(self.era),
-                              node_uuid=unicode(self.deployer.node_uuid))
+                              node_uuid=unicode(self.deployer.node_uuid),
+                              interest=unicode(self.deployer.interest.name))
         d.addErrback(writeFailure)
         self.cluster_status.receive(_ConnectedToControlService(client=client))
 
@@ -0,0 +1,201 @@
+# Copyright ClusterHQ Inc.  See LICENSE file for details.
+# -*- test-case-name: flocker.node.agents.test.test_devicewatcher -*-
+
+"""
+Wait for block devices to appear in the OS.
+
+After a storage backend attaches a volume to this node, a driver has to wait
+for the kernel to create the corresponding block device.  Rather than
+scanning ``/sys/block`` on a fixed schedule, a ``BlockDeviceWatcher`` listens
+for the uevents the kernel and udev broadcast when block devices are added
+or changed, and only looks for the device when one arrives.  Where uevents
+can't be received it falls back to polling.
+"""
+
+import socket
+import time
+from errno import EAGAIN
+from select import select
+
+from ._logging import UEVENTS_UNAVAILABLE
+
+# The netlink protocol uevents are broadcast with, from linux/netlink.h:
+NETLINK_KOBJECT_UEVENT = 15
+
+# Multicast groups of uevents: those sent by the kernel, and those sent by
+# udev once it has finished handling them, for example by creating the
+# symlinks in ``/dev/disk/by-id``:
+_KERNEL_UEVENTS = 1
+_UDEV_UEVENTS = 2
+
+# The largest uevent message, from UEVENT_BUFFER_SIZE in linux/kobject.h,
+# with room to spare for the header udev adds:
+_UEVENT_BUFFER_SIZE = 8192
+
+
+def _mentions_block_device(message):
+    """
+    :param bytes message: A uevent message, as sent by either the kernel or
+        udev.
+
+    :return: Whether the uevent is about a block device.
+    """
+    # The kernel sends a summary followed by NUL separated properties, while
+    # udev sends a binary header followed by NUL separated properties.
+    # Either way it's enough to find the property among them:
+    return b"SUBSYSTEM=block" in message.split(b"\0")
+
+
+class _NetlinkUevents(object):
+    """
+    Block device uevents received from a netlink socket.
+
+    :ivar socket _socket: A non-blocking socket subscribed to the uevents of
+        both the kernel and udev.
+    """
+    def __init__(self):
+        """
+        :raises socket.error: If the socket can't be opened.
+        :raises AttributeError: If the platform doesn't support netlink.
+        """
+        self._socket = socket.socket(
+            socket.AF_NETLINK, socket.SOCK_DGRAM, NETLINK_KOBJECT_UEVENT)
+        try:
+            self._socket.bind((0, _KERNEL_UEVENTS | _UDEV_UEVENTS))
+            self._socket.setblocking(False)
+        except:
+            self._socket.close()
+            raise
+
+    def wait(self, timeout):
+        """
+        Wait until a block device uevent arrives.
+
+        :param float timeout: The most time, in seconds, to wait.
+
+        :return: ``True`` if a block device uevent arrived, ``False`` if
+            ``timeout`` passed without one.
+        """
+        readable, _, _ = select([self._socket], [], [], timeout)
+        announced = False
+        while readable:
+            try:
+                message = self._socket.recv(_UEVENT_BUFFER_SIZE)
+            except socket.error as e:
+                if e.errno == EAGAIN:
+                    break
+                # The buffer overflowed and some uevents were lost, so a block
+                # device may have arrived:
+                return True
+            announced = announced or _mentions_block_device(message)
+        return announced
+
+    def close(self):
+        self._socket.close()
+
+
+class _PollingUevents(object):
+    """
+    A stand-in for uevents on platforms without them, which announces a
+    possible block device every ``interval`` seconds.
+    """
+    def __init__(self, interval, time_module):
+        """
+        :param float interval: The time, in seconds, between announcements.
+        :param time_module: Provider of ``sleep`` like the ``time`` module.
+        """
+        self._interval = interval
+        self._time = time_module
+
+    def wait(self, timeout):
+        """
+        Wait until it's time to look for block devices again.
+
+        :param float timeout: The most time, in seconds, to wait.
+
+        :return: ``True``.
+        """
+        self._time.sleep(min(self._interval, timeout))
+        return True
+
+    def close(self):
+        pass
+
+
+class BlockDeviceWatcher(object):
+    """
+    Wait for block devices to appear, looking for them each time a block
+    device uevent arrives.
+
+    Uevents are only treated as a hint that the device may have arrived, so
+    it is still looked for every ``recheck_interval`` seconds in case one is
+    missed.
+    """
+    def __init__(self, recheck_interval=1.0, poll_interval=0.1,
+                 time_module=None, uevents=None):
+        """
+        :param float recheck_interval: The most time, in seconds, to wait for
+            a uevent before looking for the device anyway.
+        :param float poll_interval: The time, in seconds, between looking for
+            the device if uevents can't be received.
+        :param time_module: Provider of ``time`` and ``sleep`` like the
+            ``time`` module, which is used by default.
+        :param uevents: Callable returning a new source of uevents, for
+            testing.  By default a netlink socket is opened, and polling is
+            used if that isn't possible.
+        """
+        if time_module is None:
+            time_module = time
+        self._recheck_interval = recheck_interval
+        self._poll_interval = poll_interval
+        self._time = time_module
+        if uevents is None:
+            uevents = self._default_uevents
+        self._uevents = uevents
+
+    def _default_uevents(self):
+        """
+        :return: A new source of block device uevents, which has ``wait``
+            and ``close`` methods.
+        """
+        try:
+            return _NetlinkUevents()
+        except (AttributeError, socket.error) as e:
+            UEVENTS_UNAVAILABLE(reason=unicode(e)).write()
+            return _PollingUevents(self._poll_interval, self._time)
+
+    def wait_for(self, check, time_limit):
+        """
+        Wait for a block device to appear.
+
+        Uevents are listened for before ``check`` is first called, so none
+        are missed between looking for the device and waiting for one.
+
+        :param check: Callable taking no arguments which returns ``None``
+            until the device has appeared, and otherwise the result of the
+            wait.
+        :param float time_limit: The most time, in seconds, to wait.
+
+        :return: The result of ``check``, or ``None`` if the device didn't
+            appear within ``time_limit``.
+        """
+        deadline = self._time.time() + time_limit
+        uevents = self._uevents()
+        try:
+            while True:
+                result = check()
+                if result is not None:
+                    return result
+                checked = self._time.time()
+                while True:
+                    now = self._time.time()
+                    if now >= deadline:
+                        return None
+                    # Look again on a block device uevent, or anyway after
+                    # ``recheck_interval`` in case one was missed:
+                    recheck = checked + self._recheck_interval
+                    if now >= recheck or uevents.wait(
+                            min(deadline, recheck) - now):
+                        break
+        finally:
+            uevents.close()
@@ -29,6 +29,27 @@ COUNT = Field.for_types(
     u"count", [int],
     u"Count of operation calls.")
 
+VOLUME_IDS = Field(
+    u"volume_ids",
+    lambda volume_ids: [unicode(volume_id) for volume_id in volume_ids],
+    u"The identifiers of several volumes.")
+POLL_INTERVAL = Field.for_types(
+    u"interval", [int, float],
+    u"Time, in seconds, waited since the previous poll.")
+POLLING_VOLUME_STATES = MessageType(
+    u"flocker:node:agents:blockdevice:volume_state_poll",
+    [VOLUME_IDS, POLL_INTERVAL],
+    u"Looking up the state of all the volumes being waited for.",)
+
+UEVENTS_UNAVAILABLE_REASON = Field.for_types(
+    u"reason", [unicode],
+    u"Why block device uevents can't be received.")
+UEVENTS_UNAVAILABLE = MessageType(
+    u"flocker:node:agents:blockdevice:uevents_unavailable",
+    [UEVENTS_UNAVAILABLE_REASON],
+    u"Block device uevents can't be received, so new block devices will be "
+    u"polled for instead.",)
+
 # End: Common structures used by all storage drivers.
 
 # Begin: Helper datastructures to log IBlockDeviceAPI calls
@@ -179,4 +200,13 @@ OPENSTACK_ACTION = ActionType(
     u"storage driver.")
 
 CINDER_CREATE = u'flocker:node:agents:blockdevice:openstack:create_volume'
+
+ELAPSED_TIME = Field.for_types(
+    u"elapsed_time", [int, float],
+    u"Time, in seconds, waited for the device of a volume.")
+VIRTIO_BLK_DEVICE_NOT_FOUND = MessageType(
+    u"flocker:node:agents:blockdevice:openstack:virtio_blk_device_not_found",
+    [VOLUME_ID, ELAPSED_TIME],
+    u"The device of an attached virtio_blk volume didn't appear in "
+    u"/dev/disk/by-id in the time allowed.",)
 # End: Helper datastructures used by OpenStack storage driver.
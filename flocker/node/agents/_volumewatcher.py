@@ -0,0 +1,191 @@
+# Copyright ClusterHQ Inc.  See LICENSE file for details.
+# -*- test-case-name: flocker.node.agents.test.test_volumewatcher -*-
+
+"""
+Wait for the volumes of a storage backend to change state.
+
+Storage backends change the state of volumes asynchronously, so after asking
+for a volume to be created, attached, detached or destroyed a driver has to
+poll the backend until the volume reaches its new state.  Rather than every
+such wait polling the backend for its own volume, a ``VolumeStateWatcher``
+looks up all the volumes being waited for with a single call, so concurrent
+waits cost no more API calls than one.
+"""
+
+import time
+from threading import Condition
+
+from twisted.internet.defer import Deferred
+from twisted.python.failure import Failure
+
+from ._logging import POLLING_VOLUME_STATES
+
+
+class VolumeStateWatcher(object):
+    """
+    Poll a storage backend for the state of all the volumes being waited for,
+    and tell each waiter once its volume has changed.
+
+    Polls are spaced on an exponentially increasing schedule, which restarts
+    at ``minimum_interval`` whenever a new wait begins or a poll finishes
+    some waits, so volumes that change quickly are noticed quickly while
+    those that take a long time don't cause many calls to the backend.
+
+    There is no thread of its own polling the backend: the threads blocked in
+    ``wait`` take turns to do it on behalf of all the waiters.
+
+    :ivar _waiters: ``dict`` mapping the identifier of each volume being
+        waited for to a ``list`` of 3-tuples of the check function, the time
+        the wait began and the ``Deferred`` of each wait for it.
+    :ivar bool _polling: Whether one of the threads is currently polling.
+    :ivar float _interval: The time to wait before the next poll.
+    """
+    def __init__(self, describe, minimum_interval=0.5, maximum_interval=2.0,
+                 backoff=2.0, time_module=None):
+        """
+        :param describe: Callable taking a ``list`` of volume identifiers and
+            returning an iterable of the latest backend description of each
+            of them that exists.  Descriptions have an ``id`` attribute.
+        :param float minimum_interval: The time, in seconds, to wait before
+            the first poll after a wait begins.
+        :param float maximum_interval: The most time, in seconds, to wait
+            between polls.
+        :param float backoff: The factor to increase the time between polls
+            by after each one.
+        :param time_module: Provider of ``time`` and ``sleep`` like the
+            ``time`` module, which is used by default.
+        """
+        if time_module is None:
+            time_module = time
+        self._describe = describe
+        self._minimum_interval = minimum_interval
+        self._maximum_interval = maximum_interval
+        self._backoff = backoff
+        self._time = time_module
+        self._condition = Condition()
+        self._waiters = {}
+        self._polling = False
+        self._interval = minimum_interval
+
+    def watch(self, volume_id, check):
+        """
+        Begin waiting for a volume to change state.
+
+        :param unicode volume_id: The identifier of the volume.
+        :param check: Callable taking the latest description of the volume, or
+            ``None`` if it no longer exists, and the time in seconds since
+            the wait began.  It returns ``None`` while the volume has yet to
+            reach the expected state, and otherwise the result of the wait.
+            It raises an exception if the volume can't reach the expected
+            state, for example after waiting for too long.
+
+        :return: ``Deferred`` that fires with the result of ``check``, or
+            fails with the exception it raises.
+        """
+        result = Deferred()
+        with self._condition:
+            self._waiters.setdefault(volume_id, []).append(
+                (check, self._time.time(), result))
+            self._interval = self._minimum_interval
+        return result
+
+    def wait(self, result):
+        """
+        Block until a wait has finished, polling the backend for all the
+        waiters whenever no other thread is.
+
+        :param Deferred result: A ``Deferred`` returned by ``watch``.
+
+        :raises: The exception raised by the ``check`` of the wait.
+        :return: The result of the ``check`` of the wait.
+        """
+        outcome = []
+        result.addBoth(outcome.append)
+        with self._condition:
+            while not outcome:
+                if self._polling:
+                    self._condition.wait()
+                    continue
+                self._polling = True
+                interval = self._interval
+                self._condition.release()
+                try:
+                    self._time.sleep(interval)
+                    self.poll(interval)
+                finally:
+                    self._condition.acquire()
+                    self._polling = False
+                    self._condition.notify_all()
+        [outcome] = outcome
+        if isinstance(outcome, Failure):
+            outcome.raiseException()
+        return outcome
+
+    def poll(self, interval=0):
+        """
+        Look up all the volumes being waited for with one call to
+        ``describe``, and finish the waits for those that have changed.
+
+        If ``describe`` fails, every wait fails with its exception.
+
+        :param float interval: The time, in seconds, waited since the previous
+            poll, for logging.
+        """
+        with self._condition:
+            waiters = dict(
+                (volume_id, list(waits))
+                for (volume_id, waits) in self._waiters.items()
+            )
+        if not waiters:
+            return
+        volume_ids = sorted(waiters)
+        POLLING_VOLUME_STATES(
+            volume_ids=volume_ids, interval=interval,
+        ).write()
+        try:
+            described = dict(
+                (volume.id, volume) for volume in self._describe(volume_ids)
+            )
+        except Exception:
+            failure = Failure()
+            finished = [
+                (volume_id, wait, failure)
+                for (volume_id, waits) in waiters.items()
+                for wait in waits
+            ]
+        else:
+            now = self._time.time()
+            finished = []
+            for volume_id in volume_ids:
+                volume = described.get(volume_id)
+                for wait in waiters[volume_id]:
+                    check, started, _ = wait
+                    try:
+                        reached = check(volume, now - started)
+                    except Exception:
+                        finished.append((volume_id, wait, Failure()))
+                    else:
+                        if reached is not None:
+                            finished.append((volume_id, wait, reached))
+
+        with self._condition:
+            for volume_id, wait, _ in finished:
+                waits = self._waiters[volume_id]
+                waits.remove(wait)
+                if not waits:
+                    del self._waiters[volume_id]
+            if finished or not self._waiters:
+                # Other volumes changed at the same time are likely to be
+                # changing soon too:
+                self._interval = self._minimum_interval
+            else:
+                self._interval = min(
+                    self._interval * self._backoff, self._maximum_interval)
+
+        # Fire the waits outside of the lock, so their callbacks can begin
+        # new ones:
+        for _, (_, _, result), outcome in finished:
+            if isinstance(outcome, Failure):
+                result.errback(outcome)
+            else:
+                result.callback(outcome)
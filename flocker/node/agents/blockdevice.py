@@ -8,22 +8,29 @@ devices.
 """
 
 import itertools
+from collections import defaultdict
 from uuid import UUID
 from stat import S_IRWXU, S_IRWXG, S_IRWXO
 from errno import EEXIST
 from datetime import timedelta
+from threading import Lock
+from time import time
 
-from eliot import MessageType, ActionType, Field, Logger
+from eliot import MessageType, ActionType, Field, Logger, preserve_context
 from eliot.serializers import identity
 
-from zope.interface import implementer, Interface, provider
+from zope.interface import implementer, Interface, provider, alsoProvides
 
-from pyrsistent import PClass, field, pmap_field, pset_field, thaw, CheckedPMap
+from pyrsistent import (
+    PClass, PVector, field, pmap_field, pset_field, pvector, thaw, CheckedPMap,
+)
 
 from characteristic import with_cmp
 
 from twisted.python.reflect import safe_repr
 from twisted.internet.defer import succeed, fail
+from twisted.internet.threads import deferToThreadPool
+from twisted.python.failure import Failure
 from twisted.python.filepath import FilePath
 from twisted.python.components import proxyForInterface
 from twisted.python.constants import (
@@ -39,9 +46,14 @@ from .. import (
 )
 from .._deploy import NotInUseDatasets
 
-from ...control import NodeState, Manifestation, Dataset, NonManifestDatasets
+from ...control import (
+    NodeState, Manifestation, Dataset, NonManifestDatasets, ClusterInterest,
+)
 from ...control._model import pvector_field
-from ...common import RACKSPACE_MINIMUM_VOLUME_SIZE, auto_threaded, provides
+from ...control._persistence import PayloadSummarizer
+from ...common import (
+    RACKSPACE_MINIMUM_VOLUME_SIZE, auto_threaded, gather_deferreds, provides,
+)
 from ...common.algebraic import TaggedUnionInvariant
 
 
@@ -379,6 +391,21 @@ ATTACH_VOLUME = ActionType(
     u"The volume for a block-device-backed dataset is being attached."
 )
 
+CREATE_BLOCK_DEVICE_DATASETS = ActionType(
+    u"agent:blockdevice:create_datasets",
+    [COUNT],
+    [],
+    u"Several block-device-backed datasets are being created together.",
+)
+
+ATTACH_VOLUMES = ActionType(
+    u"agent:blockdevice:attach_volumes",
+    [COUNT],
+    [],
+    u"The volumes for several block-device-backed datasets are being "
+    u"attached together."
+)
+
 DETACH_VOLUME = ActionType(
     u"agent:blockdevice:detach_volume",
     [DATASET_ID, BLOCK_DEVICE_ID],
@@ -425,7 +452,11 @@ CREATE_VOLUME_PROFILE_DROPPED = MessageType(
 
 DISCOVERED_RAW_STATE = MessageType(
     u"agent:blockdevice:raw_state",
-    [Field(u"raw_state", safe_repr)],
+    [Field(u"raw_state", PayloadSummarizer(safe_repr)),
+     Field(u"probe_seconds", identity,
+           u"The time taken by each probe of the node and its backend, in "
+           u"seconds.  For probes made once per device it is the time taken "
+           u"by the slowest of them.")],
     u"The discovered raw state of the node's block device volumes.")
 
 
@@ -944,6 +975,157 @@ class RegisterVolume(PClass):
         )
 
 
+def _finish_batch(actions, results):
+    """
+    Finish the Eliot action of each change in a batch with its result.
+
+    :param actions: The started Eliot ``Action`` of each change.
+    :param results: ``list`` of the result of each change, each a ``Failure``
+        if the change failed, or a single ``Failure`` if they all did.
+
+    :return: The first ``Failure`` if any of the changes failed, otherwise
+        ``None``.
+    """
+    if isinstance(results, Failure):
+        results = [results] * len(actions)
+    failures = []
+    for action, result in zip(actions, results):
+        if isinstance(result, Failure):
+            action.finish(result.value)
+            failures.append(result)
+        else:
+            action.finish()
+    if failures:
+        return failures[0]
+    return None
+
+
+def _sorted_by_dataset_id(changes):
+    """
+    :param changes: Iterable of changes with a ``dataset_id``.
+
+    :return: ``PVector`` of the changes, sorted by ``dataset_id`` for the
+        benefit of comparison.
+    """
+    return pvector(sorted(changes, key=lambda change: change.dataset_id))
+
+
+@implementer(IStateChange)
+class CreateBlockDeviceDatasets(PClass):
+    """
+    Create the volumes of several datasets with one call to the deployer's
+    ``IBatchBlockDeviceAPI``, or as the individual changes in parallel if
+    the deployer's API doesn't provide it.
+
+    :ivar PVector changes: The ``CreateBlockDeviceDataset`` changes to make.
+    """
+    changes = field(
+        type=PVector, factory=_sorted_by_dataset_id, mandatory=True,
+    )
+
+    @property
+    def eliot_action(self):
+        return CREATE_BLOCK_DEVICE_DATASETS(_logger, count=len(self.changes))
+
+    def run(self, deployer, state_persister):
+        batch_api = deployer.async_batch_block_device_api
+        if batch_api is None:
+            return in_parallel(changes=self.changes).run(
+                deployer=deployer, state_persister=state_persister)
+
+        api = deployer.block_device_api
+        async_api = deployer.async_block_device_api
+        profiled = IProfiledBlockDeviceAPI.providedBy(api)
+        actions = [change.eliot_action for change in self.changes]
+
+        def listed(volumes):
+            getting_unit = async_api.allocation_unit()
+            getting_unit.addCallback(
+                lambda allocation_unit: create(volumes, allocation_unit))
+            return getting_unit
+
+        def create(volumes, allocation_unit):
+            existing = {volume.dataset_id: volume for volume in volumes}
+            results = []
+            requests = []
+            for change, action in zip(self.changes, actions):
+                if change.dataset_id in existing:
+                    results.append(
+                        Failure(DatasetExists(existing[change.dataset_id])))
+                    continue
+                profile_name = change.metadata.get(PROFILE_METADATA_KEY)
+                if profile_name and not profiled:
+                    with action.context():
+                        CREATE_VOLUME_PROFILE_DROPPED(
+                            dataset_id=change.dataset_id,
+                            profile_name=profile_name,
+                        ).write()
+                    profile_name = None
+                results.append(None)
+                requests.append((
+                    len(results) - 1,
+                    (change.dataset_id,
+                     allocated_size(allocation_unit=allocation_unit,
+                                    requested_size=change.maximum_size),
+                     profile_name),
+                ))
+
+            if requests:
+                creating = batch_api.create_volumes(
+                    [request for (_, request) in requests])
+            else:
+                creating = succeed([])
+
+            def created(volumes):
+                if isinstance(volumes, Failure):
+                    volumes = [volumes] * len(requests)
+                for (index, _), volume in zip(requests, volumes):
+                    results[index] = volume
+                return results
+            return creating.addBoth(created)
+
+        listing = async_api.list_volumes()
+        listing.addCallback(listed)
+        return listing.addBoth(lambda results: _finish_batch(
+            actions, results))
+
+
+@implementer(IStateChange)
+class AttachVolumes(PClass):
+    """
+    Attach the volumes of several datasets to this node with one call to the
+    deployer's ``IBatchBlockDeviceAPI``, or as the individual changes in
+    parallel if the deployer's API doesn't provide it.
+
+    :ivar PVector changes: The ``AttachVolume`` changes to make.
+    """
+    changes = field(
+        type=PVector, factory=_sorted_by_dataset_id, mandatory=True,
+    )
+
+    @property
+    def eliot_action(self):
+        return ATTACH_VOLUMES(_logger, count=len(self.changes))
+
+    def run(self, deployer, state_persister):
+        batch_api = deployer.async_batch_block_device_api
+        if batch_api is None:
+            return in_parallel(changes=self.changes).run(
+                deployer=deployer, state_persister=state_persister)
+
+        actions = [change.eliot_action for change in self.changes]
+        getting_id = deployer.async_block_device_api.compute_instance_id()
+
+        def got_compute_id(compute_instance_id):
+            return batch_api.attach_volumes([
+                (change.blockdevice_id, compute_instance_id)
+                for change in self.changes
+            ])
+        attaching = getting_id.addCallback(got_compute_id)
+        return attaching.addBoth(lambda results: _finish_batch(
+            actions, results))
+
+
 class IBlockDeviceAsyncAPI(Interface):
     """
     Common operations provided by all block device backends, exposed via
@@ -1302,6 +1484,74 @@ class ProfiledBlockDeviceAPIAdapter(PClass):
                                                    size=size)
 
 
+class IBatchBlockDeviceAPI(Interface):
+    """
+    An interface for drivers that can create, attach and describe several
+    volumes together more cheaply than one at a time, for example by
+    waiting for all of them to change state with a single call to the
+    backend.
+
+    ``create_volumes`` and ``attach_volumes`` return a result for each
+    request, in the same order: either what the equivalent method of
+    ``IBlockDeviceAPI`` returns, or a ``Failure`` of the exception it raises,
+    so that one request failing doesn't affect the others.
+    """
+    def create_volumes(requests):
+        """
+        Create new volumes.
+
+        When called by ``IDeployer``, the supplied sizes will be rounded up to
+        the nearest ``IBlockDeviceAPI.allocation_unit()``.
+
+        :param requests: ``list`` of 3-tuples of the ``UUID`` of the dataset
+            on each volume, the size of the volume in bytes and the
+            ``unicode`` name of its storage profile, or ``None`` for no
+            profile.  Profiles are only given to providers of
+            ``IProfiledBlockDeviceAPI``.
+
+        :returns: ``list`` of the ``BlockDeviceVolume`` of each newly created
+            volume, or ``Failure``.
+        """
+
+    def attach_volumes(attachments):
+        """
+        Attach volumes to compute instances.
+
+        :param attachments: ``list`` of 2-tuples of the ``unicode``
+            ``blockdevice_id`` of each volume and the ``unicode`` compute
+            instance ID to attach it to.
+
+        :returns: ``list`` of the ``BlockDeviceVolume`` of each attached
+            volume, or ``Failure``.
+        """
+
+    def describe_volumes(blockdevice_ids):
+        """
+        Find the volumes with the given identifiers.
+
+        :param blockdevice_ids: Iterable of ``unicode`` ``blockdevice_id``.
+
+        :returns: ``list`` of the ``BlockDeviceVolume`` of each of the
+            identified volumes that exists, in no particular order.
+        """
+
+
+@auto_threaded(IBatchBlockDeviceAPI, "_reactor", "_sync", "_threadpool")
+class _SyncToThreadedAsyncBatchAPIAdapter(PClass):
+    """
+    Adapt any ``IBatchBlockDeviceAPI`` to the same interface but with
+    ``Deferred``-returning methods by running those methods in a thread
+    pool.
+
+    :ivar _reactor: The reactor, providing ``IReactorThreads``.
+    :ivar _sync: The ``IBatchBlockDeviceAPI`` provider.
+    :ivar _threadpool: ``twisted.python.threadpool.ThreadPool`` instance.
+    """
+    _reactor = field()
+    _sync = field()
+    _threadpool = field()
+
+
 @implementer(IBlockDeviceAsyncAPI)
 @auto_threaded(IBlockDeviceAPI, "_reactor", "_sync", "_threadpool")
 class _SyncToThreadedAsyncAPIAdapter(PClass):
@@ -1604,6 +1854,38 @@ DATASET_TRANSITIONS = TransitionTable.create({
 })
 del Desired, Discovered
 
+# Changes which can be made together, and the change which makes them:
+_BATCHES = {
+    CreateBlockDeviceDataset: CreateBlockDeviceDatasets,
+    AttachVolume: AttachVolumes,
+}
+
+
+def _batched(changes):
+    """
+    Group the changes which can be made together into batches.
+
+    :param changes: Iterable of ``IStateChange`` providers to be run in
+        parallel.
+
+    :return: ``list`` of the changes, with each type of change in
+        ``_BATCHES`` that appears more than once replaced by a batch of them.
+    """
+    unbatched = []
+    batchable = defaultdict(list)
+    for change in changes:
+        batch = _BATCHES.get(type(change))
+        if batch is None:
+            unbatched.append(change)
+        else:
+            batchable[batch].append(change)
+    for batch, grouped in batchable.items():
+        if len(grouped) > 1:
+            unbatched.append(batch(changes=grouped))
+        else:
+            unbatched.extend(grouped)
+    return unbatched
+
 
 @implementer(ICalculator)
 class BlockDeviceCalculator(PClass):
@@ -1659,7 +1941,7 @@ class BlockDeviceCalculator(PClass):
                 desired_dataset=desired_dataset,
             ))
 
-        return in_parallel(changes=actions)
+        return in_parallel(changes=_batched(actions))
 
 
 @implementer(IDeployer)
@@ -1680,6 +1962,11 @@ class BlockDeviceDeployer(PClass):
     :ivar _async_block_device_api: An object to override the value of the
         ``async_block_device_api`` property.  Used by tests.  Should be
         ``None`` in real-world use.
+    :ivar _reactor: The reactor to use to get the results of blocking calls
+        made in ``_threadpool``, or ``None`` to use the global reactor and its
+        thread pool.  Used by tests.  Should be ``None`` in real-world use.
+    :ivar _threadpool: The ``ThreadPool`` to make blocking calls in when
+        ``_reactor`` is not ``None``.
     :ivar block_device_manager: An ``IBlockDeviceManager`` implementation used
         to interact with the system regarding block devices.
     :ivar ICalculator calculator: The object to use to calculate dataset
@@ -1690,6 +1977,8 @@ class BlockDeviceDeployer(PClass):
     block_device_api = field(mandatory=True)
     _underlying_blockdevice_api = field(mandatory=True, initial=None)
     _async_block_device_api = field(mandatory=True, initial=None)
+    _reactor = field(mandatory=True, initial=None)
+    _threadpool = field(mandatory=True, initial=None)
     mountroot = field(type=FilePath, initial=FilePath(b"/flocker"))
     block_device_manager = field(initial=BlockDeviceManager())
     calculator = field(
@@ -1698,20 +1987,26 @@ class BlockDeviceDeployer(PClass):
         initial=BlockDeviceCalculator(),
     )
 
+    # Datasets are only ever attached to this node, so no other node's
+    # configuration or state is needed:
+    interest = ClusterInterest.LOCAL
+
     @property
     def profiled_blockdevice_api(self):
         """
         Get an ``IProfiledBlockDeviceAPI`` provider which can create volumes
         configured based on pre-defined profiles. This will use the
-        _underlying_blockdevice_api attribute, falling back to the
-        block_device_api attributed and finally an adapter implementation
-        around the block_device_api if neither of those provide the interface.
+        block_device_api attribute, so that the volumes it creates are
+        written through any cache, falling back to the
+        _underlying_blockdevice_api attribute and finally an adapter
+        implementation around the block_device_api if neither of those provide
+        the interface.
         """
+        if IProfiledBlockDeviceAPI.providedBy(self.block_device_api):
+            return self.block_device_api
         if IProfiledBlockDeviceAPI.providedBy(
                 self._underlying_blockdevice_api):
             return self._underlying_blockdevice_api
-        if IProfiledBlockDeviceAPI.providedBy(self.block_device_api):
-            return self.block_device_api
         return ProfiledBlockDeviceAPIAdapter(
             _blockdevice_api=self.block_device_api
         )
@@ -1729,26 +2024,104 @@ class BlockDeviceDeployer(PClass):
         subclass).
         """
         if self._async_block_device_api is None:
-            return _SyncToThreadedAsyncAPIAdapter.from_api(
-                self.block_device_api,
+            if self._reactor is None:
+                return _SyncToThreadedAsyncAPIAdapter.from_api(
+                    self.block_device_api,
+                )
+            return _SyncToThreadedAsyncAPIAdapter(
+                _sync=self.block_device_api,
+                _reactor=self._reactor,
+                _threadpool=self._threadpool,
             )
         return self._async_block_device_api
 
+    @property
+    def async_batch_block_device_api(self):
+        """
+        Get an ``IBatchBlockDeviceAPI`` provider with ``Deferred``-returning
+        methods which runs the methods of ``block_device_api`` in the thread
+        pool, or ``None`` if ``block_device_api`` doesn't provide
+        ``IBatchBlockDeviceAPI``.
+        """
+        if not IBatchBlockDeviceAPI.providedBy(self.block_device_api):
+            return None
+        reactor, threadpool = self._reactor_and_threadpool()
+        return _SyncToThreadedAsyncBatchAPIAdapter(
+            _sync=self.block_device_api,
+            _reactor=reactor,
+            _threadpool=threadpool,
+        )
+
+    def _reactor_and_threadpool(self):
+        """
+        :return: 2-tuple of the reactor and the ``ThreadPool`` to make
+            blocking calls in.
+        """
+        if self._reactor is None:
+            from twisted.internet import reactor
+            return reactor, reactor.getThreadPool()
+        return self._reactor, self._threadpool
+
+    def _call_in_thread(self, function, *args, **kwargs):
+        """
+        Call a blocking function in a thread of the thread pool.
+
+        :param function: The function to call with the rest of the arguments.
+
+        :return: ``Deferred`` that fires with the function's result.
+        """
+        reactor, threadpool = self._reactor_and_threadpool()
+        return deferToThreadPool(
+            reactor, threadpool, preserve_context(function), *args, **kwargs
+        )
+
     @log_list_volumes
     def _discover_raw_state(self):
         """
         Find the state of this node that is relevant to determining which
-        datasets are on this node, and return a ``RawState`` containing that
-        information.
-        """
-        # FLOC-1819 Make this asynchronous
-        api = self.block_device_api
-        compute_instance_id = api.compute_instance_id()
-        volumes = api.list_volumes()
-        system_mounts = {
-            mount.blockdevice: mount.mountpoint
-            for mount in self.block_device_manager.get_mounts()
-        }
+        datasets are on this node.
+
+        Nothing blocks the reactor while this happens: the backend is probed
+        through ``async_block_device_api`` and the system in the thread pool.
+        Probes that don't depend on one another run concurrently, and the
+        time taken by each is logged along with the result.
+
+        :return: ``Deferred`` that fires with a ``RawState`` containing that
+            information.
+        """
+        async_api = self.async_block_device_api
+        probe_seconds = {}
+
+        def timed(name, function, *args):
+            start = time()
+
+            def record(result):
+                probe_seconds[name] = max(
+                    probe_seconds.get(name, 0), time() - start)
+                return result
+            return function(*args).addCallback(record)
+
+        def get_mounts():
+            return {
+                mount.blockdevice: mount.mountpoint
+                for mount in self.block_device_manager.get_mounts()
+            }
+
+        if ICloudAPI.providedBy(self._underlying_blockdevice_api):
+            listing_live_instances = timed(
+                u"list_live_nodes", self._call_in_thread,
+                self._underlying_blockdevice_api.list_live_nodes,
+            )
+        else:
+            # Can't know accurately who is alive and who is dead:
+            listing_live_instances = succeed(None)
+
+        probing = gather_deferreds([
+            timed(u"compute_instance_id", async_api.compute_instance_id),
+            timed(u"list_volumes", async_api.list_volumes),
+            timed(u"get_mounts", self._call_in_thread, get_mounts),
+            listing_live_instances,
+        ])
 
         def is_existing_block_device(dataset_id, path):
             if isinstance(path, FilePath) and path.isBlockDevice():
@@ -1758,39 +2131,66 @@ class BlockDeviceDeployer(PClass):
             ).write(_logger)
             return False
 
-        # XXX This should probably just be included in
-        # BlockDeviceVolume for attached volumes.
-        devices = {}
-        for volume in volumes:
-            dataset_id = volume.dataset_id
-            if volume.attached_to == compute_instance_id:
-                device_path = api.get_device_path(volume.blockdevice_id)
-                if is_existing_block_device(dataset_id, device_path):
-                    devices[dataset_id] = device_path
-                else:
+        def probe_device(volume):
+            # XXX This should probably just be included in
+            # BlockDeviceVolume for attached volumes.
+            def got_device_path(device_path):
+                if not is_existing_block_device(
+                        volume.dataset_id, device_path):
                     # XXX We will detect this as NON_MANIFEST, but this is
                     # probably an intermediate state where the device is
                     # externally attached but the device hasn't shown up
                     # in the filesystem yet.
-                    pass
+                    return None
+                checking = timed(
+                    u"has_filesystem", self._call_in_thread,
+                    self.block_device_manager.has_filesystem, device_path,
+                )
+                checking.addCallback(
+                    lambda has_filesystem: (
+                        volume.dataset_id, device_path, has_filesystem))
+                return checking
+
+            getting_device_path = timed(
+                u"get_device_path", async_api.get_device_path,
+                volume.blockdevice_id,
+            )
+            return getting_device_path.addCallback(
+                preserve_context(got_device_path))
+
+        def probe_devices(results):
+            compute_instance_id, volumes, system_mounts, live_instances = (
+                results)
+
+            def got_devices(probed):
+                probed = [device for device in probed if device is not None]
+                result = RawState(
+                    compute_instance_id=compute_instance_id,
+                    _live_instances=live_instances,
+                    volumes=volumes,
+                    devices={
+                        dataset_id: device_path
+                        for (dataset_id, device_path, _) in probed
+                    },
+                    system_mounts=system_mounts,
+                    devices_with_filesystems=[
+                        device_path
+                        for (_, device_path, has_filesystem) in probed
+                        if has_filesystem
+                    ],
+                )
+                DISCOVERED_RAW_STATE(
+                    raw_state=result, probe_seconds=probe_seconds,
+                ).write()
+                return result
 
-        if ICloudAPI.providedBy(self._underlying_blockdevice_api):
-            live_instances = self._underlying_blockdevice_api.list_live_nodes()
-        else:
-            # Can't know accurately who is alive and who is dead:
-            live_instances = None
-        result = RawState(
-            compute_instance_id=compute_instance_id,
-            _live_instances=live_instances,
-            volumes=volumes,
-            devices=devices,
-            system_mounts=system_mounts,
-            devices_with_filesystems=[
-                device for device in devices.values()
-                if self.block_device_manager.has_filesystem(device)],
-        )
-        DISCOVERED_RAW_STATE(raw_state=result).write()
-        return result
+            probing_devices = gather_deferreds([
+                probe_device(volume) for volume in volumes
+                if volume.attached_to == compute_instance_id
+            ])
+            return probing_devices.addCallback(preserve_context(got_devices))
+
+        return probing.addCallback(preserve_context(probe_devices))
 
     def discover_state(self, cluster_state, persistent_state):
         """
@@ -1798,8 +2198,21 @@ class BlockDeviceDeployer(PClass):
         return a ``BlockDeviceDeployerLocalState`` containing all the datasets
         that are not manifest or are located on this node.
         """
-        raw_state = self._discover_raw_state()
+        discovering = self._discover_raw_state()
+        discovering.addCallback(
+            self._local_state_from_raw_state, persistent_state)
+        return discovering
+
+    def _local_state_from_raw_state(self, raw_state, persistent_state):
+        """
+        Determine the state of the datasets associated with this host.
+
+        :param RawState raw_state: The discovered state of this node.
+        :param PersistentState persistent_state: The persistent state of the
+            cluster.
 
+        :return: A ``BlockDeviceDeployerLocalState``.
+        """
         datasets = {}
         for volume in raw_state.volumes:
             dataset_id = volume.dataset_id
@@ -1887,7 +2300,7 @@ class BlockDeviceDeployer(PClass):
             datasets=datasets,
         )
 
-        return succeed(local_state)
+        return local_state
 
     def _mountpath_for_dataset_id(self, dataset_id):
         """
@@ -2000,44 +2413,233 @@ class BlockDeviceDeployer(PClass):
         )
 
 
+# How long the volumes listed by a ``ProcessLifetimeCache`` are used for
+# before they are listed again.  Changes made through the cache are reflected
+# immediately; this only bounds how stale changes made by other nodes can be:
+DEFAULT_VOLUMES_TTL = timedelta(seconds=5)
+
+
+def _batch_written(results, volumes):
+    """
+    :param results: The results of a call to ``IBatchBlockDeviceAPI``.
+    :param volumes: The inventory changed to match the results.
+
+    :return: ``volumes``, or ``None`` if any of the results are a ``Failure``
+        since the inventory is then no longer known.
+    """
+    if any(isinstance(result, Failure) for result in results):
+        return None
+    return volumes
+
+
 class ProcessLifetimeCache(proxyForInterface(IBlockDeviceAPI, "_api")):
     """
     A transparent caching layer around an ``IBlockDeviceAPI`` instance,
     intended to exist for the lifetime of the process.
 
+    The result of ``list_volumes`` is kept as an inventory of volumes for
+    ``volumes_ttl``, so that everything looking up volumes while the agent
+    converges (``check_for_existing_dataset``, ``get_blockdevice_volume`` and
+    the discovery of the node's state) shares one call to the backend.
+    Volumes created, attached, detached and destroyed through the cache are
+    written through to the inventory, and any of those calls failing discards
+    it.  The cache may be used from several threads at once.
+
+    If the wrapped API also provides ``IProfiledBlockDeviceAPI`` or
+    ``IBatchBlockDeviceAPI`` then so does the cache, so that volumes created
+    and attached through them are written through to the inventory too.
+
     :ivar _api: Wrapped ``IBlockDeviceAPI`` provider.
     :ivar _instance_id: Cached result of ``compute_instance_id``.
     :ivar _device_paths: Mapping from blockdevice ids to cached device path.
-    """
-    def __init__(self, api):
+    :ivar float _volumes_ttl: The number of seconds the inventory is used for.
+    :ivar _clock: ``IReactorTime`` provider used to expire the inventory.
+    :ivar _volumes: The inventory: a ``list`` of ``BlockDeviceVolume``, or
+        ``None`` if the volumes have to be listed again.
+    :ivar float _volumes_listed: When the inventory was listed.
+    :ivar int _generation: Incremented by every change to the inventory or
+        the cached device paths, so that a listing or device path lookup
+        which raced with a change is not kept.
+    :ivar _lock: ``threading.Lock`` protecting the inventory, the cached
+        device paths and the cached instance ID.  It is never held while
+        calling the wrapped API.
+    """
+    def __init__(self, api, volumes_ttl=DEFAULT_VOLUMES_TTL, clock=None):
+        """
+        :param api: The ``IBlockDeviceAPI`` provider to wrap.
+        :param timedelta volumes_ttl: How long to use the listed volumes for.
+        :param clock: ``IReactorTime`` provider, or ``None`` to use the
+            global reactor.
+        """
+        if clock is None:
+            from twisted.internet import reactor as clock
         self._api = api
         self._instance_id = None
         self._device_paths = {}
+        self._volumes_ttl = volumes_ttl.total_seconds()
+        self._clock = clock
+        self._volumes = None
+        self._volumes_listed = None
+        self._generation = 0
+        self._lock = Lock()
+        for interface in [IProfiledBlockDeviceAPI, IBatchBlockDeviceAPI]:
+            if interface.providedBy(api):
+                alsoProvides(self, interface)
 
     def compute_instance_id(self):
         """
         Always return initial result since this shouldn't change until a
         reboot.
         """
-        if self._instance_id is None:
-            self._instance_id = self._api.compute_instance_id()
-        return self._instance_id
+        with self._lock:
+            if self._instance_id is not None:
+                return self._instance_id
+        instance_id = self._api.compute_instance_id()
+        with self._lock:
+            if self._instance_id is None:
+                self._instance_id = instance_id
+            return self._instance_id
 
     def get_device_path(self, blockdevice_id):
         """
         Load the device path from a cache if possible.
         """
-        if blockdevice_id not in self._device_paths:
-            self._device_paths[blockdevice_id] = self._api.get_device_path(
-                blockdevice_id)
-        return self._device_paths[blockdevice_id]
+        with self._lock:
+            if blockdevice_id in self._device_paths:
+                return self._device_paths[blockdevice_id]
+            generation = self._generation
+        device_path = self._api.get_device_path(blockdevice_id)
+        with self._lock:
+            # Don't keep a path looked up while the volume was detached:
+            if self._generation == generation:
+                self._device_paths[blockdevice_id] = device_path
+        return device_path
+
+    def list_volumes(self):
+        """
+        Return the inventory of volumes, listing them again if it has expired.
+        """
+        with self._lock:
+            if (self._volumes is not None and
+                    self._clock.seconds() - self._volumes_listed <
+                    self._volumes_ttl):
+                return self._inventory_hit()
+            generation = self._generation
+        return self._inventory_miss(generation)
+
+    @log_list_volumes
+    def _inventory_hit(self):
+        """
+        :return: The volumes in the inventory.
+        """
+        return list(self._volumes)
+
+    @log_list_volumes
+    def _inventory_miss(self, generation):
+        """
+        List the volumes and keep them as the inventory, unless the inventory
+        has been changed since ``generation``.
+
+        :param int generation: The generation of the expired inventory.
+
+        :return: The listed volumes.
+        """
+        listed = self._clock.seconds()
+        volumes = self._api.list_volumes()
+        with self._lock:
+            if self._generation == generation:
+                self._volumes = list(volumes)
+                self._volumes_listed = listed
+        return volumes
+
+    def _write_through(self, function, update):
+        """
+        Change a volume, and the inventory to match.
+
+        :param function: Callable making the change and returning its result.
+        :param update: Callable taking the result and the inventory, and
+            returning the changed inventory, or ``None`` if it is no longer
+            known.
+
+        :return: The result of ``function``.
+        """
+        try:
+            result = function()
+        except:
+            with self._lock:
+                self._generation += 1
+                self._volumes = None
+            raise
+        with self._lock:
+            self._generation += 1
+            if self._volumes is not None:
+                self._volumes = update(result, self._volumes)
+        return result
+
+    def create_volume(self, dataset_id, size):
+        return self._write_through(
+            lambda: self._api.create_volume(dataset_id=dataset_id, size=size),
+            lambda volume, volumes: volumes + [volume],
+        )
+
+    def create_volume_with_profile(self, dataset_id, size, profile_name):
+        return self._write_through(
+            lambda: self._api.create_volume_with_profile(
+                dataset_id=dataset_id, size=size, profile_name=profile_name),
+            lambda volume, volumes: volumes + [volume],
+        )
+
+    def create_volumes(self, requests):
+        return self._write_through(
+            lambda: self._api.create_volumes(requests),
+            lambda created, volumes: _batch_written(
+                created, volumes + created),
+        )
+
+    def attach_volumes(self, attachments):
+        def update(attached, volumes):
+            by_id = {volume.blockdevice_id: volume for volume in attached
+                     if not isinstance(volume, Failure)}
+            return _batch_written(attached, [
+                by_id.get(volume.blockdevice_id, volume) for volume in volumes
+            ])
+        return self._write_through(
+            lambda: self._api.attach_volumes(attachments), update,
+        )
+
+    def describe_volumes(self, blockdevice_ids):
+        return self._api.describe_volumes(blockdevice_ids)
+
+    def destroy_volume(self, blockdevice_id):
+        return self._write_through(
+            lambda: self._api.destroy_volume(blockdevice_id),
+            lambda _, volumes: [
+                volume for volume in volumes
+                if volume.blockdevice_id != blockdevice_id
+            ],
+        )
+
+    def attach_volume(self, blockdevice_id, attach_to):
+        return self._write_through(
+            lambda: self._api.attach_volume(blockdevice_id, attach_to),
+            lambda attached, volumes: [
+                attached if volume.blockdevice_id == blockdevice_id
+                else volume for volume in volumes
+            ],
+        )
 
     def detach_volume(self, blockdevice_id):
         """
         Clear the cached device path, if it was cached.
         """
-        try:
-            del self._device_paths[blockdevice_id]
-        except KeyError:
-            pass
-        return self._api.detach_volume(blockdevice_id)
+        with self._lock:
+            self._generation += 1
+            self._device_paths.pop(blockdevice_id, None)
+        return self._write_through(
+            lambda: self._api.detach_volume(blockdevice_id),
+            lambda _, volumes: [
+                volume.set(attached_to=None)
+                if volume.blockdevice_id == blockdevice_id
+                else volume for volume in volumes
+            ],
+        )
@@ -41,8 +41,10 @@ from .blockdevice import (
 )
 from ._logging import (
     NOVA_CLIENT_EXCEPTION, KEYSTONE_HTTP_ERROR, COMPUTE_INSTANCE_ID_NOT_FOUND,
-    OPENSTACK_ACTION, CINDER_CREATE
+    OPENSTACK_ACTION, CINDER_CREATE, VIRTIO_BLK_DEVICE_NOT_FOUND,
 )
+from ._devicewatcher import BlockDeviceWatcher
+from ._volumewatcher import VolumeStateWatcher
 
 # The key name used for identifying the Flocker cluster_id in the metadata for
 # a volume.
@@ -58,6 +60,16 @@ CINDER_TIMEOUT = 600
 # The longest time we're willing to wait for a Cinder volume to be destroyed
 CINDER_VOLUME_DESTRUCTION_TIMEOUT = 300
 
+# The most volumes whose states are looked up one at a time while waiting for
+# them to change.  Listing every volume in the tenant costs more than a few
+# lookups, so it is only done once more volumes than this are being waited
+# for:
+MAXIMUM_VOLUME_GETS = 10
+
+# The longest time we're willing to wait for udev to create the device of an
+# attached virtio_blk volume.
+VIRTIO_BLK_DEVICE_TIME_LIMIT = 60
+
 
 def _openstack_logged_method(method_name, original_name):
     """
@@ -315,6 +327,23 @@ class VolumeStateMonitor:
         try:
             existing_volume = self.volume_manager.get(self.expected_volume.id)
         except CinderClientNotFound:
+            existing_volume = None
+        return self.check(existing_volume)
+
+    def check(self, existing_volume):
+        """
+        Test whether a description of the volume has the desired state.
+
+        Raise an exception if a non-valid state is reached or if the
+        desired state is not reached within the supplied time limit.
+
+        :param existing_volume: The latest ``Volume`` listed for the expected
+            volume, or ``None`` if it isn't listed.
+
+        :return: ``existing_volume`` if it has the desired state, otherwise
+            ``None``.
+        """
+        if existing_volume is None:
             elapsed_time = time.time() - self.start_time
             if elapsed_time > self.time_limit:
                 raise TimeoutException(
@@ -409,6 +438,50 @@ class CinderBlockDeviceAPI(object):
         if time_module is None:
             time_module = time
         self._time = time_module
+        self._watcher = VolumeStateWatcher(self._describe_volumes)
+        self._device_watcher = BlockDeviceWatcher(time_module=time_module)
+
+    def _describe_volumes(self, volume_ids):
+        """
+        Look up several Cinder volumes.
+
+        Up to ``MAXIMUM_VOLUME_GETS`` volumes are fetched one at a time,
+        while more are picked out of a single listing of all the volumes.
+
+        :param list volume_ids: The IDs of the volumes.
+
+        :return: ``list`` of the ``Volume`` of each of them that exists.
+        """
+        if len(volume_ids) <= MAXIMUM_VOLUME_GETS:
+            volumes = []
+            for volume_id in volume_ids:
+                try:
+                    volumes.append(self.cinder_volume_manager.get(volume_id))
+                except (CinderNotFound, CinderClientNotFound):
+                    pass
+            return volumes
+        wanted = set(volume_ids)
+        return [
+            volume for volume in self.cinder_volume_manager.list()
+            if volume.id in wanted
+        ]
+
+    def _wait_for_volume_state(self, expected_volume, desired_state,
+                               transient_states=()):
+        """
+        Wait for a volume to have ``desired_state``, like
+        ``wait_for_volume_state``, but along with any other volumes being
+        waited for.
+
+        :return: The listed ``Volume`` that matches ``expected_volume``.
+        """
+        monitor = VolumeStateMonitor(
+            self.cinder_volume_manager, expected_volume, desired_state,
+            transient_states)
+        return self._watcher.wait(self._watcher.watch(
+            expected_volume.id,
+            lambda volume, elapsed_time: monitor.check(volume),
+        ))
 
     def allocation_unit(self):
         """
@@ -476,8 +549,7 @@ class CinderBlockDeviceAPI(object):
         )
         Message.new(message_type=CINDER_CREATE,
                     blockdevice_id=requested_volume.id).write()
-        created_volume = wait_for_volume_state(
-            volume_manager=self.cinder_volume_manager,
+        created_volume = self._wait_for_volume_state(
             expected_volume=requested_volume,
             desired_state=u'available',
             transient_states=(u'creating',),
@@ -527,12 +599,12 @@ class CinderBlockDeviceAPI(object):
             # Have Nova assign a device file for us.
             device=None,
         )
-        attached_volume = wait_for_volume_state(
-            volume_manager=self.cinder_volume_manager,
+        attached_volume = self._wait_for_volume_state(
             expected_volume=nova_volume,
             desired_state=u'in-use',
             transient_states=(u'available', u'attaching',),
         )
+        self._wait_for_virtio_blk_device(attached_volume)
 
         attached_volume = unattached_volume.set('attached_to', attach_to)
 
@@ -555,8 +627,7 @@ class CinderBlockDeviceAPI(object):
             raise UnattachedVolume(blockdevice_id)
 
         # This'll blow up if the volume is deleted from elsewhere.  FLOC-1882.
-        wait_for_volume_state(
-            volume_manager=self.cinder_volume_manager,
+        self._wait_for_volume_state(
             expected_volume=cinder_volume,
             desired_state=u'available',
             transient_states=(u'in-use', u'detaching')
@@ -637,6 +708,41 @@ class CinderBlockDeviceAPI(object):
         else:
             raise UnattachedVolume(volume.id)
 
+    def _wait_for_virtio_blk_device(self, volume):
+        """
+        Wait for the device of a volume attached using the virtio_blk driver
+        to be ready, so that ``get_device_path`` can find it as soon as the
+        volume is attached.
+
+        The device is looked for whenever udev announces a change to a block
+        device.  If it doesn't appear within ``VIRTIO_BLK_DEVICE_TIME_LIMIT``
+        seconds that is logged, and ``get_device_path`` will report it as
+        unattached until it does.  The device paths of other drivers are
+        reported by the Cinder API, so aren't waited for.
+
+        :param volume: The Cinder ``Volume`` which is attached.
+        """
+        try:
+            device_path = self._get_device_path_api(volume)
+        except UnattachedVolume:
+            return
+        if not _is_virtio_blk(device_path):
+            return
+
+        def ready():
+            try:
+                return self._get_device_path_virtio_blk(volume)
+            except UnattachedVolume:
+                return None
+        started = self._time.time()
+        found = self._device_watcher.wait_for(
+            ready, VIRTIO_BLK_DEVICE_TIME_LIMIT)
+        if found is None:
+            VIRTIO_BLK_DEVICE_NOT_FOUND(
+                volume_id=unicode(volume.id),
+                elapsed_time=self._time.time() - started,
+            ).write()
+
     def _get_device_path_api(self, volume):
         """
         Return the device path reported by the Cinder API.
@@ -33,19 +33,22 @@ from zope.interface import implementer
 from twisted.python.constants import (
     Names, NamedConstant, Values, ValueConstant
 )
+from twisted.python.failure import Failure
 from twisted.python.filepath import FilePath
 
 from eliot import Message, register_exception_extractor
 
 from .blockdevice import (
-    IBlockDeviceAPI, IProfiledBlockDeviceAPI, BlockDeviceVolume, UnknownVolume,
-    AlreadyAttachedVolume, UnattachedVolume, UnknownInstanceID,
-    MandatoryProfiles, ICloudAPI,
+    IBlockDeviceAPI, IProfiledBlockDeviceAPI, IBatchBlockDeviceAPI,
+    BlockDeviceVolume, UnknownVolume, AlreadyAttachedVolume, UnattachedVolume,
+    UnknownInstanceID, MandatoryProfiles, ICloudAPI,
 )
 
 from flocker.common import poll_until
 
 from ..exceptions import StorageInitializationError
+from ._devicewatcher import BlockDeviceWatcher
+from ._volumewatcher import VolumeStateWatcher
 
 from ...control import pmap_field
 
@@ -67,6 +70,8 @@ CLUSTER_ID_LABEL = u'flocker-cluster-id'
 BOTO_NUM_RETRIES = 20
 VOLUME_STATE_CHANGE_TIMEOUT = 300
 MAX_ATTACH_RETRIES = 3
+# The most volume IDs to look up with one DescribeVolumes call:
+MAX_DESCRIBE_VOLUMES = 200
 
 # Minimum IOPS per second for a provisioned IOPS volume.
 IOPS_MIN_IOPS = 100
@@ -763,7 +768,8 @@ def _get_device_size(device):
     return int(size_file.getContent()) * 512
 
 
-def _wait_for_new_device(base, expected_size, time_limit=60):
+def _wait_for_new_device(base, expected_size, time_limit=60,
+                         watcher=None):
     """
     Helper function to wait for up to 60s for new
     EBS block device (`/dev/sd*` or `/dev/xvd*`) to
@@ -776,21 +782,27 @@ def _wait_for_new_device(base, expected_size, time_limit=60):
         manifest in the OS.
     :param int time_limit: Time, in seconds, to wait for
         new device to manifest. Defaults to 60s.
+    :param BlockDeviceWatcher watcher: Used to wait for the new device.
+        By default a new one is created.
 
     :returns: The path of the new block device file.
     :rtype: ``FilePath``
     """
-    start_time = time.time()
-    elapsed_time = time.time() - start_time
-    while elapsed_time < time_limit:
+    if watcher is None:
+        watcher = BlockDeviceWatcher()
+
+    def new_device():
         for device in list(set(FilePath(b"/sys/block").children()) -
                            set(base)):
             device_name = device.basename()
             if (device_name.startswith((b"sd", b"xvd")) and
                     _get_device_size(device_name) == expected_size):
                 return FilePath(b"/dev").child(device_name)
-        time.sleep(0.1)
-        elapsed_time = time.time() - start_time
+        return None
+
+    device_path = watcher.wait_for(new_device, time_limit)
+    if device_path is not None:
+        return device_path
 
     # If we failed to find a new device of expected size,
     # log sizes of all new devices on this compute instance,
@@ -836,7 +848,8 @@ def _is_cluster_volume(cluster_id, ebs_volume):
 
 
 def _attach_volume_and_wait_for_device(
-    volume, attach_to, attach_volume, detach_volume, device, blockdevices
+    volume, attach_to, attach_volume, detach_volume, device, blockdevices,
+    watcher=None,
 ):
     """
     Attempt to attach an EBS volume to an EC2 instance and wait for the
@@ -851,6 +864,7 @@ def _attach_volume_and_wait_for_device(
     :param list blockdevices: The OS device paths (as ``FilePath``) which are
         already present on the system before this operation is attempted
         (primarily useful to make testing easier).
+    :param BlockDeviceWatcher watcher: Used to wait for the OS device.
     :raise: Anything ``attach_volume`` can raise.  Or
         ``AttachedUnexpectedDevice`` if the volume appears to become attached
         to the wrong OS device file.
@@ -878,6 +892,7 @@ def _attach_volume_and_wait_for_device(
         device_path = _wait_for_new_device(
             base=blockdevices,
             expected_size=volume.size,
+            watcher=watcher,
         )
         # We do, however, expect the attached device name to follow
         # a certain simple pattern.  Verify that now and signal an
@@ -986,9 +1001,39 @@ def _select_free_device(existing):
     raise NoAvailableDevice()
 
 
+def _volume_state_check(operation, volume_id,
+                        timeout=VOLUME_STATE_CHANGE_TIMEOUT):
+    """
+    Create a check for ``VolumeStateWatcher.watch`` of whether a volume has
+    finished changing state, like ``_wait_for_volume_state_change`` waits
+    for.
+
+    :param NamedConstant operation: Operation triggering the volume state
+        change.  A value from ``VolumeOperations``.
+    :param unicode volume_id: The ID of the changing volume.
+    :param int timeout: Seconds to wait for the volume operation to succeed.
+
+    :return: Callable taking the latest ``boto3.resources.factory.ec2.Volume``
+        of the volume, or ``None`` if it wasn't found, and the time since the
+        operation began.  It returns that ``Volume`` once the volume has
+        reached the end state of ``operation``.
+    """
+    def check(volume, elapsed_time):
+        if volume is None:
+            raise UnknownVolume(volume_id)
+        # The watcher has already fetched the latest state:
+        if _reached_end_state(
+            operation, volume, lambda volume: None, elapsed_time, timeout
+        ):
+            return volume
+        return None
+    return check
+
+
 @implementer(IBlockDeviceAPI)
 @implementer(IProfiledBlockDeviceAPI)
 @implementer(ICloudAPI)
+@implementer(IBatchBlockDeviceAPI)
 class EBSBlockDeviceAPI(object):
     """
     An EBS implementation of ``IBlockDeviceAPI`` which creates
@@ -1006,6 +1051,8 @@ class EBSBlockDeviceAPI(object):
         self.zone = ec2_client.zone
         self.cluster_id = cluster_id
         self.lock = threading.Lock()
+        self._watcher = VolumeStateWatcher(self._describe_ebs_volumes)
+        self._device_watcher = BlockDeviceWatcher()
 
     def allocation_unit(self):
         """
@@ -1086,6 +1133,25 @@ class EBSBlockDeviceAPI(object):
             self.connection.volumes.page_size(page_size).pages()
         )))
 
+    @boto3_log
+    def _describe_ebs_volumes(self, volume_ids):
+        """
+        Look up several EBS volumes, with one DescribeVolumes call for every
+        ``MAX_DESCRIBE_VOLUMES`` of them.
+
+        :param list volume_ids: The ``unicode`` IDs of the volumes.
+
+        :return: A ``list`` of the ``Volume`` of each of the volumes that
+            exists.
+        """
+        volumes = []
+        for start in range(0, len(volume_ids), MAX_DESCRIBE_VOLUMES):
+            volumes.extend(self.connection.volumes.filter(Filters=[{
+                'Name': 'volume-id',
+                'Values': volume_ids[start:start + MAX_DESCRIBE_VOLUMES],
+            }]))
+        return volumes
+
     @boto3_log
     def _get_ebs_volume(self, blockdevice_id):
         """
@@ -1149,6 +1215,102 @@ class EBSBlockDeviceAPI(object):
         as volume tag data.
         Open issues: https://clusterhq.atlassian.net/browse/FLOC-1792
         """
+        requested_volume = self._create_tagged_ebs_volume(
+            dataset_id, size, profile_name)
+
+        # Wait for created volume to reach 'available' state.
+        created_volume = self._wait_for_volume(
+            VolumeOperations.CREATE, requested_volume)
+
+        # Return created volume in BlockDeviceVolume format.
+        return _blockdevicevolume_from_ebs_volume(created_volume)
+
+    def create_volumes(self, requests):
+        """
+        Create volumes on EBS like ``create_volume_with_profile``, waiting for
+        all of them to become available together.
+        """
+        created = []
+        for dataset_id, size, profile_name in requests:
+            if profile_name is None:
+                profile_name = MandatoryProfiles.DEFAULT.value
+            try:
+                created.append(self._create_tagged_ebs_volume(
+                    dataset_id, size, profile_name))
+            except Exception:
+                created.append(Failure())
+        return self._wait_for_volumes(VolumeOperations.CREATE, created)
+
+    def _wait_for_volume(self, operation, ebs_volume):
+        """
+        Wait for the state of a volume to change, along with any other volumes
+        being waited for.
+
+        :param NamedConstant operation: Operation triggering the volume state
+            change.  A value from ``VolumeOperations``.
+        :param ebs_volume: The ``Volume`` of the changing volume.
+
+        :raises Exception: When the volume fails to reach the expected state
+            for ``operation``.
+        :return: The ``Volume`` with the state of the volume once it has
+            changed.
+        """
+        return self._watcher.wait(self._watcher.watch(
+            ebs_volume.id, _volume_state_check(operation, ebs_volume.id)))
+
+    def _wait_for_volumes(self, operation, ebs_volumes):
+        """
+        Wait for the state of several volumes to change together.
+
+        :param NamedConstant operation: Operation triggering the volume state
+            changes.  A value from ``VolumeOperations``.
+        :param ebs_volumes: ``list`` of the ``Volume`` of each changing
+            volume, or a ``Failure`` if the operation has already failed.
+
+        :return: ``list`` of the ``BlockDeviceVolume`` of each volume once its
+            state has changed, or a ``Failure``.
+        """
+        waits = [
+            ebs_volume if isinstance(ebs_volume, Failure)
+            else self._watcher.watch(
+                ebs_volume.id, _volume_state_check(operation, ebs_volume.id))
+            for ebs_volume in ebs_volumes
+        ]
+        results = []
+        for wait in waits:
+            if not isinstance(wait, Failure):
+                try:
+                    wait = _blockdevicevolume_from_ebs_volume(
+                        self._watcher.wait(wait))
+                except Exception:
+                    wait = Failure()
+            results.append(wait)
+        return results
+
+    def describe_volumes(self, blockdevice_ids):
+        """
+        Return the volumes that belong to this Flocker cluster among the given
+        ones, looking them up together.
+        """
+        return [
+            _blockdevicevolume_from_ebs_volume(ebs_volume)
+            for ebs_volume in self._describe_ebs_volumes(list(blockdevice_ids))
+            if _is_cluster_volume(self.cluster_id, ebs_volume)
+        ]
+
+    def _create_tagged_ebs_volume(self, dataset_id, size, profile_name):
+        """
+        Create a volume on EBS and tag it with Flocker-specific metadata,
+        without waiting for it to become available.
+
+        :param UUID dataset_id: The Flocker dataset ID of the dataset on the
+            volume.
+        :param int size: The size of the new volume in bytes.
+        :param unicode profile_name: The name of the storage profile for the
+            volume.
+
+        :return: The ``Volume`` representation of the created volume.
+        """
         requested_size = int(Byte(size).to_GiB().value)
         try:
             volume_type, iops = _volume_type_and_iops_for_profile_name(
@@ -1205,13 +1367,7 @@ class EBSBlockDeviceAPI(object):
             requested_volume=requested_volume.id,
             tags=metadata
         ).write()
-
-        # Wait for created volume to reach 'available' state.
-        _wait_for_volume_state_change(VolumeOperations.CREATE,
-                                      requested_volume)
-
-        # Return created volume in BlockDeviceVolume format.
-        return _blockdevicevolume_from_ebs_volume(requested_volume)
+        return requested_volume
 
     def list_volumes(self):
         """
@@ -1264,6 +1420,42 @@ class EBSBlockDeviceAPI(object):
             device assignment rules, or some other bug in this implementation.
         :raises NoAvailableDevice: If there are no available device names.
         """
+        _, attached_volume = self._attach_to_device(blockdevice_id, attach_to)
+        return attached_volume
+
+    def attach_volumes(self, attachments):
+        """
+        Attach EBS volumes to compute instances like ``attach_volume``, one
+        after another since each must be matched to the new OS device that
+        appears, then wait for EBS to report all of them attached together.
+        """
+        attached = []
+        for blockdevice_id, attach_to in attachments:
+            try:
+                ebs_volume, _ = self._attach_to_device(
+                    blockdevice_id, attach_to, wait=False)
+            except Exception:
+                attached.append(Failure())
+            else:
+                attached.append(ebs_volume)
+        return self._wait_for_volumes(VolumeOperations.ATTACH, attached)
+
+    def _attach_to_device(self, blockdevice_id, attach_to, wait=True):
+        """
+        Attach an EBS volume to given compute instance and wait for the
+        corresponding OS device to become available.
+
+        :param unicode blockdevice_id: EBS UUID for volume to be attached.
+        :param unicode attach_to: Instance id of AWS Compute instance to
+            attached the blockdevice to.
+        :param bool wait: Whether to also wait for EBS to report the volume
+            attached.
+
+        :raises: As ``attach_volume``.
+
+        :return: 2-tuple of the ``Volume`` and the attached
+            ``BlockDeviceVolume``.
+        """
         ebs_volume = self._get_ebs_volume(blockdevice_id)
         volume = _blockdevicevolume_from_ebs_volume(ebs_volume)
         if (volume.attached_to is not None or
@@ -1285,13 +1477,15 @@ class EBSBlockDeviceAPI(object):
                     self._attach_ebs_volume,
                     self._detach_ebs_volume,
                     device, blockdevices,
+                    watcher=self._device_watcher,
                 )
                 if attached:
-                    _wait_for_volume_state_change(
-                        VolumeOperations.ATTACH, ebs_volume,
-                    )
+                    if wait:
+                        ebs_volume = self._wait_for_volume(
+                            VolumeOperations.ATTACH, ebs_volume,
+                        )
                     attached_volume = volume.set('attached_to', attach_to)
-                    return attached_volume
+                    return ebs_volume, attached_volume
 
         raise AttachFailed(volume.blockdevice_id, attach_to, device)
 
@@ -1338,7 +1532,7 @@ class EBSBlockDeviceAPI(object):
 
         self._detach_ebs_volume(blockdevice_id)
 
-        _wait_for_volume_state_change(VolumeOperations.DETACH, ebs_volume)
+        self._wait_for_volume(VolumeOperations.DETACH, ebs_volume)
 
     @boto3_log
     def destroy_volume(self, blockdevice_id):
@@ -1362,8 +1556,7 @@ class EBSBlockDeviceAPI(object):
                 ebs_volume, ebs_volume.state, ['available'])
         if destroy_result:
             try:
-                _wait_for_volume_state_change(VolumeOperations.DESTROY,
-                                              ebs_volume)
+                self._wait_for_volume(VolumeOperations.DESTROY, ebs_volume)
             except UnknownVolume:
                 return
         else:
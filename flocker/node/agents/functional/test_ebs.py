@@ -36,6 +36,7 @@ from .._logging import (
 )
 from ..testtools import (
     make_iblockdeviceapi_tests,
+    make_ibatchblockdeviceapi_tests,
     make_icloudapi_tests,
     make_iprofiledblockdeviceapi_tests,
 )
@@ -424,6 +425,18 @@ class EBSProfiledBlockDeviceAPIInterfaceTests(
     pass
 
 
+class EBSBatchBlockDeviceAPIInterfaceTests(
+        make_ibatchblockdeviceapi_tests(
+            batch_blockdevice_api_factory=ebsblockdeviceapi_for_test,
+            dataset_size=GiB(4).to_Byte().value,
+            unknown_blockdevice_id_factory=lambda test: u"vol-00000000",
+        )
+):
+    """
+    Interface adherence tests for ``IBatchBlockDeviceAPI``.
+    """
+
+
 class VolumeStub(object):
     """
     Stub object to represent properties found on the immutable
@@ -36,7 +36,9 @@ from testtools.matchers import Equals
 from testtools.deferredruntest import SynchronousDeferredRunTest
 
 from twisted.internet import reactor
-from twisted.internet.defer import succeed
+from twisted.internet.defer import Deferred, fail, succeed
+from twisted.internet.task import Clock
+from twisted.python.failure import Failure
 from twisted.python.runtime import platform
 from twisted.python.filepath import FilePath
 
@@ -59,7 +61,7 @@ from ..blockdevice import (
     CreateBlockDeviceDataset, UnattachedVolume, DatasetExists,
     UnmountBlockDevice, DetachVolume, AttachVolume,
     CreateFilesystem, DestroyVolume, MountBlockDevice,
-    RegisterVolume,
+    RegisterVolume, CreateBlockDeviceDatasets, AttachVolumes,
 
     DATASET_TRANSITIONS, IDatasetStateChangeFactory,
     ICalculator, NOTHING_TO_DO,
@@ -82,7 +84,7 @@ from ..blockdevice import (
     ProcessLifetimeCache,
     FilesystemExists,
     UnknownInstanceID,
-    log_list_volumes, CALL_LIST_VOLUMES,
+    log_list_volumes, CALL_LIST_VOLUMES, get_blockdevice_volume,
 )
 
 from ..loopback import (
@@ -105,7 +107,7 @@ from ...testtools import (
 )
 from ....testtools import (
     REALISTIC_BLOCKDEVICE_SIZE, run_process, make_with_init_tests, random_name,
-    TestCase,
+    TestCase, CustomException,
 )
 from ....control import (
     Dataset, Manifestation, Node, NodeState, Deployment, DeploymentState,
@@ -120,6 +122,7 @@ from ....common.test.test_thread import NonThreadPool, NonReactor
 from ....common import RACKSPACE_MINIMUM_VOLUME_SIZE
 
 from ..testtools import (
+    FakeBatchAPI,
     FakeCloudAPI,
     detach_destroy_volumes,
     fakeprofiledloopbackblockdeviceapi_for_test,
@@ -128,6 +131,7 @@ from ..testtools import (
     # Backend driver docs used to instruct developers to import this from here.
     make_iblockdeviceapi_tests,
     make_iprofiledblockdeviceapi_tests,
+    make_ibatchblockdeviceapi_tests,
     make_icloudapi_tests,
     mountroot_for_test,
     umount,
@@ -139,6 +143,8 @@ EMPTY_NODE_STATE = NodeState(uuid=uuid4(), hostname=u"example.com")
 
 ARBITRARY_BLOCKDEVICE_ID = u'blockdevice_id_1'
 ARBITRARY_BLOCKDEVICE_ID_2 = u'blockdevice_id_2'
+ARBITRARY_DATASET_ID = UUID(u'c5ba7e5f-a9d6-4b9d-a5c3-4e95f7c6f0a1')
+ARBITRARY_DATASET_ID_2 = UUID(u'5f4e0c2a-8f15-4d0f-9d6c-1b7b1f2f6e3c')
 
 # Eliot is transitioning away from the "Logger instances all over the place"
 # approach. So just use this global logger for now.
@@ -312,7 +318,7 @@ def mount(device, mountpoint):
 
 def create_blockdevicedeployer(
     test_case, hostname=u"192.0.2.1", node_uuid=uuid4(),
-    eventually_consistent=False,
+    eventually_consistent=False, batch=False,
 ):
     """
     Create a new ``BlockDeviceDeployer``.
@@ -322,20 +328,22 @@ def create_blockdevicedeployer(
         deployer.
     :param bool eventually_consistent: The ``IBlockDeviceAPI``
         should only be eventually consistent.
+    :param bool batch: The ``IBlockDeviceAPI`` should also provide
+        ``IBatchBlockDeviceAPI``.
 
     :return: The newly created ``BlockDeviceDeployer``.
     """
     api = loopbackblockdeviceapi_for_test(test_case)
     if eventually_consistent:
         api = EventuallyConsistentBlockDeviceAPI(api)
-    async_api = _SyncToThreadedAsyncAPIAdapter(
-        _sync=api, _reactor=NonReactor(), _threadpool=NonThreadPool(),
-    )
+    if batch:
+        api = FakeBatchAPI(api)
     return BlockDeviceDeployer(
         hostname=hostname,
         node_uuid=node_uuid,
         block_device_api=api,
-        _async_block_device_api=async_api,
+        _reactor=NonReactor(),
+        _threadpool=NonThreadPool(),
         mountroot=mountroot_for_test(test_case),
     )
 
@@ -655,6 +663,8 @@ class BlockDeviceDeployerDiscoverRawStateTests(TestCase):
             node_uuid=self.expected_uuid,
             hostname=self.expected_hostname,
             block_device_api=self.api,
+            _reactor=NonReactor(),
+            _threadpool=NonThreadPool(),
             mountroot=mountroot_for_test(self),
         )
 
@@ -663,7 +673,7 @@ class BlockDeviceDeployerDiscoverRawStateTests(TestCase):
         ``BlockDeviceDeployer._discover_raw_state`` returns a ``RawState``
         with the ``compute_instance_id`` that the ``api`` reports.
         """
-        raw_state = self.deployer._discover_raw_state()
+        raw_state = self.successResultOf(self.deployer._discover_raw_state())
         self.assertEqual(
             raw_state.compute_instance_id,
             self.api.compute_instance_id(),
@@ -675,7 +685,7 @@ class BlockDeviceDeployerDiscoverRawStateTests(TestCase):
         ``RawState`` with empty ``volumes`` if the ``api`` reports
         no attached volumes.
         """
-        raw_state = self.deployer._discover_raw_state()
+        raw_state = self.successResultOf(self.deployer._discover_raw_state())
         self.assertEqual(raw_state.volumes, [])
 
     def test_unattached_unmounted_device(self):
@@ -687,7 +697,7 @@ class BlockDeviceDeployerDiscoverRawStateTests(TestCase):
             dataset_id=uuid4(),
             size=LOOPBACK_MINIMUM_ALLOCATABLE_SIZE,
         )
-        raw_state = self.deployer._discover_raw_state()
+        raw_state = self.successResultOf(self.deployer._discover_raw_state())
         self.assertEqual(raw_state.volumes, [
             unmounted,
         ])
@@ -712,8 +722,8 @@ class BlockDeviceDeployerDiscoverRawStateTests(TestCase):
         without_fs = self.api.attach_volume(without_fs.blockdevice_id,
                                             self.api.compute_instance_id())
         without_fs_device = self.api.get_device_path(without_fs.blockdevice_id)
-        devices_with_filesystems = self.deployer._discover_raw_state(
-            ).devices_with_filesystems
+        devices_with_filesystems = self.successResultOf(
+            self.deployer._discover_raw_state()).devices_with_filesystems
 
         self.assertEqual(
             dict(
@@ -725,6 +735,79 @@ class BlockDeviceDeployerDiscoverRawStateTests(TestCase):
                 with_fs=True,
                 without_fs=False))
 
+    def test_concurrent_probes(self):
+        """
+        ``BlockDeviceDeployer._discover_raw_state`` makes the probes that
+        don't depend on one another in the thread pool at the same time, and
+        probes the devices of the volumes attached to this node once the
+        volumes are known.
+        """
+        volume = self.api.create_volume(
+            dataset_id=uuid4(),
+            size=LOOPBACK_MINIMUM_ALLOCATABLE_SIZE,
+        )
+        self.api.attach_volume(volume.blockdevice_id, self.this_node)
+        threadpool = PendingThreadPool()
+        deployer = self.deployer.set(_threadpool=threadpool)
+
+        discovering = deployer._discover_raw_state()
+        pending = []
+        while threadpool.calls:
+            pending.append(len(threadpool.calls))
+            threadpool.run_all()
+
+        self.assertEqual(
+            (pending, self.successResultOf(discovering).devices.keys()),
+            ([3, 1, 1], [volume.dataset_id]),
+        )
+
+    @capture_logging(None)
+    def test_probe_seconds(self, logger):
+        """
+        The time taken by each probe is logged along with the ``RawState``.
+        """
+        volume = self.api.create_volume(
+            dataset_id=uuid4(),
+            size=LOOPBACK_MINIMUM_ALLOCATABLE_SIZE,
+        )
+        self.api.attach_volume(volume.blockdevice_id, self.this_node)
+        self.successResultOf(self.deployer._discover_raw_state())
+
+        [message] = LoggedMessage.of_type(
+            logger.messages, DISCOVERED_RAW_STATE)
+        self.assertEqual(
+            set(message.message["probe_seconds"]),
+            {u"compute_instance_id", u"list_volumes", u"get_mounts",
+             u"get_device_path", u"has_filesystem"},
+        )
+
+
+class PendingThreadPool(object):
+    """
+    A stand-in for ``twisted.python.threadpool.ThreadPool`` which only runs
+    the functions given to it when told to.
+
+    :ivar list calls: The calls which have not been run yet.
+    """
+    def __init__(self):
+        self.calls = []
+
+    def callInThreadWithCallback(self, onResult, func, *args, **kw):
+        self.calls.append((onResult, func, args, kw))
+
+    def run_all(self):
+        """
+        Run all of the pending calls, leaving any calls they lead to pending.
+        """
+        calls, self.calls = self.calls, []
+        for onResult, func, args, kw in calls:
+            try:
+                result = func(*args, **kw)
+            except:
+                onResult(False, Failure())
+            else:
+                onResult(True, result)
+
 
 class BlockDeviceDeployerDiscoverStateTests(TestCase):
     """
@@ -740,6 +823,8 @@ class BlockDeviceDeployerDiscoverStateTests(TestCase):
             node_uuid=self.expected_uuid,
             hostname=self.expected_hostname,
             block_device_api=self.api,
+            _reactor=NonReactor(),
+            _threadpool=NonThreadPool(),
             mountroot=mountroot_for_test(self),
         )
 
@@ -1514,6 +1599,38 @@ class BlockDeviceCalculatorTests(TestCase):
             self.fail("Did not converge to next state after %d iterations." %
                       e.iteration_count)
 
+    @given(dataset_count=integers(min_value=2, max_value=4))
+    def test_batched_transitions(self, dataset_count):
+        """
+        ``BlockDeviceCalculator`` creates and attaches the volumes of several
+        datasets in batches, using ``IBatchBlockDeviceAPI`` if the deployer's
+        API provides it.
+        """
+        self.deployer = create_blockdevicedeployer(self, batch=True)
+        self.persistent_state = InMemoryStatePersister()
+        desired_datasets = []
+        for _ in range(dataset_count):
+            dataset_id = uuid4()
+            desired_datasets.append(DesiredDataset(
+                state=DatasetStates.MOUNTED,
+                dataset_id=dataset_id,
+                maximum_size=LOOPBACK_MINIMUM_ALLOCATABLE_SIZE,
+                mount_point=self.deployer._mountpath_for_dataset_id(
+                    unicode(dataset_id)),
+            ))
+
+        try:
+            self.run_to_convergence(desired_datasets)
+        except DidNotConverge as e:
+            self.fail("Did not converge after %d iterations." %
+                      e.iteration_count)
+
+        self.assertEqual(
+            [(name, len(requests))
+             for (name, requests) in self.deployer.block_device_api.batches],
+            [("create_volumes", dataset_count),
+             ("attach_volumes", dataset_count)])
+
 
 class TranistionTests(TestCase):
     """
@@ -4637,6 +4754,241 @@ class AttachVolumeTests(
         )
 
 
+class _ListingAsyncAPI(object):
+    """
+    An ``IBlockDeviceAsyncAPI`` provider whose ``list_volumes`` returns a
+    given ``Deferred``, and which otherwise delegates to another.
+    """
+    def __init__(self, async_api, listing):
+        self._async_api = async_api
+        self._listing = listing
+
+    def list_volumes(self):
+        return self._listing
+
+    def __getattr__(self, name):
+        return getattr(self._async_api, name)
+
+
+class CreateBlockDeviceDatasetsTests(
+    make_istatechange_tests(
+        CreateBlockDeviceDatasets,
+        dict(changes=[CreateBlockDeviceDataset(
+            dataset_id=ARBITRARY_DATASET_ID,
+            maximum_size=LOOPBACK_MINIMUM_ALLOCATABLE_SIZE,
+        )]),
+        dict(changes=[CreateBlockDeviceDataset(
+            dataset_id=ARBITRARY_DATASET_ID_2,
+            maximum_size=LOOPBACK_MINIMUM_ALLOCATABLE_SIZE,
+        )]),
+    )
+):
+    """
+    Tests for ``CreateBlockDeviceDatasets``.
+    """
+    def create(self, deployer, dataset_ids):
+        """
+        Run ``CreateBlockDeviceDatasets`` with a change creating each of the
+        given datasets.
+
+        :return: The ``Deferred`` result of running the change.
+        """
+        change = CreateBlockDeviceDatasets(changes=[
+            CreateBlockDeviceDataset(
+                dataset_id=dataset_id,
+                maximum_size=LOOPBACK_MINIMUM_ALLOCATABLE_SIZE,
+            ) for dataset_id in dataset_ids
+        ])
+        return run_state_change(change, deployer, InMemoryStatePersister())
+
+    def test_unbatched(self):
+        """
+        If the deployer's API doesn't provide ``IBatchBlockDeviceAPI``, each of
+        the volumes is created individually.
+        """
+        deployer = create_blockdevicedeployer(self)
+        dataset_ids = {uuid4(), uuid4()}
+        self.successResultOf(self.create(deployer, dataset_ids))
+        self.assertEqual(
+            {volume.dataset_id
+             for volume in deployer.block_device_api.list_volumes()},
+            dataset_ids)
+
+    @capture_logging(None)
+    def test_batched(self, logger):
+        """
+        If the deployer's API provides ``IBatchBlockDeviceAPI``, the volumes
+        are all created with one call, and each is logged in an action of its
+        own.
+        """
+        self.patch(blockdevice, "_logger", logger)
+        deployer = create_blockdevicedeployer(self, batch=True)
+        api = deployer.block_device_api
+        dataset_ids = {uuid4(), uuid4()}
+        self.successResultOf(self.create(deployer, dataset_ids))
+
+        self.assertEqual(
+            ({volume.dataset_id for volume in api.list_volumes()},
+             [name for (name, _) in api.batches],
+             {action.start_message["dataset_id"]
+              for action in LoggedAction.of_type(
+                  logger.messages, CREATE_BLOCK_DEVICE_DATASET)
+              if action.succeeded}),
+            (dataset_ids, ["create_volumes"],
+             dataset_ids))
+
+    def listing_deployer(self, listing):
+        """
+        :param Deferred listing: The result of listing the volumes.
+
+        :return: A ``BlockDeviceDeployer`` with an ``IBatchBlockDeviceAPI``,
+            whose asynchronous API lists the volumes with ``listing``.
+        """
+        deployer = create_blockdevicedeployer(self, batch=True)
+        return deployer.set(_async_block_device_api=_ListingAsyncAPI(
+            deployer.async_block_device_api, listing))
+
+    def test_lists_asynchronously(self):
+        """
+        The volumes are listed with the deployer's asynchronous API, and only
+        created once they have been listed.
+        """
+        listing = Deferred()
+        deployer = self.listing_deployer(listing)
+        dataset_id = uuid4()
+        creating = self.create(deployer, [dataset_id])
+        batches = list(deployer.block_device_api.batches)
+        listing.callback([])
+        self.successResultOf(creating)
+        self.assertEqual(
+            (batches, [name for (name, _)
+                       in deployer.block_device_api.batches]),
+            ([], ["create_volumes"]))
+
+    @capture_logging(None)
+    def test_listing_fails(self, logger):
+        """
+        If listing the volumes fails, ``CreateBlockDeviceDatasets.run`` fails
+        with the same exception, and the action of each change fails.
+        """
+        self.patch(blockdevice, "_logger", logger)
+        deployer = self.listing_deployer(fail(CustomException()))
+        self.failureResultOf(
+            self.create(deployer, [uuid4(), uuid4()]), CustomException)
+        self.assertEqual(
+            ([action.succeeded for action in LoggedAction.of_type(
+                logger.messages, CREATE_BLOCK_DEVICE_DATASET)],
+             deployer.block_device_api.batches),
+            ([False, False], []))
+
+    def test_exists(self):
+        """
+        ``CreateBlockDeviceDatasets.run`` fails with ``DatasetExists`` if
+        there is already a volume for one of the datasets, but still creates
+        the others.
+        """
+        deployer = create_blockdevicedeployer(self, batch=True)
+        api = deployer.block_device_api
+        existing = api.create_volume(
+            dataset_id=uuid4(), size=LOOPBACK_MINIMUM_ALLOCATABLE_SIZE,
+        )
+        dataset_id = uuid4()
+        failure = self.failureResultOf(
+            self.create(deployer, [existing.dataset_id, dataset_id]),
+            DatasetExists)
+        self.assertEqual(
+            (failure.value.blockdevice, api.batches[0][1],
+             {volume.dataset_id for volume in api.list_volumes()}),
+            (existing,
+             [(dataset_id, LOOPBACK_MINIMUM_ALLOCATABLE_SIZE, None)],
+             {existing.dataset_id, dataset_id}))
+
+
+class AttachVolumesTests(
+    make_istatechange_tests(
+        AttachVolumes,
+        dict(changes=[AttachVolume(
+            dataset_id=ARBITRARY_DATASET_ID,
+            blockdevice_id=ARBITRARY_BLOCKDEVICE_ID,
+        )]),
+        dict(changes=[AttachVolume(
+            dataset_id=ARBITRARY_DATASET_ID,
+            blockdevice_id=ARBITRARY_BLOCKDEVICE_ID_2,
+        )]),
+    )
+):
+    """
+    Tests for ``AttachVolumes``.
+    """
+    def attach(self, deployer, volumes):
+        """
+        Run ``AttachVolumes`` with a change attaching each of the given
+        volumes.
+
+        :return: The ``Deferred`` result of running the change.
+        """
+        change = AttachVolumes(changes=[
+            AttachVolume(dataset_id=volume.dataset_id,
+                         blockdevice_id=volume.blockdevice_id)
+            for volume in volumes
+        ])
+        return run_state_change(change, deployer, InMemoryStatePersister())
+
+    def create_volumes(self, api, count):
+        """
+        :return: ``list`` of ``count`` new volumes.
+        """
+        return [
+            api.create_volume(
+                dataset_id=uuid4(), size=LOOPBACK_MINIMUM_ALLOCATABLE_SIZE)
+            for _ in range(count)
+        ]
+
+    def test_unbatched(self):
+        """
+        If the deployer's API doesn't provide ``IBatchBlockDeviceAPI``, each of
+        the volumes is attached individually.
+        """
+        deployer = create_blockdevicedeployer(self)
+        api = deployer.block_device_api
+        volumes = self.create_volumes(api, 2)
+        self.successResultOf(self.attach(deployer, volumes))
+        self.assertEqual(
+            {volume.attached_to for volume in api.list_volumes()},
+            {api.compute_instance_id()})
+
+    def test_batched(self):
+        """
+        If the deployer's API provides ``IBatchBlockDeviceAPI``, the volumes
+        are all attached to this node with one call.
+        """
+        deployer = create_blockdevicedeployer(self, batch=True)
+        api = deployer.block_device_api
+        volumes = self.create_volumes(api, 2)
+        self.successResultOf(self.attach(deployer, volumes))
+        this_node = api.compute_instance_id()
+        self.assertEqual(
+            (set(api.list_volumes()), [name for (name, _) in api.batches]),
+            ({volume.set(attached_to=this_node) for volume in volumes},
+             ["attach_volumes"]))
+
+    def test_missing(self):
+        """
+        If one of the volumes can't be attached, ``AttachVolumes.run`` fails
+        but the others are still attached.
+        """
+        deployer = create_blockdevicedeployer(self, batch=True)
+        api = deployer.block_device_api
+        [volume] = self.create_volumes(api, 1)
+        missing = volume.set(blockdevice_id=u"incorrect_blockdevice_id",
+                             dataset_id=uuid4())
+        self.failureResultOf(
+            self.attach(deployer, [volume, missing]), UnknownVolume)
+        self.assertEqual(
+            api.list_volumes(),
+            [volume.set(attached_to=api.compute_instance_id())])
+
+
 class AllocatedSizeTypeTests(TestCase):
     """
     Tests for type coercion of parameters supplied to
@@ -4795,6 +5147,34 @@ class CountingProxy(object):
         return counting_proxy
 
 
+class FakeBatchAPIIBatchBlockDeviceAPITests(
+        make_ibatchblockdeviceapi_tests(
+            batch_blockdevice_api_factory=lambda test_case: FakeBatchAPI(
+                loopbackblockdeviceapi_for_test(test_case)),
+            dataset_size=LOOPBACK_MINIMUM_ALLOCATABLE_SIZE,
+            unknown_blockdevice_id_factory=lambda test: unicode(uuid4()),
+        )
+):
+    """
+    ``IBatchBlockDeviceAPI`` interface adherence tests for ``FakeBatchAPI``.
+    """
+
+
+class ProcessLifetimeCacheIBatchBlockDeviceAPITests(
+        make_ibatchblockdeviceapi_tests(
+            batch_blockdevice_api_factory=lambda test_case: (
+                ProcessLifetimeCache(FakeBatchAPI(
+                    loopbackblockdeviceapi_for_test(test_case)))),
+            dataset_size=LOOPBACK_MINIMUM_ALLOCATABLE_SIZE,
+            unknown_blockdevice_id_factory=lambda test: unicode(uuid4()),
+        )
+):
+    """
+    ``IBatchBlockDeviceAPI`` interface adherence tests for
+    ``ProcessLifetimeCache``.
+    """
+
+
 class ProcessLifetimeCacheTests(TestCase):
     """
     Tests for the caching logic in ``ProcessLifetimeCache``.
@@ -4803,7 +5183,11 @@ class ProcessLifetimeCacheTests(TestCase):
         super(ProcessLifetimeCacheTests, self).setUp()
         self.api = loopbackblockdeviceapi_for_test(self)
         self.counting_proxy = CountingProxy(self.api)
-        self.cache = ProcessLifetimeCache(self.counting_proxy)
+        self.clock = Clock()
+        self.cache = ProcessLifetimeCache(
+            self.counting_proxy, volumes_ttl=timedelta(seconds=5),
+            clock=self.clock,
+        )
 
     def test_compute_instance_id(self):
         """
@@ -4867,6 +5251,155 @@ class ProcessLifetimeCacheTests(TestCase):
         self.assertRaises(UnattachedVolume,
                           self.cache.get_device_path, attached_id1)
 
+    def test_get_device_path_raced_with_detach(self):
+        """
+        A device path looked up while the volume is being detached is not
+        cached.
+        """
+        attached_id1, _ = self.attached_volumes()
+        get_device_path = self.api.get_device_path
+
+        def detaching(blockdevice_id):
+            path = get_device_path(blockdevice_id)
+            # The detach looks up the device path too:
+            self.patch(self.api, "get_device_path", get_device_path)
+            self.cache.detach_volume(blockdevice_id)
+            return path
+        self.patch(self.api, "get_device_path", detaching)
+        self.cache.get_device_path(attached_id1)
+
+        self.assertRaises(UnattachedVolume,
+                          self.cache.get_device_path, attached_id1)
+
+    def test_list_volumes_cached(self):
+        """
+        The result of ``list_volumes`` is cached for the TTL, and volumes are
+        looked up in it.
+        """
+        volume = self.api.create_volume(
+            dataset_id=uuid4(), size=LOOPBACK_MINIMUM_ALLOCATABLE_SIZE,
+        )
+        listed = self.cache.list_volumes()
+        self.clock.advance(4)
+        self.assertEqual(
+            (self.cache.list_volumes(),
+             get_blockdevice_volume(self.cache, volume.blockdevice_id),
+             self.counting_proxy.num_calls("list_volumes")),
+            (listed, volume, 1))
+
+    def test_list_volumes_expires(self):
+        """
+        ``list_volumes`` lists the volumes again once the TTL has passed.
+        """
+        self.cache.list_volumes()
+        self.clock.advance(5)
+        volume = self.api.create_volume(
+            dataset_id=uuid4(), size=LOOPBACK_MINIMUM_ALLOCATABLE_SIZE,
+        )
+        self.assertEqual(
+            (self.cache.list_volumes(),
+             self.counting_proxy.num_calls("list_volumes")),
+            ([volume], 2))
+
+    def test_write_through(self):
+        """
+        Volumes created, attached, detached and destroyed through the cache
+        are reflected by ``list_volumes`` without listing them again.
+        """
+        self.cache.list_volumes()
+        this_node = self.cache.compute_instance_id()
+        volume = self.cache.create_volume(
+            dataset_id=uuid4(), size=LOOPBACK_MINIMUM_ALLOCATABLE_SIZE,
+        )
+        other = self.cache.create_volume(
+            dataset_id=uuid4(), size=LOOPBACK_MINIMUM_ALLOCATABLE_SIZE,
+        )
+        listings = [self.cache.list_volumes()]
+        self.cache.attach_volume(volume.blockdevice_id, this_node)
+        listings.append(self.cache.list_volumes())
+        self.cache.detach_volume(volume.blockdevice_id)
+        listings.append(self.cache.list_volumes())
+        self.cache.destroy_volume(other.blockdevice_id)
+        listings.append(self.cache.list_volumes())
+
+        self.assertEqual(
+            (listings, self.counting_proxy.num_calls("list_volumes")),
+            ([[volume, other], [volume.set(attached_to=this_node), other],
+              [volume, other], [volume]], 1))
+
+    def test_failure_discards(self):
+        """
+        If a change made through the cache fails, the volumes are listed
+        again.
+        """
+        self.cache.list_volumes()
+        self.assertRaises(
+            UnknownVolume, self.cache.destroy_volume, unicode(uuid4()))
+        self.cache.list_volumes()
+        self.assertEqual(self.counting_proxy.num_calls("list_volumes"), 2)
+
+    def test_profiled(self):
+        """
+        The cache provides ``IProfiledBlockDeviceAPI`` if the wrapped API
+        does, and volumes created with a profile are written through.
+        """
+        cache = ProcessLifetimeCache(
+            fakeprofiledloopbackblockdeviceapi_for_test(self),
+            clock=self.clock,
+        )
+        cache.list_volumes()
+        volume = cache.create_volume_with_profile(
+            dataset_id=uuid4(), size=LOOPBACK_MINIMUM_ALLOCATABLE_SIZE,
+            profile_name=u"gold",
+        )
+        self.assertEqual(
+            (IProfiledBlockDeviceAPI.providedBy(cache),
+             IProfiledBlockDeviceAPI.providedBy(self.cache),
+             cache.list_volumes()),
+            (True, False, [volume]))
+
+    def test_batch_write_through(self):
+        """
+        Volumes created and attached through ``IBatchBlockDeviceAPI`` are
+        written through to the cached volumes, unless any of the requests
+        fail.
+        """
+        cache = ProcessLifetimeCache(
+            CountingProxy(FakeBatchAPI(self.api)), clock=self.clock)
+        cache.list_volumes()
+        this_node = cache.compute_instance_id()
+        created = cache.create_volumes((
+            (uuid4(), LOOPBACK_MINIMUM_ALLOCATABLE_SIZE, None),))
+        listings = [cache.list_volumes()]
+        attached = cache.attach_volumes(
+            ((created[0].blockdevice_id, this_node),))
+        listings.append(cache.list_volumes())
+        cache.attach_volumes(((unicode(uuid4()), this_node),))
+        cache.list_volumes()
+
+        self.assertEqual(
+            (listings, cache._api.num_calls("list_volumes")),
+            ([created, attached], 2))
+
+    @capture_logging(None)
+    def test_hits_and_misses_logged(self, logger):
+        """
+        Each call to ``list_volumes`` is counted as either a hit or a miss of
+        the cache.
+        """
+        self.cache.list_volumes()
+        self.cache.list_volumes()
+        self.clock.advance(5)
+        self.cache.list_volumes()
+
+        [miss, hit, next_miss] = LoggedMessage.of_type(
+            logger.messages, CALL_LIST_VOLUMES)
+        self.assertEqual(
+            (miss.message["function"], hit.message["function"],
+             next_miss.message["function"],
+             next_miss.message["count"] - miss.message["count"]),
+            ("_inventory_miss", "_inventory_hit", "_inventory_miss", 1))
+
 
 class FakeCloudAPITests(make_icloudapi_tests(
         lambda test_case: FakeCloudAPI(
@@ -4,7 +4,20 @@
 Tests for ``flocker.node.agents.cinder``.
 """
 
-from ..cinder import _openstack_verify_from_config
+from uuid import uuid4
+
+from cinderclient.exceptions import NotFound
+
+from eliot.testing import capture_logging, assertHasMessage
+
+from ..cinder import (
+    _openstack_verify_from_config, CinderBlockDeviceAPI, MAXIMUM_VOLUME_GETS,
+    VIRTIO_BLK_DEVICE_TIME_LIMIT,
+)
+from .._devicewatcher import BlockDeviceWatcher
+from .._logging import VIRTIO_BLK_DEVICE_NOT_FOUND
+from ..testtools import FakeTime
+from .test_devicewatcher import FakeUevents
 
 from ....testtools import TestCase
 
@@ -61,3 +74,139 @@ class VerifyTests(TestCase):
             'verify_ca_path': '/a/path'
         }
         self.assertEqual(_openstack_verify_from_config(**config), False)
+
+
+class _Volume(object):
+    """
+    Stand-in for a Cinder ``Volume``.
+    """
+    def __init__(self, id, attachments=()):
+        self.id = id
+        self.attachments = list(attachments)
+
+
+class _CountingVolumeManager(object):
+    """
+    The parts of an ``ICinderVolumeManager`` used to describe volumes, which
+    record the calls made to them.
+    """
+    def __init__(self, volume_ids):
+        self.volumes = [_Volume(volume_id) for volume_id in volume_ids]
+        self.calls = []
+
+    def get(self, volume_id):
+        self.calls.append(("get", volume_id))
+        for volume in self.volumes:
+            if volume.id == volume_id:
+                return volume
+        raise NotFound(404)
+
+    def list(self):
+        self.calls.append(("list",))
+        return self.volumes
+
+
+class DescribeVolumesTests(TestCase):
+    """
+    Tests for ``CinderBlockDeviceAPI._describe_volumes``.
+    """
+    def setUp(self):
+        super(DescribeVolumesTests, self).setUp()
+        self.manager = _CountingVolumeManager([u"a", u"b", u"c"])
+        self.api = CinderBlockDeviceAPI(
+            cinder_volume_manager=self.manager,
+            nova_volume_manager=None,
+            nova_server_manager=None,
+            cluster_id=uuid4(),
+        )
+
+    def test_one(self):
+        """
+        A single volume is fetched by itself.
+        """
+        self.assertEqual(
+            ([volume.id for volume in self.api._describe_volumes([u"b"])],
+             self.manager.calls),
+            ([u"b"], [("get", u"b")]))
+
+    def test_one_missing(self):
+        """
+        A single volume that doesn't exist is not described.
+        """
+        self.assertEqual(self.api._describe_volumes([u"z"]), [])
+
+    def test_several(self):
+        """
+        Up to ``MAXIMUM_VOLUME_GETS`` volumes are fetched one at a time,
+        leaving out those that don't exist.
+        """
+        self.assertEqual(
+            ([volume.id
+              for volume in self.api._describe_volumes([u"a", u"c", u"z"])],
+             self.manager.calls),
+            ([u"a", u"c"], [("get", u"a"), ("get", u"c"), ("get", u"z")]))
+
+    def test_many(self):
+        """
+        More than ``MAXIMUM_VOLUME_GETS`` volumes are picked out of a single
+        listing of the volumes, leaving out those that don't exist.
+        """
+        volume_ids = [u"a", u"c"] + [
+            unicode(uuid4()) for _ in range(MAXIMUM_VOLUME_GETS - 1)]
+        self.assertEqual(
+            ([volume.id
+              for volume in self.api._describe_volumes(volume_ids)],
+             self.manager.calls),
+            ([u"a", u"c"], [("list",)]))
+
+
+# A volume ID which has no device in /dev/disk/by-id:
+MISSING_VOLUME_ID = u"missing-" + unicode(uuid4())
+
+
+class WaitForVirtioBlkDeviceTests(TestCase):
+    """
+    Tests for ``CinderBlockDeviceAPI._wait_for_virtio_blk_device``.
+    """
+    def setUp(self):
+        super(WaitForVirtioBlkDeviceTests, self).setUp()
+        self.time = FakeTime()
+        self.api = CinderBlockDeviceAPI(
+            cinder_volume_manager=None,
+            nova_volume_manager=None,
+            nova_server_manager=None,
+            cluster_id=uuid4(),
+            time_module=self.time,
+        )
+        self.api._device_watcher = BlockDeviceWatcher(
+            time_module=self.time, uevents=lambda: FakeUevents(self.time),
+        )
+
+    @capture_logging(
+        assertHasMessage, VIRTIO_BLK_DEVICE_NOT_FOUND, {
+            u"volume_id": MISSING_VOLUME_ID,
+            u"elapsed_time": VIRTIO_BLK_DEVICE_TIME_LIMIT,
+        })
+    def test_time_limit(self, logger):
+        """
+        If the device of a virtio_blk volume doesn't appear within
+        ``VIRTIO_BLK_DEVICE_TIME_LIMIT`` seconds, the wait ends and the
+        volume and time waited are logged.
+        """
+        self.api._wait_for_virtio_blk_device(
+            _Volume(MISSING_VOLUME_ID, [{u"device": u"/dev/vdb"}]))
+        self.assertEqual(self.time.time(), VIRTIO_BLK_DEVICE_TIME_LIMIT)
+
+    @capture_logging(None)
+    def test_not_virtio_blk(self, logger):
+        """
+        The device of a volume whose path the Cinder API reports is not
+        waited for.
+        """
+        self.api._wait_for_virtio_blk_device(
+            _Volume(MISSING_VOLUME_ID, [{u"device": u"/dev/xvdb"}]))
+        self.assertEqual(
+            (self.time.time(),
+             VIRTIO_BLK_DEVICE_NOT_FOUND.message_type in [
+                 message.get(u"message_type") for message in logger.messages]),
+            (0, False))
@@ -0,0 +1,262 @@
+# Copyright ClusterHQ Inc.  See LICENSE file for details.
+
+"""
+Tests for ``flocker.node.agents._devicewatcher``.
+"""
+
+import socket
+
+from eliot.testing import capture_logging, assertHasMessage
+
+from .._devicewatcher import (
+    BlockDeviceWatcher, _NetlinkUevents, _PollingUevents,
+    _mentions_block_device,
+)
+from .._logging import UEVENTS_UNAVAILABLE
+from ..testtools import FakeTime
+
+from ....testtools import TestCase
+
+# A uevent as sent by the kernel:
+KERNEL_BLOCK_UEVENT = (
+    b"add@/devices/virtual/block/loop0\0ACTION=add\0"
+    b"DEVPATH=/devices/virtual/block/loop0\0SUBSYSTEM=block\0"
+    b"DEVNAME=loop0\0DEVTYPE=disk\0SEQNUM=1234\0"
+)
+
+# A uevent as sent by udev, after a binary header:
+UDEV_BLOCK_UEVENT = (
+    b"libudev\0\xfe\xed\xca\xfe(\0\0\0(\0\0\0\x8e\0\0\0"
+    b"ACTION=change\0DEVPATH=/devices/virtual/block/loop0\0"
+    b"SUBSYSTEM=block\0DEVNAME=/dev/loop0\0"
+)
+
+# A uevent about something other than a block device:
+NET_UEVENT = (
+    b"add@/devices/virtual/net/veth0\0ACTION=add\0"
+    b"DEVPATH=/devices/virtual/net/veth0\0SUBSYSTEM=net\0INTERFACE=veth0\0"
+)
+
+
+class MentionsBlockDeviceTests(TestCase):
+    """
+    Tests for ``_mentions_block_device``.
+    """
+    def test_kernel(self):
+        """
+        A block device uevent sent by the kernel is recognized.
+        """
+        self.assertTrue(_mentions_block_device(KERNEL_BLOCK_UEVENT))
+
+    def test_udev(self):
+        """
+        A block device uevent sent by udev is recognized.
+        """
+        self.assertTrue(_mentions_block_device(UDEV_BLOCK_UEVENT))
+
+    def test_other_subsystem(self):
+        """
+        A uevent about another subsystem isn't about a block device.
+        """
+        self.assertFalse(_mentions_block_device(NET_UEVENT))
+
+
+class FakeUevents(object):
+    """
+    A source of uevents for ``BlockDeviceWatcher``, which announces the
+    uevents it is given at the times they are given for.
+
+    :ivar list waits: The timeout of each call to ``wait``.
+    :ivar bool closed: Whether ``close`` has been called.
+    """
+    def __init__(self, time_module, uevents=()):
+        """
+        :param time_module: A ``FakeTime`` to advance while waiting.
+        :param uevents: Iterable of 2-tuples of the time of each uevent, in
+            increasing order, and whether it is about a block device.
+        """
+        self._time = time_module
+        self._uevents = list(uevents)
+        self.waits = []
+        self.closed = False
+
+    def wait(self, timeout):
+        self.waits.append(timeout)
+        deadline = self._time.time() + timeout
+        if self._uevents and self._uevents[0][0] <= deadline:
+            when, block = self._uevents.pop(0)
+            self._time.sleep(when - self._time.time())
+            return block
+        self._time.sleep(timeout)
+        return False
+
+    def close(self):
+        self.closed = True
+
+
+class BlockDeviceWatcherTests(TestCase):
+    """
+    Tests for ``BlockDeviceWatcher``.
+    """
+    def setUp(self):
+        super(BlockDeviceWatcherTests, self).setUp()
+        self.time = FakeTime()
+        self.checks = []
+
+    def watcher(self, uevents=()):
+        """
+        :param uevents: The uevents to announce, as given to ``FakeUevents``.
+
+        :return: A ``BlockDeviceWatcher`` using ``FakeUevents``, which is
+            also returned.
+        """
+        source = FakeUevents(self.time, uevents)
+        watcher = BlockDeviceWatcher(
+            recheck_interval=1.0, time_module=self.time,
+            uevents=lambda: source,
+        )
+        return watcher, source
+
+    def appears_at(self, when):
+        """
+        :param float when: The time the device appears.
+
+        :return: A check for ``BlockDeviceWatcher.wait_for`` which records
+            the time it is called at in ``self.checks``.
+        """
+        def check():
+            now = self.time.time()
+            self.checks.append(now)
+            if now >= when:
+                return u"/dev/xvdf"
+            return None
+        return check
+
+    def test_already_present(self):
+        """
+        If the device is already present, its check's result is returned
+        without waiting.
+        """
+        watcher, source = self.watcher()
+        self.assertEqual(
+            (watcher.wait_for(self.appears_at(0), 10), source.waits),
+            (u"/dev/xvdf", []))
+
+    def test_block_uevent(self):
+        """
+        The device is looked for again as soon as a block device uevent
+        arrives.
+        """
+        watcher, source = self.watcher([(0.3, True)])
+        self.assertEqual(
+            (watcher.wait_for(self.appears_at(0.3), 10), self.checks),
+            (u"/dev/xvdf", [0, 0.3]))
+
+    def test_other_uevent(self):
+        """
+        Wake-ups without a block device uevent don't cause the device to be
+        looked for again before ``recheck_interval``.
+        """
+        watcher, source = self.watcher([(0.3, False), (0.5, True)])
+        self.assertEqual(
+            (watcher.wait_for(self.appears_at(0.5), 10), self.checks),
+            (u"/dev/xvdf", [0, 0.5]))
+
+    def test_recheck(self):
+        """
+        The device is looked for every ``recheck_interval`` seconds even if
+        no uevents arrive.
+        """
+        watcher, source = self.watcher()
+        self.assertEqual(
+            (watcher.wait_for(self.appears_at(2), 10), self.checks),
+            (u"/dev/xvdf", [0, 1, 2]))
+
+    def test_time_limit(self):
+        """
+        If the device doesn't appear within the time limit, ``None`` is
+        returned at the time limit.
+        """
+        watcher, source = self.watcher()
+        self.assertEqual(
+            (watcher.wait_for(self.appears_at(100), 2.5), self.time.time()),
+            (None, 2.5))
+
+    def test_closed(self):
+        """
+        The source of uevents is closed once the wait is over.
+        """
+        watcher, source = self.watcher()
+        watcher.wait_for(self.appears_at(100), 2.5)
+        self.assertTrue(source.closed)
+
+    def test_closed_on_error(self):
+        """
+        The source of uevents is closed if the check raises an exception.
+        """
+        watcher, source = self.watcher()
+
+        def check():
+            raise ZeroDivisionError()
+        self.assertRaises(ZeroDivisionError, watcher.wait_for, check, 10)
+        self.assertTrue(source.closed)
+
+    @capture_logging(assertHasMessage, UEVENTS_UNAVAILABLE)
+    def test_polling_fallback(self, logger):
+        """
+        If uevents can't be received, the device is looked for every
+        ``poll_interval`` seconds instead and the reason is logged.
+        """
+        def no_netlink(*args):
+            raise socket.error("Address family not supported by protocol")
+        self.patch(socket, "socket", no_netlink)
+        watcher = BlockDeviceWatcher(
+            poll_interval=0.25, time_module=self.time)
+        self.assertEqual(
+            (watcher.wait_for(self.appears_at(0.5), 10), self.checks),
+            (u"/dev/xvdf", [0, 0.25, 0.5]))
+
+
+class PollingUeventsTests(TestCase):
+    """
+    Tests for ``_PollingUevents``.
+    """
+    def test_wait(self):
+        """
+        ``wait`` sleeps for the polling interval and announces a possible
+        block device.
+        """
+        time = FakeTime()
+        uevents = _PollingUevents(0.1, time)
+        self.assertEqual((uevents.wait(5), time.time()), (True, 0.1))
+
+    def test_wait_timeout(self):
+        """
+        ``wait`` sleeps for no longer than its timeout.
+        """
+        time = FakeTime()
+        uevents = _PollingUevents(0.1, time)
+        self.assertEqual((uevents.wait(0.05), time.time()), (True, 0.05))
+
+
+class NetlinkUeventsTests(TestCase):
+    """
+    Tests for ``_NetlinkUevents``.
+    """
+    def setUp(self):
+        super(NetlinkUeventsTests, self).setUp()
+        try:
+            self.uevents = _NetlinkUevents()
+        except (AttributeError, socket.error) as e:
+            self.skipTest("Can't receive uevents: {}".format(e))
+        self.addCleanup(self.uevents.close)
+
+    def test_timeout(self):
+        """
+        ``wait`` returns ``False`` if no block device uevent arrives within
+        its timeout.
+
+        Uevents for other devices may arrive while waiting, but no block
+        devices are changed by the test.
+        """
+        self.assertFalse(self.uevents.wait(0.01))
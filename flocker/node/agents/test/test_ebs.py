@@ -12,6 +12,8 @@ from hypothesis.strategies import lists, sampled_from, builds
 
 from bitmath import GiB
 
+from zope.interface.verify import verifyClass
+
 from twisted.python.filepath import FilePath
 
 from eliot.testing import capture_logging, assertHasMessage
@@ -21,9 +23,16 @@ from ..ebs import (
     _attach_volume_and_wait_for_device, _get_blockdevices,
     _get_device_size, _wait_for_new_device, _find_allocated_devices,
     _select_free_device, NoAvailableDevice,
+    _volume_state_check, VolumeOperations, VolumeStates, TimeoutException,
+    VOLUME_STATE_CHANGE_TIMEOUT, EBSBlockDeviceAPI,
 )
+from .._volumewatcher import VolumeStateWatcher
 from .._logging import NO_NEW_DEVICE_IN_OS
-from ..blockdevice import BlockDeviceVolume
+from ..blockdevice import (
+    BlockDeviceVolume, UnknownVolume, IBlockDeviceAPI,
+    IProfiledBlockDeviceAPI, IBatchBlockDeviceAPI, ICloudAPI,
+)
+from ..testtools import FakeEC2, FakeTime
 
 from ....testtools import CustomException, TestCase
 
@@ -37,6 +46,35 @@ device_path = builds(
 )
 
 
+class EBSBlockDeviceAPIInterfaceTests(TestCase):
+    """
+    Tests for the interfaces ``EBSBlockDeviceAPI`` declares.
+    """
+    def test_iblockdeviceapi(self):
+        """
+        ``EBSBlockDeviceAPI`` implements ``IBlockDeviceAPI``.
+        """
+        verifyClass(IBlockDeviceAPI, EBSBlockDeviceAPI)
+
+    def test_iprofiledblockdeviceapi(self):
+        """
+        ``EBSBlockDeviceAPI`` implements ``IProfiledBlockDeviceAPI``.
+        """
+        verifyClass(IProfiledBlockDeviceAPI, EBSBlockDeviceAPI)
+
+    def test_icloudapi(self):
+        """
+        ``EBSBlockDeviceAPI`` implements ``ICloudAPI``.
+        """
+        verifyClass(ICloudAPI, EBSBlockDeviceAPI)
+
+    def test_ibatchblockdeviceapi(self):
+        """
+        ``EBSBlockDeviceAPI`` implements ``IBatchBlockDeviceAPI``.
+        """
+        verifyClass(IBatchBlockDeviceAPI, EBSBlockDeviceAPI)
+
+
 class AttachedUnexpectedDeviceTests(TestCase):
     """
     Tests for ``AttachedUnexpectedDevice``.
@@ -251,6 +289,27 @@ class WaitForNewDeviceTests(TestCase):
             )
         )
 
+    @capture_logging(None)
+    def test_watcher(self, logger):
+        """
+        The new device is waited for using the given ``BlockDeviceWatcher``,
+        and nothing is logged once it is found.
+        """
+        device = FilePath(b"/dev/xvdf")
+        waits = []
+
+        class FakeWatcher(object):
+            def wait_for(self, check, time_limit):
+                waits.append(time_limit)
+                return device
+
+        self.assertEqual(
+            (_wait_for_new_device(
+                base=[], expected_size=1, time_limit=30,
+                watcher=FakeWatcher()),
+             waits, logger.messages),
+            (device, [30], []))
+
 
 class FindAllocatedDeviceTests(TestCase):
     """
@@ -286,3 +345,74 @@ class SelectFreeDeviceTests(TestCase):
         """
         existing = ['sd' + ch for ch in ascii_lowercase]
         self.assertRaises(NoAvailableDevice, _select_free_device, existing)
+
+
+class VolumeStateCheckTests(TestCase):
+    """
+    Tests for ``_volume_state_check``.
+    """
+    def setUp(self):
+        super(VolumeStateCheckTests, self).setUp()
+        self.time = FakeTime()
+        self.ec2 = FakeEC2(self.time)
+        self.watcher = VolumeStateWatcher(
+            self.ec2.describe_volumes, time_module=self.time)
+
+    def wait(self, operation, volume_id, timeout=VOLUME_STATE_CHANGE_TIMEOUT):
+        """
+        Wait for a volume to change state using ``_volume_state_check``.
+        """
+        return self.watcher.wait(self.watcher.watch(
+            volume_id, _volume_state_check(operation, volume_id, timeout)))
+
+    def test_end_state(self):
+        """
+        The check finishes a wait with the description of the volume once it
+        reaches the end state of the operation.
+        """
+        volume_id = self.ec2.create_volume(latency=2)
+        volume = self.wait(VolumeOperations.CREATE, volume_id)
+        self.assertEqual(
+            (volume.state, self.time.time()),
+            (VolumeStates.AVAILABLE.value, 3.5))
+
+    def test_attach_data(self):
+        """
+        The check of an attach finishes the wait only once the volume has
+        attach data.
+        """
+        volume_id = self.ec2.create_volume(latency=0)
+        self.ec2.attach_volume(
+            volume_id, u"i-12345678", u"/dev/sdf", latency=1)
+        volume = self.wait(VolumeOperations.ATTACH, volume_id)
+        self.assertEqual(
+            (volume.state, volume.attachments[0]['Device']),
+            (VolumeStates.IN_USE.value, u"/dev/sdf"))
+
+    def test_unknown(self):
+        """
+        The check of a volume that isn't described fails the wait with
+        ``UnknownVolume``.
+        """
+        self.assertRaises(
+            UnknownVolume, self.wait, VolumeOperations.CREATE, u"vol-missing")
+
+    def test_destroyed(self):
+        """
+        The check of a destroyed volume fails the wait with ``UnknownVolume``
+        once it's gone.
+        """
+        volume_id = self.ec2.create_volume(latency=0)
+        self.ec2.delete_volume(volume_id, latency=2)
+        self.assertRaises(
+            UnknownVolume, self.wait, VolumeOperations.DESTROY, volume_id)
+
+    def test_timeout(self):
+        """
+        The check fails the wait with ``TimeoutException`` if the volume
+        doesn't reach the end state in time.
+        """
+        volume_id = self.ec2.create_volume(latency=60)
+        self.assertRaises(
+            TimeoutException, self.wait, VolumeOperations.CREATE, volume_id,
+            timeout=10)
@@ -0,0 +1,196 @@
+# Copyright ClusterHQ Inc.  See LICENSE file for details.
+
+"""
+Tests for ``flocker.node.agents._volumewatcher``.
+"""
+
+from threading import Thread
+
+from .._volumewatcher import VolumeStateWatcher
+from ..testtools import FakeEC2, FakeTime
+
+from ....testtools import CustomException, TestCase
+
+
+def available(volume, elapsed_time):
+    """
+    A ``VolumeStateWatcher`` check that a volume is available.
+    """
+    if volume is not None and volume.state == u"available":
+        return volume
+    return None
+
+
+class VolumeStateWatcherTests(TestCase):
+    """
+    Tests for ``VolumeStateWatcher``.
+    """
+    def setUp(self):
+        super(VolumeStateWatcherTests, self).setUp()
+        self.time = FakeTime()
+        self.ec2 = FakeEC2(self.time)
+        self.watcher = VolumeStateWatcher(
+            self.ec2.describe_volumes, minimum_interval=0.5,
+            maximum_interval=4.0, backoff=2.0, time_module=self.time,
+        )
+
+    def test_one_describe_per_poll(self):
+        """
+        Each poll describes all of the volumes still being waited for with one
+        call, and each wait finishes with the description of its volume once
+        it has changed.
+        """
+        volume_ids = [self.ec2.create_volume(latency) for latency in [1, 2]]
+        waits = [self.watcher.watch(volume_id, available)
+                 for volume_id in volume_ids]
+        results = [self.watcher.wait(wait) for wait in waits]
+        self.assertEqual(
+            ([volume.id for volume in results], self.ec2.describe_calls),
+            (volume_ids, [volume_ids, volume_ids, volume_ids[1:]]))
+
+    def test_backoff(self):
+        """
+        The time between polls doubles after each poll that finishes no
+        waits, starting at ``minimum_interval``.
+        """
+        volume_id = self.ec2.create_volume(7)
+        self.watcher.wait(self.watcher.watch(volume_id, available))
+        # Polls at 0.5, 1.5, 3.5 and 7.5 seconds:
+        self.assertEqual(
+            (len(self.ec2.describe_calls), self.time.time()), (4, 7.5))
+
+    def test_progress_restarts_schedule(self):
+        """
+        After a poll that finishes some waits, the next poll is
+        ``minimum_interval`` later.
+        """
+        first = self.watcher.watch(self.ec2.create_volume(3), available)
+        second = self.watcher.watch(self.ec2.create_volume(3.6), available)
+        self.watcher.wait(first)
+        self.watcher.wait(second)
+        # Polls at 0.5, 1.5, 3.5 and 4 seconds:
+        self.assertEqual(
+            (len(self.ec2.describe_calls), self.time.time()), (4, 4.0))
+
+    def test_maximum_interval(self):
+        """
+        The time between polls stops increasing at ``maximum_interval``.
+        """
+        volume_id = self.ec2.create_volume(17)
+        self.watcher.wait(self.watcher.watch(volume_id, available))
+        # Polls at 0.5, 1.5, 3.5, 7.5, 11.5, 15.5 and 19.5 seconds:
+        self.assertEqual(
+            (len(self.ec2.describe_calls), self.time.time()), (7, 19.5))
+
+    def test_new_wait_restarts_schedule(self):
+        """
+        A new wait brings the next poll forward to ``minimum_interval`` after
+        it begins, even if the time between polls had already increased.
+        """
+        slow = self.watcher.watch(self.ec2.create_volume(10), available)
+        self.time.sleep(3.5)
+        self.watcher.poll()
+        self.watcher.poll()
+        fast_id = self.ec2.create_volume(0.1)
+        fast = self.watcher.watch(fast_id, available)
+        started = self.time.time()
+        self.assertEqual(
+            (self.watcher.wait(fast).id, self.time.time() - started),
+            (fast_id, 0.5))
+        self.watcher.wait(slow)
+
+    def test_poll_fires_deferred(self):
+        """
+        ``watch`` returns a ``Deferred`` which fires when a poll finds that
+        the volume has changed.
+        """
+        volume_id = self.ec2.create_volume(1)
+        wait = self.watcher.watch(volume_id, available)
+        self.watcher.poll()
+        self.assertNoResult(wait)
+        self.time.sleep(1)
+        self.watcher.poll()
+        self.assertEqual(self.successResultOf(wait).id, volume_id)
+
+    def test_missing_volume(self):
+        """
+        The check of a wait is given ``None`` if its volume isn't described.
+        """
+        checked = []
+
+        def check(volume, elapsed_time):
+            checked.append(volume)
+            return True
+
+        self.assertEqual(
+            (self.watcher.wait(self.watcher.watch(u"vol-missing", check)),
+             checked),
+            (True, [None]))
+
+    def test_check_fails(self):
+        """
+        If the check of a wait raises an exception, ``wait`` raises it while
+        the other waits continue.
+        """
+        def check(volume, elapsed_time):
+            raise CustomException()
+
+        volume_id = self.ec2.create_volume(1)
+        failing = self.watcher.watch(volume_id, check)
+        succeeding = self.watcher.watch(volume_id, available)
+        self.assertRaises(CustomException, self.watcher.wait, failing)
+        self.assertEqual(self.watcher.wait(succeeding).id, volume_id)
+
+    def test_check_elapsed_time(self):
+        """
+        The check of a wait is given the time since the wait began.
+        """
+        elapsed = []
+
+        def check(volume, elapsed_time):
+            elapsed.append(elapsed_time)
+            return elapsed_time if elapsed_time > 2 else None
+
+        self.time.sleep(10)
+        self.watcher.wait(self.watcher.watch(u"vol-missing", check))
+        self.assertEqual(elapsed, [0.5, 1.5, 3.5])
+
+    def test_describe_fails(self):
+        """
+        If describing the volumes fails, all the waits fail with the same
+        exception.
+        """
+        def describe(volume_ids):
+            raise CustomException()
+
+        watcher = VolumeStateWatcher(describe, time_module=self.time)
+        waits = [watcher.watch(volume_id, available)
+                 for volume_id in [u"vol-1", u"vol-2"]]
+        watcher.poll()
+        for wait in waits:
+            self.failureResultOf(wait, CustomException)
+
+    def test_threads(self):
+        """
+        Waits in several threads each finish with their own result.
+        """
+        ec2 = FakeEC2(FakeTime())
+        watcher = VolumeStateWatcher(
+            ec2.describe_volumes, minimum_interval=0.001,
+            maximum_interval=0.01,
+        )
+        volume_ids = [ec2.create_volume(0) for _ in range(5)]
+        results = {}
+
+        def wait(volume_id):
+            results[volume_id] = watcher.wait(
+                watcher.watch(volume_id, available)).id
+
+        threads = [Thread(target=wait, args=(volume_id,))
+                   for volume_id in volume_ids]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(
+            results, dict((volume_id, volume_id) for volume_id in volume_ids))
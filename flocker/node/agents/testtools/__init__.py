@@ -9,8 +9,10 @@ from ._cinder import (
     make_inovavolumemanager_tests,
 )
 from ._blockdevice import (
+    FakeBatchAPI,
     FakeCloudAPI,
     detach_destroy_volumes,
+    make_ibatchblockdeviceapi_tests,
     make_iblockdeviceapi_tests,
     make_icloudapi_tests,
     make_iprofiledblockdeviceapi_tests,
@@ -18,15 +20,25 @@ from ._blockdevice import (
     umount,
     umount_all,
 )
+from ._ebs import (
+    FakeEBSVolume,
+    FakeEC2,
+    FakeTime,
+)
 from ._loopback import (
     fakeprofiledloopbackblockdeviceapi_for_test,
     loopbackblockdeviceapi_for_test,
 )
 __all__ = [
+    'FakeBatchAPI',
     'FakeCloudAPI',
+    'FakeEBSVolume',
+    'FakeEC2',
+    'FakeTime',
     'detach_destroy_volumes',
     'fakeprofiledloopbackblockdeviceapi_for_test',
     'loopbackblockdeviceapi_for_test',
+    'make_ibatchblockdeviceapi_tests',
     'make_iblockdeviceapi_tests',
     'make_icindervolumemanager_tests',
     'make_icloudapi_tests',
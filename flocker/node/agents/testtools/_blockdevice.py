@@ -20,6 +20,7 @@ from testtools.matchers import AllMatch, IsInstance
 
 from twisted.internet import reactor
 from twisted.python.components import proxyForInterface
+from twisted.python.failure import Failure
 from twisted.python.filepath import FilePath
 
 from zope.interface import implementer
@@ -30,6 +31,7 @@ from ....testtools import TestCase, AsyncTestCase
 from ..blockdevice import (
     AlreadyAttachedVolume,
     BlockDeviceVolume,
+    IBatchBlockDeviceAPI,
     IBlockDeviceAPI,
     ICloudAPI,
     IProfiledBlockDeviceAPI,
@@ -823,6 +825,142 @@ class FakeCloudAPI(proxyForInterface(IBlockDeviceAPI)):
         return
 
 
+@implementer(IBatchBlockDeviceAPI)
+class FakeBatchAPI(proxyForInterface(IBlockDeviceAPI)):
+    """
+    Wrap a ``IBlockDeviceAPI`` and also provide ``IBatchBlockDeviceAPI`` by
+    making each request of a batch in turn.
+
+    :ivar list batches: 2-tuples of the name of each batch method called and
+        its argument.
+    """
+    def __init__(self, block_api):
+        """
+        @param block_api: ``IBlockDeviceAPI`` to wrap.
+        """
+        self.original = block_api
+        self.batches = []
+
+    def _each(self, name, requests, make_request):
+        self.batches.append((name, requests))
+        results = []
+        for request in requests:
+            try:
+                results.append(make_request(*request))
+            except Exception:
+                results.append(Failure())
+        return results
+
+    def create_volumes(self, requests):
+        return self._each(
+            "create_volumes", requests,
+            lambda dataset_id, size, profile_name: self.create_volume(
+                dataset_id=dataset_id, size=size))
+
+    def attach_volumes(self, attachments):
+        return self._each("attach_volumes", attachments, self.attach_volume)
+
+    def describe_volumes(self, blockdevice_ids):
+        self.batches.append(("describe_volumes", blockdevice_ids))
+        blockdevice_ids = set(blockdevice_ids)
+        return [volume for volume in self.list_volumes()
+                if volume.blockdevice_id in blockdevice_ids]
+
+
+class IBatchBlockDeviceAPITestsMixin(object):
+    """
+    Tests to perform on ``IBatchBlockDeviceAPI`` providers.
+    """
+    def setUp(self):
+        super(IBatchBlockDeviceAPITestsMixin, self).setUp()
+        self.addCleanup(detach_destroy_volumes, self.api)
+
+    def create_volumes(self, count):
+        """
+        Create volumes with one call to ``create_volumes``.
+
+        :param int count: The number of volumes to create.
+
+        :return: ``list`` of the created ``BlockDeviceVolume``.
+        """
+        return self.api.create_volumes(
+            [(uuid4(), self.dataset_size, None) for _ in range(count)])
+
+    def test_interface(self):
+        """
+        The API object provides ``IBatchBlockDeviceAPI``.
+        """
+        self.assertTrue(
+            verifyObject(IBatchBlockDeviceAPI, self.api)
+        )
+
+    def test_create_volumes(self):
+        """
+        ``create_volumes`` creates a volume for each request, in order.
+        """
+        requests = [(uuid4(), self.dataset_size, None) for _ in range(2)]
+        created = self.api.create_volumes(requests)
+        self.assertEqual(
+            ([volume.dataset_id for volume in created],
+             set(created) <= set(self.api.list_volumes())),
+            ([dataset_id for (dataset_id, _, _) in requests], True))
+
+    def test_attach_volumes(self):
+        """
+        ``attach_volumes`` attaches each of the volumes, and a volume which
+        can't be attached doesn't prevent the others from being attached.
+        """
+        this_node = self.api.compute_instance_id()
+        created = self.create_volumes(2)
+        unknown = self.unknown_blockdevice_id_factory(self)
+        attached = self.api.attach_volumes(
+            [(created[0].blockdevice_id, this_node),
+             (unknown, this_node),
+             (created[1].blockdevice_id, this_node)])
+        attached[1].trap(UnknownVolume)
+        self.assertEqual(
+            [attached[0], attached[2]],
+            [volume.set(attached_to=this_node) for volume in created])
+
+    def test_describe_volumes(self):
+        """
+        ``describe_volumes`` returns each of the identified volumes that
+        exists.
+        """
+        created = self.create_volumes(2)
+        described = self.api.describe_volumes(
+            [created[1].blockdevice_id,
+             self.unknown_blockdevice_id_factory(self)])
+        self.assertEqual(described, [created[1]])
+
+
+def make_ibatchblockdeviceapi_tests(batch_blockdevice_api_factory,
+                                    dataset_size,
+                                    unknown_blockdevice_id_factory):
+    """
+    Create tests for classes that implement ``IBatchBlockDeviceAPI``.
+
+    :param batch_blockdevice_api_factory: A factory that generates the
+        ``IBatchBlockDeviceAPI`` provider to test.
+    :param dataset_size: The size in bytes of the datasets to be created for
+        test.
+    :param unknown_blockdevice_id_factory: A factory that takes the test case
+        and returns a ``blockdevice_id`` of a volume that doesn't exist.
+
+    :returns: A ``TestCase`` with tests that will be performed on the
+       supplied ``IBatchBlockDeviceAPI`` provider.
+    """
+    class Tests(IBatchBlockDeviceAPITestsMixin, TestCase):
+        def setUp(self):
+            self.api = batch_blockdevice_api_factory(self)
+            self.dataset_size = dataset_size
+            self.unknown_blockdevice_id_factory = (
+                unknown_blockdevice_id_factory)
+            super(Tests, self).setUp()
+
+    return Tests
+
+
 class IProfiledBlockDeviceAPITestsMixin(object):
     """
     Tests to perform on ``IProfiledBlockDeviceAPI`` providers.
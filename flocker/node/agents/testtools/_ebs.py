@@ -0,0 +1,174 @@
+# Copyright ClusterHQ Inc.  See LICENSE file for details.
+
+"""
+Test helpers for ``flocker.node.agents.ebs``.
+"""
+
+from itertools import count
+
+from pyrsistent import PClass, field, pvector
+
+from ..ebs import VolumeStates
+
+
+class FakeTime(object):
+    """
+    A replacement for the ``time`` module whose time only passes when it is
+    slept on.
+
+    :ivar float _current_time: The current time.
+    """
+    def __init__(self, initial_time=0):
+        self._current_time = initial_time
+
+    def time(self):
+        return self._current_time
+
+    def sleep(self, interval):
+        self._current_time += interval
+
+
+class FakeEBSVolume(PClass):
+    """
+    The description of a volume at one moment, with the attributes of
+    ``boto3.resources.factory.ec2.Volume`` that the EBS driver looks at.
+    """
+    id = field(type=unicode, mandatory=True)
+    state = field(type=unicode, mandatory=True)
+    attachments = field(initial=pvector())
+
+
+class FakeEC2(object):
+    """
+    An in-memory stand-in for the volumes of EC2, whose state changes take
+    time to complete like those of EC2 do.
+
+    Each change is scheduled when it is requested and then completes after a
+    given latency, as measured by a clock such as ``FakeTime``.
+
+    :ivar list describe_calls: The ``list`` of volume identifiers given to
+        each call of ``describe_volumes``.
+    :ivar dict _volumes: Map the identifier of each volume to a ``list`` of
+        2-tuples of the time it changed and the ``FakeEBSVolume`` describing
+        it from then on, or ``None`` once it has been destroyed.
+    """
+    def __init__(self, time_module):
+        """
+        :param time_module: Provider of ``time`` like the ``time`` module.
+        """
+        self._time = time_module
+        self._volumes = {}
+        self._ids = count(1)
+        self.describe_calls = []
+
+    def _schedule(self, volume_id, transient, end, latency):
+        """
+        Begin changing the state of a volume.
+
+        :param unicode volume_id: The identifier of the volume.
+        :param FakeEBSVolume transient: The description of the volume while
+            the change happens.
+        :param end: The ``FakeEBSVolume`` describing the volume once the
+            change is complete, or ``None`` if it will no longer exist.
+        :param float latency: The time, in seconds, the change takes.
+        """
+        now = self._time.time()
+        self._volumes.setdefault(volume_id, []).extend([
+            (now, transient), (now + latency, end),
+        ])
+
+    def _describe(self, volume_id):
+        """
+        :return: The ``FakeEBSVolume`` describing a volume now, or ``None``
+            if it doesn't exist.
+        """
+        now = self._time.time()
+        current = None
+        for changed, volume in self._volumes.get(volume_id, []):
+            if changed <= now:
+                current = volume
+        return current
+
+    def create_volume(self, latency):
+        """
+        Create a volume.
+
+        :param float latency: The time, in seconds, until it is available.
+
+        :return: The ``unicode`` identifier of the new volume.
+        """
+        volume_id = u"vol-{:08x}".format(next(self._ids))
+        self._schedule(
+            volume_id,
+            FakeEBSVolume(id=volume_id, state=VolumeStates.CREATING.value),
+            FakeEBSVolume(id=volume_id, state=VolumeStates.AVAILABLE.value),
+            latency,
+        )
+        return volume_id
+
+    def attach_volume(self, volume_id, instance_id, device, latency):
+        """
+        Attach a volume to an instance.
+
+        :param unicode volume_id: The identifier of the volume.
+        :param unicode instance_id: The identifier of the instance.
+        :param unicode device: The device to attach the volume as.
+        :param float latency: The time, in seconds, until it is attached.
+        """
+        attachment = {
+            'VolumeId': volume_id, 'InstanceId': instance_id,
+            'Device': device, 'State': u'attached',
+        }
+        self._schedule(
+            volume_id,
+            FakeEBSVolume(id=volume_id, state=VolumeStates.ATTACHING.value),
+            FakeEBSVolume(id=volume_id, state=VolumeStates.IN_USE.value,
+                          attachments=[attachment]),
+            latency,
+        )
+
+    def detach_volume(self, volume_id, latency):
+        """
+        Detach a volume.
+
+        :param unicode volume_id: The identifier of the volume.
+        :param float latency: The time, in seconds, until it is detached.
+        """
+        self._schedule(
+            volume_id,
+            self._describe(volume_id).set(
+                state=VolumeStates.DETACHING.value),
+            FakeEBSVolume(id=volume_id, state=VolumeStates.AVAILABLE.value),
+            latency,
+        )
+
+    def delete_volume(self, volume_id, latency):
+        """
+        Destroy a volume.
+
+        :param unicode volume_id: The identifier of the volume.
+        :param float latency: The time, in seconds, until it no longer
+            exists.
+        """
+        self._schedule(
+            volume_id,
+            FakeEBSVolume(id=volume_id, state=VolumeStates.DELETING.value),
+            None,
+            latency,
+        )
+
+    def describe_volumes(self, volume_ids):
+        """
+        Describe some volumes with one call, like the EC2 ``DescribeVolumes``
+        API filtered by volume identifier.
+
+        :param list volume_ids: The identifiers of the volumes.
+
+        :return: ``list`` of the ``FakeEBSVolume`` describing each of them
+            that exists.
+        """
+        self.describe_calls.append(list(volume_ids))
+        return [
+            volume for volume in map(self._describe, volume_ids)
+            if volume is not None
+        ]
@@ -1178,11 +1178,13 @@ class UpdateNodeEraLocator(CommandLocator):
     """
     uuid = None
     era = None
+    interest = None
 
     @SetNodeEraCommand.responder
-    def set_node_era(self, era, node_uuid):
+    def set_node_era(self, era, node_uuid, interest=None):
         self.era = era
         self.uuid = node_uuid
+        self.interest = interest
         return {}
 
 
@@ -1248,7 +1250,7 @@ class AgentLoopServiceTests(TestCase):
     def test_send_era_on_connect(self):
         """
         Upon connecting a ``SetNodeEraCommand`` is sent with the current
-        node's era and UUID.
+        node's era and UUID, and the interest of its deployer.
         """
         client = AgentAMP(self.reactor, self.service)
         # The object that processes incoming AMP commands:
@@ -1258,10 +1260,12 @@ class AgentLoopServiceTests(TestCase):
         pump.flush()
         self.assertEqual(
             # Actual result of handling AMP commands, if any:
-            dict(era=server_locator.era, uuid=server_locator.uuid),
+            dict(era=server_locator.era, uuid=server_locator.uuid,
+                 interest=server_locator.interest),
             # Expected result:
             dict(era=unicode(self.service.era),
-                 uuid=unicode(self.deployer.node_uuid)))
+                 uuid=unicode(self.deployer.node_uuid),
+                 interest=self.deployer.interest.name))
 
     def test_connected_resets_factory_delay(self):
         """
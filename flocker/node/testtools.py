@@ -30,7 +30,7 @@ from ..common import loop_until
 from ..testtools import AsyncTestCase, find_free_port
 from ..control import (
     IClusterStateChange, Node, NodeState, Deployment, DeploymentState,
-    PersistentState,
+    PersistentState, ClusterInterest,
 )
 from ..control._model import ip_to_uuid, Leases
 from ._docker import AddressInUse, DockerClient
@@ -169,6 +169,7 @@ class DummyDeployer(object):
     """
     hostname = u"127.0.0.1"
     node_uuid = uuid4()
+    interest = ClusterInterest.ALL
 
     def discover_state(self, cluster_state, persistent_state):
         return succeed(DummyLocalState())
@@ -194,6 +195,7 @@ class ControllableDeployer(object):
         """
         self.node_uuid = ip_to_uuid(hostname)
         self.hostname = hostname
+        self.interest = ClusterInterest.ALL
         self.local_states = local_states
         self.calculated_actions = calculated_actions
         self.calculate_inputs = []
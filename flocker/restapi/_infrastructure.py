@@ -5,15 +5,23 @@ This module implements tools for exposing Python methods as API endpoints.
 
 from __future__ import absolute_import
 
+from collections import Iterator
 from functools import wraps
+from itertools import chain
 import os
 import sys
+from random import random
+from time import time
 
 from json import loads, dumps
 
+from zope.interface import implementer
+
 from pyrsistent import PClass, field, pvector
 
-from twisted.internet.defer import maybeDeferred
+from twisted.internet.defer import Deferred, maybeDeferred
+from twisted.internet.interfaces import IPushProducer
+from twisted.python.failure import Failure
 from twisted.web.http import OK, INTERNAL_SERVER_ERROR
 
 from eliot import Logger, writeFailure, Action
@@ -28,6 +36,16 @@ from ._schema import getValidator
 _ASCENDING = b"ascending"
 _DESCENDING = b"descending"
 
+# Responses returned as an iterator are encoded a batch of elements at a
+# time, each batch being at least this many bytes:
+_STREAMING_CHUNK_SIZE = 2 ** 16
+
+# Responses returned as an iterator are sent as a single body if they encode
+# to fewer bytes than this, so they can be handled like any other response.
+# Larger ones are written to the connection as they are encoded instead, so
+# that they never have to be held in memory as a whole:
+_STREAMING_THRESHOLD = 2 ** 20
+
 _logger = Logger()
 
 
@@ -144,60 +162,220 @@ def _remote_logging(original):
     return logger
 
 
-# Set _validate_responses to True to perform jsonschema validation of
-# API responses from the control service.  Schema validation
-# confirms that outputs are valid, but is computationally expensive for
-# large responses.  Validation can be explicitly controlled by setting
-# the environment variable FLOCKER_VALIDATE_API_RESPONSES to "no" to
-# disable validation or any other value to enable.  If the environment
-# variable is not set, validation is only enabled when running using
-# trial or the Python unittest module.
-try:
-    if os.environ['FLOCKER_VALIDATE_API_RESPONSES'] == 'no':
-        _validate_responses = False
-    else:
-        _validate_responses = True
-except KeyError:
-    if os.path.basename(sys.argv[0]) in ('trial', 'python -m unittest'):
-        _validate_responses = True
+def _response_validation_rate(value, program):
+    """
+    Decide what fraction of API responses to validate.
+
+    :param value: The value of the ``FLOCKER_VALIDATE_API_RESPONSES``
+        environment variable, or ``None`` if it is not set.
+    :param bytes program: The name of the running program.
+
+    :return float: ``0`` to validate no responses, ``1`` to validate all of
+        them, or a fraction in between to validate a random sample of them.
+    """
+    if value is None:
+        if program in ('trial', 'python -m unittest'):
+            return 1.0
+        return 0.0
+    if value == 'no':
+        return 0.0
+    try:
+        rate = float(value)
+    except ValueError:
+        return 1.0
+    return min(max(rate, 0.0), 1.0)
+
+
+# The fraction of API responses from the control service checked against
+# their jsonschema.  Schema validation confirms that outputs are valid, but
+# is computationally expensive for large responses.  Validation can be
+# explicitly controlled by setting the environment variable
+# FLOCKER_VALIDATE_API_RESPONSES to "no" to disable validation, to a number
+# between 0 and 1 to validate that fraction of responses, or to any other
+# value to validate all of them.  If the environment variable is not set,
+# validation is only enabled when running using trial or the Python
+# unittest module.
+_validate_responses = _response_validation_rate(
+    os.environ.get('FLOCKER_VALIDATE_API_RESPONSES'),
+    os.path.basename(sys.argv[0]))
+
+
+def _encode_array(elements):
+    """
+    Encode the elements of an iterator as a JSON array, a batch of elements
+    at a time.
+
+    :param elements: An iterator of JSON encodeable objects.
+
+    :return: An iterator of ``bytes`` which together make up the encoded
+        array.
+    """
+    opening = b"["
+    batch = []
+    size = 0
+    for element in elements:
+        encoded = dumps(element)
+        batch.append(encoded)
+        size += len(encoded)
+        if size >= _STREAMING_CHUNK_SIZE:
+            yield opening + b", ".join(batch)
+            opening = b", "
+            batch = []
+            size = 0
+    if batch:
+        yield opening + b", ".join(batch) + b"]"
+    elif opening == b"[":
+        yield b"[]"
     else:
-        _validate_responses = False
+        yield b"]"
 
 
-def _serialize(outputValidator):
+def _validated_elements(elements, validator):
     """
-    Decorate a function so that its return value is automatically JSON encoded
-    into a structure indicating a successful result.
+    Validate the elements of an array response as they are consumed.
 
-    @param outputValidator: A L{jsonschema} validator for the returned JSON.
+    :param elements: An iterator of the elements of the response.
+    :param validator: A validator for the whole array.
 
-    @return: A decorator that decorates a function with the signature
-        of a Klein route endpoint that may return a Deferred.
+    :raise ValidationError: If an element isn't valid.
+    :return: An iterator of the same elements.
     """
-    def deco(original):
-        def success(result, request):
-            code = OK
-            headers = {}
-            if isinstance(result, EndpointResponse):
-                code = result.code
-                headers = result.headers
-                result = result.result
-            if _validate_responses:
-                outputValidator.validate(result)
-            request.responseHeaders.setRawHeaders(
-                b"content-type", [b"application/json"])
-            for key, value in headers.items():
-                request.responseHeaders.setRawHeaders(key, [value])
-            request.setResponseCode(code)
-            return dumps(result)
+    for element in elements:
+        validator.validate([element])
+        yield element
 
-        def doit(self, request, **routeArguments):
-            result = maybeDeferred(original, self, request, **routeArguments)
-            result.addCallback(success, request)
-            return result
 
-        return doit
-    return deco
+@implementer(IPushProducer)
+class _ResponseProducer(object):
+    """
+    Write the chunks of a response body to a request as fast as its
+    connection accepts them.
+
+    :ivar _request: The ``IRequest`` to write to.
+    :ivar _chunks: An iterator of the ``bytes`` of the body still to be
+        written.
+    :ivar _logger: The ``Logger`` to log a failure to produce a chunk to.
+    :ivar bool _paused: Whether the connection has asked for writing to stop
+        until it catches up.
+    :ivar Deferred _done: Fires with ``None`` once writing has finished.
+    """
+    def __init__(self, request, chunks, logger):
+        self._request = request
+        self._chunks = chunks
+        self._logger = logger
+        self._paused = False
+        self._done = Deferred(lambda _: self.stopProducing())
+
+    def start(self):
+        """
+        Start writing the body.
+
+        :return: ``Deferred`` that fires with ``None`` once the whole body
+            has been written, or writing it has failed or been stopped.
+        """
+        self._request.registerProducer(self, True)
+        self._write()
+        return self._done
+
+    def _write(self):
+        """
+        Write chunks until the connection pauses us or there are none left.
+        """
+        while not (self._paused or self._done.called):
+            try:
+                chunk = next(self._chunks)
+            except StopIteration:
+                self._request.unregisterProducer()
+                self._done.callback(None)
+            except Exception:
+                # The response code and part of the body have already been
+                # sent, so the only way left to tell the client something
+                # went wrong is to close the connection before the response
+                # is complete:
+                writeFailure(Failure(), self._logger, LOG_SYSTEM)
+                self._request.unregisterProducer()
+                self._request.transport.abortConnection()
+                self._done.callback(None)
+            else:
+                self._request.write(chunk)
+
+    def pauseProducing(self):
+        self._paused = True
+
+    def resumeProducing(self):
+        self._paused = False
+        self._write()
+
+    def stopProducing(self):
+        self._paused = True
+        if not self._done.called:
+            self._done.callback(None)
+
+
+def _write_array(request, elements, logger):
+    """
+    Encode the elements of an iterator as the JSON array response to a
+    request.
+
+    :param request: The ``IRequest`` being responded to.
+    :param elements: An iterator of JSON encodeable objects.
+    :param logger: The ``Logger`` to log a failure to encode the response
+        to, once it has started being written.
+
+    :return: The encoded array as ``bytes`` if it is shorter than
+        ``_STREAMING_THRESHOLD``.  Otherwise a ``Deferred`` that fires with
+        ``None`` once the array has been written to ``request``.
+    """
+    chunks = _encode_array(elements)
+    buffered = []
+    size = 0
+    for chunk in chunks:
+        buffered.append(chunk)
+        size += len(chunk)
+        # Twisted doesn't resume a producer paused while its request is
+        # queued behind a pipelined one, so those get the whole body at
+        # once:
+        if size >= _STREAMING_THRESHOLD and not request.queued:
+            producer = _ResponseProducer(
+                request, chain(buffered, chunks), logger)
+            return producer.start()
+    return b"".join(buffered)
+
+
+def _serialize(original):
+    """
+    Decorate a function so that its return value is automatically JSON encoded
+    into a structure indicating a successful result.
+
+    A return value which is an iterator is encoded as a JSON array.  If it is
+    large it is written to the request as it is encoded, rather than all at
+    once, at the rate the client reads it.
+
+    @return: A function with the signature of a Klein route endpoint that may
+        return a Deferred.
+    """
+    def success(result, request, logger):
+        code = OK
+        headers = {}
+        if isinstance(result, EndpointResponse):
+            code = result.code
+            headers = result.headers
+            result = result.result
+        request.responseHeaders.setRawHeaders(
+            b"content-type", [b"application/json"])
+        for key, value in headers.items():
+            request.responseHeaders.setRawHeaders(key, [value])
+        request.setResponseCode(code)
+        if isinstance(result, Iterator):
+            return _write_array(request, result, logger)
+        return dumps(result)
+
+    def doit(self, request, **routeArguments):
+        result = maybeDeferred(original, self, request, **routeArguments)
+        result.addCallback(success, request, _get_logger(self))
+        return result
+
+    return doit
 
 
 def structured(inputSchema, outputSchema, schema_store=None,
@@ -237,8 +415,9 @@ def structured(inputSchema, outputSchema, schema_store=None,
         @wraps(original)
         @_remote_logging
         @_logging
-        @_serialize(outputValidator)
+        @_serialize
         def loadAndDispatch(self, request, **routeArguments):
+            input_seconds = None
             if request.method in (b"GET", b"DELETE") or ignore_body:
                 objects = {}
             else:
@@ -248,9 +427,11 @@ def structured(inputSchema, outputSchema, schema_store=None,
                 except ValueError:
                     raise DECODING_ERROR
 
+                start = time()
                 errors = []
                 for error in inputValidator.iter_errors(objects):
                     errors.append(error.message)
+                input_seconds = time() - start
                 if errors:
                     raise InvalidRequestJSON(errors=errors, schema=inputSchema)
 
@@ -271,7 +452,30 @@ def structured(inputSchema, outputSchema, schema_store=None,
                     if isinstance(result, EndpointResponse):
                         code = result.code
                         json = result.result
-                    eliot_action.add_success_fields(code=code, json=json)
+                    validate = (_validate_responses and
+                                random() < _validate_responses)
+                    output_seconds = None
+                    logged_json = json
+                    if isinstance(json, Iterator):
+                        # The elements are only produced as the response
+                        # is encoded, after this action has finished, so
+                        # they are validated then and aren't logged:
+                        logged_json = None
+                        if validate:
+                            json = _validated_elements(json, outputValidator)
+                            if isinstance(result, EndpointResponse):
+                                result = EndpointResponse(
+                                    code, json, result.headers)
+                            else:
+                                result = json
+                    elif validate:
+                        start = time()
+                        outputValidator.validate(json)
+                        output_seconds = time() - start
+                    eliot_action.add_success_fields(
+                        code=code, json=logged_json,
+                        input_validation_seconds=input_seconds,
+                        output_validation_seconds=output_seconds)
                     return result
                 d.addCallback(got_result)
                 d.addActionFinish()
@@ -24,6 +24,14 @@ JSON = Field.forTypes(
 RESPONSE_CODE = Field.forTypes(
     u"code", [int],
     u"The response code for the request.")
+INPUT_VALIDATION_SECONDS = Field.forTypes(
+    u"input_validation_seconds", [float, None],
+    u"The seconds spent validating the request body, or null if it was not "
+    u"validated.")
+OUTPUT_VALIDATION_SECONDS = Field.forTypes(
+    u"output_validation_seconds", [float, None],
+    u"The seconds spent validating the response body, or null if it was not "
+    u"validated.")
 
 
 # It would be nice if RESPONSE_CODE was in REQUEST instead of
@@ -36,5 +44,6 @@ REQUEST = ActionType(
 JSON_REQUEST = ActionType(
     LOG_SYSTEM + u":json_request",
     [JSON],
-    [RESPONSE_CODE, JSON],
+    [RESPONSE_CODE, JSON, INPUT_VALIDATION_SECONDS,
+     OUTPUT_VALIDATION_SECONDS],
     u"A request containing JSON request and response bodies.")
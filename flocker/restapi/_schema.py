@@ -7,6 +7,7 @@ See https://python-jsonschema.readthedocs.org/en/v2.3.0/.
 """
 
 import copy
+from urlparse import urldefrag, urljoin
 
 from jsonschema.validators import RefResolver, validator_for
 from jsonschema import draft4_format_checker
@@ -42,6 +43,10 @@ def getValidator(schema, schema_store):
 
     @param dict schema_store: A mapping between schema paths
         (e.g. ``b/v1/types.json``) and the JSON schema structure.
+
+    All I{$ref} references in C{schema} are resolved once, when the
+    validator is created, rather than every time validation reaches them.
+    For schemas of long lists this makes validation several times faster.
     """
     # The base_uri here isn't correct for the schema,
     # but does give proper relative paths.
@@ -49,10 +54,66 @@ def getValidator(schema, schema_store):
         base_uri=b'',
         referrer=schema, store=schema_store)
     resolver.resolution_scope = b''
+    schema = _inlineReferences(schema, resolver)
     return validator_for(schema)(
         schema, resolver=resolver, format_checker=draft4_format_checker)
 
 
+def _inlineReferences(schema, resolver, resolving=frozenset()):
+    """
+    Replace every I{$ref} JSON reference in a JSON Schema with the schema it
+    refers to.
+
+    Unlike L{resolveSchema} this neither modifies nor copies the referred
+    schemas: only the objects containing references are copied, so that the
+    validation keywords of each object are still checked in the same order.
+
+    A reference met again while the schema it refers to is being inlined,
+    for example by a schema which refers to itself, can't be inlined.  It is
+    left in place instead, made absolute so that the validator can still
+    look it up when validation reaches it.
+
+    @param schema: A JSON Schema, or any part of one.
+
+    @param resolver: The L{RefResolver} to look up references with.
+
+    @param resolving: The L{frozenset} of the absolute URIs of the
+        references whose schemas are being inlined.
+
+    @return: The schema without references, apart from recursive ones, or
+        C{schema} itself if it had none.
+    """
+    if isinstance(schema, list):
+        result = [
+            _inlineReferences(item, resolver, resolving) for item in schema]
+        if all(new is old for new, old in zip(result, schema)):
+            return schema
+        return result
+
+    if isinstance(schema, dict):
+        if u"$ref" in schema:
+            uri, fragment = urldefrag(
+                urljoin(resolver.resolution_scope, schema[u"$ref"]))
+            if not uri:
+                uri = resolver.base_uri
+            absolute = u"%s#%s" % (uri, fragment)
+            if absolute in resolving:
+                return {u"$ref": absolute}
+            with resolver.resolving(schema[u"$ref"]) as resolved:
+                return _inlineReferences(
+                    resolved, resolver, resolving | {absolute})
+        result = schema
+        for key, value in schema.items():
+            inlined = _inlineReferences(value, resolver, resolving)
+            if inlined is not value:
+                if result is schema:
+                    result = schema.copy()
+                result[key] = inlined
+        return result
+
+    return schema
+
+
 def resolveSchema(schema, schemaStore):
     """
     Recursively resolve all I{$ref} JSON references in a JSON Schema.
@@ -150,6 +150,12 @@ class ResultHandlingApplication(object):
         self.kwargs = kwargs
         return self._constructSuccess({})
 
+    @app.route(b"/foo/badelements")
+    @structured({}, {'type': 'array', 'items': {'type': 'integer'}})
+    def badElements(self, **kwargs):
+        self.kwargs = kwargs
+        return self._constructSuccess(iter([1, u"two"]))
+
 
 def assertJSONLogged(test, logger, method, path, request, response,
                      code):
@@ -597,6 +603,84 @@ class StructuredJSONTests(TestCase):
 
         self.assertEqual(request._code, OK)
 
+    @validateLogging(_assertTracebackLogged(ValidationError))
+    def test_responseSampledValidation(self, logger):
+        """
+        If _validate_responses is a fraction, a response is validated if a
+        random number falls below it.
+        """
+        self.patch(_infrastructure, '_validate_responses', 0.25)
+        self.patch(_infrastructure, 'random', lambda: 0.2)
+
+        request = dummyRequest(
+            b"GET", b"/foo/badresponse",
+            Headers({b"content-type": [b"application/json"]}), b"")
+
+        app = self.Application(logger, None)
+        render(app.app.resource(), request)
+
+        self.assertEqual(request._code, INTERNAL_SERVER_ERROR)
+
+    @validateLogging(_assertRequestLogged(b"/foo/badresponse", b"GET"))
+    def test_responseSampledNoValidation(self, logger):
+        """
+        If _validate_responses is a fraction, a response is not validated if
+        a random number does not fall below it.
+        """
+        self.patch(_infrastructure, '_validate_responses', 0.25)
+        self.patch(_infrastructure, 'random', lambda: 0.25)
+
+        request = dummyRequest(
+            b"GET", b"/foo/badresponse",
+            Headers({b"content-type": [b"application/json"]}), b"")
+
+        app = self.Application(logger, None)
+        render(app.app.resource(), request)
+
+        self.assertEqual(request._code, OK)
+
+    @capture_logging(None)
+    def test_validationTimesLogged(self, logger):
+        """
+        The seconds spent validating the request and response bodies are
+        logged in the JSON request action.
+        """
+        self.patch(_infrastructure, '_validate_responses', 1.0)
+        request = dummyRequest(
+            b"PUT", b"/foo/bar",
+            Headers({b"content-type": [b"application/json"]}), dumps({}))
+
+        app = self.Application(logger, None)
+        render(app.app.resource(), request)
+
+        [action] = LoggedAction.of_type(logger.messages, JSON_REQUEST)
+        fields = action.end_message
+        self.assertEqual(
+            (type(fields[u"input_validation_seconds"]),
+             type(fields[u"output_validation_seconds"])),
+            (float, float))
+
+    @capture_logging(None)
+    def test_noValidationTimesLogged(self, logger):
+        """
+        If the request body is not decoded and the response body is not
+        validated, no validation time is logged for them.
+        """
+        self.patch(_infrastructure, '_validate_responses', 0.0)
+        request = dummyRequest(
+            b"GET", b"/foo/bar",
+            Headers({b"content-type": [b"application/json"]}), b"")
+
+        app = self.Application(logger, None)
+        render(app.app.resource(), request)
+
+        [action] = LoggedAction.of_type(logger.messages, JSON_REQUEST)
+        fields = action.end_message
+        self.assertEqual(
+            (fields[u"input_validation_seconds"],
+             fields[u"output_validation_seconds"]),
+            (None, None))
+
     @validateLogging(_assertRequestLogged(b"/baz/quux", b"POST"))
     def test_onlyArgumentsFromRoute(self, logger):
         """
@@ -628,6 +712,194 @@ class StructuredJSONTests(TestCase):
             {"jsonValue": True, "routingValue": "quux"}, app.kwargs)
 
 
+class StreamingTests(TestCase):
+    """
+    Tests for the L{structured} behavior related to encoding responses that
+    are returned as iterators.
+    """
+    def render(self, logger, elements):
+        """
+        Render a response returned as an iterator.
+
+        @param elements: An iterable of the elements of the response.
+
+        @return: The L{_DummyRequest} rendered to.
+        """
+        request = dummyRequest(b"GET", b"/foo/bar", Headers(), b"")
+        app = ResultHandlingApplication(
+            Execution.SYNCHRONOUS, logger, iter(elements))
+        render(app.app.resource(), request)
+        return request
+
+    def stream(self):
+        """
+        Make all responses returned as iterators large enough to be written
+        to the request as they are encoded, with each element encoded
+        separately.
+        """
+        self.patch(_infrastructure, "_STREAMING_CHUNK_SIZE", 1)
+        self.patch(_infrastructure, "_STREAMING_THRESHOLD", 1)
+
+    @validateLogging(
+        assertJSONLogged, b"GET", b"/foo/bar", {}, None, OK)
+    def test_encode(self, logger):
+        """
+        An iterator is encoded as a JSON array, and isn't logged.
+        """
+        request = self.render(logger, [{u"a": 1}, [2], u"three"])
+        self.assertEqual(
+            [{u"a": 1}, [2], u"three"], loads(request._responseBody))
+
+    @capture_logging(None)
+    def test_empty(self, logger):
+        """
+        An empty iterator is encoded as an empty JSON array.
+        """
+        request = self.render(logger, [])
+        self.assertEqual([], loads(request._responseBody))
+
+    @capture_logging(None)
+    def test_streamed(self, logger):
+        """
+        A large response is written to the request as it is encoded, and the
+        request is finished once it has all been written.
+        """
+        self.stream()
+        request = self.render(logger, [1, 2, 3])
+        self.assertEqual(
+            ([1, 2, 3], True),
+            (loads(request._responseBody), request._finished))
+
+    @capture_logging(None)
+    def test_paused(self, logger):
+        """
+        A large response is only encoded while the request's connection
+        accepts more data.
+        """
+        self.stream()
+        produced = []
+        request = dummyRequest(b"GET", b"/foo/bar", Headers(), b"")
+        written = []
+
+        def write(data):
+            written.append(data)
+            request.transport.producer.pauseProducing()
+        request.write = write
+
+        def elements():
+            for element in [1, 2, 3]:
+                produced.append(element)
+                yield element
+        app = ResultHandlingApplication(
+            Execution.SYNCHRONOUS, logger, elements())
+        render(app.app.resource(), request)
+        paused = (list(produced), list(written))
+        request.transport.producer.resumeProducing()
+        self.assertEqual(
+            (paused, produced, written),
+            (([1], [b"[1"]), [1, 2], [b"[1", b", 2"]))
+
+    @validateLogging(_assertTracebackLogged(ArbitraryException))
+    def test_streamingFailure(self, logger):
+        """
+        If producing a large response fails after it has started being
+        written, the failure is logged and the connection is closed before
+        the response is complete.
+        """
+        self.stream()
+        aborted = []
+
+        def elements():
+            yield 1
+            yield 2
+            raise ArbitraryException()
+        request = dummyRequest(b"GET", b"/foo/bar", Headers(), b"")
+        request.transport.abortConnection = lambda: aborted.append(True)
+        app = ResultHandlingApplication(
+            Execution.SYNCHRONOUS, logger, elements())
+        render(app.app.resource(), request)
+        self.assertEqual(
+            (request._responseBody, aborted), (b"[1, 2", [True]))
+
+    @capture_logging(None)
+    def test_stopped(self, logger):
+        """
+        If the connection is lost while a large response is being written,
+        no more of it is encoded.
+        """
+        self.stream()
+        request = dummyRequest(b"GET", b"/foo/bar", Headers(), b"")
+        produced = []
+
+        def write(data):
+            request.transport.producer.stopProducing()
+        request.write = write
+
+        def elements():
+            for element in [1, 2, 3]:
+                produced.append(element)
+                yield element
+        app = ResultHandlingApplication(
+            Execution.SYNCHRONOUS, logger, elements())
+        render(app.app.resource(), request)
+        self.assertEqual([1], produced)
+
+    @validateLogging(_assertTracebackLogged(ValidationError))
+    def test_elementValidationError(self, logger):
+        """
+        The elements of an iterator are validated against the response
+        schema as they are encoded.
+        """
+        self.patch(_infrastructure, '_validate_responses', 1.0)
+        request = dummyRequest(b"GET", b"/foo/badelements", Headers(), b"")
+        app = ResultHandlingApplication(Execution.SYNCHRONOUS, logger, None)
+        render(app.app.resource(), request)
+        self.assertEqual(request._code, INTERNAL_SERVER_ERROR)
+
+
+class ResponseValidationRateTests(TestCase):
+    """
+    Tests for L{_infrastructure._response_validation_rate}.
+    """
+    def test_unset(self):
+        """
+        If the environment variable is not set, all responses are validated
+        when running tests and none are otherwise.
+        """
+        rate = _infrastructure._response_validation_rate
+        self.assertEqual(
+            (rate(None, 'trial'), rate(None, 'flocker-control')),
+            (1.0, 0.0))
+
+    def test_no(self):
+        """
+        If the environment variable is C{"no"} no responses are validated.
+        """
+        self.assertEqual(
+            _infrastructure._response_validation_rate('no', 'trial'), 0.0)
+
+    def test_fraction(self):
+        """
+        If the environment variable is a number that fraction of responses
+        is validated, limited to between 0 and 1.
+        """
+        rate = _infrastructure._response_validation_rate
+        self.assertEqual(
+            [rate(value, 'flocker-control')
+             for value in ('0.01', '0', '1', '-1', '2')],
+            [0.01, 0.0, 1.0, 0.0, 1.0])
+
+    def test_other(self):
+        """
+        If the environment variable has any other value all responses are
+        validated.
+        """
+        self.assertEqual(
+            _infrastructure._response_validation_rate(
+                'yes', 'flocker-control'),
+            1.0)
+
+
 class UserDocumentationTests(TestCase):
     """
     Tests for L{user_documentation}.
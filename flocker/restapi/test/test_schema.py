@@ -63,6 +63,59 @@ class GetValidatorTests(TestCase):
                                  {'schema.json': {'type': 'string'}})
         self.assertRaises(ValidationError, validator.validate, {})
 
+    def test_resolvedWhenCreated(self):
+        """
+        L{getValidator} resolves references when the validator is created,
+        so that validation does not need to look them up.
+        """
+        validator = getValidator({u'$ref': u'schema.json'},
+                                 {'schema.json': {'type': 'string'}})
+        self.assertEqual(validator.schema[u'type'], u'string')
+
+    def test_selfReference(self):
+        """
+        L{getValidator} accepts a schema which refers to itself, and still
+        validates the parts of an instance matching the recursive reference.
+        """
+        store = {b"/path/tree.json": {
+            u"tree": {
+                u"type": u"object",
+                u"properties": {
+                    u"value": {u"type": u"integer"},
+                    u"children": {u"type": u"array",
+                                  u"items": {u"$ref": u"#/tree"}}}}}}
+        validator = getValidator({u"$ref": u"/path/tree.json#/tree"}, store)
+        validator.validate({u"value": 1, u"children": [
+            {u"value": 2, u"children": [{u"value": 3}]}]})
+        self.assertRaises(
+            ValidationError, validator.validate,
+            {u"value": 1, u"children": [
+                {u"value": 2, u"children": [{u"value": u"three"}]}]})
+
+    def test_mutualReference(self):
+        """
+        L{getValidator} accepts schemas which refer to each other.
+        """
+        store = {b"/path/types.json": {
+            u"a": {u"type": u"object",
+                   u"properties": {u"b": {u"$ref": u"#/b"}}},
+            u"b": {u"type": u"object",
+                   u"properties": {u"a": {u"$ref": u"#/a"},
+                                   u"value": {u"type": u"string"}}}}}
+        validator = getValidator({u"$ref": u"/path/types.json#/a"}, store)
+        validator.validate({u"b": {u"a": {u"b": {u"value": u"x"}}}})
+        self.assertRaises(
+            ValidationError, validator.validate,
+            {u"b": {u"a": {u"b": {u"value": 1}}}})
+
+    def test_unresolvableReference(self):
+        """
+        L{getValidator} raises an exception if a reference cannot be
+        resolved.
+        """
+        self.assertRaises(RefResolutionError, getValidator,
+                          {u'$ref': u'missing.json'}, {})
+
 
 class ResolveSchemaTests(TestCase):
     """